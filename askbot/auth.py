@@ -10,6 +10,7 @@ User.assert_can...
 from django.db import transaction
 from django.utils import timezone
 from askbot.models import Repute
+from askbot.models.reputation_ledger import record_reputation_change
 # from askbot.models import Answer
 from askbot import signals
 from askbot.conf import settings as askbot_settings
@@ -27,22 +28,15 @@ def onFlaggedItem(post, user, timestamp=None):
     post.save()
 
     flagged_user = post.author
-
-    flagged_user.receive_reputation(
-        askbot_settings.REP_LOSS_FOR_RECEIVING_FLAG,
-        post.language_code)
-    flagged_user.save()
-
     question = post.thread._question_post()
 
-    reputation = Repute(
-        user=flagged_user,
-        negative=askbot_settings.REP_LOSS_FOR_RECEIVING_FLAG,
-        question=question,
-        reputed_at=timestamp,
+    record_reputation_change(
+        flagged_user,
+        askbot_settings.REP_LOSS_FOR_RECEIVING_FLAG,
         reputation_type=-4,  # TODO: clean up magic number
-        reputation=flagged_user.reputation)
-    reputation.save()
+        question=question,
+        language_code=post.language_code,
+        timestamp=timestamp)
 
     signals.flag_offensive.send(sender=post.__class__, instance=post,
                                 mark_by=user)
@@ -56,36 +50,22 @@ def onFlaggedItem(post, user, timestamp=None):
     if post.offensive_flag_count == askbot_settings.MIN_FLAGS_TO_HIDE_POST:
         # TODO: strange - are we supposed to hide the post here or the name of
         # setting is incorrect?
-        flagged_user.receive_reputation(
+        record_reputation_change(
+            flagged_user,
             askbot_settings.REP_LOSS_FOR_RECEIVING_THREE_FLAGS_PER_REVISION,
-            post.language_code)
-
-        flagged_user.save()
-
-        reputation = Repute(
-            user=flagged_user,
-            negative=askbot_settings.REP_LOSS_FOR_RECEIVING_THREE_FLAGS_PER_REVISION,
-            question=question,
-            reputed_at=timestamp,
             reputation_type=-6,
-            reputation=flagged_user.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
 
     elif post.offensive_flag_count == askbot_settings.MIN_FLAGS_TO_DELETE_POST:
-        flagged_user.receive_reputation(
+        record_reputation_change(
+            flagged_user,
             askbot_settings.REP_LOSS_FOR_RECEIVING_FIVE_FLAGS_PER_REVISION,
-            post.language_code)
-
-        flagged_user.save()
-
-        reputation = Repute(
-            user=flagged_user,
-            negative=askbot_settings.REP_LOSS_FOR_RECEIVING_FIVE_FLAGS_PER_REVISION,
-            question=question,
-            reputed_at=timestamp,
             reputation_type=-7,
-            reputation=flagged_user.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
 
         post.deleted = True
         # post.deleted_at = timestamp
@@ -105,22 +85,15 @@ def onUnFlaggedItem(post, user, timestamp=None):
     post.save()
 
     flagged_user = post.author
-
-    flagged_user.receive_reputation(
-        -askbot_settings.REP_LOSS_FOR_RECEIVING_FLAG,  # negative of a negative
-        post.language_code)
-    flagged_user.save()
-
     question = post.thread._question_post()
 
-    reputation = Repute(
-        user=flagged_user,
-        positive=abs(askbot_settings.REP_LOSS_FOR_RECEIVING_FLAG),
-        question=question,
-        reputed_at=timestamp,
+    record_reputation_change(
+        flagged_user,
+        -askbot_settings.REP_LOSS_FOR_RECEIVING_FLAG,  # negative of a negative
         reputation_type=-4,  # TODO: clean up magic number
-        reputation=flagged_user.reputation)
-    reputation.save()
+        question=question,
+        language_code=post.language_code,
+        timestamp=timestamp)
 
     signals.remove_flag_offensive.send(sender=post.__class__, instance=post,
                                        mark_by=user)
@@ -135,36 +108,22 @@ def onUnFlaggedItem(post, user, timestamp=None):
     if post.offensive_flag_count == askbot_settings.MIN_FLAGS_TO_HIDE_POST - 1:
         # TODO: strange - are we supposed to hide the post here or the name of
         # setting is incorrect?
-        flagged_user.receive_reputation(
+        record_reputation_change(
+            flagged_user,
             -askbot_settings.REP_LOSS_FOR_RECEIVING_THREE_FLAGS_PER_REVISION,
-            post.language_code)
-
-        flagged_user.save()
-
-        reputation = Repute(
-            user=flagged_user,
-            positive=abs(askbot_settings.REP_LOSS_FOR_RECEIVING_THREE_FLAGS_PER_REVISION),
-            question=question,
-            reputed_at=timestamp,
             reputation_type=-6,
-            reputation=flagged_user.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
     # The post fell below DELETE treshold, undelete it
     elif post.offensive_flag_count == askbot_settings.MIN_FLAGS_TO_DELETE_POST-1:
-        flagged_user.receive_reputation(
+        record_reputation_change(
+            flagged_user,
             -askbot_settings.REP_LOSS_FOR_RECEIVING_FIVE_FLAGS_PER_REVISION,
-            post.language_code)
-
-        flagged_user.save()
-
-        reputation = Repute(
-            user=flagged_user,
-            positive=abs(askbot_settings.REP_LOSS_FOR_RECEIVING_FIVE_FLAGS_PER_REVISION),
-            question=question,
-            reputed_at=timestamp,
             reputation_type=-7,
-            reputation=flagged_user.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
 
         post.deleted = False
         post.save()
@@ -180,35 +139,26 @@ def onAnswerAccept(answer, user, timestamp=None):
     question = answer.thread._question_post()
 
     if answer.author != user:
-        answer.author.receive_reputation(
+        record_reputation_change(
+            answer.author,
             askbot_settings.REP_GAIN_FOR_RECEIVING_ANSWER_ACCEPTANCE,
-            answer.language_code)
-        answer.author.save()
-        reputation = Repute(
-            user=answer.author,
-            positive=abs(askbot_settings.REP_GAIN_FOR_RECEIVING_ANSWER_ACCEPTANCE),
-            question=question,
-            reputed_at=timestamp,
             reputation_type=2,
-            reputation=answer.author.reputation)
-        reputation.save()
+            question=question,
+            language_code=answer.language_code,
+            timestamp=timestamp)
 
     if answer.author_id == question.author_id and user.pk == question.author_id:
         # a plug to prevent reputation gaming by posting a question
         # then answering and accepting as best all by the same person
         return
 
-    user.receive_reputation(askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER,
-                            answer.language_code)
-    user.save()
-    reputation = Repute(
-        user=user,
-        positive=askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER,
-        question=question,
-        reputed_at=timestamp,
+    record_reputation_change(
+        user,
+        askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER,
         reputation_type=3,
-        reputation=user.reputation)
-    reputation.save()
+        question=question,
+        language_code=answer.language_code,
+        timestamp=timestamp)
 
 
 @transaction.atomic
@@ -227,18 +177,13 @@ def onAnswerAcceptCanceled(answer, user, timestamp=None):
     question = answer.thread._question_post()
 
     if user != answer.author:
-        answer.author.receive_reputation(
+        record_reputation_change(
+            answer.author,
             -askbot_settings.REP_GAIN_FOR_RECEIVING_ANSWER_ACCEPTANCE,
-            answer.language_code)
-        answer.author.save()
-        reputation = Repute(
-            user=answer.author,
-            negative=-askbot_settings.REP_GAIN_FOR_RECEIVING_ANSWER_ACCEPTANCE,
-            question=question,
-            reputed_at=timestamp,
             reputation_type=-2,
-            reputation=answer.author.reputation)
-        reputation.save()
+            question=question,
+            language_code=answer.language_code,
+            timestamp=timestamp)
 
     if answer.author_id == question.author_id and user.pk == question.author_id:
         # a symmettric measure for the reputation gaming plug
@@ -246,17 +191,13 @@ def onAnswerAcceptCanceled(answer, user, timestamp=None):
         # here it protects the user from uwanted reputation loss
         return
 
-    user.receive_reputation(-askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER,
-                            answer.language_code)
-    user.save()
-    reputation = Repute(
-        user=user,
-        negative=-askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER,
-        question=question,
-        reputed_at=timestamp,
+    record_reputation_change(
+        user,
+        -askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER,
         reputation_type=-1,
-        reputation=user.reputation)
-    reputation.save()
+        question=question,
+        language_code=answer.language_code,
+        timestamp=timestamp)
 
 
 @transaction.atomic
@@ -278,22 +219,16 @@ def onUpVoted(vote, post, user, timestamp=None):
         author = post.author
         todays_rep_gain = Repute.objects.get_reputation_by_upvoted_today(author)
         if todays_rep_gain < askbot_settings.MAX_REP_GAIN_PER_USER_PER_DAY:
-            author.receive_reputation(
-                askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
-                post.language_code)
-            author.save()
-
             # TODO: this is suboptimal if post is already a question
             question = post.thread._question_post()
 
-            reputation = Repute(
-                user=author,
-                positive=askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
-                question=question,
-                reputed_at=timestamp,
+            record_reputation_change(
+                author,
+                askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
                 reputation_type=1,
-                reputation=author.reputation)
-            reputation.save()
+                question=question,
+                language_code=post.language_code,
+                timestamp=timestamp)
 
 
 @transaction.atomic
@@ -315,23 +250,16 @@ def onUpVotedCanceled(vote, post, user, timestamp=None):
         return
 
     if not (post.wiki or post.is_anonymous):
-        author = post.author
-        author.receive_reputation(
-            -askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
-            post.language_code)
-        author.save()
-
         # TODO: this is suboptimal if post is already a question
         question = post.thread._question_post()
 
-        reputation = Repute(
-            user=author,
-            negative=-askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
-            question=question,
-            reputed_at=timestamp,
+        record_reputation_change(
+            post.author,
+            -askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE,
             reputation_type=-8,
-            reputation=author.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
 
 
 @transaction.atomic
@@ -345,37 +273,24 @@ def onDownVoted(vote, post, user, timestamp=None):
     post.save()
 
     if not (post.wiki or post.is_anonymous):
-        author = post.author
-        author.receive_reputation(
-            askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE,
-            post.language_code)
-        author.save()
-
         # TODO: this is suboptimal if post is already a question
         question = post.thread._question_post()
 
-        reputation = Repute(
-            user=author,
-            negative=abs(askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE),
-            question=question,
-            reputed_at=timestamp,
+        record_reputation_change(
+            post.author,
+            askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE,
             reputation_type=-3,
-            reputation=author.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
 
-        user.receive_reputation(
+        record_reputation_change(
+            user,
             askbot_settings.REP_LOSS_FOR_DOWNVOTING,
-            post.language_code)
-        user.save()
-
-        reputation = Repute(
-            user=user,
-            negative=askbot_settings.REP_LOSS_FOR_DOWNVOTING,
-            question=question,
-            reputed_at=timestamp,
             reputation_type=-5,
-            reputation=user.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
 
 
 @transaction.atomic
@@ -391,34 +306,21 @@ def onDownVotedCanceled(vote, post, user, timestamp=None):
     post.save()
 
     if not (post.wiki or post.is_anonymous):
-        author = post.author
-        author.receive_reputation(
-            -askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE,
-            post.language_code)
-        author.save()
-
         # TODO: this is suboptimal if post is already a question
         question = post.thread._question_post()
 
-        reputation = Repute(
-            user=author,
-            positive=abs(askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE),
-            question=question,
-            reputed_at=timestamp,
+        record_reputation_change(
+            post.author,
+            -askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE,
             reputation_type=4,
-            reputation=author.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
 
-        user.receive_reputation(
+        record_reputation_change(
+            user,
             -askbot_settings.REP_LOSS_FOR_DOWNVOTING,
-            post.language_code)
-        user.save()
-
-        reputation = Repute(
-            user=user,
-            positive=abs(askbot_settings.REP_LOSS_FOR_DOWNVOTING),
-            question=question,
-            reputed_at=timestamp,
             reputation_type=5,
-            reputation=user.reputation)
-        reputation.save()
+            question=question,
+            language_code=post.language_code,
+            timestamp=timestamp)
@@ -0,0 +1,10 @@
+"""Tools for measuring the performance of askbot on large forums:
+
+* :mod:`askbot.benchmarks.generator` - fills the database with
+  a deterministic synthetic forum of configurable size
+* :mod:`askbot.benchmarks.runner` - times the hot paths and
+  compares the results with a stored baseline
+
+Both are used by the management commands
+``askbot_generate_forum`` and ``askbot_run_benchmarks``.
+"""
@@ -0,0 +1,476 @@
+"""Generator of a deterministic synthetic forum for the benchmarks.
+
+The same options and the same seed always produce the same users,
+tags, questions, answers, comments and votes. Activity is skewed
+the way it is on the real sites - a few tags, users and threads
+get most of the posts and votes - following the Zipf distribution
+with the exponent ``skew``.
+
+Rows are written with ``bulk_create`` in batches, with the primary
+keys allocated up front, so that a forum with a million posts
+is made in tens of minutes rather than hours. The denormalized counters (points, vote
+and comment counts, tag use counts, reputation) are computed
+while generating, the derived tables (tag co-occurrence,
+thread listing) are rebuilt at the end.
+"""
+import bisect
+import datetime
+import hashlib
+import random
+
+from django.conf import settings as django_settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from askbot import const
+from askbot.conf import settings as askbot_settings
+from askbot.models import EmailFeedSetting
+from askbot.models import Group
+from askbot.models import GroupMembership
+from askbot.models import Post
+from askbot.models import PostRevision
+from askbot.models import PostToGroup
+from askbot.models import Tag
+from askbot.models import Thread
+from askbot.models import ThreadToGroup
+from askbot.models import User
+from askbot.models import UserProfile
+from askbot.models import Vote
+from askbot.models.tag_cooccurrence import rebuild_tag_cooccurrence
+from askbot.models.thread_listing import listing_is_enabled, ThreadListing
+
+SYLLABLES = ('ba', 'ce', 'di', 'fo', 'gu', 'ha', 'ke', 'li',
+             'mo', 'nu', 'pa', 're', 'si', 'to', 'vu', 'za')
+
+#share of the votes cast on the question rather than the answers
+QUESTION_VOTE_SHARE = 0.4
+UPVOTE_SHARE = 0.85
+#sqlite allows up to 999 parameters per query
+ID_LIST_SIZE = 500
+
+
+def make_vocabulary():
+    """returns list of the made up words of two and three syllables"""
+    words = [a + b for a in SYLLABLES for b in SYLLABLES]
+    words.extend([a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES])
+    return words
+
+
+class ZipfSampler(object):
+    """draws items of the list, the item at the position ``k``
+    with the probability proportional to ``1/(k + 1)**skew``"""
+
+    def __init__(self, items, skew, rng):
+        self.items = items
+        self.rng = rng
+        self.cumulative = list()
+        total = 0.0
+        for rank in range(1, len(items) + 1):
+            total += 1.0 / rank ** skew
+            self.cumulative.append(total)
+        self.total = total
+
+    def sample(self):
+        pos = bisect.bisect_left(self.cumulative, self.rng.random() * self.total)
+        return self.items[min(pos, len(self.items) - 1)]
+
+    def sample_distinct(self, count, exclude=None):
+        """returns list of up to ``count`` distinct items,
+        the rare items are drawn uniformly once the skewed
+        draws keep repeating the popular ones"""
+        exclude = exclude or set()
+        count = min(count, len(self.items) - len(exclude))
+        found = list()
+        seen = set(exclude)
+        attempts = 0
+        while len(found) < count:
+            attempts += 1
+            if attempts < count * 10:
+                item = self.sample()
+            else:
+                item = self.rng.choice(self.items)
+            if item not in seen:
+                seen.add(item)
+                found.append(item)
+        return found
+
+
+class ForumGenerator(object):
+    """Fills the database with a synthetic forum, usage::
+
+        generator = ForumGenerator(users=1000, questions=5000, seed=1)
+        generator.generate()
+        print(generator.counts)
+    """
+
+    def __init__(self, users=1000, questions=2000, answers=6000,
+                 comments=6000, votes=20000, tags=300, tags_per_question=3,
+                 skew=1.1, days=365, seed=1, batch_size=1000,
+                 username_prefix='bench', stdout=None):
+        self.user_count = users
+        self.question_count = questions
+        self.answer_count = answers
+        self.comment_count = comments
+        self.vote_count = votes
+        self.tag_count = tags
+        self.tags_per_question = tags_per_question
+        self.skew = skew
+        self.days = days
+        self.batch_size = batch_size
+        self.username_prefix = username_prefix
+        self.stdout = stdout
+        self.rng = random.Random(seed)
+        self.counts = dict()
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def get_next_id(self, model):
+        return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+    def bulk_create(self, model, objects):
+        """inserts the objects in batches, the database
+        backend may split the batches further"""
+        for start in range(0, len(objects), self.batch_size):
+            model.objects.bulk_create(objects[start:start + self.batch_size])
+
+    def get_sampler(self, items):
+        """returns sampler of the items with random popularity ranking"""
+        items = list(items)
+        self.rng.shuffle(items)
+        return ZipfSampler(items, self.skew, self.rng)
+
+    def distribute(self, total, sampler, size):
+        """returns list of ``size`` counts adding up to ``total``"""
+        counts = [0] * size
+        for _ in range(total):
+            counts[sampler.sample()] += 1
+        return counts
+
+    def make_text(self, min_words, max_words):
+        words = [self.word_sampler.sample()
+                    for _ in range(self.rng.randint(min_words, max_words))]
+        return ' '.join(words).capitalize() + '.'
+
+    def generate(self):
+        """generates the whole forum in one transaction"""
+        with transaction.atomic():
+            with connection.constraint_checks_disabled():
+                self.generate_users()
+                self.generate_tags()
+                self.generate_threads()
+                self.generate_profiles()
+            self.update_derived_data()
+        self.reset_sequences()
+        return self.counts
+
+    def generate_users(self):
+        first_name = '%s_%07d' % (self.username_prefix, 1)
+        if User.objects.filter(username=first_name).exists():
+            raise ValueError(
+                'users with prefix "%s" exist already, use another prefix'
+                % self.username_prefix
+            )
+        start_id = self.get_next_id(User)
+        self.user_ids = range(start_id, start_id + self.user_count)
+        self.reputation = dict([(user_id, const.MIN_REPUTATION) for user_id in self.user_ids])
+        self.emails = dict()
+        self.start_time = timezone.now() - datetime.timedelta(days=self.days)
+        global_group = Group.objects.get_global_group()
+        self.global_group_id = global_group.id
+
+        users = list()
+        memberships = list()
+        feeds = list()
+        for number, user_id in enumerate(self.user_ids, 1):
+            username = '%s_%07d' % (self.username_prefix, number)
+            self.emails[user_id] = '%s@example.com' % username
+            users.append(
+                User(
+                    id=user_id,
+                    username=username,
+                    email=self.emails[user_id],
+                    password=UNUSABLE_PASSWORD_PREFIX,
+                    date_joined=self.start_time
+                )
+            )
+            memberships.append(GroupMembership(group_id=global_group.id, user_id=user_id))
+            for feed_type in EmailFeedSetting.FEED_TYPES:
+                setting_name = 'DEFAULT_NOTIFICATION_DELIVERY_SCHEDULE_' + feed_type.upper()
+                feeds.append(
+                    EmailFeedSetting(
+                        subscriber_id=user_id,
+                        feed_type=feed_type,
+                        frequency=getattr(askbot_settings, setting_name),
+                        added_at=self.start_time
+                    )
+                )
+        self.bulk_create(User, users)
+        self.bulk_create(GroupMembership, memberships)
+        self.bulk_create(EmailFeedSetting, feeds)
+        self.user_sampler = self.get_sampler(self.user_ids)
+        self.counts['users'] = len(users)
+        self.log('Created %d users' % len(users))
+
+    def generate_tags(self):
+        vocabulary = make_vocabulary()
+        self.rng.shuffle(vocabulary)
+        self.word_sampler = ZipfSampler(vocabulary, self.skew, self.rng)
+
+        names = list()
+        for number in range(self.tag_count):
+            word = vocabulary[number % len(vocabulary)]
+            cycle = number // len(vocabulary)
+            names.append(word if cycle == 0 else '%s%d' % (word, cycle))
+
+        #tags of the forums generated before are reused
+        existing_ids = dict()
+        for start in range(0, len(names), ID_LIST_SIZE):
+            existing_ids.update(
+                Tag.objects.filter(
+                    name__in=names[start:start + ID_LIST_SIZE],
+                    language_code=django_settings.LANGUAGE_CODE
+                ).values_list('name', 'id')
+            )
+
+        next_id = self.get_next_id(Tag)
+        tag_ids = list()
+        self.tag_names = dict()
+        tags = list()
+        for name in names:
+            tag_id = existing_ids.get(name)
+            if tag_id is None:
+                tag_id = next_id
+                next_id += 1
+                tags.append(
+                    Tag(
+                        id=tag_id,
+                        name=name,
+                        created_by_id=self.user_ids[0],
+                        language_code=django_settings.LANGUAGE_CODE,
+                        status=Tag.STATUS_ACCEPTED
+                    )
+                )
+            tag_ids.append(tag_id)
+            self.tag_names[tag_id] = name
+        self.bulk_create(Tag, tags)
+        self.tag_sampler = self.get_sampler(tag_ids)
+        self.tag_used_counts = dict([(tag_id, 0) for tag_id in tag_ids])
+        self.counts['tags'] = len(tags)
+        self.log('Created %d tags' % len(tags))
+
+    def generate_threads(self):
+        thread_positions = self.get_sampler(range(self.question_count))
+        self.answers_per_thread = self.distribute(
+                                self.answer_count, thread_positions, self.question_count
+                            )
+        self.comments_per_thread = self.distribute(
+                                self.comment_count, thread_positions, self.question_count
+                            )
+        self.votes_per_thread = self.distribute(
+                                self.vote_count, thread_positions, self.question_count
+                            )
+        self.next_thread_id = self.get_next_id(Thread)
+        self.next_post_id = self.get_next_id(Post)
+        self.next_revision_id = self.get_next_id(PostRevision)
+        for name in ('questions', 'answers', 'comments', 'votes'):
+            self.counts[name] = 0
+
+        for start in range(0, self.question_count, self.batch_size):
+            end = min(start + self.batch_size, self.question_count)
+            self.generate_thread_batch(range(start, end))
+            self.log('Created %d of %d questions' % (end, self.question_count))
+
+    def make_post(self, post_type, author_id, added_at, thread_id, parent_id=None):
+        text = self.make_text(5, 60)
+        post = Post(
+            id=self.next_post_id,
+            post_type=post_type,
+            thread_id=thread_id,
+            parent_id=parent_id,
+            author_id=author_id,
+            added_at=added_at,
+            text=text,
+            html='<p>%s</p>' % text,
+            summary=text[:300],
+            language_code=django_settings.LANGUAGE_CODE,
+            current_revision_id=self.next_revision_id,
+            approved=True
+        )
+        self.next_post_id += 1
+        self.next_revision_id += 1
+        return post
+
+    def make_revision(self, post, title='', tagnames=''):
+        return PostRevision(
+            id=post.current_revision_id,
+            post_id=post.id,
+            revision=1,
+            author_id=post.author_id,
+            revised_at=post.added_at,
+            summary='',
+            text=post.text,
+            approved=True,
+            approved_at=post.added_at,
+            title=title,
+            tagnames=tagnames
+        )
+
+    def make_votes(self, post, count, votes):
+        """adds the votes to the list and updates the counters"""
+        voter_ids = self.user_sampler.sample_distinct(count, exclude=set([post.author_id]))
+        for voter_id in voter_ids:
+            if self.rng.random() < UPVOTE_SHARE:
+                vote = Vote.VOTE_UP
+                post.vote_up_count += 1
+                self.reputation[post.author_id] += askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+            else:
+                vote = Vote.VOTE_DOWN
+                post.vote_down_count += 1
+                self.reputation[post.author_id] += askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE
+                self.reputation[voter_id] += askbot_settings.REP_LOSS_FOR_DOWNVOTING
+            votes.append(
+                Vote(user_id=voter_id, voted_post_id=post.id,
+                     vote=vote, voted_at=post.added_at)
+            )
+        post.points = post.vote_up_count - post.vote_down_count
+
+    def generate_thread_batch(self, positions):
+        threads = list()
+        posts = list()
+        revisions = list()
+        thread_tags = list()
+        thread_groups = list()
+        votes = list()
+        seconds = self.days * 24 * 3600
+
+        for position in positions:
+            thread_id = self.next_thread_id
+            self.next_thread_id += 1
+            added_at = self.start_time + datetime.timedelta(
+                                seconds=seconds * position // max(self.question_count, 1)
+                            )
+            tag_ids = self.tag_sampler.sample_distinct(
+                                self.rng.randint(1, self.tags_per_question)
+                            )
+            tagnames = ' '.join([self.tag_names[tag_id] for tag_id in tag_ids])
+            title = self.make_text(3, 12).rstrip('.')
+
+            question = self.make_post(
+                    'question', self.user_sampler.sample(), added_at, thread_id
+                )
+            answers = list()
+            for number in range(self.answers_per_thread[position]):
+                answer_time = added_at + datetime.timedelta(minutes=10 * (number + 1))
+                answers.append(
+                    self.make_post('answer', self.user_sampler.sample(), answer_time, thread_id)
+                )
+            thread_posts = [question] + answers
+
+            comments = list()
+            for number in range(self.comments_per_thread[position]):
+                parent = self.rng.choice(thread_posts)
+                comment_time = parent.added_at + datetime.timedelta(minutes=number + 1)
+                comments.append(
+                    self.make_post(
+                        'comment', self.user_sampler.sample(),
+                        comment_time, thread_id, parent_id=parent.id
+                    )
+                )
+                parent.comment_count += 1
+
+            post_votes = dict()
+            for _ in range(self.votes_per_thread[position]):
+                if not answers or self.rng.random() < QUESTION_VOTE_SHARE:
+                    voted_post = question
+                else:
+                    voted_post = self.rng.choice(answers)
+                post_votes[voted_post] = post_votes.get(voted_post, 0) + 1
+            for post in thread_posts:
+                if post in post_votes:
+                    self.make_votes(post, post_votes[post], votes)
+
+            last_post = max(thread_posts + comments, key=lambda item: item.added_at)
+            threads.append(
+                Thread(
+                    id=thread_id,
+                    title=title,
+                    tagnames=tagnames,
+                    answer_count=len(answers),
+                    points=question.points,
+                    added_at=added_at,
+                    last_activity_at=last_post.added_at,
+                    last_activity_by_id=last_post.author_id,
+                    language_code=django_settings.LANGUAGE_CODE,
+                    approved=True
+                )
+            )
+            revisions.append(self.make_revision(question, title=title, tagnames=tagnames))
+            for post in answers + comments:
+                revisions.append(self.make_revision(post))
+            posts.append(question)
+            posts.extend(answers)
+            posts.extend(comments)
+            for tag_id in tag_ids:
+                self.tag_used_counts[tag_id] += 1
+                thread_tags.append(Thread.tags.through(thread_id=thread_id, tag_id=tag_id))
+            thread_groups.append(
+                ThreadToGroup(thread_id=thread_id, group_id=self.global_group_id)
+            )
+            self.counts['questions'] += 1
+            self.counts['answers'] += len(answers)
+            self.counts['comments'] += len(comments)
+
+        self.bulk_create(Thread, threads)
+        self.bulk_create(Post, posts)
+        self.bulk_create(PostRevision, revisions)
+        self.bulk_create(Thread.tags.through, thread_tags)
+        self.bulk_create(ThreadToGroup, thread_groups)
+        self.bulk_create(
+            PostToGroup,
+            [PostToGroup(post_id=post.id, group_id=self.global_group_id) for post in posts]
+        )
+        self.bulk_create(Vote, votes)
+        self.counts['votes'] += len(votes)
+
+    def generate_profiles(self):
+        profiles = list()
+        for user_id in self.user_ids:
+            profiles.append(
+                UserProfile(
+                    auth_user_ptr_id=user_id,
+                    reputation=max(self.reputation[user_id], const.MIN_REPUTATION),
+                    gravatar=hashlib.md5(self.emails[user_id]).hexdigest()
+                )
+            )
+        self.bulk_create(UserProfile, profiles)
+
+    def update_derived_data(self):
+        tags_by_count = dict()
+        for tag_id, used_count in self.tag_used_counts.items():
+            if used_count:
+                tags_by_count.setdefault(used_count, list()).append(tag_id)
+        for used_count, tag_ids in tags_by_count.items():
+            for start in range(0, len(tag_ids), ID_LIST_SIZE):
+                Tag.objects.filter(
+                    id__in=tag_ids[start:start + ID_LIST_SIZE]
+                ).update(used_count=F('used_count') + used_count)
+
+        self.log('Rebuilding tag co-occurrence')
+        rebuild_tag_cooccurrence()
+        if listing_is_enabled():
+            self.log('Rebuilding thread listing')
+            ThreadListing.objects.rebuild()
+
+    def reset_sequences(self):
+        """lets the database allocate the ids following the generated ones"""
+        models = [User, Tag, Thread, Post, PostRevision]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            cursor = connection.cursor()
+            for sql in statements:
+                cursor.execute(sql)
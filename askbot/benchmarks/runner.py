@@ -0,0 +1,312 @@
+"""Times the hot paths of askbot on the forum in the database.
+
+Each scenario is run a number of times, every run is measured
+with :class:`askbot.utils.profiling.ViewProfile`. The scenarios
+changing the data run inside a transaction which is rolled back,
+so that the forum stays the same from run to run.
+
+The report is a json-serializable dictionary::
+
+    {
+        "askbot_version": "...",
+        "database": "sqlite",
+        "forum": {"questions": 2000, ...},
+        "scenarios": {
+            "question_view": {
+                "runs": 5, "min_ms": .., "median_ms": .., "mean_ms": ..,
+                "p95_ms": .., "max_ms": .., "queries": ..
+            },
+            ...
+        }
+    }
+
+:func:`compare_reports` matches the medians against a stored baseline.
+"""
+import contextlib
+
+from django.conf import settings as django_settings
+from django.core import mail
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.core.urlresolvers import reverse
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils import translation
+from django.utils.six import StringIO
+
+import askbot
+from askbot import const
+from askbot.models import Post
+from askbot.models import Tag
+from askbot.models import Thread
+from askbot.models import User
+from askbot.models import UserProfile
+from askbot.models import Vote
+from askbot.models.badges import award_badges_signal
+from askbot.search.state_manager import SearchState
+from askbot.utils.profiling import ViewProfile
+
+SCENARIOS = (
+    'main_page_search',
+    'question_view',
+    'vote',
+    'post_answer',
+    'email_alerts',
+    'badge_award',
+    'full_text_search',
+)
+
+#scenarios which are too slow to be repeated on a large forum
+SINGLE_RUN_SCENARIOS = ('email_alerts',)
+
+DEFAULT_THRESHOLD = 1.2
+
+
+class BenchmarkError(Exception):
+    """raised when the forum does not have the data
+    needed by the benchmarks"""
+
+
+def get_percentile(sorted_values, percent):
+    """returns the value at the percentile, nearest rank method"""
+    rank = int(round(percent / 100.0 * len(sorted_values) + 0.5))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def summarize(timings, query_counts):
+    """returns statistics of the run times in milliseconds"""
+    values = sorted([seconds * 1000 for seconds in timings])
+    count = len(values)
+    if count % 2:
+        median = values[count // 2]
+    else:
+        median = (values[count // 2 - 1] + values[count // 2]) / 2
+    return {
+        'runs': count,
+        'min_ms': round(values[0], 2),
+        'median_ms': round(median, 2),
+        'mean_ms': round(sum(values) / count, 2),
+        'p95_ms': round(get_percentile(values, 95), 2),
+        'max_ms': round(values[-1], 2),
+        'queries': max(query_counts),
+    }
+
+
+def compare_reports(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """returns list of dictionaries with the scenario name,
+    the baseline and the current median, their ratio and
+    the ``regression`` flag set when the ratio is above the
+    ``threshold``. Scenarios missing in either report are skipped"""
+    results = list()
+    baseline_scenarios = baseline.get('scenarios', {})
+    for name, data in sorted(report['scenarios'].items()):
+        if name not in baseline_scenarios:
+            continue
+        old_median = baseline_scenarios[name]['median_ms']
+        new_median = data['median_ms']
+        ratio = new_median / old_median if old_median else 1.0
+        results.append({
+            'scenario': name,
+            'baseline_ms': old_median,
+            'current_ms': new_median,
+            'ratio': round(ratio, 3),
+            'regression': ratio > threshold,
+        })
+    return results
+
+
+@contextlib.contextmanager
+def keep_query_log():
+    """stops the requests of the test client from
+    clearing the log of the queries being measured"""
+    request_started.disconnect(reset_queries)
+    try:
+        yield
+    finally:
+        request_started.connect(reset_queries)
+
+
+@contextlib.contextmanager
+def rollback():
+    """runs the block in a transaction which is rolled back"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+class BenchmarkRunner(object):
+    """Runs the scenarios, usage::
+
+        runner = BenchmarkRunner(runs=5)
+        report = runner.run()
+    """
+
+    def __init__(self, runs=5, scenarios=None, seed=1, stdout=None):
+        self.runs = runs
+        self.scenarios = scenarios or SCENARIOS
+        self.stdout = stdout
+        self.seed = seed
+        for name in self.scenarios:
+            if name not in SCENARIOS:
+                raise BenchmarkError('unknown scenario "%s"' % name)
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def load_fixtures(self):
+        """selects the data used by the scenarios, the same
+        for the same contents of the database"""
+        threads = Thread.objects.filter(
+                            deleted=False, approved=True
+                        ).order_by('-answer_count', 'id')[:self.runs]
+        self.threads = list(threads)
+        if not self.threads:
+            raise BenchmarkError('there are no questions, run askbot_generate_forum first')
+
+        actor_ids = UserProfile.objects.filter(
+                                auth_user_ptr__is_active=True
+                            ).order_by('-reputation', 'pk').values_list('pk', flat=True)[:1]
+        self.actor = User.objects.get(id=actor_ids[0])
+
+        self.popular_tags = list(
+            Tag.objects.filter(
+                status=Tag.STATUS_ACCEPTED, deleted=False
+            ).order_by('-used_count', 'id').values_list('name', flat=True)[:self.runs]
+        )
+
+        voted_ids = Vote.objects.filter(user=self.actor).values_list('voted_post_id', flat=True)
+        answers = Post.objects.filter(
+                            post_type='answer', deleted=False
+                        ).exclude(
+                            author=self.actor
+                        ).exclude(
+                            id__in=voted_ids
+                        ).order_by('-points', 'id')[:self.runs]
+        self.answers = list(answers)
+
+        self.search_words = list()
+        for thread in self.threads:
+            words = thread.title.split()
+            self.search_words.append(words[len(words) // 2] if words else 'question')
+
+    def get_client(self):
+        client = Client()
+        client.login(method='force', user_id=self.actor.id)
+        return client
+
+    def measure(self, name, func):
+        """runs the function ``self.runs`` times and
+        returns the summary of the measurements"""
+        runs = 1 if name in SINGLE_RUN_SCENARIOS else self.runs
+        timings = list()
+        query_counts = list()
+        for number in range(runs):
+            with ViewProfile(name) as profile:
+                func(number)
+            timings.append(profile.total_time)
+            query_counts.append(profile.query_count)
+        return summarize(timings, query_counts)
+
+    def check_response(self, response):
+        if response.status_code != 200:
+            raise BenchmarkError(
+                'unexpected response status %d' % response.status_code
+            )
+
+    def run_main_page_search(self, number):
+        tag = self.popular_tags[number % len(self.popular_tags)]
+        url = SearchState(
+                    scope='all', sort='activity-desc',
+                    tags=tag, user_logged_in=True
+                ).full_url()
+        self.check_response(self.client.get(url))
+
+    def run_question_view(self, number):
+        thread = self.threads[number % len(self.threads)]
+        question = thread._question_post()
+        self.check_response(self.client.get(question.get_absolute_url()))
+
+    def run_vote(self, number):
+        if self.answers:
+            post = self.answers[number % len(self.answers)]
+            vote_type = const.VOTE_UPVOTE_ANSWER
+        else:
+            post = self.threads[number % len(self.threads)]._question_post()
+            vote_type = const.VOTE_UPVOTE_QUESTION
+        with rollback():
+            response = self.client.post(
+                            reverse('vote'),
+                            data={'type': vote_type, 'postId': post.id},
+                            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+                        )
+            self.check_response(response)
+
+    def run_post_answer(self, number):
+        thread = self.threads[number % len(self.threads)]
+        with rollback():
+            response = self.client.post(
+                reverse('answer', kwargs={'id': thread._question_post().id}),
+                data={'text': 'Benchmark answer number %d, long enough to pass.' % number}
+            )
+            #on success redirects to the new answer
+            if 'answer=' not in response.get('Location', ''):
+                raise BenchmarkError('answer to the thread %d was not posted' % thread.id)
+
+    def run_email_alerts(self, number):
+        with rollback():
+            call_command('send_email_alerts', stdout=StringIO())
+        mail.outbox = list()
+
+    def run_badge_award(self, number):
+        if self.answers:
+            post = self.answers[number % len(self.answers)]
+            event = 'upvote_answer'
+        else:
+            post = self.threads[number % len(self.threads)]._question_post()
+            event = 'upvote_question'
+        with rollback():
+            award_badges_signal.send(
+                None, event=event, actor=self.actor,
+                context_object=post, timestamp=timezone.now()
+            )
+
+    def run_full_text_search(self, number):
+        word = self.search_words[number % len(self.search_words)]
+        url = SearchState(
+                    scope='all', sort='activity-desc',
+                    query=word, user_logged_in=True
+                ).full_url()
+        self.check_response(self.client.get(url))
+
+    def get_forum_counts(self):
+        return {
+            'users': User.objects.count(),
+            'tags': Tag.objects.count(),
+            'questions': Thread.objects.count(),
+            'posts': Post.objects.count(),
+            'votes': Vote.objects.count(),
+        }
+
+    def run(self):
+        """runs the scenarios and returns the report"""
+        hosts = list(django_settings.ALLOWED_HOSTS) + ['testserver']
+        with override_settings(
+                ALLOWED_HOSTS=hosts,
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+            ), translation.override(django_settings.LANGUAGE_CODE), keep_query_log():
+            self.load_fixtures()
+            self.client = self.get_client()
+            report = {
+                'askbot_version': askbot.get_version(),
+                'database': connection.vendor,
+                'forum': self.get_forum_counts(),
+                'scenarios': dict(),
+            }
+            for name in self.scenarios:
+                func = getattr(self, 'run_' + name)
+                report['scenarios'][name] = self.measure(name, func)
+                self.log('%s: %s' % (name, report['scenarios'][name]))
+        return report
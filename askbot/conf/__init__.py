@@ -39,7 +39,10 @@ def should_show_sort_by_relevance():
     """True if configuration support sorting
     questions by search relevance
     """
-    return ('postgresql_psycopg2' in askbot.get_database_engine_name())
+    if 'postgresql_psycopg2' in askbot.get_database_engine_name():
+        return True
+    from askbot.search import sqlite as sqlite_search
+    return sqlite_search.is_enabled()
 
 def get_tag_display_filter_strategy_choices():
     from askbot.conf import settings as askbot_settings
@@ -21,9 +21,11 @@ at run time
 askbot.deps.livesettings is a module developed for satchmo project
 """
 import logging
+import uuid
 
 from django.conf import settings as django_settings
 from django.core.cache import cache
+from django.core.signals import request_started
 from django.contrib.sites.models import Site
 from django.utils.encoding import force_unicode
 from django.utils.functional import lazy
@@ -46,6 +48,62 @@ def assert_setting_info_correct(info):
     assert isinstance(info[2], bool)
 
 
+SETTINGS_VERSION_CACHE_KEY = 'askbot-settings-version'
+
+
+class SettingsSnapshot(object):
+    """Values of the settings read in this process.
+
+    The snapshot is valid while the global settings version
+    stored in the cache stays the same. The version is checked
+    once per request and once per celery task, and is replaced
+    whenever any setting is changed.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.values = dict()#language -> dict of values
+        self.bulk_values = dict()#bulk cache key -> dict of values
+
+    def reset(self, version=None):
+        self.version = version
+        self.values = dict()
+        self.bulk_values = dict()
+
+    def check_version(self):
+        """drops the snapshot if settings
+        were changed in any process"""
+        version = cache.get(SETTINGS_VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(SETTINGS_VERSION_CACHE_KEY, uuid.uuid4().hex)
+            version = cache.get(SETTINGS_VERSION_CACHE_KEY)
+        if version != self.version:
+            self.reset(version)
+
+    def get_values(self):
+        """returns dictionary of values read in the current language"""
+        lang = get_language() or django_settings.LANGUAGE_CODE
+        values = self.values.get(lang)
+        if values is None:
+            values = dict()
+            self.values[lang] = values
+        return values
+
+
+settings_snapshot = SettingsSnapshot()
+
+
+def bump_settings_version():
+    """makes all processes reload the settings"""
+    version = uuid.uuid4().hex
+    cache.set(SETTINGS_VERSION_CACHE_KEY, version)
+    settings_snapshot.reset(version)
+
+
+def check_settings_version(*args, **kwargs):
+    settings_snapshot.check_version()
+
+
 class ConfigSettings(object):
     """A very simple Singleton wrapper for settings
     a limitation is that all settings names using this class
@@ -75,7 +133,13 @@ class ConfigSettings(object):
         settings_key = 'ASKBOT_' + key
         if hasattr(django_settings, settings_key):
             return getattr(django_settings, settings_key)
-        return cls.__instance[key].value
+        values = settings_snapshot.get_values()
+        try:
+            return values[key]
+        except KeyError:
+            value = cls.__instance[key].value
+            values[key] = value
+            return value
 
     def get_default(self, key):
         """return the defalut value for the setting"""
@@ -109,6 +173,7 @@ class ConfigSettings(object):
 
             setting.value = value
             setting.save()
+            bump_settings_version()
         # self.prime_cache()
 
     def register(self, value):
@@ -193,7 +258,12 @@ class ConfigSettings(object):
 
     def as_dict(self):
         cache_key = get_bulk_cache_key()
-        return cache.get(cache_key) or self.prime_cache(cache_key)
+        values = settings_snapshot.bulk_values.get(cache_key)
+        if values is None:
+            values = cache.get(cache_key) or self.prime_cache(cache_key)
+            settings_snapshot.bulk_values[cache_key] = values
+        #copy, because callers add their own items
+        return dict(values)
 
     @classmethod
     def precache_all_values(cls):
@@ -272,10 +342,15 @@ def cached_value_update_handler(setting=None, new_value=None,
             update_cached_value(key, new_value, lang)
     else:
         update_cached_value(key, new_value, language_code)
+    bump_settings_version()
 
 signals.configuration_value_changed.connect(
     cached_value_update_handler,
     dispatch_uid='update_cached_value_upon_config_change'
 )
+request_started.connect(
+    check_settings_version,
+    dispatch_uid='check_settings_version_on_request_start'
+)
 # settings instance to be used elsewhere in the project
 settings = ConfigSettings()
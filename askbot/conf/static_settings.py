@@ -6,6 +6,7 @@ import os
 class AskbotStaticSettings(AppConf):
     ALLOWED_UPLOAD_FILE_TYPES = ('.jpg', '.jpeg', '.gif',
                                 '.bmp', '.png', '.tiff')
+    ASYNC_VOTES = False # if true - reputation, badges and caches are updated after the votes by a celery task
     CAS_USER_FILTER = None
     CAS_USER_FILTER_DENIED_MSG = None
     CAS_GET_USERNAME = None # python path to function
@@ -15,22 +16,36 @@ class AskbotStaticSettings(AppConf):
                                    # the latter is path to func with 
                                    # variables (request, user)
     DEBUG_INCOMING_EMAIL = False
+    EMAIL_BATCH_SIZE = 100 # messages sent over one email server connection
+    EMAIL_SEND_RETRIES = 2 # retries of a failed message over a new connection
     EXTRA_SKINS_DIR = None #None or path to directory with skins
     IP_MODERATION_ENABLED = False
     LANGUAGE_MODE = 'single-lang' # 'single-lang', 'url-lang' or 'user-lang'
     MAIN_PAGE_BASE_URL = pgettext('urls', 'questions') + '/'
     MAX_UPLOAD_FILE_SIZE = 1024 * 1024 #result in bytes
     NEW_ANSWER_FORM = None # path to custom form class
+    PERIODIC_BADGES = () # keys of the badges awarded only by the scheduled askbot_award_badges
     POST_RENDERERS = { # generators of html from source content
             'plain-text': 'askbot.utils.markup.plain_text_input_converter',
             'markdown': 'askbot.utils.markup.markdown_input_converter',
             'tinymce': 'askbot.utils.markup.tinymce_input_converter',
         }
 
+    QUERY_BUDGETS = {} # max number of sql queries by view path, checked by ViewProfileMiddleware
+    QUERY_BUDGET_STRICT = False # if true - views exceeding the query budget raise an error
     QUESTION_PAGE_BASE_URL = pgettext('urls', 'question') + '/'
+    RENDERED_HTML_CACHE_SIZE = 1000 # post texts converted to html kept in memory of each process
+    SEARCH_REINDEX_BATCH_SIZE = 100 # threads or users sent to the search backend at once
+    SEARCH_REINDEX_DELAY = 10 # seconds the changed threads and users are collected before reindexing
+    SEARCH_REINDEX_QUEUE = False # if true - the search index is updated in batches by a celery task
     SERVICE_URL_PREFIX = 's/' # prefix for non-UI urls
+    SQLITE_FULL_TEXT_SEARCH = False # if true - search on SQLite uses the FTS5 index, see init_sqlite_full_text_search
     SELF_TEST = True # if true - run startup self-test
+    THREAD_LISTING_ENABLED = False # if true - main page reads from askbot_thread_listing
     TRANSLATE_URL = True # set true to localize urls
+    USER_SEARCH_TRIGRAMS = False # if true - user search uses the trigram index
+    VISIT_BUFFER_FLUSH_INTERVAL = 0 # seconds between writes of view counts and user visit times
+    VOTE_EFFECTS_DELAY = 5 # seconds the votes on one post are collected before the async processing
     WHITELISTED_IPS = tuple() # a tuple of whitelisted ips for moderation
 
     class Meta:
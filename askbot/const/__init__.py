@@ -21,6 +21,10 @@ CLOSE_REASONS = (
 )
 
 LONG_TIME = 60*60*24*30 #30 days is a lot of time
+SEARCH_COUNT_CACHE_TIMEOUT = 60*5 #question counts on the main page may be this old
+SEARCH_RESULTS_CACHE_TIMEOUT = 60*60 #cached anonymous question lists
+QUESTION_PAGE_CACHE_TIMEOUT = 60*60 #rendered posts of the question page
+CACHED_SEARCH_PAGES = 3 #number of first pages of the question lists to cache
 DATETIME_FORMAT = '%I:%M %p, %d %b %Y'
 
 SHARE_NOTHING = 0
@@ -48,8 +52,16 @@ TYPE_REPUTATION = (
     (-8, 'lose_by_upvote_canceled'),
     #for reputation type 10 Repute.comment field is required
     (10, 'assigned_by_moderator'),
+    (11, 'recounted'),
+    (12, 'imported'),
 )
 
+TYPE_REPUTATION_ASSIGNED_BY_MODERATOR = 10
+#correction made by the command askbot_recount_reputation
+TYPE_REPUTATION_RECOUNTED = 11
+#reputation brought by the import from another forum
+TYPE_REPUTATION_IMPORTED = 12
+
 #do not translate keys
 POST_SORT_METHODS = (
     ('age-desc', _('newest')),
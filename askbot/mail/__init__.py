@@ -49,9 +49,13 @@ def extract_first_email_address(text):
     else:
         return None
 
-def _send_mail(subject_line, body_text, sender_email, recipient_list, headers=None, attachments=None):
-    """base send_mail function, which will attach email in html format
-    if html email is enabled"""
+def build_message(subject_line, body_text, sender_email, recipient_list,
+                  headers=None, attachments=None, plain_text=None):
+    """returns email message object, with the html alternative
+    if html email is enabled; recipients may be email addresses,
+    users or invited moderators
+    ``plain_text`` - optional text version of the html ``body_text``,
+    by default it is extracted from the html"""
     html_enabled = askbot_settings.HTML_EMAIL_ENABLED
     if html_enabled:
         message_class = mail.EmailMultiAlternatives
@@ -69,7 +73,7 @@ def _send_mail(subject_line, body_text, sender_email, recipient_list, headers=No
 
     msg = message_class(
                 subject_line,
-                get_text_from_html(body_text),
+                plain_text or get_text_from_html(body_text),
                 sender_email,
                 email_list,
                 headers=headers,
@@ -77,8 +81,115 @@ def _send_mail(subject_line, body_text, sender_email, recipient_list, headers=No
             )
     if html_enabled:
         msg.attach_alternative(body_text, "text/html")
+    return msg
 
-    msg.send()
+def prepare_message(
+            subject_line=None,
+            body_text=None,
+            from_email=None,
+            recipient_list=None,
+            headers=None,
+            attachments=None,
+            plain_text=None
+        ):
+    """returns email message with the same
+    defaults, urls and subject prefix as in the :func:`send_mail`,
+    to be sent with the :func:`send_messages`"""
+    from_email = from_email or askbot_settings.ADMIN_EMAIL \
+                            or django_settings.DEFAULT_FROM_EMAIL
+    assert(subject_line is not None)
+    return build_message(
+                prefix_the_subject_line(subject_line),
+                absolutize_urls(body_text),
+                from_email,
+                recipient_list,
+                headers=headers,
+                attachments=attachments,
+                plain_text=plain_text
+            )
+
+def reopen_connection(connection):
+    """closes and opens the email backend connection,
+    errors are ignored, because the backend will try
+    to open the connection again with the next message"""
+    try:
+        connection.close()
+    except Exception:
+        pass
+    try:
+        connection.open()
+    except Exception:
+        pass
+
+def _send_message(message, connection, retries):
+    """sends one message, reopening the connection
+    and retrying up to ``retries`` times after a failure,
+    returns ``True`` if message was sent"""
+    if len(message.recipients()) == 0:
+        return False
+
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            reopen_connection(connection)
+        try:
+            if connection.send_messages([message]):
+                return True
+        except Exception as error:
+            logging.warning(
+                'email to %s not sent, attempt %d: %s',
+                ','.join(message.recipients()), attempt + 1, error
+            )
+    return False
+
+def send_messages(messages, connection=None):
+    """sends many email messages over one email server connection,
+    which is reopened after each ``ASKBOT_EMAIL_BATCH_SIZE`` messages.
+    Failed messages are retried ``ASKBOT_EMAIL_SEND_RETRIES`` times
+    over a fresh connection.
+
+    ``messages`` - email message objects, for example
+    made by :func:`prepare_message` or by the ``build_message``
+    method of the templated emails
+    ``connection`` - optional email backend connection, if not given
+    the connection is opened and closed by this function
+
+    returns list of messages that were not sent
+    """
+    messages = list(messages)
+    failed = list()
+    if len(messages) == 0:
+        return failed
+
+    batch_size = max(django_settings.ASKBOT_EMAIL_BATCH_SIZE, 1)
+    retries = django_settings.ASKBOT_EMAIL_SEND_RETRIES
+
+    own_connection = connection is None
+    if own_connection:
+        connection = mail.get_connection()
+        try:
+            connection.open()
+        except Exception:
+            pass
+
+    try:
+        for count, message in enumerate(messages):
+            if count > 0 and count % batch_size == 0:
+                #some servers limit the number of messages per session
+                reopen_connection(connection)
+            if not _send_message(message, connection, retries):
+                failed.append(message)
+    finally:
+        if own_connection:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    logging.debug(
+        'sent %d email messages, failed %d',
+        len(messages) - len(failed), len(failed)
+    )
+    return failed
 
 def send_mail(
             subject_line=None,
@@ -87,7 +198,8 @@ def send_mail(
             recipient_list=None,
             headers=None,
             raise_on_failure=False,
-            attachments=None
+            attachments=None,
+            connection=None
         ):
     """
     todo: remove parameters not relevant to the function
@@ -98,22 +210,23 @@ def send_mail(
 
     if raise_on_failure is True, exceptions.EmailNotSent is raised
     `attachments` is a tuple of triples ((filename, filedata, mimetype), ...)
+    `connection` is an optional email backend connection, reused
+    by the callers sending many messages; to send many
+    messages use :func:`send_messages`
     """
-    from_email = from_email or askbot_settings.ADMIN_EMAIL \
-                            or django_settings.DEFAULT_FROM_EMAIL
-    body_text = absolutize_urls(body_text)
     try:
-        assert(subject_line is not None)
-        subject_line = prefix_the_subject_line(subject_line)
-        _send_mail(
-            subject_line,
-            body_text,
-            from_email,
-            recipient_list,
+        msg = prepare_message(
+            subject_line=subject_line,
+            body_text=body_text,
+            from_email=from_email,
+            recipient_list=recipient_list,
             headers=headers,
             attachments=attachments
         )
-        logging.debug('sent update to %s' % ','.join(recipient_list))
+        if connection:
+            msg.connection = connection
+        msg.send()
+        logging.debug('sent update to %s' % ','.join(msg.to))
     except Exception as error:
         sys.stderr.write('\n' + unicode(error).encode('utf-8') + '\n')
         if raise_on_failure == True:
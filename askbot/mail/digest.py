@@ -0,0 +1,730 @@
+"""Set-based builder of the daily and weekly email digests,
+used by the ``send_email_alerts`` management command.
+
+The :class:`DigestBuilder` loads the data for a chunk of users
+in a fixed number of queries, independent of the number of users:
+the ripe email feeds, the questions changed since the earliest
+cutoff of the chunk, followed, asked and answered threads,
+question views, tag selections, comments, mentions and the records
+of the previously sent digests.
+The digest of each user is assembled from that data in memory.
+
+Nothing is written to the database until :meth:`DigestBuilder.save`
+is called, so that a chunk interrupted before the save is fully
+recomputed on the next run.
+"""
+import datetime
+from collections import defaultdict, OrderedDict
+
+from django.conf import settings as django_settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from django.utils.translation import get_language
+
+import askbot
+from askbot import const
+from askbot.conf import settings as askbot_settings
+from askbot.models import Activity
+from askbot.models import ActivityAuditStatus
+from askbot.models import EmailFeedSetting
+from askbot.models import GroupMembership
+from askbot.models import MarkedTag
+from askbot.models import Post
+from askbot.models import PostRevision
+from askbot.models import PostToGroup
+from askbot.models import QuestionView
+from askbot.models import Tag
+from askbot.models import Thread
+from askbot.utils.lists import batch_size
+
+#max number of ids in one "IN" clause
+QUERY_BATCH_SIZE = 500
+#max number of the latest questions considered
+#for the feeds which were never reported
+FIRST_REPORT_QUESTIONS_LIMIT = 500
+
+
+def get_epoch():
+    """time of the "email" sent to user about
+    the question that was never emailed about"""
+    epoch = datetime.datetime(1970, 1, 1)
+    if django_settings.USE_TZ:
+        epoch = timezone.make_aware(epoch, timezone.utc)
+    return epoch
+
+
+def extend_question_list(
+                    src, dst, cutoff_time=None,
+                    limit=False, add_mention=False,
+                    add_comment=False,
+                    languages=None
+                ):
+    """src is a list of questions
+    dst - is an ordered dictionary
+    update reporting cutoff time for each question
+    to the latest value to be more permissive about updates
+    """
+    if src is None:
+        return #will not do anything if subscription of this type is not used
+    if limit and len(dst.keys()) >= askbot_settings.MAX_ALERTS_PER_EMAIL:
+        return
+
+    for q in src:
+        if languages and q.language_code not in languages:
+            continue
+        if q in dst:
+            meta_data = dst[q]
+        else:
+            meta_data = {'cutoff_time': cutoff_time}
+            dst[q] = meta_data
+
+        if cutoff_time > meta_data['cutoff_time']:
+            #the latest cutoff time wins for a given question
+            #if the question falls into several subscription groups
+            #this makes mailer more eager in sending email
+            meta_data['cutoff_time'] = cutoff_time
+        if add_mention:
+            meta_data['mentions'] = meta_data.get('mentions', 0) + 1
+        if add_comment:
+            meta_data['comments'] = meta_data.get('comments', 0) + 1
+
+
+class DigestBuilder(object):
+    """Builds the email digests for a chunk of users.
+
+    Usage::
+
+        builder = DigestBuilder(users)
+        for user, question_list in builder.build():
+            #send the email
+        builder.save()
+
+    ``question_list`` is an ordered dictionary of question posts
+    with the metadata dictionaries as values, the questions
+    with ``meta_data['skip'] == True`` are not to be reported.
+    """
+
+    def __init__(self, users, now=None):
+        self.users = list(users)
+        self.user_ids = [user.id for user in self.users]
+        self.now = now or timezone.now()
+        self.epoch = get_epoch()
+        self.post_content_type = ContentType.objects.get_for_model(Post)
+        self.max_alerts = askbot_settings.MAX_ALERTS_PER_EMAIL
+        self.feeds = dict()#user id -> feed type -> ripe feed
+        self.questions = list()#changed questions, most recent first
+        self.questions_by_thread = dict()
+        self.listed_thread_ids = set()#threads passing the digest filters
+        self.followed = defaultdict(set)#user id -> thread ids
+        self.answered = defaultdict(set)#user id -> thread ids
+        self.view_times = dict()#(user id, question id) -> first view time
+        self.selected_tags = defaultdict(lambda: defaultdict(set))
+        self.thread_tags = defaultdict(set)#thread id -> tag ids
+        self.wildcard_tags = dict()#tuple of wildcards -> tag ids
+        self.comments = defaultdict(list)#user id -> [(time, thread id)]
+        self.mentions = defaultdict(set)#user id -> set((time, thread id))
+        self.emailed_at = dict()#(user id, question id) -> activity
+        self.question_revisions = defaultdict(list)
+        self.thread_answers = defaultdict(list)
+        self.answer_revision_authors = defaultdict(list)
+        self.answer_groups = defaultdict(set)
+        self.user_groups = defaultdict(set)
+        self.reported_activities = dict()#(user id, question id) -> activity
+
+    def get_cutoff_time(self, feed):
+        return self.now - EmailFeedSetting.DELTA_TABLE[feed.frequency]
+
+    def build(self):
+        """returns list of tuples (user, question list)
+        for the users who have ripe feeds"""
+        self.load_feeds()
+        users = [user for user in self.users if user.id in self.feeds]
+        if len(users) == 0:
+            return list()
+
+        self.users = users
+        self.user_ids = [user.id for user in users]
+        self.load_questions()
+        self.load_followed_threads()
+        self.load_answered_threads()
+        self.load_tag_selections()
+        self.load_mentions()
+        self.load_comments()
+        self.load_question_views()
+
+        digests = list()
+        for user in users:
+            digests.append((user, self.get_question_list(user)))
+
+        self.load_update_data(digests)
+        for user, question_list in digests:
+            self.update_meta_data(user, question_list)
+        return digests
+
+    def save(self):
+        """marks the ripe feeds as reported and
+        records the time of the emails about the questions"""
+        feed_ids = list()
+        for feeds in self.feeds.values():
+            for feed in feeds.values():
+                #comment and mention feeds are not marked reported,
+                #they are throttled by the email activity records
+                if feed.feed_type != 'm_and_c':
+                    feed_ids.append(feed.id)
+        for ids in batch_size(feed_ids, QUERY_BATCH_SIZE):
+            EmailFeedSetting.objects.filter(id__in=ids).update(reported_at=self.now)
+
+        new_activities = list()
+        updated_ids = list()
+        for activity in self.reported_activities.values():
+            if activity.id:
+                updated_ids.append(activity.id)
+            else:
+                activity.active_at = self.now
+                new_activities.append(activity)
+        for ids in batch_size(updated_ids, QUERY_BATCH_SIZE):
+            Activity.objects.filter(id__in=ids).update(active_at=self.now)
+        Activity.objects.bulk_create(new_activities)
+
+    def get_feed_queryset(self):
+        return EmailFeedSetting.objects.filter(subscriber__id__in=self.user_ids)
+
+    def add_missing_subscriptions(self, feeds):
+        """creates the feeds with default frequencies
+        for the feed types missing in ``feeds``,
+        returns ``True`` if any feeds were created"""
+        from askbot import forms#need to avoid circular dependency
+        need_feed_types = forms.EditUserEmailFeedsForm().get_db_model_subscription_type_names()
+        have_feed_types = defaultdict(set)
+        for feed in feeds:
+            have_feed_types[feed.subscriber_id].add(feed.feed_type)
+
+        new_feeds = list()
+        for user_id in self.user_ids:
+            for feed_type in set(need_feed_types) - have_feed_types[user_id]:
+                attr_key = 'DEFAULT_NOTIFICATION_DELIVERY_SCHEDULE_%s' % feed_type.upper()
+                new_feeds.append(
+                    EmailFeedSetting(
+                        subscriber_id=user_id,
+                        feed_type=feed_type,
+                        frequency=getattr(askbot_settings, attr_key)
+                    )
+                )
+        EmailFeedSetting.objects.bulk_create(new_feeds)
+        return len(new_feeds) > 0
+
+    def load_feeds(self):
+        feeds = list(self.get_feed_queryset())
+        if self.add_missing_subscriptions(feeds):
+            feeds = list(self.get_feed_queryset())
+
+        self.feeds = dict()
+        for feed in feeds:
+            if feed.frequency in ('n', 'i') or not feed.should_send_now():
+                continue
+            self.feeds.setdefault(feed.subscriber_id, dict())[feed.feed_type] = feed
+
+    def get_since_time(self, user, feed):
+        """questions changed before the returned time
+        are not reported for the feed"""
+        if feed.reported_at and feed.reported_at > user.date_joined:
+            return feed.reported_at
+        return None
+
+    def get_base_questions(self):
+        """same filters as for all the questions
+        reported in the digests"""
+        questions = Post.objects.get_questions().exclude(
+                                deleted=True
+                            ).exclude(
+                                thread__closed=True
+                            )
+        if askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
+            questions = questions.filter(approved=True)
+        return questions.select_related('thread')
+
+    def load_questions(self):
+        """loads the questions changed since the earliest
+        cutoff of the reported feeds in the chunk and at most
+        ``FIRST_REPORT_QUESTIONS_LIMIT`` latest questions
+        for the feeds which were never reported"""
+        since_times = list()
+        first_report_since_times = list()
+        for user in self.users:
+            for feed in self.feeds[user.id].values():
+                if feed.feed_type != 'm_and_c':
+                    since_time = self.get_since_time(user, feed)
+                    if since_time:
+                        since_times.append(since_time)
+                    else:
+                        first_report_since_times.append(user.date_joined)
+
+        questions = self.get_base_questions().order_by('-thread__last_activity_at')
+        loaded = list()
+        if since_times:
+            loaded.extend(questions.filter(thread__last_activity_at__gte=min(since_times)))
+        if first_report_since_times:
+            loaded_ids = set([question.id for question in loaded])
+            first_report_questions = questions.filter(
+                        thread__last_activity_at__gte=min(first_report_since_times)
+                    )[:FIRST_REPORT_QUESTIONS_LIMIT]
+            loaded.extend([
+                question for question in first_report_questions
+                if question.id not in loaded_ids
+            ])
+            loaded.sort(key=lambda question: question.thread.last_activity_at, reverse=True)
+
+        self.questions = loaded
+        for question in self.questions:
+            self.questions_by_thread[question.thread_id] = question
+            self.listed_thread_ids.add(question.thread_id)
+
+    def load_questions_by_thread_ids(self, thread_ids, listed=True):
+        """loads questions missing from the changed questions,
+        ``listed`` - if ``True`` - use the same filters
+        as for the changed questions"""
+        if listed:
+            thread_ids = set(thread_ids) - self.listed_thread_ids
+            questions = self.get_base_questions()
+        else:
+            thread_ids = set(thread_ids) - set(self.questions_by_thread.keys())
+            questions = Post.objects.filter(post_type='question').select_related('thread')
+        for ids in batch_size(list(thread_ids), QUERY_BATCH_SIZE):
+            for question in questions.filter(thread__id__in=ids):
+                self.questions_by_thread[question.thread_id] = question
+                if listed:
+                    self.listed_thread_ids.add(question.thread_id)
+
+    def get_recent_thread_ids(self):
+        return [question.thread_id for question in self.questions]
+
+    def get_users_with_feed(self, feed_type):
+        return [user_id for user_id in self.user_ids if feed_type in self.feeds[user_id]]
+
+    def load_followed_threads(self):
+        user_ids = self.get_users_with_feed('q_sel')
+        if not user_ids or not self.questions:
+            return
+        follows = Thread.followed_by.through.objects.filter(
+                                user__id__in=user_ids,
+                                thread__id__in=self.get_recent_thread_ids()
+                            ).values_list('user_id', 'thread_id')
+        for user_id, thread_id in follows:
+            self.followed[user_id].add(thread_id)
+
+    def load_answered_threads(self):
+        user_ids = self.get_users_with_feed('q_ans')
+        if not user_ids or not self.questions:
+            return
+        answers = Post.objects.filter(
+                                post_type='answer',
+                                author__id__in=user_ids,
+                                thread__id__in=self.get_recent_thread_ids()
+                            ).values_list('author_id', 'thread_id').distinct()
+        for user_id, thread_id in answers:
+            self.answered[user_id].add(thread_id)
+
+    def get_wildcard_tag_ids(self, wildcards):
+        """returns set of ids of tags matching the wildcards,
+        the same wildcards are matched only once per chunk"""
+        key = tuple(sorted(wildcards))
+        if key not in self.wildcard_tags:
+            tags = Tag.objects.get_by_wildcards(list(key))
+            self.wildcard_tags[key] = set(tags.values_list('id', flat=True))
+        return self.wildcard_tags[key]
+
+    def load_tag_selections(self):
+        user_ids = self.get_users_with_feed('q_all')
+        if not user_ids or not self.questions:
+            return
+
+        selections = MarkedTag.objects.filter(
+                                user__id__in=user_ids,
+                                tag__language_code=get_language()
+                            ).values_list('user_id', 'reason', 'tag_id')
+        for user_id, reason, tag_id in selections:
+            self.selected_tags[user_id][reason].add(tag_id)
+
+        thread_tags = Thread.tags.through.objects.filter(
+                                thread__id__in=self.get_recent_thread_ids()
+                            ).values_list('thread_id', 'tag_id')
+        for thread_id, tag_id in thread_tags:
+            self.thread_tags[thread_id].add(tag_id)
+
+    def load_comments(self):
+        """loads the comments responding to the posts
+        of the users with the ripe comment and mention feeds"""
+        user_ids = self.get_users_with_feed('m_and_c')
+        if not user_ids:
+            return
+        #the earliest of the cutoffs in the chunk
+        cutoff_time = max([
+                    self.get_cutoff_time(self.feeds[user_id]['m_and_c'])
+                    for user_id in user_ids
+                ])
+        comments = Post.objects.filter(
+                                post_type='comment',
+                                parent__author__id__in=user_ids,
+                                added_at__lt=cutoff_time
+                            ).values_list(
+                                'parent__author_id', 'author_id',
+                                'added_at', 'thread_id'
+                            )
+        for user_id, author_id, added_at, thread_id in comments:
+            if author_id != user_id:
+                self.comments[user_id].append((added_at, thread_id))
+
+        thread_ids = set()
+        for user_comments in self.comments.values():
+            thread_ids.update([thread_id for added_at, thread_id in user_comments])
+        self.load_questions_by_thread_ids(thread_ids, listed=False)
+
+    def load_mentions(self):
+        """loads the mentions of the users with the
+        ripe comment and mention feeds"""
+        user_ids = self.get_users_with_feed('m_and_c')
+        if not user_ids:
+            return
+        cutoff_time = max([
+                    self.get_cutoff_time(self.feeds[user_id]['m_and_c'])
+                    for user_id in user_ids
+                ])
+        mentions = ActivityAuditStatus.objects.filter(
+                                user__id__in=user_ids,
+                                activity__activity_type=const.TYPE_ACTIVITY_MENTION,
+                                activity__content_type=self.post_content_type,
+                                activity__active_at__lt=cutoff_time
+                            ).values_list(
+                                'user_id', 'activity__active_at', 'activity__object_id'
+                            )
+        mentions = list(mentions)
+
+        post_ids = set([post_id for user_id, active_at, post_id in mentions])
+        post_threads = dict()
+        for ids in batch_size(list(post_ids), QUERY_BATCH_SIZE):
+            posts = Post.objects.filter(id__in=ids).values_list('id', 'thread_id')
+            post_threads.update(dict(posts))
+
+        for user_id, active_at, post_id in mentions:
+            thread_id = post_threads.get(post_id)
+            if thread_id:
+                self.mentions[user_id].add((active_at, thread_id))
+
+        thread_ids = set()
+        for user_mentions in self.mentions.values():
+            thread_ids.update([thread_id for active_at, thread_id in user_mentions])
+        self.load_questions_by_thread_ids(thread_ids)
+
+    def load_question_views(self):
+        """loads the earliest views of the loaded questions"""
+        question_ids = [question.id for question in self.questions_by_thread.values()]
+        for ids in batch_size(question_ids, QUERY_BATCH_SIZE):
+            views = QuestionView.objects.filter(
+                                who__id__in=self.user_ids,
+                                question__id__in=ids
+                            ).values_list('who_id', 'question_id', 'when')
+            for user_id, question_id, when in views:
+                key = (user_id, question_id)
+                if key not in self.view_times or when < self.view_times[key]:
+                    self.view_times[key] = when
+
+    def get_updated_questions(self, user, questions):
+        """returns two lists of questions from ``questions``:
+        not seen by user at all and seen before the last modification
+        """
+        not_seen = list()
+        seen_before_last_mod = list()
+        for question in questions:
+            thread = question.thread
+            if thread.last_activity_by_id == user.id:
+                continue
+            if thread.last_activity_at < user.date_joined:
+                continue
+            view_time = self.view_times.get((user.id, question.id))
+            if view_time is None:
+                not_seen.append(question)
+            elif view_time < thread.last_activity_at:
+                seen_before_last_mod.append(question)
+        return not_seen, seen_before_last_mod
+
+    def get_tag_filtered_questions(self, user, questions):
+        """same as ``User.get_tag_filtered_questions``,
+        for the list of questions"""
+        selected_tags = self.selected_tags[user.id]
+        if user.email_tag_filter_strategy == const.EXCLUDE_IGNORED:
+            tag_ids = set(selected_tags['bad'])
+            wildcards = user.ignored_tags.strip().split()
+            if wildcards:
+                tag_ids |= self.get_wildcard_tag_ids(wildcards)
+            return [
+                question for question in questions
+                if not (self.thread_tags[question.thread_id] & tag_ids)
+            ]
+        elif user.email_tag_filter_strategy == const.INCLUDE_INTERESTING:
+            if askbot_settings.SUBSCRIBED_TAG_SELECTOR_ENABLED:
+                tag_ids = set(selected_tags['subscribed'])
+                wildcards = user.subscribed_tags.strip().split()
+            else:
+                tag_ids = set(selected_tags['good'])
+                wildcards = user.interesting_tags.strip().split()
+            if wildcards:
+                tag_ids |= self.get_wildcard_tag_ids(wildcards)
+            return [
+                question for question in questions
+                if self.thread_tags[question.thread_id] & tag_ids
+            ]
+        else:
+            return questions
+
+    def get_question_list(self, user):
+        """returns ordered dictionary question -> metadata
+        of the candidate questions for the user digest
+        ordering is the same as used before for the per user queries"""
+        feeds = self.feeds[user.id]
+        max_alerts = self.max_alerts
+
+        if askbot.is_multilingual():
+            languages = user.languages.split()
+        else:
+            languages = None
+
+        #lists of questions per feed type, each is a tuple of
+        #questions not seen by user and seen before the last modification
+        selections = dict()
+        for feed_type, feed in feeds.items():
+            if feed_type == 'm_and_c':
+                continue
+            since_time = self.get_since_time(user, feed)
+            questions = self.questions
+            if since_time:
+                questions = [
+                    question for question in questions
+                    if question.thread.last_activity_at > since_time
+                ]
+            if feed_type == 'q_sel':
+                followed = self.followed[user.id]
+                questions = [q for q in questions if q.thread_id in followed]
+            elif feed_type == 'q_ask':
+                questions = [q for q in questions if q.author_id == user.id]
+            elif feed_type == 'q_ans':
+                answered = self.answered[user.id]
+                questions = [q for q in questions if q.thread_id in answered]
+            elif feed_type == 'q_all':
+                questions = self.get_tag_filtered_questions(user, questions)
+
+            not_seen, seen = self.get_updated_questions(user, questions)
+            if feed_type in ('q_ans', 'q_all'):
+                not_seen = not_seen[:max_alerts]
+                seen = seen[:max_alerts]
+            cutoff_time = self.get_cutoff_time(feed)
+            selections[feed_type] = (not_seen, seen, cutoff_time)
+
+        q_list = OrderedDict()
+
+        def extend(feed_type, **kwargs):
+            if feed_type in selections:
+                not_seen, seen, cutoff_time = selections[feed_type]
+                kwargs['languages'] = languages
+                extend_question_list(not_seen, q_list, cutoff_time, **kwargs)
+                extend_question_list(seen, q_list, cutoff_time, **kwargs)
+
+        extend('q_sel')
+
+        #comments do not change the last activity time
+        #of the thread, so they are collected separately
+        if 'm_and_c' in feeds:
+            cutoff_time = self.get_cutoff_time(feeds['m_and_c'])
+            commented = list()
+            for added_at, thread_id in self.comments[user.id]:
+                if added_at < cutoff_time and thread_id in self.questions_by_thread:
+                    commented.append(self.questions_by_thread[thread_id])
+            extend_question_list(
+                commented,
+                q_list,
+                cutoff_time=cutoff_time,
+                add_comment=True,
+                languages=languages
+            )
+
+            mentioned_thread_ids = set([
+                thread_id for active_at, thread_id in self.mentions[user.id]
+                if active_at < cutoff_time
+            ])
+            mentioned = [
+                self.questions_by_thread[thread_id]
+                for thread_id in mentioned_thread_ids
+                if thread_id in self.listed_thread_ids
+            ]
+            mentioned.sort(key=lambda q: q.thread.last_activity_at, reverse=True)
+            for questions in self.get_updated_questions(user, mentioned):
+                extend_question_list(
+                    questions,
+                    q_list,
+                    cutoff_time=cutoff_time,
+                    add_mention=True,
+                    languages=languages
+                )
+
+        if user.email_tag_filter_strategy != const.EXCLUDE_IGNORED:
+            extend('q_all')
+
+        extend('q_ask', limit=True)
+        extend('q_ans', limit=True)
+
+        if user.email_tag_filter_strategy == const.EXCLUDE_IGNORED:
+            extend('q_all', limit=True)
+
+        return q_list
+
+    def load_update_data(self, digests):
+        """loads data about the updates of the questions
+        since they were last emailed to the users"""
+        pairs = set()
+        for user, question_list in digests:
+            pairs.update([(user.id, question.id) for question in question_list])
+        if len(pairs) == 0:
+            return
+        question_ids = list(set([question_id for user_id, question_id in pairs]))
+
+        for ids in batch_size(question_ids, QUERY_BATCH_SIZE):
+            activities = Activity.objects.filter(
+                                user__id__in=self.user_ids,
+                                content_type=self.post_content_type,
+                                object_id__in=ids,
+                                activity_type=const.TYPE_ACTIVITY_EMAIL_UPDATE_SENT
+                            ).only('id', 'user', 'object_id', 'active_at')
+            for activity in activities:
+                key = (activity.user_id, activity.object_id)
+                if key in self.emailed_at:
+                    raise Exception(
+                                'server error - multiple question email activities '
+                                'found per user-question pair'
+                            )
+                self.emailed_at[key] = activity
+
+        #updates are only interesting after the earliest email
+        since_time = self.epoch
+        if pairs.issubset(self.emailed_at.keys()):
+            since_time = min([self.emailed_at[pair].active_at for pair in pairs])
+
+        thread_ids = list()
+        for ids in batch_size(question_ids, QUERY_BATCH_SIZE):
+            revisions = PostRevision.objects.filter(
+                                post__id__in=ids,
+                                revised_at__gt=since_time
+                            ).values_list('post_id', 'author_id', 'revised_at', 'revision')
+            for post_id, author_id, revised_at, revision in revisions:
+                self.question_revisions[post_id].append((revision, author_id, revised_at))
+            threads = Post.objects.filter(id__in=ids).values_list('thread_id', flat=True)
+            thread_ids.extend(threads)
+
+        for revisions in self.question_revisions.values():
+            revisions.sort(reverse=True)#latest revision first
+
+        answer_ids = list()
+        for ids in batch_size(thread_ids, QUERY_BATCH_SIZE):
+            answers = Post.objects.filter(
+                                post_type='answer',
+                                thread__id__in=ids,
+                                added_at__gt=since_time,
+                                deleted=False
+                            ).values_list('id', 'thread_id', 'author_id', 'added_at')
+            for answer_id, thread_id, author_id, added_at in answers:
+                self.thread_answers[thread_id].append((answer_id, author_id, added_at))
+                answer_ids.append(answer_id)
+
+        for ids in batch_size(answer_ids, QUERY_BATCH_SIZE):
+            revisions = PostRevision.objects.filter(
+                                post__id__in=ids
+                            ).values_list('post_id', 'author_id')
+            for post_id, author_id in revisions:
+                self.answer_revision_authors[post_id].append(author_id)
+
+        if askbot_settings.GROUPS_ENABLED:
+            for ids in batch_size(answer_ids, QUERY_BATCH_SIZE):
+                groups = PostToGroup.objects.filter(
+                                post__id__in=ids
+                            ).values_list('post_id', 'group_id')
+                for post_id, group_id in groups:
+                    self.answer_groups[post_id].add(group_id)
+
+            memberships = GroupMembership.objects.filter(
+                                user__id__in=self.user_ids
+                            ).values_list('user_id', 'group_id')
+            for user_id, group_id in memberships:
+                self.user_groups[user_id].add(group_id)
+
+    def get_new_answers(self, user, question, emailed_at):
+        """answers visible to the user posted after ``emailed_at``"""
+        answers = list()
+        for answer in self.thread_answers[question.thread_id]:
+            answer_id, author_id, added_at = answer
+            if added_at <= emailed_at:
+                continue
+            if askbot_settings.GROUPS_ENABLED:
+                if not (self.answer_groups[answer_id] & self.user_groups[user.id]):
+                    continue
+            answers.append(answer)
+        return answers
+
+    def update_meta_data(self, user, question_list):
+        """sets the counts of updates per question and
+        marks the questions that need to be skipped,
+        because an email about them was sent recently enough"""
+        for q, meta_data in question_list.items():
+            activity = self.emailed_at.get((user.id, q.id))
+            if activity:
+                emailed_at = activity.active_at
+            else:
+                activity = Activity(
+                                user=user,
+                                content_type=self.post_content_type,
+                                object_id=q.id,
+                                activity_type=const.TYPE_ACTIVITY_EMAIL_UPDATE_SENT
+                            )
+                emailed_at = self.epoch
+
+            cutoff_time = meta_data['cutoff_time']#cutoff time for the question
+
+            #skip question if we need to wait longer because
+            #the delay before the next email has not yet elapsed
+            #or if last email was sent after the most recent modification
+            if emailed_at > cutoff_time or emailed_at > q.thread.last_activity_at:
+                meta_data['skip'] = True
+                continue
+
+            q_rev = [
+                revised_at for revision, author_id, revised_at
+                in self.question_revisions[q.id]
+                if revised_at > emailed_at and author_id != user.id
+            ]
+            meta_data['q_rev'] = len(q_rev)
+            if len(q_rev) > 0 and q.added_at == q_rev[0]:
+                meta_data['q_rev'] = 0
+                meta_data['new_q'] = True
+            else:
+                meta_data['new_q'] = False
+
+            new_answers = self.get_new_answers(user, q, emailed_at)
+            meta_data['new_ans'] = len([
+                answer for answer in new_answers if answer[1] != user.id
+            ])
+
+            ans_rev = 0
+            for answer in new_answers:
+                revision_authors = self.answer_revision_authors[answer[0]]
+                ans_rev += len([
+                    author_id for author_id in revision_authors
+                    if author_id != user.id
+                ])
+            meta_data['ans_rev'] = ans_rev
+
+            comments = meta_data.get('comments', 0)
+            mentions = meta_data.get('mentions', 0)
+
+            #finally skip question if there are no news indeed
+            if len(q_rev) + meta_data['new_ans'] + ans_rev + comments + mentions == 0:
+                meta_data['skip'] = True
+            else:
+                meta_data['skip'] = False
+                self.reported_activities[(user.id, q.id)] = activity
@@ -11,7 +11,8 @@ from django.core.urlresolvers import reverse
 from django.template import Context
 from django.template.loader import get_template
 from django.utils.encoding import force_unicode
-from django.utils.html import mark_safe
+from django.utils.html import escape, mark_safe
+from django.utils.translation import get_language
 from django.utils.translation import ugettext_lazy as _
 from askbot import const
 from askbot.conf import settings as askbot_settings
@@ -137,7 +138,22 @@ class BaseEmail(object):
         body = template.render(Context(self.get_context(context)))
         return absolutize_urls(body)
 
-    def send(self, recipient_list, raise_on_failure=False, headers=None, attachments=None):
+    def build_message(self, recipient_list, headers=None, attachments=None):
+        """returns rendered email message, to be sent
+        with :func:`askbot.mail.send_messages` together
+        with other messages over one connection"""
+        from askbot.mail import prepare_message
+        return prepare_message(
+            subject_line=self.render_subject(),
+            body_text=self.render_body(),
+            from_email=None,
+            recipient_list=recipient_list,
+            headers=headers or self.get_headers(),
+            attachments=attachments or self.get_attachments()
+        )
+
+    def send(self, recipient_list, raise_on_failure=False, headers=None,
+             attachments=None, connection=None):
         if self.is_enabled():
             from askbot.mail import send_mail
             send_mail(
@@ -147,7 +163,8 @@ class BaseEmail(object):
                 recipient_list=recipient_list,
                 headers=headers or self.get_headers(),
                 raise_on_failure=raise_on_failure,
-                attachments=attachments or self.get_attachments()
+                attachments=attachments or self.get_attachments(),
+                connection=connection
             )
         else:
             LOG.warning(
@@ -156,6 +173,46 @@ class BaseEmail(object):
             )
 
 
+class RecipientPlaceholder(object):
+    """Stands for the recipient when the shared part
+    of an email is rendered once for many users.
+
+    Attributes are taken from the ``user`` representing
+    the group of recipients, except the per-recipient values,
+    which are rendered as placeholders and replaced
+    in the copy of the email made for each recipient.
+    """
+    username = 'askbot-recipient-username-placeholder'
+    unsubscribe_url = '/askbot-recipient-unsubscribe-url-placeholder'
+    subscriptions_url = '/askbot-recipient-subscriptions-url-placeholder'
+    reply_address = 'askbot-recipient-reply-address-placeholder'
+    alt_reply_address = 'askbot-recipient-alt-reply-address-placeholder'
+
+    def __init__(self, user):
+        self.user = user
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
+
+    def get_unsubscribe_url(self):
+        return self.unsubscribe_url
+
+    def get_subscriptions_url(self):
+        return self.subscriptions_url
+
+    @classmethod
+    def get_substitutions(cls, user, reply_address, alt_reply_address):
+        """returns list of triples (placeholder, value, is_url)
+        for the recipient ``user``"""
+        return [
+            (site_url(cls.unsubscribe_url), site_url(user.get_unsubscribe_url()), True),
+            (site_url(cls.subscriptions_url), site_url(user.get_subscriptions_url()), True),
+            (cls.alt_reply_address, alt_reply_address or '', False),
+            (cls.reply_address, reply_address, False),
+            (cls.username, user.username, False),
+        ]
+
+
 class InstantEmailAlert(BaseEmail):
     template_path = 'email/instant_notification'
     title = _('Instant email notification')
@@ -164,6 +221,11 @@ class InstantEmailAlert(BaseEmail):
         'At least two users and one post are needed to generate the preview'
     )
 
+    def __init__(self, context=None):
+        super(InstantEmailAlert, self).__init__(context)
+        self._involved_user_ids = None
+        self._shared_parts = dict()
+
     def is_enabled(self):
         return askbot_settings.ENABLE_EMAIL_ALERTS \
             and askbot_settings.INSTANT_EMAIL_ALERT_ENABLED
@@ -287,6 +349,103 @@ class InstantEmailAlert(BaseEmail):
             'update_activity': activity
         }
 
+    def get_involved_user_ids(self):
+        """ids of the users whose names are shown in the alert"""
+        post = self.context['post']
+        user_ids = set([post.author_id, post.last_edited_by_id])
+        for parent_post in post.get_parent_post_chain():
+            user_ids.add(parent_post.author_id)
+        return user_ids
+
+    def get_content_variant(self, user, alt_reply_address):
+        """returns key of the version of the alert seen by the ``user``
+        or ``None`` if the alert must be rendered for this user alone"""
+        if getattr(user, 'invited_outside_moderator', False):
+            return None
+        if self._involved_user_ids is None:
+            self._involved_user_ids = self.get_involved_user_ids()
+        if user.id in self._involved_user_ids:
+            #user sees own private data in the alert
+            return None
+        sees_private_data = user.is_administrator_or_moderator() \
+                            and askbot_settings.SHOW_ADMINS_PRIVATE_USER_DATA
+        return (
+            get_language(),
+            user.can_post_by_email(),
+            alt_reply_address is not None,
+            sees_private_data
+        )
+
+    def render_shared_part(self, user, alt_reply_address):
+        """renders the alert for the group of recipients
+        represented by the ``user``, with the placeholders for
+        the per-recipient values"""
+        placeholder = RecipientPlaceholder(user)
+        if alt_reply_address is not None:
+            alt_reply_address = placeholder.alt_reply_address
+        context = copy(self.context)
+        context.update({
+            'to_user': placeholder,
+            'reply_address': placeholder.reply_address,
+            'alt_reply_address': alt_reply_address
+        })
+        email = InstantEmailAlert(context)
+        body = absolutize_urls(email.render_body())
+        return {
+            'subject': email.render_subject(),
+            'body': body,
+            'text': html_utils.get_text_from_html(body),
+            'headers': email.get_headers()
+        }
+
+    def build_recipient_message(self, user):
+        """returns alert email message for the recipient ``user``,
+        the alert is rendered once per language and content variant,
+        the copies get the per-recipient values substituted,
+        so the instance should be reused for all recipients
+        of the alert"""
+        from askbot.mail import prepare_message
+        from askbot.models import get_reply_to_addresses
+        post = self.context['post']
+        reply_address, alt_reply_address = get_reply_to_addresses(user, post)
+
+        variant = self.get_content_variant(user, alt_reply_address)
+        if variant is None:
+            context = copy(self.context)
+            context.update({
+                'to_user': user,
+                'reply_address': reply_address,
+                'alt_reply_address': alt_reply_address
+            })
+            return InstantEmailAlert(context).build_message([user.email])
+
+        if variant not in self._shared_parts:
+            self._shared_parts[variant] = self.render_shared_part(
+                                                        user, alt_reply_address
+                                                    )
+        shared = self._shared_parts[variant]
+
+        body = shared['body']
+        text = shared['text']
+        substitutions = RecipientPlaceholder.get_substitutions(
+                                        user, reply_address, alt_reply_address
+                                    )
+        for placeholder, value, is_url in substitutions:
+            text = text.replace(placeholder, value)
+            if is_url:
+                value = escape(value)
+            body = body.replace(placeholder, value)
+
+        headers = dict(shared['headers'])
+        headers['Reply-To'] = reply_address
+        return prepare_message(
+                    subject_line=shared['subject'],
+                    body_text=body,
+                    recipient_list=[user.email],
+                    headers=headers,
+                    plain_text=text
+                )
+
     def get_headers(self):
         context = self.get_context()
         post = context['post']
@@ -353,8 +512,12 @@ class InstantEmailAlert(BaseEmail):
         post_url = site_url(post.get_absolute_url())
 
         can_reply = to_user.can_post_by_email()
-        from askbot.models import get_reply_to_addresses
-        reply_address, alt_reply_address = get_reply_to_addresses(to_user, post)
+        if 'reply_address' in context:
+            reply_address = context['reply_address']
+            alt_reply_address = context.get('alt_reply_address')
+        else:
+            from askbot.models import get_reply_to_addresses
+            reply_address, alt_reply_address = get_reply_to_addresses(to_user, post)
         alt_reply_subject = urllib.quote(('Re: ' + post.thread.title).encode('utf-8'))
 
         return {
@@ -1,10 +1,22 @@
 """Base command class, used by some Askbot management commands"""
 from __future__ import print_function
+import multiprocessing
 import sys
-from django.core.management.base import NoArgsCommand
-from django.db import transaction
+from importlib import import_module
+from django.conf import settings as django_settings
+from django.core import mail
+from django.core.management.base import BaseCommand, NoArgsCommand
+from django.db import connection, connections, transaction
+from django.utils import translation
 from askbot import signals
+from askbot.conf import settings as askbot_settings
+from askbot.mail import send_messages
+from askbot.models import User
 from askbot.utils import console
+from askbot.utils.lists import batch_size, batches
+
+#max number of the users loaded by one query of the email commands
+USER_CHUNK_SIZE = 500
 
 class NoArgsJob(NoArgsCommand):
     """Base class for a job command -
@@ -79,3 +91,162 @@ class NoArgsJob(NoArgsCommand):
             print(batch['changed_count_message'] % changed_count)
         else:
             print(batch['nothing_changed_message'])
+
+
+class EmailReport(object):
+    """counts of the emails sent by a command,
+    reports from the pool workers are merged into one"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def merge(self, other):
+        self.sent += other.sent
+        self.failed += other.failed
+        self.skipped += other.skipped
+
+    def __unicode__(self):
+        return u'sent %d, failed %d, skipped %d' % (
+                            self.sent, self.failed, self.skipped
+                        )
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+
+def run_email_worker(args):
+    """runs the email command on a shard of users
+    in the pool worker process"""
+    module_name, user_ids, options = args
+    command = import_module(module_name).Command()
+    try:
+        return command.send_to_users(user_ids, **options)
+    finally:
+        connection.close()
+
+
+class UserEmailCommand(BaseCommand):
+    """Base class for the commands sending emails to users.
+
+    With ``--workers`` larger than 1, the recipients are split
+    into the contiguous ranges of ids, processed by a pool of
+    worker processes, each with its own database and
+    email server connections.
+
+    By default the emails go to all users except the blocked ones,
+    if the email alerts are enabled. The subclass usually overrides:
+
+    * ``build_email(user, **options)`` - the email for the user,
+      ``None`` if there is nothing to send
+    * ``get_users(**options)`` - query set of the recipients
+    * ``get_user_ids(**options)`` - ordered list of recipient ids,
+      empty if there is nothing to do
+    * ``send_emails(user_ids, report, email_connection, **options)`` -
+      sends the emails using the given open email connection
+      and counts them in the :class:`EmailReport`, it is called
+      with at most ``USER_CHUNK_SIZE`` user ids at a time
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            action='store',
+            type=int,
+            dest='workers',
+            default=1,
+            help='Number of worker processes'
+        )
+
+    def handle(self, **options):
+        user_ids = self.get_user_ids(**options)
+        if len(user_ids) == 0:
+            return
+
+        #only plain values can be passed to the worker processes
+        worker_options = dict([
+            (key, value) for key, value in options.items()
+            if isinstance(value, (basestring, int, float, bool, type(None)))
+        ])
+
+        workers = min(options['workers'], len(user_ids))
+        if workers > 1:
+            #workers must open their own database connections
+            connections.close_all()
+            module_name = self.__class__.__module__
+            pool = multiprocessing.Pool(workers)
+            try:
+                reports = pool.map(
+                    run_email_worker,
+                    [
+                        (module_name, shard, worker_options)
+                        for shard in batches(user_ids, workers)
+                    ]
+                )
+            finally:
+                pool.close()
+                pool.join()
+            report = EmailReport()
+            for worker_report in reports:
+                report.merge(worker_report)
+        else:
+            report = self.send_to_users(user_ids, **worker_options)
+
+        if int(options.get('verbosity', 1)) > 1:
+            self.stdout.write(str(report))
+
+    def get_users(self, **options):
+        """recipients of the emails - all users,
+        except the blocked ones"""
+        return User.objects.exclude(askbot_profile__status='b')
+
+    def get_user_ids(self, **options):
+        """ordered ids of the recipients,
+        empty if the email alerts are disabled"""
+        if not askbot_settings.ENABLE_EMAIL_ALERTS:
+            return list()
+        users = self.get_users(**options).order_by('id')
+        return list(users.values_list('id', flat=True))
+
+    def build_email(self, user, **options):
+        """returns the email for the user,
+        ``None`` if there is nothing to send"""
+        return None
+
+    def send_emails(self, user_ids, report, email_connection, **options):
+        """sends the emails returned by :meth:`build_email`
+        to the given users"""
+        translation.activate(django_settings.LANGUAGE_CODE)
+        messages = list()
+        for user in self.get_users(**options).filter(id__in=user_ids):
+            email = self.build_email(user, **options)
+            if email and email.is_enabled():
+                messages.append(email.build_message([user.email]))
+            else:
+                report.skipped += 1
+
+        failed = send_messages(messages, connection=email_connection)
+        report.sent += len(messages) - len(failed)
+        report.failed += len(failed)
+
+    def send_to_users(self, user_ids, **options):
+        """sends emails to users over one email connection,
+        returns :class:`EmailReport`"""
+        report = EmailReport()
+        email_connection = mail.get_connection()
+        try:
+            email_connection.open()
+        except Exception:
+            #connection will be retried for each email,
+            #failed emails are counted in the report
+            pass
+        try:
+            for chunk in batch_size(list(user_ids), USER_CHUNK_SIZE):
+                self.send_emails(chunk, report, email_connection, **options)
+        finally:
+            try:
+                email_connection.close()
+            except Exception:
+                pass
+        return report
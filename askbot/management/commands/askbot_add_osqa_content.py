@@ -8,6 +8,7 @@ from askbot.models import PostRevision
 from askbot.models import Thread
 from askbot.models import Tag
 from askbot.models import User
+from askbot.models.reputation_ledger import record_reputation_change
 from askbot.utils.slug import slugify_camelcase
 from askbot import const
 from bs4 import BeautifulSoup
@@ -185,7 +186,11 @@ class Command(BaseImportXMLCommand):
         for profile in self.get_objects_for_model('forum.user'):
             user = self.get_imported_object_by_old_id(User, profile.id)
             self.copy_bool_parameter(profile, user, 'email_isvalid')
-            user.receive_reputation(profile.reputation - const.MIN_REPUTATION)
+            record_reputation_change(
+                        user,
+                        profile.reputation - const.MIN_REPUTATION,
+                        const.TYPE_REPUTATION_IMPORTED
+                    )
             user.gold += profile.gold
             user.silver += profile.silver
             user.bronze += profile.bronze
@@ -1,38 +1,64 @@
-"""WARNING:
-This command is incomplete, current awards only
-Civic Duty badge
+"""Awards the badges having a set-based criterion
+to all users deserving them:
+
+python manage.py askbot_award_badges
+python manage.py askbot_award_badges --badges=civic-duty,commentator
+
+Meant to be run periodically, e.g. by cron, in particular
+for the badges listed in ``ASKBOT_PERIODIC_BADGES``, which are
+not considered when the users act on the site.
 """
-from __future__ import print_function
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from askbot.models import badges
-from askbot.models import User
-from askbot.models import Vote
-from askbot.utils.console import ProgressBar
-from django.core.management.base import NoArgsCommand
-from django.utils import timezone
-
-class Command(NoArgsCommand):
-    def handle_noargs(self, *args, **kwargs):
-        now = timezone.now()
-        awarded_count = 0
-
-        users = User.objects.all()
-        count = users.count()
-        message = 'Awarding badges for each user'
-        for user in ProgressBar(users.iterator(), count, message):
-            try:
-                #get last vote
-                vote = Vote.objects.filter(user=user).order_by('-id')[0]
-            except IndexError:
-                #user did not vote
-                continue
-            else:
-                cd = badges.CivicDuty()
-                awarded = cd.consider_award(
-                            actor=user,
-                            context_object=vote.voted_post,
-                            timestamp=now
-                        )
-                awarded_count += int(awarded)
-
-        print('Awarded %d badges' % awarded_count)
+from askbot.models.badge_evaluator import evaluate_badges
+from askbot.models.badge_evaluator import get_invalid_periodic_badge_keys
+from askbot.models.badge_evaluator import get_unsupported_badge_keys
+
+
+class Command(BaseCommand):
+    help = 'Awards the badges in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--badges',
+            action='store',
+            dest='badges',
+            default=None,
+            help='comma-separated keys of the badges, by default all'
+        )
+
+    def handle(self, **options):
+        invalid_keys = get_invalid_periodic_badge_keys()
+        if invalid_keys:
+            raise CommandError(
+                'ASKBOT_PERIODIC_BADGES has badges which cannot '
+                'be awarded periodically: %s' % ', '.join(invalid_keys)
+            )
+
+        badge_keys = None
+        if options['badges']:
+            badge_keys = [key.strip() for key in options['badges'].split(',')]
+            unknown_keys = [key for key in badge_keys if key not in badges.BADGES]
+            if unknown_keys:
+                raise CommandError('unknown badges: %s' % ', '.join(unknown_keys))
+            unsupported_keys = get_unsupported_badge_keys(badge_keys)
+            if unsupported_keys:
+                raise CommandError(
+                    'badges which cannot be awarded in bulk: %s' % ', '.join(unsupported_keys)
+                )
+
+        with transaction.atomic():
+            result = evaluate_badges(badge_keys)
+
+        total = 0
+        for key, count in sorted(result['awards'].items()):
+            if count:
+                self.stdout.write('%s: %d' % (key, count))
+            total += count
+        seconds = result['seconds']
+        rate = total / seconds if seconds else 0
+        self.stdout.write(
+            'Awarded %d badges in %.2f seconds (%.1f awards per second)' % (total, seconds, rate)
+        )
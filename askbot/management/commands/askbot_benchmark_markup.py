@@ -0,0 +1,60 @@
+"""Measures the time of converting the post texts to html,
+first with the new markdown parser and the html of the
+converted posts removed from the rendered html cache,
+then once more with the cache filled
+
+python manage.py askbot_benchmark_markup --limit=500
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from askbot.models import Post
+from askbot.utils import markup
+
+
+class Command(BaseCommand):
+    help = 'Compares cold and warm conversion of the post texts to html'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            action='store',
+            type=int,
+            dest='limit',
+            default=500,
+            help='number of the latest posts to convert'
+        )
+
+    def render_posts(self, posts):
+        start = time.time()
+        for post in posts:
+            post.parse_post_text()
+        return time.time() - start
+
+    def handle(self, **options):
+        posts = list(Post.objects.exclude(text='').order_by('-id')[:options['limit']])
+        if not posts:
+            self.stdout.write('There are no posts to convert')
+            return
+
+        #only the html of the converted posts is evicted,
+        #the rest of the site cache is left alone
+        markup.rendered_html_cache.delete_many([
+            markup.rendered_html_cache.get_key(post.get_text_converter_path(), post.text)
+            for post in posts
+        ])
+        markup.reset_cached_parser()
+        cold_time = self.render_posts(posts)
+        warm_time = self.render_posts(posts)
+
+        count = len(posts)
+        self.stdout.write('Converted %d posts' % count)
+        self.stdout.write(
+            'cold: %.3fs total, %.2fms per post' % (cold_time, cold_time * 1000 / count)
+        )
+        self.stdout.write(
+            'warm: %.3fs total, %.2fms per post' % (warm_time, warm_time * 1000 / count)
+        )
+        if warm_time:
+            self.stdout.write('speedup: %.1fx' % (cold_time / warm_time))
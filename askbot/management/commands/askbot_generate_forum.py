@@ -0,0 +1,79 @@
+"""Fills the database with a deterministic synthetic forum
+for the benchmarks, the same options and seed always produce
+the same forum. A forum of about a million posts:
+
+python manage.py askbot_generate_forum --users=100000 --questions=200000 \
+    --answers=500000 --comments=300000 --votes=2000000 --tags=20000
+
+Use a separate database, the generated data is not meant to be deleted.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from askbot.benchmarks.generator import ForumGenerator
+
+SIZE_OPTIONS = (
+    ('users', 1000, 'number of users'),
+    ('questions', 2000, 'number of questions'),
+    ('answers', 6000, 'number of answers'),
+    ('comments', 6000, 'number of comments'),
+    ('votes', 20000, 'number of votes'),
+    ('tags', 300, 'number of tags'),
+    ('tags-per-question', 3, 'maximum number of tags per question'),
+    ('seed', 1, 'seed of the random number generator'),
+    ('batch-size', 1000, 'number of rows inserted per query'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Generates a synthetic forum for the benchmarks'
+
+    def add_arguments(self, parser):
+        for name, default, help_text in SIZE_OPTIONS:
+            parser.add_argument(
+                '--' + name,
+                action='store',
+                type=int,
+                dest=name.replace('-', '_'),
+                default=default,
+                help=help_text
+            )
+        parser.add_argument(
+            '--skew',
+            action='store',
+            type=float,
+            dest='skew',
+            default=1.1,
+            help='exponent of the Zipf distribution of the activity'
+        )
+        parser.add_argument(
+            '--username-prefix',
+            action='store',
+            dest='username_prefix',
+            default='bench',
+            help='prefix of the generated usernames'
+        )
+
+    def handle(self, **options):
+        generator = ForumGenerator(
+            users=options['users'],
+            questions=options['questions'],
+            answers=options['answers'],
+            comments=options['comments'],
+            votes=options['votes'],
+            tags=options['tags'],
+            tags_per_question=options['tags_per_question'],
+            skew=options['skew'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            username_prefix=options['username_prefix'],
+            stdout=self.stdout
+        )
+        try:
+            counts = generator.generate()
+        except ValueError as error:
+            raise CommandError(unicode(error))
+        self.stdout.write(
+            'Generated ' + ', '.join(
+                ['%d %s' % (counts[key], key) for key in sorted(counts.keys())]
+            )
+        )
@@ -0,0 +1,21 @@
+"""Recreates the tag co-occurrence counts and the
+thread tag vectors used for the related tags and
+the similar questions
+
+python manage.py askbot_rebuild_tag_cooccurrence
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from askbot.models.tag_cooccurrence import rebuild_tag_cooccurrence
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the tag co-occurrence and thread tag weight tables'
+
+    def handle(self, **options):
+        with transaction.atomic():
+            pair_count, weight_count = rebuild_tag_cooccurrence()
+        self.stdout.write(
+            'Rebuilt %d tag pairs and %d thread tag weights' % (pair_count, weight_count)
+        )
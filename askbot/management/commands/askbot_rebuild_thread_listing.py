@@ -0,0 +1,28 @@
+"""Recreates the denormalized table used for the
+question lists when ``ASKBOT_THREAD_LISTING_ENABLED`` is ``True``
+
+python manage.py askbot_rebuild_thread_listing
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from askbot.models import ThreadListing
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the thread listing table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            type=int,
+            dest='batch_size',
+            default=500,
+            help='Number of threads processed per batch'
+        )
+
+    def handle(self, **options):
+        with transaction.atomic():
+            count = ThreadListing.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write('Rebuilt listing rows for %d threads' % count)
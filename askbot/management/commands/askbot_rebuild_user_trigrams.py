@@ -0,0 +1,19 @@
+"""Recreates the trigrams of the user names and the real
+names used by the user search with
+``ASKBOT_USER_SEARCH_TRIGRAMS = True``
+
+python manage.py askbot_rebuild_user_trigrams
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from askbot.models.user_trigrams import rebuild_user_trigrams
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the trigram index of the user names'
+
+    def handle(self, **options):
+        with transaction.atomic():
+            count = rebuild_user_trigrams()
+        self.stdout.write('Rebuilt %d user name trigrams' % count)
@@ -0,0 +1,19 @@
+"""Recreates the prefix table of the wildcard tag selections,
+used to find subscribers of the instant email notifications
+when the wildcard tags are enabled
+
+python manage.py askbot_rebuild_wildcard_tag_prefixes
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from askbot.models import WildcardTagPrefix
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the wildcard tag prefix table'
+
+    def handle(self, **options):
+        with transaction.atomic():
+            count = WildcardTagPrefix.objects.rebuild()
+        self.stdout.write('Rebuilt wildcard tag prefixes for %d users' % count)
@@ -0,0 +1,71 @@
+"""Recomputes the reputation of all users from the votes,
+the accepted answers, the offensive flags, the changes
+made by the moderators and the imported reputation,
+and reports the differences from the stored reputation:
+
+python manage.py askbot_recount_reputation
+python manage.py askbot_recount_reputation --fix
+
+With ``--fix`` the stored reputation is corrected and
+the corrections are appended to the reputation ledger.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from askbot.models import User
+from askbot.models.reputation_ledger import fix_reputation_mismatches
+from askbot.models.reputation_ledger import get_ledger_reputation
+from askbot.models.reputation_ledger import get_reputation_mismatches
+from askbot.models.reputation_ledger import replay_reputation
+
+
+class Command(BaseCommand):
+    help = 'Recounts the reputation of the users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            dest='fix',
+            default=False,
+            help='correct the stored reputation, by default the differences are only reported'
+        )
+
+    def handle(self, **options):
+        started_at = time.time()
+        with transaction.atomic():
+            mismatches = get_reputation_mismatches(replay_reputation())
+            if options['fix']:
+                fix_reputation_mismatches(mismatches)
+            else:
+                self.print_mismatches(mismatches)
+        self.stdout.write(
+            '%s %d differences in %.2f seconds' % (
+                'Fixed' if options['fix'] else 'Found',
+                len(mismatches),
+                time.time() - started_at
+            )
+        )
+
+    def print_mismatches(self, mismatches):
+        if not mismatches:
+            return
+        ledger = get_ledger_reputation()
+        user_ids = set([item[0] for item in mismatches])
+        usernames = dict(User.objects.filter(id__in=user_ids).values_list('id', 'username'))
+        for user_id, language_code, stored, expected in mismatches:
+            if language_code is None:
+                self.stdout.write(
+                    u'%s (id %d): stored %d, recounted %d' % (
+                        usernames.get(user_id), user_id, stored, expected
+                    )
+                )
+            else:
+                self.stdout.write(
+                    u'%s (id %d), language %s: stored %d, ledger %d, recounted %d' % (
+                        usernames.get(user_id), user_id, language_code, stored,
+                        ledger.get((user_id, language_code), 0), expected
+                    )
+                )
@@ -0,0 +1,101 @@
+"""Times the hot paths on the forum in the database,
+usually made with ``askbot_generate_forum``, writes the
+json report and compares it with the stored baseline:
+
+python manage.py askbot_run_benchmarks --runs=10 --output=report.json
+python manage.py askbot_run_benchmarks --baseline=report.json --threshold=1.2
+
+Fails when a median time grows more than the threshold times.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from askbot.benchmarks.runner import BenchmarkError
+from askbot.benchmarks.runner import BenchmarkRunner
+from askbot.benchmarks.runner import compare_reports
+from askbot.benchmarks.runner import DEFAULT_THRESHOLD
+from askbot.benchmarks.runner import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = 'Runs the benchmarks and compares the results with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            action='store',
+            type=int,
+            dest='runs',
+            default=5,
+            help='number of runs of each scenario'
+        )
+        parser.add_argument(
+            '--scenarios',
+            action='store',
+            dest='scenarios',
+            default=','.join(SCENARIOS),
+            help='comma-separated scenarios, by default all of: ' + ', '.join(SCENARIOS)
+        )
+        parser.add_argument(
+            '--output',
+            action='store',
+            dest='output',
+            default=None,
+            help='path of the json report'
+        )
+        parser.add_argument(
+            '--baseline',
+            action='store',
+            dest='baseline',
+            default=None,
+            help='path of the json report to compare with'
+        )
+        parser.add_argument(
+            '--threshold',
+            action='store',
+            type=float,
+            dest='threshold',
+            default=DEFAULT_THRESHOLD,
+            help='allowed ratio of the current and the baseline median times'
+        )
+
+    def handle(self, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        try:
+            runner = BenchmarkRunner(runs=options['runs'], scenarios=scenarios)
+            report = runner.run()
+        except BenchmarkError as error:
+            raise CommandError(unicode(error))
+
+        for name in scenarios:
+            data = report['scenarios'][name]
+            self.stdout.write(
+                '%-18s median %8.2fms  p95 %8.2fms  queries %d' % (
+                    name, data['median_ms'], data['p95_ms'], data['queries']
+                )
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, indent=2, sort_keys=True)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+            results = compare_reports(report, baseline, options['threshold'])
+            regressions = list()
+            for result in results:
+                mark = ' REGRESSION' if result['regression'] else ''
+                self.stdout.write(
+                    '%-18s baseline %8.2fms  current %8.2fms  x%.2f%s' % (
+                        result['scenario'], result['baseline_ms'],
+                        result['current_ms'], result['ratio'], mark
+                    )
+                )
+                if result['regression']:
+                    regressions.append(result['scenario'])
+            if regressions:
+                raise CommandError(
+                    'slower than the baseline: %s' % ', '.join(regressions)
+                )
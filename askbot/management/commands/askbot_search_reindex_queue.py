@@ -0,0 +1,34 @@
+"""Shows the state of the search reindex queue or
+reindexes the queued threads and users right away:
+
+python manage.py askbot_search_reindex_queue --status
+python manage.py askbot_search_reindex_queue
+"""
+from django.core.management.base import BaseCommand
+
+from askbot.models.reindex_queue import get_queue_stats
+from askbot.models.reindex_queue import process_reindex_queue
+
+
+class Command(BaseCommand):
+    help = 'Reports or processes the queue of the threads and users to reindex'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            dest='status',
+            default=False,
+            help='only print the depth and the lag of the queue'
+        )
+
+    def handle(self, **options):
+        if options['status']:
+            stats = get_queue_stats()
+            self.stdout.write(
+                'queued: %(depth)d (threads: %(thread)d, users: %(user)d), '
+                'lag: %(lag).1f seconds' % stats
+            )
+        else:
+            count = process_reindex_queue()
+            self.stdout.write('Reindexed %d threads and users' % count)
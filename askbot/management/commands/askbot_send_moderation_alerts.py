@@ -3,6 +3,7 @@ from django.core.management.base import NoArgsCommand
 from django.conf import settings as django_settings
 from django.utils import translation
 from askbot import const
+from askbot.mail import send_messages
 from askbot.mail.messages import ModerationQueueNotification
 from askbot.models import Activity
 from askbot.models import User
@@ -107,9 +108,12 @@ class Command(NoArgsCommand):
         if not all_mods:
             return
 
+        messages = list()
         for mod in all_mods:
             email = ModerationQueueNotification({'user': mod})
-            email.send([mod,])
+            if email.is_enabled():
+                messages.append(email.build_message([mod,]))
+        send_messages(messages)
 
         if not mods:
             return
@@ -0,0 +1,20 @@
+"""Adds the reputation changes recorded since the previous
+run to the per-user, per-language snapshots of the ledger:
+
+python manage.py askbot_snapshot_reputation
+
+Meant to be run periodically, e.g. by cron.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from askbot.models.reputation_ledger import take_reputation_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Updates the snapshots of the reputation ledger'
+
+    def handle(self, **options):
+        with transaction.atomic():
+            count = take_reputation_snapshots()
+        self.stdout.write('Updated %d reputation snapshots' % count)
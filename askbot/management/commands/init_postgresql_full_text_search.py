@@ -1,6 +1,8 @@
+from django.conf import settings as django_settings
 from django.core.management.base import NoArgsCommand
 import os.path
 import askbot
+from askbot.search.postgresql import drop_vector_triggers
 from askbot.search.postgresql import setup_full_text_search
 
 class Command(NoArgsCommand):
@@ -22,3 +24,6 @@ class Command(NoArgsCommand):
                             'user_profile_search_12202015.plsql'
                         )
         setup_full_text_search(script_path)
+
+        if django_settings.ASKBOT_SEARCH_REINDEX_QUEUE:
+            drop_vector_triggers()
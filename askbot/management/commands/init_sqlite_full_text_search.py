@@ -0,0 +1,20 @@
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import connection, transaction
+from askbot.search import sqlite as sqlite_search
+
+class Command(NoArgsCommand):
+    help = 'Creates and fills the SQLite FTS5 full text search index'
+
+    def handle_noargs(self, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('the database is not SQLite')
+        if not sqlite_search.is_configured():
+            raise CommandError('set ASKBOT_SQLITE_FULL_TEXT_SEARCH = True in the settings.py')
+        if not sqlite_search.supports_fts5():
+            raise CommandError('the SQLite library does not support FTS5')
+        with transaction.atomic():
+            sqlite_search.create_index_tables()
+            counts = sqlite_search.rebuild_index()
+        self.stdout.write(
+            'indexed %(threads)d threads, %(posts)d posts and %(users)d users' % counts
+        )
@@ -3,9 +3,10 @@ from django.core.management.base import CommandError, BaseCommand
 from django.db import transaction
 from askbot.deployment import package_utils
 from askbot.models import (User, LocalizedUserProfile, Post,
-                           GroupMembership
+                           GroupMembership, Repute
                           )
 from askbot.deps.group_messaging.models import get_unread_inbox_counter
+from askbot.models.reputation_ledger import merge_reputation_snapshots
 from askbot import const
 
 # TODO: this command is broken - doesn't take into account UNIQUE constraints
@@ -107,12 +108,16 @@ class Command(MergeUsersBaseCommand):
         #delete subscriptions (todo: merge properly)
         self.from_user.notification_subscriptions.all().delete()
 
-        #merge reputations
+        #merge reputations, the ledger rows accounting for
+        #the reputation are moved together with it
+        Repute.objects.filter(user=self.from_user).update(user=self.to_user)
         localized_profiles = LocalizedUserProfile.objects.filter(auth_user=self.from_user)
         for profile in localized_profiles:
             self.to_user.receive_reputation(profile.reputation, profile.language_code)
         #delete dupes of localized profiles
         localized_profiles.delete()
+        #the ledger rows are moved, so are the sums in the snapshots
+        merge_reputation_snapshots(self.from_user, self.to_user)
 
         #merge badges
         from_profile = self.from_user.askbot_profile
@@ -1,38 +1,26 @@
 from __future__ import print_function
-import datetime
-from django.core.management.base import NoArgsCommand
-from django.conf import settings as django_settings
-from django.template.loader import get_template
 from askbot import models
 from askbot import const
 from askbot.conf import settings as askbot_settings
-from django.utils.translation import ugettext as _
-from django.utils.translation import ungettext
-from django.utils import translation
 from askbot.mail.messages import AcceptAnswersReminder
+from askbot.management.base import UserEmailCommand
 from askbot.utils.classes import ReminderSchedule
-from askbot.utils.html import site_url
-from django.template import Context
 
 DEBUG_THIS_COMMAND = False
 
-class Command(NoArgsCommand):
-    def handle_noargs(self, **options):
-        translation.activate(django_settings.LANGUAGE_CODE)
-        if askbot_settings.ENABLE_EMAIL_ALERTS == False:
-            return
-        if askbot_settings.ENABLE_ACCEPT_ANSWER_REMINDERS == False:
-            return
-        #get questions without answers, excluding closed and deleted
-        #order it by descending added_at date
-
-        schedule = ReminderSchedule(
+class Command(UserEmailCommand):
+    def get_schedule(self):
+        return ReminderSchedule(
             askbot_settings.DAYS_BEFORE_SENDING_ACCEPT_ANSWER_REMINDER,
             askbot_settings.ACCEPT_ANSWER_REMINDER_FREQUENCY,
             askbot_settings.MAX_ACCEPT_ANSWER_REMINDERS
         )
 
-        questions = models.Post.objects.get_questions().exclude(
+    def get_questions(self):
+        #get questions without answers, excluding closed and deleted
+        #order it by descending added_at date
+        schedule = self.get_schedule()
+        return models.Post.objects.get_questions().exclude(
                                         deleted = True
                                     ).added_between(
                                         start = schedule.start_cutoff_date,
@@ -42,31 +30,37 @@ class Command(NoArgsCommand):
                                     ).filter(
                                         thread__accepted_answer__isnull=True #answer_accepted = False
                                     ).order_by('-added_at')
-        #for all users, excluding blocked
-        #for each user, select a tag filtered subset
-        #format the email reminder and send it
-        for user in models.User.objects.exclude(askbot_profile__status = 'b'):
-            user_questions = questions.filter(author=user)
 
-            final_question_list = user_questions.get_questions_needing_reminder(
-                activity_type=const.TYPE_ACTIVITY_ACCEPT_ANSWER_REMINDER_SENT,
-                user=user,
-                recurrence_delay=schedule.recurrence_delay
-            )
-            #todo: rewrite using query set filter
-            #may be a lot more efficient
+    def get_user_ids(self, **options):
+        if askbot_settings.ENABLE_ACCEPT_ANSWER_REMINDERS == False:
+            return list()
+        return super(Command, self).get_user_ids(**options)
+
+    def build_email(self, user, **options):
+        #for each user, select the questions needing the reminder
+        #and format the email reminder
+        schedule = self.get_schedule()
+        user_questions = self.get_questions().filter(author=user)
+
+        final_question_list = user_questions.get_questions_needing_reminder(
+            activity_type=const.TYPE_ACTIVITY_ACCEPT_ANSWER_REMINDER_SENT,
+            user=user,
+            recurrence_delay=schedule.recurrence_delay
+        )
+        #todo: rewrite using query set filter
+        #may be a lot more efficient
 
-            question_count = len(final_question_list)
-            if question_count == 0:
-                continue
+        question_count = len(final_question_list)
+        if question_count == 0:
+            return None
 
-            email = AcceptAnswersReminder({
-                        'questions': final_question_list,
-                        'recipient_user': user
-                    })
+        email = AcceptAnswersReminder({
+                    'questions': final_question_list,
+                    'recipient_user': user
+                })
 
-            if DEBUG_THIS_COMMAND:
-                print("User: %s<br>\nSubject:%s<br>\nText: %s<br>\n" % \
-                    (user.email, email.render_subject(), email.render_body()))
-            else:
-                email.send([user.email],)
+        if DEBUG_THIS_COMMAND:
+            print("User: %s<br>\nSubject:%s<br>\nText: %s<br>\n" % \
+                (user.email, email.render_subject(), email.render_body()))
+            return None
+        return email
@@ -0,0 +1,72 @@
+"""
+Middleware measuring the database queries, cache reads
+and template rendering of each view, see :mod:`askbot.utils.profiling`.
+
+The measurements are logged by the "askbot.profiler" logger,
+with ``DEBUG = True`` they are also sent in the response headers.
+
+Views running more queries than given in ``ASKBOT_QUERY_BUDGETS``
+are logged as warnings, or raise :class:`QueryBudgetExceeded`
+when ``ASKBOT_QUERY_BUDGET_STRICT`` is true - as in the test suite.
+
+To profile all the work done in the request, put this middleware
+first in the ``MIDDLEWARE_CLASSES``.
+"""
+import logging
+
+from django.conf import settings as django_settings
+
+from askbot.utils.profiling import QueryBudgetExceeded
+from askbot.utils.profiling import ViewProfile
+from askbot.utils.profiling import get_active_profiles
+from askbot.utils.profiling import set_request_view
+
+LOG = logging.getLogger('askbot.profiler')
+
+
+class ViewProfileMiddleware(object):
+
+    def process_request(self, request):
+        #profiles of the requests which ended without
+        #the response or exception processing
+        for profile in list(get_active_profiles()):
+            if getattr(profile, 'is_request_profile', False):
+                profile.__exit__(None, None, None)
+        profile = ViewProfile(name=request.path)
+        profile.is_request_profile = True
+        profile.__enter__()
+        request._askbot_view_profile = profile
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_request_view(request, view_func)
+
+    def finish_profile(self, request):
+        """stops the profile of the request and logs it,
+        returns the profile or ``None``"""
+        profile = getattr(request, '_askbot_view_profile', None)
+        if profile is None:
+            return None
+        del request._askbot_view_profile
+        profile.__exit__(None, None, None)
+        LOG.info(profile.format_log_line())
+        return profile
+
+    def process_exception(self, request, exception):
+        self.finish_profile(request)
+
+    def process_response(self, request, response):
+        profile = self.finish_profile(request)
+        if profile is None:
+            return response
+
+        if django_settings.DEBUG:
+            for header, value in profile.get_response_headers().items():
+                response[header] = value
+
+        try:
+            profile.check_budget(django_settings.ASKBOT_QUERY_BUDGETS)
+        except QueryBudgetExceeded as error:
+            if django_settings.ASKBOT_QUERY_BUDGET_STRICT:
+                raise
+            LOG.warning(unicode(error))
+        return response
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+def populate_wildcard_tag_prefixes(apps, schema_editor):
+    UserProfile = apps.get_model('askbot', 'UserProfile')
+    WildcardTagPrefix = apps.get_model('askbot', 'WildcardTagPrefix')
+    profiles = UserProfile.objects.exclude(
+                                    interesting_tags='',
+                                    ignored_tags='',
+                                    subscribed_tags=''
+                                )
+    prefixes = list()
+    for profile in profiles.iterator():
+        reason_tags = (
+            ('good', profile.interesting_tags),
+            ('bad', profile.ignored_tags),
+            ('subscribed', profile.subscribed_tags),
+        )
+        for reason, wildcard_tags in reason_tags:
+            wildcards = set([tag for tag in wildcard_tags.split() if tag.endswith('*')])
+            for wildcard in wildcards:
+                prefixes.append(
+                    WildcardTagPrefix(
+                        user_id=profile.pk,
+                        prefix=wildcard[:-1],
+                        reason=reason
+                    )
+                )
+    WildcardTagPrefix.objects.bulk_create(prefixes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('askbot', '0013_threadlisting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WildcardTagPrefix',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('prefix', models.CharField(max_length=255)),
+                ('reason', models.CharField(max_length=16, choices=[(b'good', 'interesting'), (b'bad', 'ignored'), (b'subscribed', 'subscribed')])),
+                ('user', models.ForeignKey(related_name='wildcard_tag_prefixes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'askbot_wildcard_tag_prefix',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterIndexTogether(
+            name='wildcardtagprefix',
+            index_together=set([('reason', 'prefix')]),
+        ),
+        migrations.RunPython(
+            populate_wildcard_tag_prefixes,
+            migrations.RunPython.noop
+        ),
+    ]
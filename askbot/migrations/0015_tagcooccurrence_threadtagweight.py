@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import itertools
+import math
+
+from django.db import models, migrations
+
+
+def populate_tag_cooccurrence(apps, schema_editor):
+    Tag = apps.get_model('askbot', 'Tag')
+    Thread = apps.get_model('askbot', 'Thread')
+    TagCooccurrence = apps.get_model('askbot', 'TagCooccurrence')
+    ThreadTagWeight = apps.get_model('askbot', 'ThreadTagWeight')
+
+    thread_tags = dict()
+    tag_values = Thread.tags.through.objects.filter(
+                            tag__status=1
+                        ).values_list('thread_id', 'tag_id')
+    for thread_id, tag_id in tag_values.iterator():
+        thread_tags.setdefault(thread_id, list()).append(tag_id)
+
+    counts = dict()
+    for tag_ids in thread_tags.values():
+        for pair in itertools.permutations(set(tag_ids), 2):
+            counts[pair] = counts.get(pair, 0) + 1
+    TagCooccurrence.objects.bulk_create(
+        [
+            TagCooccurrence(tag_id=tag_id, other_tag_id=other_tag_id, count=count)
+            for (tag_id, other_tag_id), count in counts.items()
+        ],
+        batch_size=500
+    )
+
+    used_counts = dict(Tag.objects.values_list('id', 'used_count'))
+    weights = list()
+    for thread_id, tag_ids in thread_tags.items():
+        for tag_id in tag_ids:
+            used_count = used_counts[tag_id]
+            weight = 1.0 / math.log(used_count + 1, 2) if used_count > 1 else 1.0
+            weights.append(
+                ThreadTagWeight(thread_id=thread_id, tag_id=tag_id, weight=weight)
+            )
+    ThreadTagWeight.objects.bulk_create(weights, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0014_wildcardtagprefix'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagCooccurrence',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('other_tag', models.ForeignKey(related_name='+', to='askbot.Tag')),
+                ('tag', models.ForeignKey(related_name='cooccurrences', to='askbot.Tag')),
+            ],
+            options={
+                'db_table': 'askbot_tag_cooccurrence',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='ThreadTagWeight',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('weight', models.FloatField(default=1.0)),
+                ('tag', models.ForeignKey(related_name='+', to='askbot.Tag')),
+                ('thread', models.ForeignKey(related_name='tag_weights', to='askbot.Thread')),
+            ],
+            options={
+                'db_table': 'askbot_thread_tag_weight',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tagcooccurrence',
+            unique_together=set([('tag', 'other_tag')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='threadtagweight',
+            unique_together=set([('tag', 'thread')]),
+        ),
+        migrations.RunPython(
+            populate_tag_cooccurrence,
+            migrations.RunPython.noop
+        ),
+    ]
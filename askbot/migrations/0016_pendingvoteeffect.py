@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('askbot', '0015_tagcooccurrence_threadtagweight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingVoteEffect',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('vote', models.SmallIntegerField(choices=[(1, 'Up'), (-1, 'Down')])),
+                ('cancel', models.BooleanField(default=False)),
+                ('added_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('post', models.ForeignKey(related_name='+', to='askbot.Post')),
+                ('user', models.ForeignKey(related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'askbot_pending_vote_effect',
+            },
+            bases=(models.Model,),
+        ),
+    ]
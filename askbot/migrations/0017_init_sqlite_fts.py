@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from askbot.search import sqlite as sqlite_search
+from django.db import models, migrations
+
+def init_sqlite_fts(apps, schema_editor):
+    """the index is made only if turned on by the setting
+    ASKBOT_SQLITE_FULL_TEXT_SEARCH"""
+    if sqlite_search.is_configured() and sqlite_search.supports_fts5():
+        sqlite_search.create_index_tables()
+        sqlite_search.rebuild_index()
+
+def drop_sqlite_fts(apps, schema_editor):
+    conn = schema_editor.connection
+    if hasattr(conn, 'vendor') and conn.vendor == 'sqlite':
+        sqlite_search.drop_index_tables()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0016_pendingvoteeffect'),
+    ]
+
+    operations = [
+            migrations.RunPython(init_sqlite_fts, drop_sqlite_fts)
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0017_init_sqlite_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingReindex',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('kind', models.CharField(max_length=8, choices=[('thread', 'thread'), ('user', 'user')])),
+                ('object_id', models.PositiveIntegerField()),
+                ('added_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'askbot_pending_reindex',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pendingreindex',
+            unique_together=set([('kind', 'object_id')]),
+        ),
+    ]
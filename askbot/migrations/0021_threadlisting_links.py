@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def copy_ids_to_links(apps, schema_editor):
+    """moves the space separated ids to the link tables"""
+    ThreadListing = apps.get_model('askbot', 'ThreadListing')
+    ThreadListingTag = apps.get_model('askbot', 'ThreadListingTag')
+    ThreadListingGroup = apps.get_model('askbot', 'ThreadListingGroup')
+    tag_links = list()
+    group_links = list()
+    rows = ThreadListing.objects.values_list('thread_id', 'tag_ids', 'group_ids')
+    for thread_id, tag_ids, group_ids in rows.iterator():
+        for tag_id in set(tag_ids.split()):
+            tag_links.append(ThreadListingTag(listing_id=thread_id, tag_id=int(tag_id)))
+        for group_id in set(group_ids.split()):
+            group_links.append(ThreadListingGroup(listing_id=thread_id, group_id=int(group_id)))
+    ThreadListingTag.objects.bulk_create(tag_links, batch_size=500)
+    ThreadListingGroup.objects.bulk_create(group_links, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0020_reputationsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThreadListingGroup',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('group_id', models.PositiveIntegerField()),
+                ('listing', models.ForeignKey(related_name='group_links', to='askbot.ThreadListing')),
+            ],
+            options={
+                'db_table': 'askbot_thread_listing_group',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='ThreadListingTag',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('tag_id', models.PositiveIntegerField()),
+                ('listing', models.ForeignKey(related_name='tag_links', to='askbot.ThreadListing')),
+            ],
+            options={
+                'db_table': 'askbot_thread_listing_tag',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='threadlistinggroup',
+            unique_together=set([('group_id', 'listing')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='threadlistingtag',
+            unique_together=set([('tag_id', 'listing')]),
+        ),
+        migrations.RunPython(copy_ids_to_links, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='threadlisting',
+            name='group_ids',
+        ),
+        migrations.RemoveField(
+            model_name='threadlisting',
+            name='tag_ids',
+        ),
+    ]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import itertools
+import math
+
+from django.db import migrations
+
+#default value of the GLOBAL_GROUP_NAME livesetting
+DEFAULT_GLOBAL_GROUP_NAME = 'everyone'
+
+
+def get_global_group_name(apps):
+    """name of the global group, as overridden
+    in the livesettings, if at all"""
+    Setting = apps.get_model('livesettings', 'Setting')
+    names = Setting.objects.filter(
+                            group='GROUP_SETTINGS',
+                            key='GLOBAL_GROUP_NAME'
+                        ).exclude(value='').values_list('value', flat=True)
+    return names.first() or DEFAULT_GLOBAL_GROUP_NAME
+
+
+def recount_public_tag_cooccurrence(apps, schema_editor):
+    """the tag statistics count only the public threads -
+    approved, not deleted and shared with the global group"""
+    Tag = apps.get_model('askbot', 'Tag')
+    Thread = apps.get_model('askbot', 'Thread')
+    TagCooccurrence = apps.get_model('askbot', 'TagCooccurrence')
+    ThreadTagWeight = apps.get_model('askbot', 'ThreadTagWeight')
+
+    TagCooccurrence.objects.all().delete()
+    ThreadTagWeight.objects.all().delete()
+    if not Thread.objects.exists():
+        return
+
+    thread_ids = Thread.objects.filter(
+                            deleted=False,
+                            approved=True,
+                            groups__name=get_global_group_name(apps)
+                        ).values('id')
+    thread_tags = dict()
+    tag_values = Thread.tags.through.objects.filter(
+                            tag__status=1,
+                            thread__id__in=thread_ids
+                        ).values_list('thread_id', 'tag_id')
+    for thread_id, tag_id in tag_values.iterator():
+        thread_tags.setdefault(thread_id, list()).append(tag_id)
+
+    counts = dict()
+    for tag_ids in thread_tags.values():
+        for pair in itertools.permutations(set(tag_ids), 2):
+            counts[pair] = counts.get(pair, 0) + 1
+    TagCooccurrence.objects.bulk_create(
+        [
+            TagCooccurrence(tag_id=tag_id, other_tag_id=other_tag_id, count=count)
+            for (tag_id, other_tag_id), count in counts.items()
+        ],
+        batch_size=500
+    )
+
+    used_counts = dict(Tag.objects.values_list('id', 'used_count'))
+    weights = list()
+    for thread_id, tag_ids in thread_tags.items():
+        for tag_id in tag_ids:
+            used_count = used_counts[tag_id]
+            weight = 1.0 / math.log(used_count + 1, 2) if used_count > 1 else 1.0
+            weights.append(
+                ThreadTagWeight(thread_id=thread_id, tag_id=tag_id, weight=weight)
+            )
+    ThreadTagWeight.objects.bulk_create(weights, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0021_threadlisting_links'),
+        ('livesettings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recount_public_tag_cooccurrence,
+            migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings as django_settings
+from django.db import models, migrations
+
+
+def drop_vector_triggers(apps, schema_editor):
+    """the search reindex queue replaces the triggers
+    updating the text search vectors on each save"""
+    conn = schema_editor.connection
+    if conn.vendor == 'postgresql' and django_settings.ASKBOT_SEARCH_REINDEX_QUEUE:
+        from askbot.search import postgresql
+        postgresql.drop_vector_triggers()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0022_recount_public_tag_cooccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingreindex',
+            name='generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(drop_vector_triggers, migrations.RunPython.noop),
+    ]
@@ -41,9 +41,30 @@ from askbot.skins import utils as skin_utils
 from askbot.mail.messages import WelcomeEmail, WelcomeEmailRespondable
 from askbot.models.question import QuestionView, AnonymousQuestion
 from askbot.models.question import DraftQuestion
+from askbot.models.question import ThreadToGroup
+from askbot.models.thread_listing import ThreadListing
+from askbot.models.thread_listing import ThreadListingGroup, ThreadListingTag
+from askbot.models.thread_listing import listing_is_enabled, refresh_thread_listings
+from askbot.models.visit_buffer import visit_buffer
+from askbot.models.username_index import remove_from_username_index
+from askbot.models.username_index import update_username_index
+from askbot.models.vote_effects import PendingVoteEffect
+from askbot.models.vote_effects import async_votes_enabled, save_vote
+from askbot.models.reindex_queue import PendingReindex
+from askbot.models.reindex_queue import enqueue_reindex, reindex_queue_enabled
+from askbot.models.reindex_queue import queue_post_reindex, queue_profile_reindex
+from askbot.models.reindex_queue import queue_thread_reindex, queue_user_reindex
+from askbot.models.user_trigrams import UserTrigram
+from askbot.models.user_trigrams import search_users_by_trigrams, user_trigrams_enabled
+from askbot.models.user_trigrams import remember_real_name, remember_username
+from askbot.models.user_trigrams import update_trigrams_on_profile_save
+from askbot.models.user_trigrams import update_trigrams_on_user_save
+from askbot.models.reputation_ledger import ReputationSnapshot, record_reputation_change
 from askbot.models.question import FavoriteQuestion
 from askbot.models.message import Message
-from askbot.models.tag import Tag, MarkedTag, TagSynonym
+from askbot.models.tag import Tag, MarkedTag, TagSynonym, WildcardTagPrefix
+from askbot.models.tag_cooccurrence import TagCooccurrence, ThreadTagWeight
+from askbot.models.tag_cooccurrence import update_tag_cooccurrence
 from askbot.models.tag import format_personal_group_name
 from askbot.models.user import EmailFeedSetting, ActivityAuditStatus, Activity
 from askbot.models.user import GroupMembership
@@ -57,7 +78,10 @@ from askbot.models.user_profile import (
                                 add_profile_properties,
                                 UserProfile,
                                 LocalizedUserProfile,
-                                get_localized_profile_cache_key
+                                get_localized_profile_cache_key,
+                                get_profile,
+                                get_user_cards_signature,
+                                prime_profiles
                             )
 from askbot.models.reply_by_email import ReplyAddress
 from askbot.models.badges import award_badges_signal, get_badge
@@ -65,6 +89,8 @@ from askbot.models.repute import Award, Repute, Vote, BadgeData
 from askbot.models.widgets import AskWidget, QuestionWidget
 from askbot.models.meta import ImportRun, ImportedObjectInfo
 from askbot import auth
+from askbot.search import result_cache as search_result_cache
+from askbot.search import sqlite as sqlite_search
 from askbot.utils.functions import generate_random_key
 from askbot.utils.decorators import auto_now_timestamp
 from askbot.utils.decorators import reject_forbidden_phrases
@@ -129,6 +155,10 @@ def get_users_by_text_query(search_query, users_query_set = None):
         if 'postgresql_psycopg2' in askbot.get_database_engine_name():
             from askbot.search import postgresql
             return postgresql.run_user_search(users_query_set, search_query)
+        elif user_trigrams_enabled():
+            return search_users_by_trigrams(users_query_set, search_query)
+        elif sqlite_search.is_enabled():
+            return sqlite_search.run_user_search(users_query_set, search_query)
         else:
             return users_query_set.filter(
                 models.Q(username__icontains=search_query) |
@@ -1400,6 +1430,10 @@ def user_update_localized_profile(self, **kwargs):
     profile.update_cache()
     lp = LocalizedUserProfile.objects.filter(pk=profile.pk)
     lp.update(**kwargs)
+    if sqlite_search.is_updated_on_save():
+        sqlite_search.update_user_index([self.id])
+    elif reindex_queue_enabled():
+        enqueue_reindex(PendingReindex.USER, [self.id])
 
 
 def user_get_unused_votes_today(self):
@@ -1598,6 +1632,7 @@ def user_merge_duplicate_questions(self, from_q, to_q):
     #set new thread value to all posts
     posts = from_thread.posts.all()
     posts.update(thread=to_thread)
+    refresh_thread_listings([to_thread.id])
 
     if askbot_settings.LIMIT_ONE_ANSWER_PER_USER:
         #merge answers if only one is allowed per user
@@ -1814,6 +1849,7 @@ def user_delete_question(
 
     question.thread.deleted = True
     question.thread.save()
+    update_tag_cooccurrence(question.thread)
 
     for tag in list(question.thread.tags.all()):
         if tag.used_count <= 1:
@@ -1864,6 +1900,12 @@ def user_delete_all_content_authored_by_user(self, author, timestamp=None):
     threads.update(deleted=True)
     for thread in threads:
         thread.reset_cached_data()
+        update_tag_cooccurrence(thread)
+    changed_thread_ids = list(Post.objects.filter(
+                                author=author, post_type__in=('question', 'answer')
+                            ).values_list('thread_id', flat=True).distinct())
+    refresh_thread_listings(changed_thread_ids)
+    search_result_cache.evict_results_of_threads(changed_thread_ids)
 
     #delete comments
     comments = Post.objects.get_comments().filter(author=author)
@@ -1935,6 +1977,7 @@ def user_restore_post(
         if post.post_type == 'question':
             post.thread.deleted = False
             post.thread.save()
+            update_tag_cooccurrence(post.thread)
         post.thread.reset_cached_data()
         if post.post_type == 'answer':
             if post.endorsed and post.thread.accepted_answer == None:
@@ -2573,30 +2616,17 @@ def user_moderate_user_reputation(
     if comment == None:
         raise ValueError('comment is required to moderate user reputation')
 
-    user.receive_reputation(reputation_change, get_language())
-    user.save()
-
-    #any question. This is necessary because reputes are read in the
-    #user_reputation view with select_related('question__title') and it fails if
-    #ForeignKey is nullable even though it should work (according to the manual)
-    #probably a bug in the Django ORM
-    #fake_question = Question.objects.all()[:1][0]
-    #so in cases where reputation_type == 10
-    #question record is fake and is ignored
-    #this bug is hidden in call Repute.get_explanation_snippet()
-    repute = Repute(
-                user=user,
-                comment=comment,
-                #question = fake_question,
-                reputed_at=timestamp,
-                reputation_type=10, #todo: fix magic number
-                reputation=user.reputation
-            )
-    if reputation_change < 0:
-        repute.negative = -1 * reputation_change
-    else:
-        repute.positive = reputation_change
-    repute.save()
+    #question is not set for this reputation type,
+    #the comment is displayed in place of the link to the question
+    #see Repute.get_explanation_snippet()
+    record_reputation_change(
+        user,
+        reputation_change,
+        reputation_type=const.TYPE_REPUTATION_ASSIGNED_BY_MODERATOR,
+        language_code=get_language(),
+        timestamp=timestamp,
+        comment=comment
+    )
 
 def user_get_status_display(self):
     if self.is_approved():
@@ -2973,6 +3003,9 @@ def _process_vote(user, post, timestamp=None, cancel=False, vote_type=None):
     """"private" wrapper function that applies post upvotes/downvotes
     and cancelations
     """
+    if async_votes_enabled():
+        return save_vote(user, post, vote_type, cancel=cancel, timestamp=timestamp)
+
     #get or create the vote object
     #return with noop in some situations
     try:
@@ -3138,6 +3171,7 @@ def user_approve_post_revision(user, post_revision, timestamp = None):
             thread = post.thread
             thread.approved = True
             thread.save()
+            update_tag_cooccurrence(thread)
 
         post.thread.reset_cached_data()
 
@@ -3300,6 +3334,7 @@ def user_update_wildcard_tag_selections(
     self.ignored_tags = ' '.join(ignored)
     self.subscribed_tags = ' '.join(subscribed)
     self.save()
+    WildcardTagPrefix.objects.update_for_user(self)
     return new_tags
 
 
@@ -3745,28 +3780,33 @@ def record_answer_accepted(instance, created, **kwargs):
 def record_user_visit(user, timestamp, **kwargs):
     """
     when user visits any pages, we update the last_seen and
-    consecutive_days_visit_count
+    consecutive_days_visit_count,
+    the values are written to the database by the visit buffer
     """
-    prev_last_seen = user.last_seen or timezone.now()
-    user.last_seen = timestamp
-    consecutive_days = user.consecutive_days_visit_count
-    if (user.last_seen.date() - prev_last_seen.date()).days == 1:
-        user.consecutive_days_visit_count += 1
-        consecutive_days = user.consecutive_days_visit_count
+    #profile fields are set on the cached profile, because the
+    #user properties write them to the database right away
+    profile = get_profile(user)
+    buffered_visit = visit_buffer.get_user_visit(user.id)
+    if buffered_visit:
+        prev_last_seen, consecutive_days = buffered_visit
+    else:
+        prev_last_seen = profile.last_seen or timezone.now()
+        consecutive_days = profile.consecutive_days_visit_count
+    new_day = (timestamp.date() - prev_last_seen.date()).days == 1
+    if new_day:
+        consecutive_days += 1
+    profile.last_seen = timestamp
+    profile.consecutive_days_visit_count = consecutive_days
+    profile.update_cache()
+    if new_day:
         award_badges_signal.send(None,
             event = 'site_visit',
             actor = user,
             context_object = user,
             timestamp = timestamp
         )
-    #somehow it saves on the query as compared to user.save()
-    update_data = {
-        'last_seen': timestamp,
-        'consecutive_days_visit_count': consecutive_days
-    }
-    UserProfile.objects.filter(pk=user.pk).update(**update_data)
-    profile = UserProfile.objects.get(pk=user.pk)
-    profile.update_cache()
+    visit_buffer.add_user_visit(user.id, timestamp, consecutive_days)
+    visit_buffer.maybe_flush()
 
 
 def record_question_visit(request, question, **kwargs):
@@ -3792,14 +3832,21 @@ def record_question_visit(request, question, **kwargs):
                 update_view_count = True
 
         request.session['question_view_times'][question.id] = timezone.now()
-        #2) run the slower jobs in a celery task
+        if update_view_count:
+            visit_buffer.add_thread_view(question.thread_id)
+            visit_buffer.maybe_flush()
+
+        #2) run the slower jobs in a celery task,
+        #there are none for the anonymous visitors
+        if request.user.is_anonymous():
+            return
         from askbot import tasks
         defer_celery_task(
             tasks.record_question_visit,
             kwargs={
                 'question_post_id': question.id,
                 'user_id': request.user.id,
-                'update_view_count': update_view_count,
+                'update_view_count': False,
                 'language_code': get_language()
             }
         )
@@ -4210,6 +4257,89 @@ def record_spam_rejection(
         activity.save()
 
 
+def get_changed_thread(instance):
+    """returns thread affected by the change of the
+    thread, the question, or thread-to-group record
+    or ``None``"""
+    if isinstance(instance, Thread):
+        return instance
+    if isinstance(instance, Post) and not instance.is_question():
+        return None
+    #thread may be already gone when deleted with cascade
+    return Thread.objects.filter(id=instance.thread_id).first()
+
+
+def update_thread_listing(sender, instance, **kwargs):
+    """updates the listing row of the thread
+    when the thread, the question, or thread-to-group
+    record is saved or deleted"""
+    if not listing_is_enabled():
+        return
+    thread = get_changed_thread(instance)
+    if thread:
+        ThreadListing.objects.update_for_thread(thread)
+
+
+def update_thread_listing_tags(sender, instance, action, **kwargs):
+    """updates the listing rows when the thread tags change"""
+    if not listing_is_enabled():
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Thread):
+        ThreadListing.objects.update_for_thread(instance)
+    else:
+        #change made from the tag side, instance is a Tag
+        pk_set = kwargs.get('pk_set') or list()
+        for thread in Thread.objects.filter(id__in=pk_set):
+            ThreadListing.objects.update_for_thread(thread)
+
+
+def update_tag_cooccurrence_on_thread_group_change(sender, instance, **kwargs):
+    """only the threads shared with the global group
+    are counted in the tag statistics"""
+    if instance.group.name != askbot_settings.GLOBAL_GROUP_NAME:
+        return
+    thread = Thread.objects.filter(id=instance.thread_id).first()
+    if thread:
+        update_tag_cooccurrence(thread)
+
+
+def remove_tag_cooccurrence_of_thread(sender, instance, **kwargs):
+    update_tag_cooccurrence(instance, removed=True)
+
+
+def evict_cached_search_results(sender, instance, **kwargs):
+    """removes cached question lists which may include the thread"""
+    thread = get_changed_thread(instance)
+    if thread:
+        search_result_cache.evict_thread_results(thread)
+
+
+def evict_cached_search_results_on_retag(sender, instance, action, **kwargs):
+    """removes cached question lists for the old and the new tags"""
+    pk_set = kwargs.get('pk_set') or list()
+    if isinstance(instance, Thread):
+        if action == 'pre_clear':
+            tag_names = instance.tags.values_list('name', flat=True)
+        elif action in ('post_add', 'post_remove'):
+            tag_names = Tag.objects.filter(id__in=pk_set).values_list('name', flat=True)
+        else:
+            return
+        search_result_cache.evict_thread_results(instance, tag_names)
+    elif action in ('post_add', 'post_remove'):
+        #change made from the tag side, instance is a Tag
+        for thread in Thread.objects.filter(id__in=pk_set):
+            search_result_cache.evict_thread_results(thread, [instance.name])
+
+
+def invalidate_thread_post_groups(sender, instance, **kwargs):
+    """cached post data and page fragments depend
+    on the groups to which the thread posts are shared"""
+    for thread in Thread.objects.filter(posts__id=instance.post_id):
+        thread.invalidate_cached_post_data()
+
+
 # signals for User model save changes
 user_signals = [
     signals.GenericSignal(
@@ -4252,6 +4382,16 @@ user_signals = [
         callback=record_user_full_updated,
         dispatch_uid='record_full_profile_upon_user_update',
     ),
+    signals.GenericSignal(
+        django_signals.post_save,
+        callback=update_username_index,
+        dispatch_uid='update_username_index_on_user_save',
+    ),
+    signals.GenericSignal(
+        django_signals.post_delete,
+        callback=remove_from_username_index,
+        dispatch_uid='remove_from_username_index_on_user_delete',
+    ),
 ]
 
 
@@ -4295,6 +4435,172 @@ django_signals.m2m_changed.connect(
     dispatch_uid='record_group_membership_change_on_group_change'
 )
 
+django_signals.post_save.connect(
+    update_thread_listing,
+    sender=Thread,
+    dispatch_uid='update_thread_listing_on_thread_save'
+)
+django_signals.post_save.connect(
+    update_thread_listing,
+    sender=Post,
+    dispatch_uid='update_thread_listing_on_question_save'
+)
+django_signals.post_save.connect(
+    update_thread_listing,
+    sender=ThreadToGroup,
+    dispatch_uid='update_thread_listing_on_thread_group_save'
+)
+django_signals.post_delete.connect(
+    update_thread_listing,
+    sender=ThreadToGroup,
+    dispatch_uid='update_thread_listing_on_thread_group_delete'
+)
+django_signals.m2m_changed.connect(
+    update_thread_listing_tags,
+    sender=Thread.tags.through,
+    dispatch_uid='update_thread_listing_on_tags_change'
+)
+django_signals.post_save.connect(
+    update_tag_cooccurrence_on_thread_group_change,
+    sender=ThreadToGroup,
+    dispatch_uid='update_tag_cooccurrence_on_thread_group_save'
+)
+django_signals.post_delete.connect(
+    update_tag_cooccurrence_on_thread_group_change,
+    sender=ThreadToGroup,
+    dispatch_uid='update_tag_cooccurrence_on_thread_group_delete'
+)
+django_signals.pre_delete.connect(
+    remove_tag_cooccurrence_of_thread,
+    sender=Thread,
+    dispatch_uid='remove_tag_cooccurrence_on_thread_delete'
+)
+django_signals.post_save.connect(
+    evict_cached_search_results,
+    sender=Thread,
+    dispatch_uid='evict_cached_search_results_on_thread_save'
+)
+django_signals.post_save.connect(
+    evict_cached_search_results,
+    sender=Post,
+    dispatch_uid='evict_cached_search_results_on_question_save'
+)
+django_signals.post_save.connect(
+    evict_cached_search_results,
+    sender=ThreadToGroup,
+    dispatch_uid='evict_cached_search_results_on_thread_group_save'
+)
+django_signals.post_delete.connect(
+    evict_cached_search_results,
+    sender=ThreadToGroup,
+    dispatch_uid='evict_cached_search_results_on_thread_group_delete'
+)
+django_signals.m2m_changed.connect(
+    evict_cached_search_results_on_retag,
+    sender=Thread.tags.through,
+    dispatch_uid='evict_cached_search_results_on_tags_change'
+)
+django_signals.post_save.connect(
+    sqlite_search.index_thread,
+    sender=Thread,
+    dispatch_uid='update_sqlite_search_index_on_thread_save'
+)
+django_signals.post_delete.connect(
+    sqlite_search.unindex_thread,
+    sender=Thread,
+    dispatch_uid='update_sqlite_search_index_on_thread_delete'
+)
+django_signals.post_save.connect(
+    sqlite_search.index_post,
+    sender=Post,
+    dispatch_uid='update_sqlite_search_index_on_post_save'
+)
+django_signals.post_delete.connect(
+    sqlite_search.unindex_post,
+    sender=Post,
+    dispatch_uid='update_sqlite_search_index_on_post_delete'
+)
+django_signals.post_save.connect(
+    sqlite_search.index_user,
+    sender=User,
+    dispatch_uid='update_sqlite_search_index_on_user_save'
+)
+django_signals.post_delete.connect(
+    sqlite_search.unindex_user,
+    sender=User,
+    dispatch_uid='update_sqlite_search_index_on_user_delete'
+)
+django_signals.post_save.connect(
+    sqlite_search.index_localized_profile,
+    sender=LocalizedUserProfile,
+    dispatch_uid='update_sqlite_search_index_on_profile_save'
+)
+django_signals.post_save.connect(
+    queue_thread_reindex,
+    sender=Thread,
+    dispatch_uid='queue_search_reindex_on_thread_save'
+)
+django_signals.post_delete.connect(
+    queue_thread_reindex,
+    sender=Thread,
+    dispatch_uid='queue_search_reindex_on_thread_delete'
+)
+django_signals.post_save.connect(
+    queue_post_reindex,
+    sender=Post,
+    dispatch_uid='queue_search_reindex_on_post_save'
+)
+django_signals.post_delete.connect(
+    queue_post_reindex,
+    sender=Post,
+    dispatch_uid='queue_search_reindex_on_post_delete'
+)
+django_signals.post_save.connect(
+    queue_user_reindex,
+    sender=User,
+    dispatch_uid='queue_search_reindex_on_user_save'
+)
+django_signals.post_delete.connect(
+    queue_user_reindex,
+    sender=User,
+    dispatch_uid='queue_search_reindex_on_user_delete'
+)
+django_signals.post_save.connect(
+    queue_profile_reindex,
+    sender=LocalizedUserProfile,
+    dispatch_uid='queue_search_reindex_on_profile_save'
+)
+django_signals.post_save.connect(
+    update_trigrams_on_user_save,
+    sender=User,
+    dispatch_uid='update_user_trigrams_on_user_save'
+)
+django_signals.post_init.connect(
+    remember_username,
+    sender=User,
+    dispatch_uid='remember_username_on_user_init'
+)
+django_signals.post_init.connect(
+    remember_real_name,
+    sender=UserProfile,
+    dispatch_uid='remember_real_name_on_profile_init'
+)
+django_signals.post_save.connect(
+    update_trigrams_on_profile_save,
+    sender=UserProfile,
+    dispatch_uid='update_user_trigrams_on_profile_save'
+)
+django_signals.post_save.connect(
+    invalidate_thread_post_groups,
+    sender=PostToGroup,
+    dispatch_uid='invalidate_thread_post_groups_on_save'
+)
+django_signals.post_delete.connect(
+    invalidate_thread_post_groups,
+    sender=PostToGroup,
+    dispatch_uid='invalidate_thread_post_groups_on_delete'
+)
+
 django_signals.post_delete.connect(
     record_cancel_vote,
     sender=Vote,
@@ -4410,6 +4716,9 @@ signals.question_visited.connect(
 __all__ = [
         'signals',
         'Thread',
+        'ThreadListing',
+        'ThreadListingTag',
+        'ThreadListingGroup',
 
         'QuestionView',
         'FavoriteQuestion',
@@ -4428,6 +4737,13 @@ __all__ = [
         'PostFlagReason',
         'MarkedTag',
         'TagSynonym',
+        'WildcardTagPrefix',
+        'PendingVoteEffect',
+        'PendingReindex',
+        'UserTrigram',
+        'ReputationSnapshot',
+        'TagCooccurrence',
+        'ThreadTagWeight',
 
         'BadgeData',
         'Award',
@@ -0,0 +1,217 @@
+"""Periodic evaluation of the badges in bulk.
+
+Badges defining method ``get_candidates`` (see
+:class:`askbot.models.badges.Badge`) can be awarded to all
+deserving users at once: the candidates are selected with a few
+queries, the new awards are written with ``bulk_create`` and the
+effects of the award signal handlers - award counts of the badges,
+badge counts of the users, activities and messages - are applied
+with a few queries per badge.
+
+The badges with keys in ``ASKBOT_PERIODIC_BADGES`` are not
+considered on the request path anymore, they are awarded by
+the scheduled runs of ``python manage.py askbot_award_badges``.
+"""
+import time
+
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import override
+from django.utils.translation import ugettext as _
+
+from askbot import const
+from askbot.conf import settings as askbot_settings
+from askbot.models import badges as badge_registry
+from askbot.models.message import Message
+from askbot.models.repute import Award, BadgeData
+from askbot.models.user import Activity, ActivityAuditStatus
+from askbot.models.user_profile import UserProfile, prime_profiles
+
+#max number of ids in one "IN" clause and of rows in one insert
+BATCH_SIZE = 500
+
+LEVEL_FIELDS = {
+    const.GOLD_BADGE: 'gold',
+    const.SILVER_BADGE: 'silver',
+    const.BRONZE_BADGE: 'bronze',
+}
+
+
+def get_batches(items, batch_size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def get_periodic_badges():
+    """returns instances of the enabled badges
+    having the set-based criterion"""
+    badges = list()
+    for key in sorted(badge_registry.BADGES):
+        badge = badge_registry.BADGES[key]()
+        if badge.is_enabled() and badge.get_candidates() is not None:
+            badges.append(badge)
+    return badges
+
+
+def get_new_awards(badge, data, candidates):
+    """returns list of pairs (recipient id, context object id)
+    of the candidates not having the badge yet"""
+    awarded = Award.objects.filter(badge=data)
+    new_awards = list()
+    if badge.multiple:
+        seen = set(awarded.values_list('user_id', 'object_id'))
+        for pair in candidates:
+            if pair not in seen:
+                seen.add(pair)
+                new_awards.append(pair)
+    else:
+        seen = set(awarded.values_list('user_id', flat=True))
+        for user_id, object_id in candidates:
+            if user_id not in seen:
+                seen.add(user_id)
+                new_awards.append((user_id, object_id))
+    return new_awards
+
+
+def update_badge_counts(badge, user_ids):
+    """increments the gold, silver or bronze
+    counts of the users, by one per award"""
+    field = LEVEL_FIELDS[badge.level]
+    counts = dict()
+    for user_id in user_ids:
+        counts[user_id] = counts.get(user_id, 0) + 1
+    users_by_count = dict()
+    for user_id, count in counts.items():
+        users_by_count.setdefault(count, list()).append(user_id)
+    for count, count_user_ids in users_by_count.items():
+        for batch in get_batches(count_user_ids):
+            UserProfile.objects.filter(pk__in=batch).update(**{field: F(field) + count})
+    for batch in get_batches(counts.keys()):
+        for profile in UserProfile.objects.filter(pk__in=batch):
+            profile.update_cache()
+
+
+def record_award_activities(data, user_ids, timestamp):
+    """creates the "prize" activities of the awards
+    made at the ``timestamp``, addressed to the recipients"""
+    award_type = ContentType.objects.get_for_model(Award)
+    award_ids = list()
+    for batch in get_batches(set(user_ids)):
+        awards = Award.objects.filter(badge=data, awarded_at=timestamp, user_id__in=batch)
+        award_ids.extend(awards.values_list('id', 'user_id'))
+
+    activities = [
+        Activity(
+            user_id=user_id,
+            active_at=timestamp,
+            content_type=award_type,
+            object_id=award_id,
+            activity_type=const.TYPE_ACTIVITY_PRIZE
+        )
+        for award_id, user_id in award_ids
+    ]
+    Activity.objects.bulk_create(activities, batch_size=BATCH_SIZE)
+
+    statuses = list()
+    for batch in get_batches([award_id for award_id, user_id in award_ids]):
+        activities = Activity.objects.filter(
+                                content_type=award_type,
+                                object_id__in=batch,
+                                activity_type=const.TYPE_ACTIVITY_PRIZE
+                            ).values_list('id', 'user_id')
+        statuses.extend([
+            ActivityAuditStatus(user_id=user_id, activity_id=activity_id)
+            for activity_id, user_id in activities
+        ])
+    ActivityAuditStatus.objects.bulk_create(statuses, batch_size=BATCH_SIZE)
+
+
+def send_award_messages(badge, user_ids):
+    """same messages as sent by ``notify_award_message``"""
+    if askbot_settings.BADGES_MODE != 'public':
+        return
+    messages = list()
+    for batch in get_batches(set(user_ids)):
+        users = list(User.objects.filter(id__in=batch))
+        prime_profiles(users)
+        for user in users:
+            with override(user.primary_language):
+                badge_name = badge_registry.get_badge(badge.key).name
+                msg = _(u"Congratulations, you have received a badge '%(badge_name)s'. "
+                        u"Check out <a href=\"%(user_profile)s\">your profile</a>.") \
+                        % {
+                            'badge_name': badge_name,
+                            'user_profile': user.get_profile_url()
+                        }
+            messages.append(Message(user=user, message=msg))
+    Message.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+
+
+def award_badge_in_bulk(badge, timestamp=None):
+    """awards the badge to all candidates not having it,
+    returns the number of the new awards"""
+    model_class, candidates = badge.get_candidates()
+    data = badge.get_stored_data()
+    new_awards = get_new_awards(badge, data, candidates)
+    if not new_awards:
+        return 0
+
+    timestamp = timestamp or timezone.now()
+    content_type = ContentType.objects.get_for_model(model_class)
+    awards = [
+        Award(
+            user_id=user_id,
+            badge=data,
+            content_type=content_type,
+            object_id=object_id,
+            awarded_at=timestamp
+        )
+        for user_id, object_id in new_awards
+    ]
+    Award.objects.bulk_create(awards, batch_size=BATCH_SIZE)
+    BadgeData.objects.filter(id=data.id).update(
+                                awarded_count=F('awarded_count') + len(awards)
+                            )
+    user_ids = [user_id for user_id, object_id in new_awards]
+    update_badge_counts(badge, user_ids)
+    record_award_activities(data, user_ids, timestamp)
+    send_award_messages(badge, user_ids)
+    return len(awards)
+
+
+def evaluate_badges(badge_keys=None, timestamp=None):
+    """awards the badges in bulk, by default all badges
+    with the set-based criterion, returns dictionary with
+    numbers of ``awards`` per badge key and the ``seconds``
+    spent on the run"""
+    started_at = time.time()
+    timestamp = timestamp or timezone.now()
+    awards = dict()
+    for badge in get_periodic_badges():
+        if badge_keys is None or badge.key in badge_keys:
+            awards[badge.key] = award_badge_in_bulk(badge, timestamp)
+    return {
+        'awards': awards,
+        'seconds': time.time() - started_at,
+    }
+
+
+def get_unsupported_badge_keys(badge_keys):
+    """returns the keys of the badges which are unknown
+    or cannot be awarded in bulk"""
+    invalid_keys = list()
+    for key in badge_keys:
+        badge_class = badge_registry.BADGES.get(key)
+        if badge_class is None or badge_class().get_candidates() is None:
+            invalid_keys.append(key)
+    return invalid_keys
+
+
+def get_invalid_periodic_badge_keys():
+    """returns keys in the ``ASKBOT_PERIODIC_BADGES``
+    of the badges that cannot be awarded periodically"""
+    return get_unsupported_badge_keys(django_settings.ASKBOT_PERIODIC_BADGES)
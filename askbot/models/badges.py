@@ -21,7 +21,9 @@ import datetime
 
 from django.template.defaultfilters import slugify
 from django.conf import settings as django_settings
+from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Max, Min
 from django.utils.translation import ugettext as _
 from django.utils.translation import ungettext
 from django.utils import timezone
@@ -125,6 +127,37 @@ class Badge(object):
         """
         return self.award(actor, context_object, timestamp)
 
+    def get_candidates(self):
+        """set-based version of the ``consider_award``, used
+        by the periodic evaluation of the badges, see
+        :mod:`askbot.models.badge_evaluator`
+
+        returns ``None`` if the badge has no such criterion,
+        otherwise tuple (model of the context objects, iterable
+        of pairs (recipient id, context object id)) for all
+        deserving users, including those already awarded
+        """
+        return None
+
+
+def get_candidate_posts(**filters):
+    """returns (author id, post id) pairs of the posts matching filters"""
+    from askbot.models.post import Post
+    posts = Post.objects.filter(deleted=False, author__is_active=True, **filters)
+    return posts.order_by('id').values_list('author_id', 'id')
+
+
+def get_last_item_of_active_users(query_set, user_field, min_count):
+    """returns subquery selecting ids of the latest items
+    in the query set of the users having at least ``min_count`` items"""
+    return query_set.values(
+                        user_field
+                    ).annotate(
+                        item_count=Count('id'), last_id=Max('id')
+                    ).filter(
+                        item_count__gte=min_count
+                    ).values('last_id')
+
 
 class Disciplined(Badge):
     key = 'disciplined'
@@ -187,6 +220,13 @@ class Teacher(Badge):
             return self.award(context_object.author, context_object, timestamp)
         return False
 
+    def get_candidates(self):
+        from askbot.models.post import Post
+        return Post, get_candidate_posts(
+                        post_type='answer',
+                        points__gte=askbot_settings.TEACHER_BADGE_MIN_UPVOTES
+                    )
+
 
 class FirstVote(Badge):
     """this badge is not awarded directly, but through
@@ -205,6 +245,18 @@ class FirstVote(Badge):
             return False
         return self.award(actor, context_object, timestamp)
 
+    def get_candidates(self):
+        from askbot.models.post import Post
+        from askbot.models.repute import Vote
+        vote_value = Vote.VOTE_UP if self.key == 'supporter' else Vote.VOTE_DOWN
+        first_votes = Vote.objects.filter(
+                                vote=vote_value,
+                                user__is_active=True,
+                                voted_post__post_type__in=('question', 'answer')
+                            ).values('user_id').annotate(first_id=Min('id'))
+        votes = Vote.objects.filter(id__in=first_votes.values('first_id'))
+        return Post, votes.values_list('user_id', 'voted_post_id')
+
 
 class Supporter(FirstVote):
     """first upvote"""
@@ -247,6 +299,17 @@ class CivicDuty(Badge):
             return self.award(actor, obj, timestamp)
         return False
 
+    def get_candidates(self):
+        from askbot.models.post import Post
+        from askbot.models.repute import Vote
+        last_vote_ids = get_last_item_of_active_users(
+                                Vote.objects.filter(user__is_active=True),
+                                'user_id',
+                                askbot_settings.CIVIC_DUTY_BADGE_MIN_VOTES
+                            )
+        votes = Vote.objects.filter(id__in=last_vote_ids)
+        return Post, votes.values_list('user_id', 'voted_post_id')
+
 
 class SelfLearner(Badge):
     key = 'self-learner'
@@ -271,6 +334,15 @@ class SelfLearner(Badge):
         if question.author_id == answer.author_id and answer.points >= min_upvotes:
             self.award(context_object.author, context_object, timestamp)
 
+    def get_candidates(self):
+        from askbot.models.post import Post
+        return Post, get_candidate_posts(
+                        post_type='answer',
+                        points__gte=askbot_settings.SELF_LEARNER_BADGE_MIN_UPVOTES,
+                        thread__posts__post_type='question',
+                        thread__posts__author=F('author')
+                    )
+
 
 class QualityPost(Badge):
     """Generic Badge for Nice/Good/Great Question or Answer
@@ -296,6 +368,13 @@ class QualityPost(Badge):
             return self.award(context_object.author, context_object, timestamp)
         return False
 
+    def get_candidates(self):
+        from askbot.models.post import Post
+        return Post, get_candidate_posts(
+                        post_type=self.post_type,
+                        points__gte=self.min_votes
+                    )
+
 
 class NiceAnswer(QualityPost):
     key = 'nice-answer'
@@ -438,6 +517,13 @@ class FrequentedQuestion(Badge):
             return self.award(context_object.author, context_object, timestamp)
         return False
 
+    def get_candidates(self):
+        from askbot.models.post import Post
+        return Post, get_candidate_posts(
+                        post_type='question',
+                        thread__view_count__gte=self.min_views
+                    )
+
 
 class PopularQuestion(FrequentedQuestion):
     key = 'popular-question'
@@ -529,6 +615,14 @@ class VotedAcceptedAnswer(Badge):
         if answer.points >= self.min_votes and answer.endorsed:
             return self.award(answer.author, answer, timestamp)
 
+    def get_candidates(self):
+        from askbot.models.post import Post
+        return Post, get_candidate_posts(
+                        post_type='answer',
+                        endorsed=True,
+                        points__gte=self.min_votes
+                    )
+
 
 class Enlightened(VotedAcceptedAnswer):
     key = 'enlightened'
@@ -779,6 +873,14 @@ class Enthusiast(Badge):
             return self.award(actor, context_object, timestamp)
         return False
 
+    def get_candidates(self):
+        users = User.objects.filter(
+                        is_active=True,
+                        askbot_profile__consecutive_days_visit_count__gte=\
+                            askbot_settings.ENTHUSIAST_BADGE_MIN_DAYS
+                    )
+        return User, users.order_by('id').values_list('id', 'id')
+
 
 class Commentator(Badge):
     """Commentator is a bronze badge that is
@@ -801,6 +903,16 @@ class Commentator(Badge):
             return self.award(actor, context_object, timestamp)
         return False
 
+    def get_candidates(self):
+        from askbot.models import Post
+        last_comment_ids = get_last_item_of_active_users(
+                                Post.objects.get_comments().filter(author__is_active=True),
+                                'author_id',
+                                askbot_settings.COMMENTATOR_BADGE_MIN_COMMENTS
+                            )
+        comments = Post.objects.filter(id__in=last_comment_ids)
+        return Post, comments.values_list('author_id', 'id')
+
 
 class Taxonomist(Badge):
     key = 'taxonomist'
@@ -821,6 +933,14 @@ class Taxonomist(Badge):
             return self.award(tag.created_by, tag, timestamp)
         return False
 
+    def get_candidates(self):
+        from askbot.models.tag import Tag
+        tags = Tag.objects.filter(
+                        created_by__is_active=True,
+                        used_count__gte=askbot_settings.TAXONOMIST_BADGE_MIN_USE_COUNT
+                    )
+        return Tag, tags.order_by('id').values_list('created_by_id', 'id')
+
 
 class RapidResponder(Badge):
     key = 'rapid-responder'
@@ -998,7 +1118,11 @@ def award_badges(event=None, actor=None,
     except KeyError:
         raise NotImplementedError('event "%s" is not implemented' % event)
 
+    periodic_badges = django_settings.ASKBOT_PERIODIC_BADGES
     for badge in consider_badges:
+        if badge.key in periodic_badges:
+            #awarded by the command askbot_award_badges
+            continue
         badge_instance = badge()
         if badge_instance.is_enabled():
             badge_instance.consider_award(actor, context_object, timestamp)
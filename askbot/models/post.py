@@ -29,7 +29,9 @@ from askbot.utils.loading import load_module, load_plugin
 from askbot.utils.slug import slugify
 from askbot import const
 from askbot.models.tag import Tag, MarkedTag
-from askbot.models.tag import tags_match_some_wildcard
+from askbot.models.tag import WildcardTagPrefix
+from askbot.models.tag_cooccurrence import update_tag_cooccurrence
+from askbot.models.username_index import get_users_by_name_seeds
 from askbot.models.fields import LanguageCodeField
 from askbot.conf import settings as askbot_settings
 from askbot import exceptions
@@ -44,6 +46,7 @@ from askbot.models.base import (AnonymousContent, BaseQuerySetManager,
 # TODO: maybe merge askbot.utils.markup and forum.utils.html
 from askbot.utils.diff import textDiff as htmldiff
 from askbot.search import mysql
+from askbot.search import sqlite as sqlite_search
 
 
 def default_html_moderator(post):
@@ -114,6 +117,8 @@ class PostQuerySet(models.query.QuerySet):
         """returns a query set of questions,
         matching the full text query
         """
+        if sqlite_search.is_enabled():
+            return sqlite_search.run_post_search(self, search_query)
         return self.filter(
             models.Q(thread__title__icontains=search_query) |
             models.Q(text__icontains=search_query) |
@@ -496,8 +501,10 @@ class Post(models.Model):
         removed_mentions - list of mention <Activity> objects - for removed ones
         """
 
-        text_converter = self.get_text_converter()
-        text = text_converter(self.text)
+        text = markup.convert_text_cached(
+                                self.get_text_converter_path(),
+                                self.text
+                            )
 
         # TODO: add markdown parser call conditional on self.use_markdown flag
         post_html = text
@@ -513,15 +520,11 @@ class Post(models.Model):
                 anticipated_authors = list()
 
             extra_name_seeds = markup.extract_mentioned_name_seeds(text)
-
-            extra_authors = set()
-            for name_seed in extra_name_seeds:
-                extra_authors.update(
-                    User.objects.filter(username__istartswith=name_seed))
+            extra_authors = get_users_by_name_seeds(extra_name_seeds)
 
             # it is important to preserve order here so that authors of post
             # get mentioned first
-            anticipated_authors += list(extra_authors)
+            anticipated_authors += extra_authors
 
             mentioned_authors, post_html = markup.mentionize_text(
                 text, anticipated_authors)
@@ -690,18 +693,20 @@ class Post(models.Model):
 
         return answer
 
-    def get_text_converter(self):
-        """returns text converter, which may
-        be overridden by setting
-        ASKBOT_POST_RENDERERS (look for format in the source code)
-        """
+    def get_text_converter_path(self):
+        """returns python path to the text converter"""
         renderer_type = get_post_renderer_type(self.post_type)
         try:
-            renderer_path = POST_RENDERERS_MAP[renderer_type]
+            return POST_RENDERERS_MAP[renderer_type]
         except KeyError:
             raise NotImplementedError
 
-        return load_module(renderer_path)
+    def get_text_converter(self):
+        """returns text converter, which may
+        be overridden by setting
+        ASKBOT_POST_RENDERERS (look for format in the source code)
+        """
+        return load_module(self.get_text_converter_path())
 
     def has_group(self, group):
         """true if post belongs to the group"""
@@ -936,6 +941,7 @@ class Post(models.Model):
         if self.is_question():
             self.thread.approved = is_approved
             self.thread.save()
+            update_tag_cooccurrence(self.thread)
 
     def is_approved(self):
         """``False`` only when moderation is ``True`` and post
@@ -1200,40 +1206,21 @@ class Post(models.Model):
         )
 
         # part 2 - find users who follow or not ignore tags via wildcard selections
-        # inside there is a potentially time consuming loop
+        # matching wildcards are looked up by the tag name prefixes
         if askbot_settings.USE_WILDCARD_TAGS:
-            # TODO: fix this
-            # this branch will not scale well
-            # because we have to loop through the list of users
-            # in python
-            if tag_mark_reason == 'good':
-                empty_wildcard_filter = {'askbot_profile__interesting_tags__exact': ''}
-                wildcard_tags_attribute = 'interesting_tags'
-                update_subscribers = lambda the_set, item: the_set.add(item)
-            elif tag_mark_reason == 'bad':
-                empty_wildcard_filter = {'askbot_profile__ignored_tags__exact': ''}
-                wildcard_tags_attribute = 'ignored_tags'
-                update_subscribers = lambda the_set, item: the_set.discard(item)
-            elif tag_mark_reason == 'subscribed':
-                empty_wildcard_filter = {'askbot_profile__subscribed_tags__exact': ''}
-                wildcard_tags_attribute = 'subscribed_tags'
-                update_subscribers = lambda the_set, item: the_set.add(item)
-
-            potential_wildcard_subscribers = User.objects.filter(
-                notification_subscriptions__in=subscription_records
+            wildcard_subscriber_ids = WildcardTagPrefix.objects.get_subscriber_ids(
+                tag_names, tag_mark_reason
+            )
+            wildcard_subscribers = User.objects.filter(
+                id__in=wildcard_subscriber_ids
             ).filter(
-                askbot_profile__email_tag_filter_strategy=email_tag_filter_strategy
-            ).exclude(
-                **empty_wildcard_filter  # need this to limit size of the loop
+                askbot_profile__email_tag_filter_strategy=email_tag_filter_strategy,
+                notification_subscriptions__in=subscription_records
             )
-            for potential_subscriber in potential_wildcard_subscribers:
-                wildcard_tags = getattr(
-                    potential_subscriber,
-                    wildcard_tags_attribute
-                ).split(' ')
-
-                if tags_match_some_wildcard(tag_names, wildcard_tags):
-                    update_subscribers(subscribers, potential_subscriber)
+            if tag_mark_reason == 'bad':
+                subscribers.difference_update(wildcard_subscribers)
+            else:
+                subscribers.update(wildcard_subscribers)
 
         return subscribers
 
@@ -1244,8 +1231,6 @@ class Post(models.Model):
 
         this method in turn calls several more specialized
         subscriber retrieval functions
-        todo: retrieval of wildcard tag followers ignorers
-              won't scale at all
         """
         subscriber_set = set()
 
@@ -1502,11 +1487,14 @@ class Post(models.Model):
 #       # TODO: remove this method
 #       return self.current_revision
 
+    def cache_earliest_revision(self, rev):
+        setattr(self, '_first_rev_cache', rev)
+
     def get_earliest_revision(self):
         if hasattr(self, '_first_rev_cache'):
             return self._first_rev_cache
         rev = self.revisions.order_by('revision')[0]
-        setattr(self, '_first_rev_cache', rev)
+        self.cache_earliest_revision(rev)
         return rev
 
     def get_latest_revision_number(self):
@@ -2087,6 +2075,41 @@ class Post(models.Model):
 
 
 class PostRevisionManager(models.Manager):
+    def precache_for_posts(self, posts):
+        """loads the earliest and the latest revisions
+        of the posts with two queries and caches them on the posts,
+        so that ``get_earliest_revision()`` and ``get_latest_revision()``
+        do not hit the database"""
+        post_map = dict([(post.id, post) for post in posts])
+        if not post_map:
+            return
+
+        revisions = self.filter(
+                        post__id__in=post_map.keys()
+                    ).values_list('id', 'post_id', 'revision')
+        first_revs = dict()# post id -> (revision number, revision id)
+        last_revs = dict()
+        for rev_id, post_id, number in revisions:
+            if post_id not in first_revs or number < first_revs[post_id][0]:
+                first_revs[post_id] = (number, rev_id)
+            if post_id not in last_revs or number > last_revs[post_id][0]:
+                last_revs[post_id] = (number, rev_id)
+
+        rev_ids = set([rev_id for number, rev_id in first_revs.values()])
+        rev_ids.update([rev_id for number, rev_id in last_revs.values()])
+        revisions = self.filter(id__in=rev_ids).select_related('author')
+        rev_map = dict([(rev.id, rev) for rev in revisions])
+
+        for post_id, post in post_map.items():
+            if post_id not in first_revs:
+                continue
+            first_rev = rev_map[first_revs[post_id][1]]
+            last_rev = rev_map[last_revs[post_id][1]]
+            first_rev.post = post
+            last_rev.post = post
+            post.cache_earliest_revision(first_rev)
+            post.cache_latest_revision(last_rev)
+
     def create(self, *args, **kwargs):
         # clean the "summary" field
         kwargs.setdefault('summary', '')
@@ -2331,7 +2354,7 @@ class PostRevision(models.Model):
 
     @property
     def html(self, **kwargs):
-        markdowner = markup.get_parser()
+        markdowner = markup.get_cached_parser()
         sanitized_html = sanitize_html(markdowner.convert(self.text))
 
         if self.post.is_question():
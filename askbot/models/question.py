@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 import logging
 import operator
 import regex as re
@@ -16,6 +17,7 @@ from django.template import Context
 from django.utils.translation import ugettext as _
 from django.utils.translation import ungettext, string_concat, get_language
 from django.utils import timezone
+from django.utils.encoding import smart_str
 
 import askbot
 from askbot.conf import settings as askbot_settings
@@ -25,15 +27,19 @@ from askbot.models.tag import Tag, TagSynonym
 from askbot.models.tag import get_tags_by_names
 from askbot.models.tag import filter_accepted_tags, filter_suggested_tags
 from askbot.models.tag import separate_unused_tags
+from askbot.models.tag_cooccurrence import ThreadTagWeight
+from askbot.models.tag_cooccurrence import update_tag_cooccurrence
 from askbot.models.base import BaseQuerySetManager
 from askbot.models.base import DraftContent, AnonymousContent
 from askbot.models.user import Group, PERSONAL_GROUP_NAME_PREFIX
 from askbot.models.fields import LanguageCodeField
 from askbot import signals
 from askbot import const
+from askbot.utils.functions import generate_random_key
 from askbot.utils.lists import LazyList
 from askbot.utils.loading import load_plugin
 from askbot.search import mysql
+from askbot.search import sqlite as sqlite_search
 from askbot.utils.slug import slugify
 from askbot.utils import translation as translation_utils
 from askbot.search.state_manager import DummySearchState
@@ -79,6 +85,27 @@ def default_title_renderer(thread):
         return thread.title
 
 
+QUESTION_ORDER_BY_MAP = {
+    'age-desc': '-added_at',
+    'age-asc': 'added_at',
+    'activity-desc': '-last_activity_at',
+    'activity-asc': 'last_activity_at',
+    'answers-desc': '-answer_count',
+    'answers-asc': 'answer_count',
+    'votes-desc': '-points',
+    'votes-asc': 'points',
+
+    'relevance-desc': '-relevance', # special ordering for Postgresql and SQLite full text search, 'relevance' quaso-column is added by get_for_query()
+}
+
+
+#fields of the thread loaded for the question lists
+THREAD_LIST_FIELDS = (
+    'id', 'title', 'view_count', 'answer_count', 'last_activity_at',
+    'last_activity_by', 'closed', 'tagnames', 'accepted_answer'
+)
+
+
 class ThreadQuerySet(models.query.QuerySet):
 
     def get_visible(self, user):
@@ -111,6 +138,12 @@ class ThreadQuerySet(models.query.QuerySet):
                                     ).order_by('-relevance')
             elif 'mysql' in db_engine_name and mysql.supports_full_text_search():
                 filter_parameters['title__search'] = search_query
+            elif sqlite_search.is_enabled():
+                return sqlite_search.run_title_search(
+                                        self, search_query
+                                    ).filter(
+                                        **filter_parameters
+                                    ).order_by('-relevance')
             else:
                 filter_parameters['title__icontains'] = search_query
 
@@ -261,6 +294,8 @@ class ThreadManager(BaseQuerySetManager):
             elif 'postgresql_psycopg2' in askbot.get_database_engine_name():
                 from askbot.search import postgresql
                 return postgresql.run_thread_search(qs, search_query)
+            elif sqlite_search.is_enabled():
+                return sqlite_search.run_thread_search(qs, search_query)
             else:
                 return qs.filter(
                     models.Q(title__icontains=search_query) |
@@ -268,6 +303,71 @@ class ThreadManager(BaseQuerySetManager):
                     models.Q(posts__deleted=False, posts__text__icontains=search_query)
                 )
 
+    def get_search_tag_names(self, search_state, meta_data):
+        """returns names of tags by which the search must be
+        restricted: tags from the tag selector plus those
+        given in the query string.
+
+        Names of tags that do not exist in the database are
+        stored in ``meta_data['non_existing_tags']``
+        """
+        meta_data['non_existing_tags'] = list()
+        tags = search_state.unified_tags()
+        if len(tags) > 0 and askbot_settings.TAG_SEARCH_INPUT_ENABLED:
+            # TODO: this may be gone or disabled per option
+            # "tag_search_box_enabled"
+            existing_tags = set()
+            non_existing_tags = set()
+            # we're using a one-by-one tag retreival, b/c
+            # we want to take advantage of case-insensitive search indexes
+            # in postgresql, plus it is most likely that there will be
+            # only one or two search tags anyway
+            for tag in tags:
+                try:
+                    tag_record = Tag.objects.get(
+                        name__iexact=tag, language_code=get_language())
+                    existing_tags.add(tag_record.name)
+                except Tag.DoesNotExist:
+                    non_existing_tags.add(tag)
+
+            meta_data['non_existing_tags'] = list(non_existing_tags)
+            tags = existing_tags
+        return tags
+
+    def get_user_tag_selections(self, request_user, meta_data):
+        """returns a tuple of query sets of tags
+        (interesting, ignored, subscribed) selected by the user
+        in the current language and stores the names of the
+        selected tags (including wildcards) in the ``meta_data``
+        """
+        # mark questions tagged with interesting tags
+        # a kind of fancy annotation, would be nice to avoid it
+        lang = get_language()
+        interesting_tags = Tag.objects.filter(
+            user_selections__user=request_user,
+            user_selections__reason='good',
+            language_code=lang)
+        ignored_tags = Tag.objects.filter(
+            user_selections__user=request_user,
+            user_selections__reason='bad',
+            language_code=lang)
+        subscribed_tags = Tag.objects.none()
+        if askbot_settings.SUBSCRIBED_TAG_SELECTOR_ENABLED:
+            subscribed_tags = Tag.objects.filter(
+                user_selections__user=request_user,
+                user_selections__reason='subscribed',
+                language_code=lang)
+            meta_data['subscribed_tag_names'] = [tag.name for tag in subscribed_tags]
+
+        meta_data['interesting_tag_names'] = [tag.name for tag in interesting_tags]
+        meta_data['ignored_tag_names'] = [tag.name for tag in ignored_tags]
+
+        if askbot_settings.USE_WILDCARD_TAGS:
+            meta_data['interesting_tag_names'].extend(request_user.interesting_tags.split())
+            meta_data['ignored_tag_names'].extend(request_user.ignored_tags.split())
+
+        return interesting_tags, ignored_tags, subscribed_tags
+
     # TODO: !! review, fix, and write tests for this
     def run_advanced_search(self, request_user, search_state):
         """
@@ -331,36 +431,11 @@ class ThreadManager(BaseQuerySetManager):
         # syntax.
         # run tag search in addition to these unified tags
         meta_data = {}
-        tags = search_state.unified_tags()
-        if len(tags) > 0:
-            if askbot_settings.TAG_SEARCH_INPUT_ENABLED:
-                # TODO: this may be gone or disabled per option
-                # "tag_search_box_enabled"
-                existing_tags = set()
-                non_existing_tags = set()
-                # we're using a one-by-one tag retreival, b/c
-                # we want to take advantage of case-insensitive search indexes
-                # in postgresql, plus it is most likely that there will be
-                # only one or two search tags anyway
-                for tag in tags:
-                    try:
-                        tag_record = Tag.objects.get(
-                            name__iexact=tag, language_code=get_language())
-                        existing_tags.add(tag_record.name)
-                    except Tag.DoesNotExist:
-                        non_existing_tags.add(tag)
-
-                meta_data['non_existing_tags'] = list(non_existing_tags)
-                tags = existing_tags
-            else:
-                meta_data['non_existing_tags'] = list()
-
-            # construct filter for the tag search
-            for tag in tags:
-                # Tags or AND-ed here, not OR-ed (i.e. we fetch only threads with all tags)
-                qs = qs.filter(tags__name=tag)
-        else:
-            meta_data['non_existing_tags'] = list()
+        tags = self.get_search_tag_names(search_state, meta_data)
+        # construct filter for the tag search
+        for tag in tags:
+            # Tags or AND-ed here, not OR-ed (i.e. we fetch only threads with all tags)
+            qs = qs.filter(tags__name=tag)
 
         if search_state.scope == 'unanswered':
             # Do not show closed questions in unanswered section
@@ -410,27 +485,8 @@ class ThreadManager(BaseQuerySetManager):
 
         # get users tag filters
         if request_user and request_user.is_authenticated():
-            # mark questions tagged with interesting tags
-            # a kind of fancy annotation, would be nice to avoid it
-            lang = get_language()
-            interesting_tags = Tag.objects.filter(
-                user_selections__user=request_user,
-                user_selections__reason='good',
-                language_code=lang)
-            ignored_tags = Tag.objects.filter(
-                user_selections__user=request_user,
-                user_selections__reason='bad',
-                language_code=lang)
-            subscribed_tags = Tag.objects.none()
-            if askbot_settings.SUBSCRIBED_TAG_SELECTOR_ENABLED:
-                subscribed_tags = Tag.objects.filter(
-                    user_selections__user=request_user,
-                    user_selections__reason='subscribed',
-                    language_code=lang)
-                meta_data['subscribed_tag_names'] = [tag.name for tag in subscribed_tags]
-
-            meta_data['interesting_tag_names'] = [tag.name for tag in interesting_tags]
-            meta_data['ignored_tag_names'] = [tag.name for tag in ignored_tags]
+            interesting_tags, ignored_tags, subscribed_tags = \
+                self.get_user_tag_selections(request_user, meta_data)
 
             if request_user.display_tag_filter_strategy == const.INCLUDE_INTERESTING and (interesting_tags or request_user.has_interesting_wildcard_tags()):
                 # filter by interesting tags only
@@ -454,23 +510,6 @@ class ThreadManager(BaseQuerySetManager):
                     and subscribed_tags:
                 qs = qs.filter(tags__in=subscribed_tags)
 
-            if askbot_settings.USE_WILDCARD_TAGS:
-                meta_data['interesting_tag_names'].extend(request_user.interesting_tags.split())
-                meta_data['ignored_tag_names'].extend(request_user.ignored_tags.split())
-
-        QUESTION_ORDER_BY_MAP = {
-            'age-desc': '-added_at',
-            'age-asc': 'added_at',
-            'activity-desc': '-last_activity_at',
-            'activity-asc': 'last_activity_at',
-            'answers-desc': '-answer_count',
-            'answers-asc': 'answer_count',
-            'votes-desc': '-points',
-            'votes-asc': 'points',
-
-            'relevance-desc': '-relevance', # special Postgresql-specific ordering, 'relevance' quaso-column is added by get_for_query()
-        }
-
         orderby = QUESTION_ORDER_BY_MAP[search_state.sort]
 
         if not (getattr(django_settings, 'ENABLE_HAYSTACK_SEARCH', False) \
@@ -483,12 +522,18 @@ class ThreadManager(BaseQuerySetManager):
         # UPDATE: Apparently we don't need distinct, the query don't duplicate Thread rows!
         # qs = qs.extra(select={'ordering_key': orderby.lstrip('-')}, order_by=['-ordering_key' if orderby.startswith('-') else 'ordering_key'])
         # qs = qs.distinct()
-        qs = qs.only(
-            'id', 'title', 'view_count', 'answer_count', 'last_activity_at',
-            'last_activity_by', 'closed', 'tagnames', 'accepted_answer'
-        )
+        qs = qs.only(*THREAD_LIST_FIELDS)
         return qs.distinct(), meta_data
 
+    def get_for_list(self, thread_ids):
+        """returns list of threads with the given ids
+        in the order of the ids, with only the fields
+        necessary for the question lists loaded"""
+        thread_ids = list(thread_ids)
+        threads = self.filter(id__in=thread_ids).only(*THREAD_LIST_FIELDS)
+        thread_map = dict([(thread.id, thread) for thread in threads])
+        return [thread_map[thread_id] for thread_id in thread_ids if thread_id in thread_map]
+
     def precache_view_data_hack(self, threads):
         # TODO: Re-enable this when we have a good test cases to verify that it works properly.
         #
@@ -1029,16 +1074,86 @@ class Thread(models.Model):
         lang = lang or get_language()
         return 'thread-question-summary-%d-%s' % (self.id, lang)
 
-    def get_post_data_cache_key(self, sort_method=None):
-        return 'thread-data-%s-%s' % (self.id, sort_method)
+    def get_post_data_cache_key(self, sort_method=None, group_signature=None):
+        """key of the post data as seen by the users
+        with the given group signature"""
+        key = '%d-%s-%s-%s' % (
+                            self.id,
+                            self.get_post_data_version(),
+                            group_signature,
+                            sort_method
+                        )
+        return 'thread-data-%s' % hashlib.md5(smart_str(key)).hexdigest()
+
+    def get_post_data_version_cache_key(self):
+        return 'thread-data-version-%d' % self.id
+
+    def get_post_data_version(self):
+        """returns random string which changes each time
+        the post data is invalidated, it is a part of the keys
+        of the data cached per group signature, which
+        cannot be enumerated for the deletion"""
+        key = self.get_post_data_version_cache_key()
+        version = cache.cache.get(key)
+        if version is None:
+            version = generate_random_key(length=4)
+            cache.cache.set(key, version, const.LONG_TIME)
+        return version
+
+    def get_post_group_ids(self):
+        """returns set of ids of groups to which
+        the posts of the thread are shared"""
+        key = 'thread-post-groups-%d' % self.id
+        group_ids = cache.cache.get(key)
+        if group_ids is None:
+            from askbot.models.post import PostToGroup
+            group_ids = PostToGroup.objects.filter(
+                                    post__thread=self
+                                ).values_list('group_id', flat=True)
+            group_ids = set(group_ids)
+            cache.cache.set(key, group_ids, const.LONG_TIME)
+        return group_ids
+
+    def get_group_signature(self, user=None):
+        """returns string describing which posts of the thread
+        the user can see: users with the same signature
+        see exactly the same posts"""
+        if not askbot_settings.GROUPS_ENABLED:
+            return 'public'
+        if user is None or user.is_anonymous():
+            user_group_ids = set([Group.objects.get_global_group().id])
+        else:
+            user_group_ids = set(user.get_groups().values_list('id', flat=True))
+        group_ids = sorted(user_group_ids & self.get_post_group_ids())
+        return ','.join(map(str, group_ids))
+
+    def get_page_fragment_cache_key(self, user=None, sort_method=None, page=1):
+        """key of the cached html of the posts on the question page,
+        the html is the same for the users with the same
+        group signature, except the anonymous visitors
+        may see different banners"""
+        user_type = 'anon' if user is None or user.is_anonymous() else 'user'
+        key = '%d-%s-%s-%s-%d-%s-%s' % (
+                            self.id,
+                            self.get_post_data_version(),
+                            self.get_group_signature(user),
+                            sort_method,
+                            page,
+                            user_type,
+                            get_language()
+                        )
+        return 'thread-page-fragment-%s' % hashlib.md5(smart_str(key)).hexdigest()
 
     def invalidate_cached_post_data(self):
         """needs to be called when anything notable
         changes in the post data - on votes, adding,
-        deleting, editing content"""
-        # we can call delete_many() here if using Django > 1.2
-        sort_methods = map(lambda v: v[0], const.ANSWER_SORT_METHODS)
-        keys = map(lambda v: self.get_post_data_cache_key(v), sort_methods)
+        deleting, editing content.
+        Data cached for all group signatures is evicted
+        at once by the change of the post data version"""
+        keys = (
+            self.get_post_data_version_cache_key(),
+            'thread-post-groups-%d' % self.id
+        )
         cache.cache.delete_many(keys)
 
     def reset_cached_data(self):
@@ -1158,16 +1273,20 @@ class Thread(models.Model):
 
     def get_cached_post_data(self, user=None, sort_method=None):
         """returns cached post data, as calculated by
-        the method get_post_data()"""
+        the method get_post_data(), the data is shared
+        by the users with the same group signature"""
         sort_method = sort_method or askbot_settings.DEFAULT_ANSWER_SORT_METHOD
 
-        if askbot_settings.GROUPS_ENABLED:
-            # temporary plug: bypass cache where groups are enabled
-            return self.get_post_data(sort_method=sort_method, user=user)
-        key = self.get_post_data_cache_key(sort_method)
+        group_signature = self.get_group_signature(user)
+        key = self.get_post_data_cache_key(sort_method, group_signature)
         post_data = cache.cache.get(key)
         if not post_data:
-            post_data = self.get_post_data(sort_method)
+            post_data = self.get_post_data(sort_method=sort_method, user=user)
+            question = post_data[0]
+            if question and not question.is_approved():
+                # order of the answers depends on whether
+                # the user is the enquirer, don't cache
+                return post_data
             cache.cache.set(key, post_data, const.LONG_TIME)
         return post_data
 
@@ -1216,7 +1335,11 @@ class Thread(models.Model):
         else:
             order_by = (order_by,)
 
-        thread_posts = thread_posts.order_by(*order_by)
+        thread_posts = list(thread_posts.order_by(*order_by))
+        # precache the revision data used in the templates
+        from askbot.models import PostRevision
+        PostRevision.objects.precache_for_posts(thread_posts)
+
         # 1) collect question, answer and comment posts and list of post id's
         answers = list()
         post_map = dict()
@@ -1224,12 +1347,6 @@ class Thread(models.Model):
         post_to_author = dict()
         question_post = None
         for post in thread_posts:
-            # precache some revision data
-            first_rev = post.get_earliest_revision()
-            last_rev = post.get_latest_revision()
-            first_rev.post = post
-            last_rev.post = post
-
             # pass through only deleted question posts
             if post.deleted and post.post_type != 'question':
                 continue
@@ -1312,37 +1429,27 @@ class Thread(models.Model):
     def get_similar_threads(self):
         """
         Get 10 similar threads for given one.
-        Threads with the individual tags will be added to list if above questions are not full.
-
-        This function has a limitation that it will
-        retrieve only 100 records then select 10 most similar
-        from that list as querying entire database may
-        be very expensive - this function will benefit from
-        some sort of optimization
+        Threads are ordered by the total weight of the shared tags,
+        from the tag vectors in the
+        :class:`~askbot.models.tag_cooccurrence.ThreadTagWeight`
         """
 
         def get_data():
-            # TODO: code in this function would be simpler if
-            # we had question post id denormalized on the thread
-            tags_list = self.get_tag_names()
-            similar_threads = Thread.objects\
-                .filter(tags__name__in=tags_list, language_code=self.language_code)\
-                .exclude(id=self.id)\
-                .exclude(posts__post_type='question', posts__deleted=True)\
-                .distinct()[:100]
-            similar_threads = list(similar_threads)
-
-            for thread in similar_threads:
-                thread.similarity = self.get_similarity(other_thread=thread)
-
-            similar_threads.sort(key=operator.attrgetter('similarity'), reverse=True)
-            similar_threads = similar_threads[:10]
+            #candidates are scored by the weights of the shared tags,
+            #the extra ones replace threads with deleted questions
+            similar_thread_ids = ThreadTagWeight.objects.get_similar_thread_ids(
+                                                                self, limit=20
+                                                            )
+            thread_map = Thread.objects.in_bulk(similar_thread_ids)
+            similar_threads = [
+                thread_map[thread_id] for thread_id in similar_thread_ids
+                if thread_id in thread_map
+            ]
 
             # Denormalize questions to speed up template rendering
             # TODO: just denormalize question_post_id on the thread!
-            thread_map = dict([(thread.id, thread) for thread in similar_threads])
             from askbot.models.post import Post
-            questions = Post.objects.get_questions()
+            questions = Post.objects.get_questions().filter(deleted=False)
             questions = questions.select_related('thread').filter(thread__in=similar_threads)
             for q in questions:
                 thread_map[q.thread_id].question_denorm = q
@@ -1360,6 +1467,8 @@ class Thread(models.Model):
                     url = question_post.get_absolute_url()
                     title = thread.get_title()
                     result.append({'url': url, 'title': title})
+                if len(result) == 10:
+                    break
 
             return result
 
@@ -1603,6 +1712,7 @@ class Thread(models.Model):
         modified_tags = set(modified_tags)
         if modified_tags:
             Tag.objects.update_use_counts(modified_tags)
+            update_tag_cooccurrence(self)
             signals.tags_updated.send(None, thread=self, tags=modified_tags,
                                       user=user, timestamp=timestamp)
             return True
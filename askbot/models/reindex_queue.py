@@ -0,0 +1,195 @@
+"""Queue of the threads and the users waiting to be reindexed.
+
+With ``ASKBOT_SEARCH_REINDEX_QUEUE = True`` the saves of the
+threads, posts, users and user profiles do not update the
+search index. The ids of the changed threads and users are
+stored as :class:`PendingReindex` rows, one row per object
+however many times it changes, and the celery task
+``askbot.tasks.process_search_reindex_queue`` sends them to
+the search backend in batches of ``ASKBOT_SEARCH_REINDEX_BATCH_SIZE``.
+
+The task is scheduled once within ``ASKBOT_SEARCH_REINDEX_DELAY``
+seconds, so an edit, vote or comment re-saving several posts
+of one thread causes a single reindex of the thread.
+An object queued again while the task reindexes it gets
+a new ``generation`` of its entry, the task removes only the
+entries of the generation it has read, so the change is
+reindexed by the next run.
+
+Supported backends are haystack (with
+``HAYSTACK_SIGNAL_PROCESSOR`` set to
+``askbot.search.haystack.signals.AskbotQueuedSignalProcessor``),
+the PostgreSQL text search vectors and the SQLite FTS5 index.
+With PostgreSQL the triggers updating the vectors on each save of
+a thread or a post are dropped by the migration or by the command
+``init_postgresql_full_text_search`` when the queue is enabled.
+"""
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.core import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from askbot.search import sqlite as sqlite_search
+
+#time after which the changes schedule the task again,
+#even if the previously scheduled task did not run
+SCHEDULE_TIMEOUT = 300
+SCHEDULE_CACHE_KEY = 'search-reindex-scheduled'
+
+
+def reindex_queue_enabled():
+    return django_settings.ASKBOT_SEARCH_REINDEX_QUEUE
+
+
+class PendingReindex(models.Model):
+    """thread or user whose search index
+    entry is to be updated"""
+    THREAD = 'thread'
+    USER = 'user'
+    KIND_CHOICES = (
+        (THREAD, 'thread'),
+        (USER, 'user'),
+    )
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    generation = models.PositiveIntegerField(default=0)
+    added_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_pending_reindex'
+        unique_together = ('kind', 'object_id')
+
+
+def schedule_reindex():
+    """schedules the task, unless it is scheduled already"""
+    if cache.cache.add(SCHEDULE_CACHE_KEY, True, SCHEDULE_TIMEOUT):
+        from askbot import tasks
+        from askbot.utils.transaction import defer_celery_task
+        defer_celery_task(
+            tasks.process_search_reindex_queue,
+            countdown=django_settings.ASKBOT_SEARCH_REINDEX_DELAY
+        )
+
+
+def enqueue_reindex(kind, object_ids):
+    """adds the objects to the queue, the objects
+    already in the queue keep their place and
+    get the next generation of the entry"""
+    object_ids = set(object_ids)
+    queued = PendingReindex.objects.filter(kind=kind, object_id__in=object_ids)
+    queued.update(generation=F('generation') + 1)
+    new_ids = object_ids - set(queued.values_list('object_id', flat=True))
+    if new_ids:
+        timestamp = timezone.now()
+        entries = [
+            PendingReindex(kind=kind, object_id=object_id, added_at=timestamp)
+            for object_id in new_ids
+        ]
+        try:
+            with transaction.atomic():
+                PendingReindex.objects.bulk_create(entries)
+        except IntegrityError:
+            #some were queued by a concurrent request
+            for entry in entries:
+                entry, created = PendingReindex.objects.get_or_create(
+                                    kind=kind, object_id=entry.object_id,
+                                    defaults={'added_at': timestamp}
+                                )
+                if not created:
+                    PendingReindex.objects.filter(id=entry.id).update(
+                                            generation=F('generation') + 1
+                                        )
+    schedule_reindex()
+
+
+def reindex_objects(kind, object_ids):
+    """updates the search index entries of the objects
+    in the backend in use"""
+    import askbot
+    from askbot.models.question import Thread
+    model_class = Thread if kind == PendingReindex.THREAD else User
+    if getattr(django_settings, 'ENABLE_HAYSTACK_SEARCH', False):
+        from askbot.search.haystack.helpers import update_index
+        update_index(model_class, object_ids)
+    elif 'postgresql_psycopg2' in askbot.get_database_engine_name():
+        from askbot.search import postgresql
+        if kind == PendingReindex.THREAD:
+            postgresql.update_thread_vectors(object_ids)
+        else:
+            postgresql.update_user_vectors(object_ids)
+    elif sqlite_search.is_enabled():
+        if kind == PendingReindex.THREAD:
+            sqlite_search.update_thread_index(object_ids)
+        else:
+            sqlite_search.update_user_index(object_ids)
+
+
+def process_reindex_queue():
+    """reindexes the queued objects in batches,
+    returns the number of the reindexed objects"""
+    #changes made from now on will schedule another run
+    cache.cache.delete(SCHEDULE_CACHE_KEY)
+    batch_size = django_settings.ASKBOT_SEARCH_REINDEX_BATCH_SIZE
+    total = 0
+    last_id = 0
+    while True:
+        entries = list(
+            PendingReindex.objects.filter(id__gt=last_id).order_by('id')[:batch_size]
+        )
+        if not entries:
+            break
+        last_id = entries[-1].id
+        object_ids = dict()
+        entry_ids = dict()
+        for entry in entries:
+            object_ids.setdefault(entry.kind, list()).append(entry.object_id)
+            entry_ids.setdefault(entry.generation, list()).append(entry.id)
+        with transaction.atomic():
+            for kind, ids in object_ids.items():
+                reindex_objects(kind, ids)
+        #entries queued again during the reindex stay for the next run
+        for generation, ids in entry_ids.items():
+            PendingReindex.objects.filter(id__in=ids, generation=generation).delete()
+        total += len(entries)
+    return total
+
+
+def get_queue_stats():
+    """returns dictionary with the numbers of queued threads
+    and users, the total ``depth`` of the queue and the ``lag`` -
+    seconds since the oldest entry was queued"""
+    stats = {PendingReindex.THREAD: 0, PendingReindex.USER: 0}
+    counts = PendingReindex.objects.values('kind').annotate(count=models.Count('id'))
+    for item in counts:
+        stats[item['kind']] = item['count']
+    stats['depth'] = stats[PendingReindex.THREAD] + stats[PendingReindex.USER]
+
+    oldest = PendingReindex.objects.aggregate(oldest=models.Min('added_at'))['oldest']
+    if oldest is None:
+        stats['lag'] = 0
+    else:
+        stats['lag'] = (timezone.now() - oldest).total_seconds()
+    return stats
+
+
+def queue_thread_reindex(sender, instance, **kwargs):
+    if reindex_queue_enabled():
+        enqueue_reindex(PendingReindex.THREAD, [instance.id])
+
+
+def queue_post_reindex(sender, instance, **kwargs):
+    if reindex_queue_enabled() and instance.thread_id:
+        enqueue_reindex(PendingReindex.THREAD, [instance.thread_id])
+
+
+def queue_user_reindex(sender, instance, **kwargs):
+    if reindex_queue_enabled():
+        enqueue_reindex(PendingReindex.USER, [instance.id])
+
+
+def queue_profile_reindex(sender, instance, **kwargs):
+    if reindex_queue_enabled():
+        enqueue_reindex(PendingReindex.USER, [instance.auth_user_id])
@@ -0,0 +1,658 @@
+"""Ledger of the reputation changes.
+
+Every change of the reputation is appended to the ledger -
+the :class:`~askbot.models.Repute` rows, which are never
+updated. :func:`record_reputation_change` applies the change to
+the user and to the localized profile and appends the row.
+
+:class:`ReputationSnapshot` rows hold the sums of the ledger
+per user and language up to the repute ``last_repute_id``,
+common to all snapshots. They are advanced by the periodic runs of
+``python manage.py askbot_snapshot_reputation``, so the balance of
+the ledger is the snapshot plus the few rows appended after it.
+The rows appended within the last ``SNAPSHOT_LAG`` seconds are left
+for the next run, so that the rows of the transactions still running,
+having lower ids than the rows already committed, are not skipped.
+
+:func:`replay_reputation` recomputes the reputation of all users
+from the votes, the accepted answers, the offensive flags, the changes
+made by the moderators and the imported reputation with a few aggregate
+queries. The changes of the users who lost reputation are replayed one
+by one, in the order of the time, to apply the lower limits of the
+reputation as they were applied to the stored reputation.
+``python manage.py askbot_recount_reputation`` compares it with
+the stored reputation and reports the differences, with ``--fix``
+it fixes them, appending the corrections to the ledger.
+"""
+import datetime
+import math
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, models
+from django.db.models import Count, F, Func, Max, Sum
+from django.conf import settings as django_settings
+from django.utils import timezone
+
+from askbot import const
+from askbot.conf import settings as askbot_settings
+from askbot.models.fields import LanguageCodeField
+from askbot.models.repute import Repute, Vote
+from askbot.models.user_profile import LocalizedUserProfile, UserProfile
+
+#max number of ids in one "IN" clause and of rows in one insert
+BATCH_SIZE = 500
+
+#reputation types not derived from the other records
+RECORDED_TYPES = (
+    const.TYPE_REPUTATION_ASSIGNED_BY_MODERATOR,
+    const.TYPE_REPUTATION_IMPORTED,
+)
+
+#seconds the new ledger rows wait before they are added to the snapshots
+SNAPSHOT_LAG = 600
+
+
+class ReputationSnapshot(models.Model):
+    """sum of the reputation changes of the user in the language
+    recorded in the ledger up to the repute ``last_repute_id``"""
+    user = models.ForeignKey(User, related_name='+')
+    language_code = LanguageCodeField()
+    reputation = models.IntegerField(default=0)
+    last_repute_id = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_reputation_snapshot'
+        unique_together = ('user', 'language_code')
+
+
+def get_batches(items, batch_size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def add_points(totals, key, points):
+    if points:
+        totals[key] = totals.get(key, 0) + points
+
+
+def record_reputation_change(user, points, reputation_type, question=None,
+                             language_code=None, timestamp=None, comment=None):
+    """changes reputation of the user by ``points``,
+    saves the user and appends the change to the ledger"""
+    user.receive_reputation(points, language_code)
+    user.save()
+    repute = Repute(
+                user=user,
+                question=question,
+                reputed_at=timestamp or timezone.now(),
+                reputation_type=reputation_type,
+                reputation=user.reputation,
+                comment=comment
+            )
+    #losses are stored as negative numbers
+    if points < 0:
+        repute.negative = points
+    else:
+        repute.positive = points
+    repute.save()
+    return repute
+
+
+def get_repute_sums(reputes, *fields):
+    """returns dictionary with the sums of the reputation
+    changes grouped by the ``fields``
+
+    the older rows may hold the losses as positive numbers,
+    so the absolute values are subtracted"""
+    sums = reputes.order_by().values(*fields).annotate(
+                                gained=Sum('positive'),
+                                lost=Sum(Func(F('negative'), function='ABS'))
+                            )
+    result = dict()
+    for item in sums:
+        key = tuple([item[field] for field in fields])
+        add_points(result, key, (item['gained'] or 0) - (item['lost'] or 0))
+    return result
+
+
+def take_reputation_snapshots(timestamp=None):
+    """adds the ledger rows appended since the last snapshot
+    and older than ``SNAPSHOT_LAG`` seconds to the snapshots,
+    returns the number of updated snapshots"""
+    timestamp = timestamp or timezone.now()
+    last_id = ReputationSnapshot.objects.aggregate(
+                                    last_id=Max('last_repute_id')
+                                )['last_id'] or 0
+    settled = Repute.objects.filter(
+                    reputed_at__lte=timestamp - datetime.timedelta(seconds=SNAPSHOT_LAG)
+                )
+    top_id = settled.aggregate(top_id=Max('id'))['top_id'] or 0
+    if top_id <= last_id:
+        return 0
+
+    changes = get_repute_sums(
+                    Repute.objects.filter(id__gt=last_id, id__lte=top_id),
+                    'user_id', 'language_code'
+                )
+    existing = set()
+    for user_ids in get_batches(set([user_id for user_id, language in changes])):
+        snapshots = ReputationSnapshot.objects.filter(user_id__in=user_ids)
+        existing.update(snapshots.values_list('user_id', 'language_code'))
+
+    #increments of the existing snapshots, grouped by the value
+    user_ids_by_change = dict()
+    new_snapshots = list()
+    for (user_id, language_code), points in changes.items():
+        if (user_id, language_code) in existing:
+            key = (language_code, points)
+            user_ids_by_change.setdefault(key, list()).append(user_id)
+        else:
+            new_snapshots.append(
+                ReputationSnapshot(
+                    user_id=user_id,
+                    language_code=language_code,
+                    reputation=points,
+                    last_repute_id=top_id,
+                    updated_at=timestamp
+                )
+            )
+    for (language_code, points), user_ids in user_ids_by_change.items():
+        for batch in get_batches(user_ids):
+            ReputationSnapshot.objects.filter(
+                                user_id__in=batch,
+                                language_code=language_code
+                            ).update(reputation=F('reputation') + points)
+    ReputationSnapshot.objects.bulk_create(new_snapshots, batch_size=BATCH_SIZE)
+    ReputationSnapshot.objects.update(last_repute_id=top_id, updated_at=timestamp)
+    return len(changes)
+
+
+def get_ledger_reputation():
+    """returns dictionary (user id, language code) -> sum of
+    the reputation changes in the ledger"""
+    balances = dict()
+    last_id = 0
+    snapshots = ReputationSnapshot.objects.values_list(
+                                    'user_id', 'language_code',
+                                    'reputation', 'last_repute_id'
+                                )
+    for user_id, language_code, reputation, last_repute_id in snapshots.iterator():
+        add_points(balances, (user_id, language_code), reputation)
+        last_id = last_repute_id
+    changes = get_repute_sums(
+                    Repute.objects.filter(id__gt=last_id),
+                    'user_id', 'language_code'
+                )
+    for key, points in changes.items():
+        add_points(balances, key, points)
+    return balances
+
+
+def merge_reputation_snapshots(from_user, to_user):
+    """adds the snapshots of ``from_user`` to those of
+    ``to_user`` and deletes them, used with merging of
+    the users, when their ledger rows are reassigned"""
+    from_snapshots = ReputationSnapshot.objects.filter(user=from_user)
+    for snapshot in from_snapshots:
+        updated = ReputationSnapshot.objects.filter(
+                                user=to_user,
+                                language_code=snapshot.language_code
+                            ).update(reputation=F('reputation') + snapshot.reputation)
+        if not updated:
+            ReputationSnapshot.objects.create(
+                                user=to_user,
+                                language_code=snapshot.language_code,
+                                reputation=snapshot.reputation,
+                                last_repute_id=snapshot.last_repute_id,
+                                updated_at=snapshot.updated_at
+                            )
+    from_snapshots.delete()
+
+
+def get_upvote_gains():
+    """returns dictionary (user id, language code) -> reputation
+    gained by the received upvotes, within the daily limit"""
+    gain = askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+    qn = connection.ops.quote_name
+    day = connection.ops.date_trunc_sql(
+                            'day', '%s.%s' % (qn(Vote._meta.db_table), qn('voted_at'))
+                        )
+    counts = Vote.objects.filter(
+                        vote=Vote.VOTE_UP,
+                        voted_post__post_type__in=('question', 'answer'),
+                        voted_post__wiki=False,
+                        voted_post__is_anonymous=False
+                    ).extra(
+                        select={'day': day}
+                    ).order_by().values(
+                        'voted_post__author_id', 'voted_post__language_code', 'day'
+                    ).annotate(count=Count('id'))
+
+    max_votes = None
+    if gain > 0:
+        max_gain = askbot_settings.MAX_REP_GAIN_PER_USER_PER_DAY
+        max_votes = max(0, int(math.ceil(float(max_gain) / gain)))
+
+    daily_counts = dict()
+    for item in counts:
+        key = (item['voted_post__author_id'], item['day'])
+        daily_counts.setdefault(key, list()).append(
+                        (item['voted_post__language_code'], item['count'])
+                    )
+
+    gains = dict()
+    for (user_id, day), language_counts in daily_counts.items():
+        #the limit is per user, not per language
+        credited = max_votes
+        for language_code, count in sorted(language_counts):
+            if credited is not None:
+                count = min(count, credited)
+                credited -= count
+            add_points(gains, (user_id, language_code), count * gain)
+    return gains
+
+
+def get_downvote_losses():
+    """returns dictionary (user id, language code) -> reputation
+    lost by the received and by the given downvotes"""
+    votes = Vote.objects.filter(
+                        vote=Vote.VOTE_DOWN,
+                        voted_post__wiki=False,
+                        voted_post__is_anonymous=False
+                    ).order_by()
+    losses = dict()
+    received = votes.values(
+                        'voted_post__author_id', 'voted_post__language_code'
+                    ).annotate(count=Count('id'))
+    for item in received:
+        key = (item['voted_post__author_id'], item['voted_post__language_code'])
+        add_points(losses, key, item['count'] * askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE)
+
+    given = votes.values('user_id', 'voted_post__language_code').annotate(count=Count('id'))
+    for item in given:
+        key = (item['user_id'], item['voted_post__language_code'])
+        add_points(losses, key, item['count'] * askbot_settings.REP_LOSS_FOR_DOWNVOTING)
+    return losses
+
+
+def get_accept_gains():
+    """returns dictionary (user id, language code) -> reputation
+    gained by the authors and by the acceptors of the accepted answers"""
+    from askbot.models.post import Post
+    answers = Post.objects.filter(
+                            post_type='answer',
+                            endorsed=True,
+                            endorsed_by__isnull=False
+                        ).order_by()
+    gains = dict()
+    received = answers.exclude(
+                            author=F('endorsed_by')
+                        ).values(
+                            'author_id', 'language_code'
+                        ).annotate(count=Count('id'))
+    for item in received:
+        key = (item['author_id'], item['language_code'])
+        add_points(
+            gains, key,
+            item['count'] * askbot_settings.REP_GAIN_FOR_RECEIVING_ANSWER_ACCEPTANCE
+        )
+
+    given = answers.values('endorsed_by_id', 'language_code').annotate(count=Count('id'))
+    #accepting own answer to own question gives nothing
+    own = answers.filter(
+                    endorsed_by=F('author'),
+                    thread__posts__post_type='question',
+                    thread__posts__author=F('author')
+                ).values(
+                    'endorsed_by_id', 'language_code'
+                ).annotate(count=Count('id'))
+    own_counts = dict()
+    for item in own:
+        own_counts[(item['endorsed_by_id'], item['language_code'])] = item['count']
+    for item in given:
+        key = (item['endorsed_by_id'], item['language_code'])
+        count = item['count'] - own_counts.get(key, 0)
+        add_points(gains, key, count * askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER)
+    return gains
+
+
+def get_flag_losses():
+    """returns dictionary (user id, language code) -> reputation
+    lost by the authors of the posts flagged as offensive"""
+    from askbot.models.post import Post
+    counts = Post.objects.filter(
+                            offensive_flag_count__gt=0
+                        ).order_by().values(
+                            'author_id', 'language_code', 'post_type', 'offensive_flag_count'
+                        ).annotate(count=Count('id'))
+    min_to_hide = askbot_settings.MIN_FLAGS_TO_HIDE_POST
+    min_to_delete = askbot_settings.MIN_FLAGS_TO_DELETE_POST
+    losses = dict()
+    for item in counts:
+        flag_count = item['offensive_flag_count']
+        points = flag_count * askbot_settings.REP_LOSS_FOR_RECEIVING_FLAG
+        #extra losses on hiding and on deleting, comments are not hidden
+        if item['post_type'] != 'comment':
+            if flag_count >= min_to_hide:
+                points += askbot_settings.REP_LOSS_FOR_RECEIVING_THREE_FLAGS_PER_REVISION
+            if flag_count >= min_to_delete and min_to_delete != min_to_hide:
+                points += askbot_settings.REP_LOSS_FOR_RECEIVING_FIVE_FLAGS_PER_REVISION
+        add_points(losses, (item['author_id'], item['language_code']), item['count'] * points)
+    return losses
+
+
+def get_recorded_changes():
+    """returns dictionary (user id, language code) -> sum of the
+    reputation changes not derived from the other records"""
+    return get_repute_sums(
+                Repute.objects.filter(reputation_type__in=RECORDED_TYPES),
+                'user_id', 'language_code'
+            )
+
+
+def get_losing_user_ids():
+    """returns ids of the users who lost reputation,
+    only their reputation may be held by the lower limits"""
+    user_ids = set()
+    downvotes = Vote.objects.filter(
+                        vote=Vote.VOTE_DOWN,
+                        voted_post__wiki=False,
+                        voted_post__is_anonymous=False
+                    ).order_by()
+    user_ids.update(downvotes.values_list('voted_post__author_id', flat=True).distinct())
+    user_ids.update(downvotes.values_list('user_id', flat=True).distinct())
+    from askbot.models.post import Post
+    flagged = Post.objects.filter(offensive_flag_count__gt=0).order_by()
+    user_ids.update(flagged.values_list('author_id', flat=True).distinct())
+    lost = Repute.objects.filter(
+                        reputation_type__in=RECORDED_TYPES
+                    ).exclude(negative=0).order_by()
+    user_ids.update(lost.values_list('user_id', flat=True).distinct())
+    return user_ids
+
+
+def get_reputation_events(user_ids):
+    """returns dictionary user id -> list of tuples (time,
+    language code, points) of the changes of the reputation
+    of the users, the same changes as summed up by the replay"""
+    from askbot.models.post import Post
+    from askbot.models.question import Thread
+    from askbot.models import Activity
+    events = dict()
+
+    def add_event(user_id, timestamp, language_code, points):
+        if points and user_id in user_ids:
+            events.setdefault(user_id, list()).append((timestamp, language_code, points))
+
+    #upvotes, within the daily limit
+    gain = askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+    max_votes = None
+    if gain > 0:
+        max_gain = askbot_settings.MAX_REP_GAIN_PER_USER_PER_DAY
+        max_votes = max(0, int(math.ceil(float(max_gain) / gain)))
+    upvotes = Vote.objects.filter(
+                        vote=Vote.VOTE_UP,
+                        voted_post__post_type__in=('question', 'answer'),
+                        voted_post__wiki=False,
+                        voted_post__is_anonymous=False,
+                        voted_post__author_id__in=user_ids
+                    ).order_by('voted_at', 'id').values_list(
+                        'voted_post__author_id', 'voted_post__language_code', 'voted_at'
+                    )
+    daily_counts = dict()
+    for user_id, language_code, voted_at in upvotes.iterator():
+        key = (user_id, voted_at.date())
+        count = daily_counts.get(key, 0)
+        if max_votes is None or count < max_votes:
+            add_event(user_id, voted_at, language_code, gain)
+        daily_counts[key] = count + 1
+
+    #downvotes, received and given
+    downvotes = Vote.objects.filter(
+                        vote=Vote.VOTE_DOWN,
+                        voted_post__wiki=False,
+                        voted_post__is_anonymous=False
+                    ).filter(
+                        models.Q(voted_post__author_id__in=user_ids) |
+                        models.Q(user_id__in=user_ids)
+                    ).values_list(
+                        'voted_post__author_id', 'user_id',
+                        'voted_post__language_code', 'voted_at'
+                    )
+    for author_id, voter_id, language_code, voted_at in downvotes.iterator():
+        add_event(author_id, voted_at, language_code,
+                  askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE)
+        add_event(voter_id, voted_at, language_code,
+                  askbot_settings.REP_LOSS_FOR_DOWNVOTING)
+
+    #accepted answers
+    answers = Post.objects.filter(
+                        post_type='answer',
+                        endorsed=True,
+                        endorsed_by__isnull=False
+                    ).filter(
+                        models.Q(author_id__in=user_ids) |
+                        models.Q(endorsed_by_id__in=user_ids)
+                    ).values_list(
+                        'author_id', 'endorsed_by_id', 'thread_id',
+                        'language_code', 'endorsed_at', 'added_at'
+                    )
+    answers = list(answers)
+    question_authors = dict(
+        Post.objects.filter(
+                    post_type='question',
+                    thread_id__in=set([answer[2] for answer in answers])
+                ).values_list('thread_id', 'author_id')
+    )
+    for author_id, endorser_id, thread_id, language_code, endorsed_at, added_at in answers:
+        endorsed_at = endorsed_at or added_at
+        if author_id != endorser_id:
+            add_event(author_id, endorsed_at, language_code,
+                      askbot_settings.REP_GAIN_FOR_RECEIVING_ANSWER_ACCEPTANCE)
+            add_event(endorser_id, endorsed_at, language_code,
+                      askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER)
+        elif question_authors.get(thread_id) != author_id:
+            add_event(endorser_id, endorsed_at, language_code,
+                      askbot_settings.REP_GAIN_FOR_ACCEPTING_ANSWER)
+
+    #offensive flags, at the times of the flags
+    posts = Post.objects.filter(
+                        offensive_flag_count__gt=0,
+                        author_id__in=user_ids
+                    ).values_list(
+                        'id', 'author_id', 'post_type', 'language_code',
+                        'offensive_flag_count', 'added_at'
+                    )
+    posts = list(posts)
+    flag_times = dict()
+    flags = Activity.objects.filter(
+                        activity_type=const.TYPE_ACTIVITY_MARK_OFFENSIVE,
+                        content_type=ContentType.objects.get_for_model(Post),
+                        object_id__in=[post[0] for post in posts]
+                    ).order_by('active_at').values_list('object_id', 'active_at')
+    for post_id, active_at in flags:
+        flag_times.setdefault(post_id, list()).append(active_at)
+    min_to_hide = askbot_settings.MIN_FLAGS_TO_HIDE_POST
+    min_to_delete = askbot_settings.MIN_FLAGS_TO_DELETE_POST
+    for post_id, author_id, post_type, language_code, flag_count, added_at in posts:
+        times = flag_times.get(post_id, list())
+        #flags without the records are counted at the time of posting
+        times = [added_at] * (flag_count - len(times)) + times[-flag_count:]
+        for number, flagged_at in enumerate(times, 1):
+            points = askbot_settings.REP_LOSS_FOR_RECEIVING_FLAG
+            if post_type != 'comment':
+                if number == min_to_hide:
+                    points += askbot_settings.REP_LOSS_FOR_RECEIVING_THREE_FLAGS_PER_REVISION
+                if number == min_to_delete and min_to_delete != min_to_hide:
+                    points += askbot_settings.REP_LOSS_FOR_RECEIVING_FIVE_FLAGS_PER_REVISION
+            add_event(author_id, flagged_at, language_code, points)
+
+    #the older rows may hold the losses as positive numbers
+    reputes = Repute.objects.filter(
+                        reputation_type__in=RECORDED_TYPES,
+                        user_id__in=user_ids
+                    ).values_list('user_id', 'reputed_at', 'language_code', 'positive', 'negative')
+    for user_id, reputed_at, language_code, positive, negative in reputes.iterator():
+        add_event(user_id, reputed_at, language_code, positive - abs(negative))
+    return events
+
+
+def replay_events(events):
+    """returns the total and the localized reputation
+    after the events, applying the lower limits at each step"""
+    total = const.MIN_REPUTATION
+    localized = dict()
+    for timestamp, language_code, points in sorted(events, key=lambda event: event[0]):
+        total = max(const.MIN_REPUTATION, total + points)
+        localized[language_code] = max(0, localized.get(language_code, 0) + points)
+    return total, localized
+
+
+def replay_reputation():
+    """returns dictionary (user id, language code) -> reputation
+    recomputed from the votes, the accepted answers, the flags
+    and the recorded changes, with the language code ``None`` -
+    the total reputation of the user
+
+    the changes of the users who lost reputation are replayed
+    in the order of the time, to apply the lower limits of the
+    reputation as they were applied to the stored reputation"""
+    sums = dict()
+    for changes in (
+        get_upvote_gains(), get_downvote_losses(),
+        get_accept_gains(), get_flag_losses(), get_recorded_changes()
+    ):
+        for key, points in changes.items():
+            add_points(sums, key, points)
+
+    losing_user_ids = get_losing_user_ids()
+    replayed = dict()
+    for (user_id, language_code), points in sums.items():
+        if user_id in losing_user_ids:
+            continue
+        replayed[(user_id, language_code)] = points
+        total = replayed.get((user_id, None), const.MIN_REPUTATION)
+        replayed[(user_id, None)] = total + points
+
+    for user_ids in get_batches(losing_user_ids):
+        events = get_reputation_events(set(user_ids))
+        for user_id, user_events in events.items():
+            total, localized = replay_events(user_events)
+            replayed[(user_id, None)] = total
+            for language_code, points in localized.items():
+                replayed[(user_id, language_code)] = points
+    return replayed
+
+
+def get_reputation_mismatches(replayed):
+    """returns list of tuples (user id, language code, stored reputation,
+    replayed reputation) of the differences between the stored and the
+    replayed reputation, language code is ``None`` for the total reputation
+    of the user"""
+    mismatches = list()
+    seen = set()
+    profiles = LocalizedUserProfile.objects.values_list(
+                                    'auth_user_id', 'language_code', 'reputation'
+                                )
+    for user_id, language_code, reputation in profiles.iterator():
+        key = (user_id, language_code)
+        seen.add(key)
+        expected = replayed.get(key, 0)
+        if reputation != expected:
+            mismatches.append((user_id, language_code, reputation, expected))
+    for key, expected in replayed.items():
+        if key[1] is not None and key not in seen and expected != 0:
+            mismatches.append(key + (0, expected))
+
+    profiles = UserProfile.objects.values_list('auth_user_ptr_id', 'reputation')
+    for user_id, reputation in profiles.iterator():
+        expected = replayed.get((user_id, None), const.MIN_REPUTATION)
+        if reputation != expected:
+            mismatches.append((user_id, None, reputation, expected))
+    return sorted(mismatches)
+
+
+def fix_reputation_mismatches(mismatches, timestamp=None):
+    """writes the replayed reputation and appends
+    the corrections to the ledger"""
+    timestamp = timestamp or timezone.now()
+    totals = dict()
+    localized = list()
+    for user_id, language_code, stored, expected in mismatches:
+        if language_code is None:
+            totals[user_id] = (stored, expected)
+        else:
+            localized.append((user_id, language_code, stored, expected))
+
+    #total reputation, users grouped by the value
+    user_ids_by_value = dict()
+    for user_id, (stored, expected) in totals.items():
+        user_ids_by_value.setdefault(expected, list()).append(user_id)
+    for reputation, user_ids in user_ids_by_value.items():
+        for batch in get_batches(user_ids):
+            UserProfile.objects.filter(pk__in=batch).update(reputation=reputation)
+            for profile in UserProfile.objects.filter(pk__in=batch):
+                profile.update_cache()
+
+    #localized reputation
+    existing = set(
+        LocalizedUserProfile.objects.filter(
+                        auth_user_id__in=[item[0] for item in localized]
+                    ).values_list('auth_user_id', 'language_code')
+    )
+    user_ids_by_value = dict()
+    new_profiles = list()
+    for user_id, language_code, stored, expected in localized:
+        if (user_id, language_code) in existing:
+            key = (language_code, expected)
+            user_ids_by_value.setdefault(key, list()).append(user_id)
+        else:
+            new_profiles.append(
+                LocalizedUserProfile(
+                    auth_user_id=user_id,
+                    language_code=language_code,
+                    reputation=expected
+                )
+            )
+    for (language_code, reputation), user_ids in user_ids_by_value.items():
+        for batch in get_batches(user_ids):
+            profiles = LocalizedUserProfile.objects.filter(
+                                            auth_user_id__in=batch,
+                                            language_code=language_code
+                                        )
+            profiles.update(reputation=reputation)
+            for profile in profiles:
+                profile.update_cache()
+    LocalizedUserProfile.objects.bulk_create(new_profiles, batch_size=BATCH_SIZE)
+
+    #corrections in the ledger, per language, and for the users
+    #with only the total reputation changed - in the default language
+    reputes = list()
+    corrected_user_ids = set()
+    for user_id, language_code, stored, expected in localized:
+        corrected_user_ids.add(user_id)
+        reputes.append((user_id, language_code, expected - stored))
+    for user_id, (stored, expected) in totals.items():
+        if user_id not in corrected_user_ids:
+            reputes.append((user_id, django_settings.LANGUAGE_CODE, expected - stored))
+
+    reputations = dict(UserProfile.objects.filter(
+                                pk__in=[item[0] for item in reputes]
+                            ).values_list('auth_user_ptr_id', 'reputation'))
+    Repute.objects.bulk_create([
+        Repute(
+            user_id=user_id,
+            language_code=language_code,
+            positive=max(points, 0),
+            negative=min(points, 0),
+            reputed_at=timestamp,
+            reputation_type=const.TYPE_REPUTATION_RECOUNTED,
+            reputation=reputations.get(user_id, const.MIN_REPUTATION),
+            comment='recounted'
+        )
+        for user_id, language_code, points in reputes
+    ], batch_size=BATCH_SIZE)
@@ -84,8 +84,11 @@ class Vote(models.Model):
         """
         # importing locally because of circular dependency
         from askbot import auth
+        from askbot.models.vote_effects import async_votes_enabled, save_vote
         score_before = self.voted_post.points
-        if self.vote > 0:
+        if async_votes_enabled():
+            save_vote(self.user, self.voted_post, self.vote, cancel=True)
+        elif self.vote > 0:
             # cancel upvote
             auth.onUpVotedCanceled(self, self.voted_post, self.user)
         else:
@@ -245,9 +248,13 @@ class Repute(models.Model):
 
         part of the purpose of this method is to hide this idiosyncracy
         """
-        if self.reputation_type == 10:  # TODO: hide magic number
+        if self.reputation_type == const.TYPE_REPUTATION_ASSIGNED_BY_MODERATOR:
             return _('<em>Changed by moderator. Reason:</em> %(reason)s') \
                                                     % {'reason': self.comment}
+        elif self.reputation_type == const.TYPE_REPUTATION_RECOUNTED:
+            return _('<em>Corrected by the recount of reputation</em>')
+        elif self.reputation_type == const.TYPE_REPUTATION_IMPORTED:
+            return _('<em>Imported from another forum</em>')
         else:  # .negative is < 0 so we add!
             delta = self.positive + self.negative
             link_title_data = {
@@ -309,6 +309,113 @@ class MarkedTag(models.Model):
         app_label = 'askbot'
 
 
+def get_wildcard_prefixes(wildcard_tags):
+    """returns set of prefixes of the wildcard tags,
+    i.e. the wildcards without the trailing asterisk"""
+    return set([tag[:-1] for tag in wildcard_tags if tag.endswith('*')])
+
+
+def get_tag_name_prefixes(tag_names):
+    """returns set of all prefixes of the tag names, including
+    the full names, each of them may be a wildcard prefix
+    matching the tag"""
+    prefixes = set()
+    for tag_name in tag_names:
+        for length in range(1, len(tag_name) + 1):
+            prefixes.add(tag_name[:length])
+    return prefixes
+
+
+class WildcardTagPrefixManager(models.Manager):
+
+    def get_subscriber_ids(self, tag_names, reason):
+        """returns query set of ids of users who selected
+        for the ``reason`` a wildcard matching any of the tag names"""
+        return self.filter(
+                    reason=reason,
+                    prefix__in=get_tag_name_prefixes(tag_names)
+                ).values('user_id')
+
+    def make_prefixes(self, user_id, interesting_tags='',
+                      ignored_tags='', subscribed_tags=''):
+        """returns unsaved prefix rows for the space separated
+        wildcard tags of one user"""
+        reason_tags = (
+            ('good', interesting_tags),
+            ('bad', ignored_tags),
+            ('subscribed', subscribed_tags),
+        )
+        prefixes = list()
+        for reason, wildcard_tags in reason_tags:
+            for prefix in get_wildcard_prefixes(wildcard_tags.split()):
+                prefixes.append(
+                    self.model(user_id=user_id, prefix=prefix, reason=reason)
+                )
+        return prefixes
+
+    def update_for_user(self, user):
+        """replaces prefixes of the user with the prefixes of
+        the wildcard tags stored in the user profile"""
+        self.filter(user=user).delete()
+        self.bulk_create(
+            self.make_prefixes(
+                user.id,
+                interesting_tags=user.interesting_tags,
+                ignored_tags=user.ignored_tags,
+                subscribed_tags=user.subscribed_tags
+            )
+        )
+
+    def rebuild(self):
+        """recreates prefixes of all users from the
+        wildcard tags in the user profiles,
+        returns number of the users with wildcard tags"""
+        from askbot.models.user_profile import UserProfile
+        self.all().delete()
+        profiles = UserProfile.objects.exclude(
+                                    interesting_tags='',
+                                    ignored_tags='',
+                                    subscribed_tags=''
+                                ).values_list(
+                                    'pk',
+                                    'interesting_tags',
+                                    'ignored_tags',
+                                    'subscribed_tags'
+                                )
+        count = 0
+        prefixes = list()
+        for user_id, interesting, ignored, subscribed in profiles.iterator():
+            prefixes.extend(
+                self.make_prefixes(user_id, interesting, ignored, subscribed)
+            )
+            count += 1
+        self.bulk_create(prefixes, batch_size=500)
+        return count
+
+
+class WildcardTagPrefix(models.Model):
+    """prefix table of the wildcard tag selections,
+    e.g. ``python*`` selected as interesting is stored as
+    prefix ``python`` with the reason ``good``
+
+    the rows are copies of the wildcard tags stored in the
+    user profile and are updated by the
+    :meth:`~askbot.models.User.update_wildcard_tag_selections`,
+    the table can be rebuilt with the management command
+    ``askbot_rebuild_wildcard_tag_prefixes``
+    """
+    user = models.ForeignKey(User, related_name='wildcard_tag_prefixes')
+    prefix = models.CharField(max_length=255)
+    reason = models.CharField(max_length=16, choices=MarkedTag.TAG_MARK_REASONS)
+
+    objects = WildcardTagPrefixManager()
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_wildcard_tag_prefix'
+        index_together = (('reason', 'prefix'),)
+
+
 class TagSynonym(models.Model):
 
     source_tag_name = models.CharField(max_length=255, unique=True)
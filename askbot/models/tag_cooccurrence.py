@@ -0,0 +1,281 @@
+"""Materialized tag statistics used by the related tags
+and the similar questions widgets.
+
+:class:`TagCooccurrence` counts the threads for each ordered
+pair of tags used together, so the tags related to the
+selected ones are read with one indexed query.
+
+:class:`ThreadTagWeight` keeps the tag vector of each thread,
+rare tags weigh more than the popular ones, so similar threads
+are scored by the sum of the weights of the shared tags
+in one aggregate query.
+
+Both tables contain only the accepted tags of the public threads -
+approved, not deleted and shared with the global group, so that
+nothing from the private or deleted threads is shown on the
+public pages. The tag vectors are the state from which the pair
+counts of a thread are removed when the thread changes.
+They are updated by :func:`update_tag_cooccurrence` when the
+thread tags, the deleted or approved status or the groups
+change, and can be rebuilt with the management command
+``askbot_rebuild_tag_cooccurrence``.
+"""
+import itertools
+import math
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Sum
+from django.utils.translation import get_language
+
+from askbot.models.tag import Tag
+
+#max number of related tags shown with the question list
+RELATED_TAGS_LIMIT = 50
+
+
+def get_tag_pairs(tag_ids):
+    """returns set of ordered pairs of different tag ids"""
+    return set(itertools.permutations(set(tag_ids), 2))
+
+
+def get_tag_weight(used_count):
+    """weight of the tag in the thread tag vector,
+    1 for the tags used once, smaller for the popular tags"""
+    return 1.0 / math.log(used_count + 1, 2) if used_count > 1 else 1.0
+
+
+def get_counted_threads(threads):
+    """filters the thread queryset to the public threads"""
+    from askbot.conf import settings as askbot_settings
+    return threads.filter(
+                    deleted=False,
+                    approved=True,
+                    groups__name=askbot_settings.GLOBAL_GROUP_NAME
+                )
+
+
+def get_counted_tag_ids(thread):
+    """ids of the accepted tags of the thread,
+    empty if the thread is not public"""
+    from askbot.models.question import Thread
+    if thread.deleted or not thread.approved:
+        return set()
+    if not get_counted_threads(Thread.objects.filter(id=thread.id)).exists():
+        return set()
+    return set(thread.tags.filter(
+                            status=Tag.STATUS_ACCEPTED
+                        ).values_list('id', flat=True))
+
+
+class TagCooccurrenceManager(models.Manager):
+
+    def add_pair(self, tag_id, other_tag_id):
+        """increments count of the pair, the row is created
+        if missing, a row created by a concurrent transaction
+        is incremented"""
+        pairs = self.filter(tag_id=tag_id, other_tag_id=other_tag_id)
+        if pairs.update(count=F('count') + 1):
+            return
+        try:
+            with transaction.atomic():
+                self.create(tag_id=tag_id, other_tag_id=other_tag_id, count=1)
+        except IntegrityError:
+            pairs.update(count=F('count') + 1)
+
+    def add_pairs(self, pairs):
+        """increments counts of the tag pairs"""
+        for tag_id, other_tag_id in pairs:
+            self.add_pair(tag_id, other_tag_id)
+
+    def remove_pairs(self, pairs):
+        """decrements counts of the tag pairs,
+        pairs no longer used together are deleted"""
+        for tag_id, other_tag_id in pairs:
+            self.filter(
+                    tag_id=tag_id, other_tag_id=other_tag_id, count__gt=0
+                ).update(count=F('count') - 1)
+        tag_ids = set([pair[0] for pair in pairs])
+        if tag_ids:
+            self.filter(tag_id__in=tag_ids, count=0).delete()
+
+    def update_for_thread(self, previous_tag_ids, current_tag_ids):
+        """updates pair counts after the change of the counted
+        tags of a thread"""
+        previous_pairs = get_tag_pairs(previous_tag_ids)
+        current_pairs = get_tag_pairs(current_tag_ids)
+        self.remove_pairs(previous_pairs - current_pairs)
+        self.add_pairs(current_pairs - previous_pairs)
+
+    def get_related_tags(self, tag_names, ignored_tag_names=None,
+                         limit=RELATED_TAGS_LIMIT):
+        """returns list of tags most often used together with
+        the tags named in ``tag_names``, each with the attribute
+        ``local_used_count`` - the number of the shared threads"""
+        tags = Tag.objects.filter(name__in=tag_names, language_code=get_language())
+        pairs = self.filter(
+                        tag__in=tags
+                    ).exclude(
+                        other_tag__in=tags
+                    ).exclude(
+                        other_tag__deleted=True
+                    )
+        if ignored_tag_names:
+            pairs = pairs.exclude(other_tag__name__in=ignored_tag_names)
+
+        counts = pairs.values(
+                            'other_tag_id'
+                        ).annotate(
+                            local_used_count=Sum('count')
+                        ).order_by(
+                            '-local_used_count', 'other_tag_id'
+                        )[:limit]
+        counts = dict([
+            (item['other_tag_id'], item['local_used_count']) for item in counts
+        ])
+
+        related_tags = list(Tag.objects.filter(id__in=counts.keys()))
+        for tag in related_tags:
+            tag.local_used_count = counts[tag.id]
+        related_tags.sort(key=lambda tag: (-tag.local_used_count, tag.name))
+        return related_tags
+
+    def rebuild(self, thread_tags):
+        """recreates all pair counts from the dictionary
+        thread id -> list of accepted tag ids"""
+        self.all().delete()
+        counts = dict()
+        for tag_ids in thread_tags.values():
+            for pair in get_tag_pairs(tag_ids):
+                counts[pair] = counts.get(pair, 0) + 1
+        self.bulk_create(
+            [
+                self.model(tag_id=tag_id, other_tag_id=other_tag_id, count=count)
+                for (tag_id, other_tag_id), count in counts.items()
+            ],
+            batch_size=500
+        )
+        return len(counts)
+
+
+class TagCooccurrence(models.Model):
+    """number of threads in which ``tag`` is used
+    together with the ``other_tag``, each pair is
+    stored twice - in both orders"""
+    tag = models.ForeignKey(Tag, related_name='cooccurrences')
+    other_tag = models.ForeignKey(Tag, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    objects = TagCooccurrenceManager()
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_tag_cooccurrence'
+        unique_together = (('tag', 'other_tag'),)
+
+
+class ThreadTagWeightManager(models.Manager):
+
+    def update_for_thread(self, thread, tag_ids):
+        """replaces the tag vector of the thread"""
+        tags = Tag.objects.filter(id__in=tag_ids).values_list('id', 'used_count')
+        self.filter(thread=thread).delete()
+        self.bulk_create([
+            self.model(
+                thread_id=thread.id,
+                tag_id=tag_id,
+                weight=get_tag_weight(used_count)
+            )
+            for tag_id, used_count in tags
+        ])
+
+    def get_similar_thread_ids(self, thread, limit=10):
+        """returns ids of the public threads in the language of the
+        ``thread`` sharing tags with it, ordered by the total weight
+        of the shared tags"""
+        tag_ids = thread.tags.filter(status=Tag.STATUS_ACCEPTED).values('id')
+        scores = self.filter(
+                            tag_id__in=tag_ids,
+                            thread__language_code=thread.language_code
+                        ).exclude(
+                            thread=thread
+                        ).values(
+                            'thread_id'
+                        ).annotate(
+                            score=Sum('weight')
+                        ).order_by(
+                            '-score', '-thread_id'
+                        )[:limit]
+        return [item['thread_id'] for item in scores]
+
+    def rebuild(self, thread_tags):
+        """recreates tag vectors from the dictionary
+        thread id -> list of accepted tag ids"""
+        self.all().delete()
+        used_counts = dict(Tag.objects.values_list('id', 'used_count'))
+        weights = list()
+        for thread_id, tag_ids in thread_tags.items():
+            for tag_id in tag_ids:
+                weights.append(
+                    self.model(
+                        thread_id=thread_id,
+                        tag_id=tag_id,
+                        weight=get_tag_weight(used_counts[tag_id])
+                    )
+                )
+        self.bulk_create(weights, batch_size=500)
+        return len(weights)
+
+
+class ThreadTagWeight(models.Model):
+    """element of the weighted tag vector of the thread"""
+    thread = models.ForeignKey('Thread', related_name='tag_weights')
+    tag = models.ForeignKey(Tag, related_name='+')
+    weight = models.FloatField(default=1.0)
+
+    objects = ThreadTagWeightManager()
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_thread_tag_weight'
+        unique_together = (('tag', 'thread'),)
+
+
+def get_thread_tags():
+    """returns dictionary thread id -> list of
+    accepted tag ids of the public threads"""
+    from askbot.models.question import Thread
+    thread_tags = dict()
+    thread_ids = get_counted_threads(Thread.objects.all()).values('id')
+    tag_values = Thread.tags.through.objects.filter(
+                            tag__status=Tag.STATUS_ACCEPTED,
+                            thread__id__in=thread_ids
+                        ).values_list('thread_id', 'tag_id')
+    for thread_id, tag_id in tag_values.iterator():
+        thread_tags.setdefault(thread_id, list()).append(tag_id)
+    return thread_tags
+
+
+def rebuild_tag_cooccurrence():
+    """recreates both tables, returns tuple
+    (number of tag pairs, number of thread tag weights)"""
+    thread_tags = get_thread_tags()
+    pair_count = TagCooccurrence.objects.rebuild(thread_tags)
+    weight_count = ThreadTagWeight.objects.rebuild(thread_tags)
+    return pair_count, weight_count
+
+
+def update_tag_cooccurrence(thread, removed=False):
+    """updates both tables after a change of the thread,
+    ``removed`` is ``True`` when the thread is being deleted"""
+    previous_tag_ids = ThreadTagWeight.objects.filter(
+                                    thread=thread
+                                ).values_list('tag_id', flat=True)
+    previous_tag_ids = set(previous_tag_ids)
+    if removed:
+        current_tag_ids = set()
+    else:
+        current_tag_ids = get_counted_tag_ids(thread)
+    if not (previous_tag_ids or current_tag_ids):
+        return
+    TagCooccurrence.objects.update_for_thread(previous_tag_ids, current_tag_ids)
+    ThreadTagWeight.objects.update_for_thread(thread, current_tag_ids)
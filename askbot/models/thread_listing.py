@@ -0,0 +1,389 @@
+"""Denormalized "read model" for the question listings.
+
+:class:`ThreadListing` keeps one row per thread with everything
+the main page needs to filter and to sort the threads: question post
+and author ids, tag and group ids, moderation and deletion flags and
+the sort keys. This allows to paginate the question list by reading
+a single table - without the joins and the ``DISTINCT`` done by
+:meth:`~askbot.models.question.ThreadManager.run_advanced_search`.
+
+The tag and group ids of each thread are stored as rows of the
+tables :class:`ThreadListingTag` and :class:`ThreadListingGroup`,
+indexed by the tag and by the group id, and the filters by tag
+or by group are ``IN`` subqueries served by these indexes.
+
+The table is optional and is used only when
+``ASKBOT_THREAD_LISTING_ENABLED`` is ``True``. The rows are updated
+by the signal handlers connected in :mod:`askbot.models`, and the
+whole table can be rebuilt with the management command
+``askbot_rebuild_thread_listing``. The code changing the
+threads with ``.update()`` refreshes the rows with
+:func:`refresh_thread_listings`.
+"""
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import get_language
+
+import askbot
+from askbot import const
+from askbot.conf import settings as askbot_settings
+from askbot.models.fields import LanguageCodeField
+from askbot.models.tag import Tag
+from askbot.models.user import Group
+
+#sort keys available in the listing, the thread id is
+#added to each of them to make the order deterministic
+LISTING_ORDER_BY_MAP = {
+    'age-desc': ('-added_at', '-thread'),
+    'age-asc': ('added_at', 'thread'),
+    'activity-desc': ('-last_activity_at', '-thread'),
+    'activity-asc': ('last_activity_at', 'thread'),
+    'answers-desc': ('-answer_count', '-thread'),
+    'answers-asc': ('answer_count', 'thread'),
+    'votes-desc': ('-points', '-thread'),
+    'votes-asc': ('points', 'thread'),
+}
+
+
+def listing_is_enabled():
+    return django_settings.ASKBOT_THREAD_LISTING_ENABLED
+
+
+def get_ids_filter(link_model, ids):
+    """returns a Q object which matches listing rows
+    linked to any of the ids, or ``None`` if the list
+    of ids is empty
+    """
+    ids = list(ids)
+    if len(ids) == 0:
+        return None
+    field_name = link_model.LINKED_FIELD
+    thread_ids = link_model.objects.filter(
+                            **{field_name + '__in': ids}
+                        ).values('listing_id')
+    return models.Q(thread_id__in=thread_ids)
+
+
+def refresh_thread_listings(thread_ids):
+    """updates the listing rows of the threads changed
+    with ``.update()``, which does not send the signals"""
+    if not listing_is_enabled():
+        return
+    from askbot.models.question import Thread
+    for thread in Thread.objects.filter(id__in=list(thread_ids)):
+        ThreadListing.objects.update_for_thread(thread)
+
+
+def update_links(link_model, thread_id, ids):
+    """makes the thread linked exactly to the ids"""
+    field_name = link_model.LINKED_FIELD
+    links = link_model.objects.filter(listing_id=thread_id)
+    old_ids = set(links.values_list(field_name, flat=True))
+    new_ids = set(ids)
+    if old_ids - new_ids:
+        links.filter(**{field_name + '__in': old_ids - new_ids}).delete()
+    link_model.objects.bulk_create([
+        link_model(**{'listing_id': thread_id, field_name: item_id})
+        for item_id in new_ids - old_ids
+    ])
+
+
+class ThreadListingManager(models.Manager):
+
+    def get_listing_data(self, thread):
+        """returns a dictionary of field values
+        of the listing row for the thread"""
+        from askbot.models.post import Post
+        from askbot.models.question import ThreadToGroup
+        question_data = Post.objects.filter(
+                                post_type='question', thread=thread
+                            ).values('id', 'author_id', 'deleted')
+        question_data = list(question_data[:1])
+        if question_data:
+            question_data = question_data[0]
+        else:
+            question_data = {'id': None, 'author_id': None, 'deleted': True}
+
+        tag_ids = thread.tags.values_list('id', flat=True)
+        group_ids = ThreadToGroup.objects.filter(
+                                thread=thread
+                            ).values_list('group_id', flat=True)
+        return {
+            'question_post_id': question_data['id'],
+            'author_id': question_data['author_id'],
+            'tag_ids': list(tag_ids),
+            'group_ids': list(group_ids),
+            'language_code': thread.language_code,
+            'approved': thread.approved,
+            'deleted': question_data['deleted'],
+            'closed': thread.closed,
+            'has_accepted_answer': thread.accepted_answer_id is not None,
+            'last_activity_at': thread.last_activity_at,
+            'added_at': thread.added_at or timezone.now(),
+            'points': thread.points,
+            'answer_count': thread.answer_count,
+        }
+
+    def update_for_thread(self, thread):
+        """creates or updates the listing row for the thread"""
+        data = self.get_listing_data(thread)
+        tag_ids = data.pop('tag_ids')
+        group_ids = data.pop('group_ids')
+        updated = self.filter(thread_id=thread.id).update(**data)
+        if updated == 0:
+            self.create(thread_id=thread.id, **data)
+        update_links(ThreadListingTag, thread.id, tag_ids)
+        update_links(ThreadListingGroup, thread.id, group_ids)
+
+    def rebuild(self, batch_size=500):
+        """recreates all the rows in the listing table
+        with a few set-based queries per batch of threads,
+        returns the number of created rows
+        """
+        from askbot.models.post import Post
+        from askbot.models.question import Thread, ThreadToGroup
+        ThreadListingTag.objects.all().delete()
+        ThreadListingGroup.objects.all().delete()
+        self.all().delete()
+
+        thread_ids = list(Thread.objects.values_list('id', flat=True).order_by('id'))
+        count = 0
+        for start in range(0, len(thread_ids), batch_size):
+            batch_ids = thread_ids[start:start + batch_size]
+
+            questions = dict()
+            question_values = Post.objects.filter(
+                                    post_type='question',
+                                    thread__id__in=batch_ids
+                                ).values_list('thread_id', 'id', 'author_id', 'deleted')
+            for thread_id, post_id, author_id, deleted in question_values:
+                questions[thread_id] = (post_id, author_id, deleted)
+
+            thread_tags = dict()
+            tag_values = Thread.tags.through.objects.filter(
+                                    thread__id__in=batch_ids
+                                ).values_list('thread_id', 'tag_id')
+            for thread_id, tag_id in tag_values:
+                thread_tags.setdefault(thread_id, list()).append(tag_id)
+
+            thread_groups = dict()
+            group_values = ThreadToGroup.objects.filter(
+                                    thread__id__in=batch_ids
+                                ).values_list('thread_id', 'group_id')
+            for thread_id, group_id in group_values:
+                thread_groups.setdefault(thread_id, list()).append(group_id)
+
+            rows = list()
+            tag_links = list()
+            group_links = list()
+            for thread in Thread.objects.filter(id__in=batch_ids):
+                post_id, author_id, deleted = questions.get(thread.id, (None, None, True))
+                rows.append(ThreadListing(
+                        thread_id=thread.id,
+                        question_post_id=post_id,
+                        author_id=author_id,
+                        language_code=thread.language_code,
+                        approved=thread.approved,
+                        deleted=deleted,
+                        closed=thread.closed,
+                        has_accepted_answer=thread.accepted_answer_id is not None,
+                        last_activity_at=thread.last_activity_at,
+                        added_at=thread.added_at,
+                        points=thread.points,
+                        answer_count=thread.answer_count
+                    ))
+                tag_links.extend([
+                    ThreadListingTag(listing_id=thread.id, tag_id=tag_id)
+                    for tag_id in set(thread_tags.get(thread.id, []))
+                ])
+                group_links.extend([
+                    ThreadListingGroup(listing_id=thread.id, group_id=group_id)
+                    for group_id in set(thread_groups.get(thread.id, []))
+                ])
+            self.bulk_create(rows)
+            ThreadListingTag.objects.bulk_create(tag_links)
+            ThreadListingGroup.objects.bulk_create(group_links)
+            count += len(rows)
+        return count
+
+    def can_run_search(self, search_state):
+        """True if the search can be answered from the listing table
+        alone. Full text and title search and the "followed" scope
+        require the data which is not in the listing table.
+        """
+        if search_state.stripped_query or search_state.query_title:
+            return False
+        if search_state.scope == 'followed':
+            return False
+        if search_state.sort not in LISTING_ORDER_BY_MAP:
+            return False
+        if search_state.scope == 'unanswered' and \
+            askbot_settings.UNANSWERED_QUESTION_MEANING == 'NO_UPVOTED_ANSWERS':
+            return False
+        return True
+
+    def run_search(self, request_user, search_state):
+        """same as
+        :meth:`~askbot.models.question.ThreadManager.run_advanced_search`
+        but runs the query against the listing table.
+
+        Returns a tuple: query set of thread ids, in the order
+        of the search state sort method and the search meta data.
+        Use :meth:`can_run_search` to make sure that the
+        listing can be used for the given search state.
+        """
+        from askbot.models.question import Thread
+
+        qs = self.filter(deleted=False)
+
+        lang_mode = askbot.get_lang_mode()
+        if lang_mode == 'url-lang':
+            qs = qs.filter(language_code=get_language())
+        elif lang_mode == 'user-lang':
+            if request_user.is_authenticated():
+                language_codes = request_user.get_languages()
+            else:
+                language_codes = dict(django_settings.LANGUAGES).keys()
+            qs = qs.filter(language_code__in=language_codes)
+
+        if askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
+            qs = qs.filter(approved=True)
+
+        if askbot_settings.GROUPS_ENABLED:
+            if request_user.is_authenticated():
+                groups = request_user.get_groups()
+            else:
+                groups = [Group.objects.get_global_group()]
+            group_filter = get_ids_filter(ThreadListingGroup, [group.id for group in groups])
+            if group_filter is None:
+                return self.none().values_list('thread_id', flat=True), {}
+            qs = qs.filter(group_filter)
+
+        if search_state.query_users:
+            author_ids = User.objects.filter(
+                                username__in=search_state.query_users
+                            ).values_list('id', flat=True)
+            author_ids = list(author_ids)
+            if author_ids:
+                qs = qs.filter(author_id__in=author_ids)
+
+        meta_data = {}
+        tag_names = Thread.objects.get_search_tag_names(search_state, meta_data)
+        for tag_name in tag_names:
+            #tags are AND-ed, any tag with the name in any language matches
+            tag_ids = Tag.objects.filter(name=tag_name).values_list('id', flat=True)
+            tag_filter = get_ids_filter(ThreadListingTag, tag_ids)
+            if tag_filter is None:
+                return self.none().values_list('thread_id', flat=True), meta_data
+            qs = qs.filter(tag_filter)
+
+        if search_state.scope == 'unanswered':
+            qs = qs.filter(closed=False)
+            if askbot_settings.UNANSWERED_QUESTION_MEANING == 'NO_ANSWERS':
+                qs = qs.filter(answer_count=0)
+            elif askbot_settings.UNANSWERED_QUESTION_MEANING == 'NO_ACCEPTED_ANSWERS':
+                qs = qs.filter(has_accepted_answer=False)
+
+        if search_state.author:
+            try:
+                author = User.objects.get(id=int(search_state.author))
+            except User.DoesNotExist:
+                meta_data['author_name'] = None
+            else:
+                qs = qs.filter(author_id=author.id)
+                meta_data['author_name'] = author.username
+
+        if request_user and request_user.is_authenticated():
+            interesting_tags, ignored_tags, subscribed_tags = \
+                Thread.objects.get_user_tag_selections(request_user, meta_data)
+            strategy = request_user.display_tag_filter_strategy
+
+            if strategy == const.INCLUDE_INTERESTING:
+                tag_ids = list(interesting_tags.values_list('id', flat=True))
+                if request_user.has_interesting_wildcard_tags():
+                    wildcards = request_user.interesting_tags.split()
+                    extra_tags = Tag.objects.get_by_wildcards(wildcards)
+                    tag_ids.extend(extra_tags.values_list('id', flat=True))
+                tag_filter = get_ids_filter(ThreadListingTag, tag_ids)
+                if tag_filter is not None:
+                    qs = qs.filter(tag_filter)
+                elif request_user.has_interesting_wildcard_tags():
+                    #wildcards matching no tags filter out everything
+                    return self.none().values_list('thread_id', flat=True), meta_data
+
+            elif strategy == const.EXCLUDE_IGNORED:
+                tag_ids = list(ignored_tags.values_list('id', flat=True))
+                if request_user.has_ignored_wildcard_tags():
+                    wildcards = request_user.ignored_tags.split()
+                    extra_tags = Tag.objects.get_by_wildcards(wildcards)
+                    tag_ids.extend(extra_tags.values_list('id', flat=True))
+                tag_filter = get_ids_filter(ThreadListingTag, tag_ids)
+                if tag_filter is not None:
+                    qs = qs.exclude(tag_filter)
+
+            elif strategy == const.INCLUDE_SUBSCRIBED:
+                tag_ids = subscribed_tags.values_list('id', flat=True)
+                tag_filter = get_ids_filter(ThreadListingTag, tag_ids)
+                if tag_filter is not None:
+                    qs = qs.filter(tag_filter)
+
+        order_by = LISTING_ORDER_BY_MAP[search_state.sort]
+        qs = qs.order_by(*order_by).values_list('thread_id', flat=True)
+        return qs, meta_data
+
+
+class ThreadListing(models.Model):
+    """one row per thread with the data necessary
+    to filter and sort the question lists"""
+    thread = models.OneToOneField('Thread', primary_key=True, related_name='listing')
+    question_post_id = models.PositiveIntegerField(null=True)
+    author_id = models.PositiveIntegerField(null=True, db_index=True)
+    language_code = LanguageCodeField()
+    approved = models.BooleanField(default=True)
+    deleted = models.BooleanField(default=False)
+    closed = models.BooleanField(default=False)
+    has_accepted_answer = models.BooleanField(default=False)
+    #sort keys
+    last_activity_at = models.DateTimeField(default=timezone.now, db_index=True)
+    added_at = models.DateTimeField(default=timezone.now, db_index=True)
+    points = models.IntegerField(default=0, db_index=True)
+    answer_count = models.PositiveIntegerField(default=0, db_index=True)
+
+    objects = ThreadListingManager()
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_thread_listing'
+
+    def get_tag_ids(self):
+        return sorted(self.tag_links.values_list('tag_id', flat=True))
+
+    def get_group_ids(self):
+        return sorted(self.group_links.values_list('group_id', flat=True))
+
+
+class ThreadListingTag(models.Model):
+    """tag of the thread in the listing"""
+    LINKED_FIELD = 'tag_id'
+    listing = models.ForeignKey(ThreadListing, related_name='tag_links')
+    tag_id = models.PositiveIntegerField()
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_thread_listing_tag'
+        #the index on (tag_id, listing_id) serves the filters by tag
+        unique_together = ('tag_id', 'listing')
+
+
+class ThreadListingGroup(models.Model):
+    """group which can see the thread in the listing"""
+    LINKED_FIELD = 'group_id'
+    listing = models.ForeignKey(ThreadListing, related_name='group_links')
+    group_id = models.PositiveIntegerField()
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_thread_listing_group'
+        unique_together = ('group_id', 'listing')
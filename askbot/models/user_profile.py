@@ -1,7 +1,11 @@
+import hashlib
+import threading
+
 from askbot import const
 from askbot.models.fields import LanguageCodeField
 from django.conf import settings as django_settings
 from django.core.cache import cache
+from django.core.signals import request_finished, request_started
 from django.db.models.signals import post_save
 from django.contrib.auth.models import User
 from django.db import models
@@ -29,17 +33,127 @@ def get_profile_from_db(user):
     raise ValueError('auth.models.User is not saved, cant make UserProfile')
 
 
+class ProfileIdentityMap(threading.local):
+    """profiles loaded during the current request by the user id,
+    so that each profile is read from the cache once per request
+    and all instances of the same user share the profile.
+    Outside of the requests the map is inactive."""
+
+    def __init__(self):
+        self.profiles = None
+
+    def activate(self):
+        self.profiles = dict()
+
+    def deactivate(self):
+        self.profiles = None
+
+    def get(self, user_id):
+        if self.profiles is None:
+            return None
+        return self.profiles.get(user_id)
+
+    def add(self, profile):
+        if self.profiles is not None:
+            self.profiles[profile.pk] = profile
+
+
+profile_identity_map = ProfileIdentityMap()
+
+
+def activate_profile_identity_map(*args, **kwargs):
+    profile_identity_map.activate()
+
+
+def deactivate_profile_identity_map(*args, **kwargs):
+    profile_identity_map.deactivate()
+
+
+request_started.connect(
+    activate_profile_identity_map,
+    dispatch_uid='activate_profile_identity_map_on_request_start'
+)
+request_finished.connect(
+    deactivate_profile_identity_map,
+    dispatch_uid='deactivate_profile_identity_map_on_request_finish'
+)
+
+
 def get_profile(user):
-    key = get_profile_cache_key(user)
-    profile = cache.get(key)
-    if not profile:
-        profile = get_profile_from_db(user)
-        cache.set(key, profile)
+    profile = profile_identity_map.get(user.pk)
+    if profile is None:
+        key = get_profile_cache_key(user)
+        profile = cache.get(key)
+        if not profile:
+            profile = get_profile_from_db(user)
+            cache.set(key, profile)
+        profile_identity_map.add(profile)
 
     setattr(user, 'askbot_profile', profile)
     return profile
 
 
+def prime_profiles(users):
+    """loads profiles of the ``users`` with one cache read
+    and one query for the profiles missing in the cache,
+    the profiles are added to the identity map of the request"""
+    users = [user for user in users if user is not None and user.pk]
+    users_by_id = dict([(user.pk, user) for user in users])
+    profiles = dict()
+    for user_id in users_by_id:
+        profile = profile_identity_map.get(user_id)
+        if profile is not None:
+            profiles[user_id] = profile
+
+    missing_keys = dict([
+        (get_profile_cache_key(user), user_id)
+        for user_id, user in users_by_id.items() if user_id not in profiles
+    ])
+    if missing_keys:
+        cached = cache.get_many(missing_keys.keys())
+        for key, profile in cached.items():
+            if profile:
+                profiles[missing_keys[key]] = profile
+
+    missing_ids = set(users_by_id.keys()) - set(profiles.keys())
+    if missing_ids:
+        loaded = dict()
+        for profile in UserProfile.objects.filter(pk__in=missing_ids):
+            loaded[profile.pk] = profile
+        for user_id in missing_ids - set(loaded.keys()):
+            loaded[user_id] = get_profile_from_db(users_by_id[user_id])
+        cache.set_many(dict([
+            (get_profile_cache_key(users_by_id[user_id]), profile)
+            for user_id, profile in loaded.items()
+        ]))
+        profiles.update(loaded)
+
+    for user in users:
+        profile = profiles[user.pk]
+        profile_identity_map.add(profile)
+        setattr(user, 'askbot_profile', profile)
+
+
+def get_user_cards_signature(user_ids, language_code):
+    """returns string which changes when any data shown
+    in the user cards of the users changes: the name,
+    the avatar, the reputation and the badge counts"""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return ''
+    users = User.objects.filter(id__in=user_ids).values_list(
+                        'id', 'username', 'askbot_profile__status',
+                        'askbot_profile__reputation', 'askbot_profile__avatar_type',
+                        'askbot_profile__gravatar', 'askbot_profile__gold',
+                        'askbot_profile__silver', 'askbot_profile__bronze'
+                    ).order_by('id')
+    localized_reputations = LocalizedUserProfile.objects.filter(
+                        auth_user__id__in=user_ids, language_code=language_code
+                    ).values_list('auth_user_id', 'reputation').order_by('auth_user_id')
+    data = repr((list(users), list(localized_reputations)))
+    return hashlib.md5(data).hexdigest()
+
+
 def user_profile_property(field_name):
     """returns property that will access Askbot UserProfile
     of auth_user by field name"""
@@ -186,6 +300,7 @@ class UserProfile(models.Model):
     def update_cache(self):
         key = self.get_cache_key()
         cache.set(key, self)
+        profile_identity_map.add(self)
 
     def save(self, *args, **kwargs):
         self.update_cache()
@@ -0,0 +1,157 @@
+"""Index for the search of the users by name.
+
+:class:`UserTrigram` rows hold the three-letter substrings of
+the user names and of the real names. A substring query first
+selects the users having all trigrams of the query through the
+index, and only those few candidates are matched with ``icontains``,
+so the users page search does not scan the whole users table.
+The "about" texts are not searched, they have no index.
+
+The index is used with ``ASKBOT_USER_SEARCH_TRIGRAMS = True``,
+the trigrams are built by ``askbot_rebuild_user_trigrams``
+and then updated on saving of the users and of their profiles.
+"""
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.db import models
+
+TRIGRAM_SIZE = 3
+
+#number of rows written per query by the rebuild
+REBUILD_BATCH_SIZE = 500
+
+
+def user_trigrams_enabled():
+    return django_settings.ASKBOT_USER_SEARCH_TRIGRAMS
+
+
+class UserTrigram(models.Model):
+    """trigram of the user name or of the real name of the user"""
+    user = models.ForeignKey(User, related_name='+')
+    trigram = models.CharField(max_length=TRIGRAM_SIZE, db_index=True)
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_user_trigram'
+        unique_together = ('trigram', 'user')
+
+
+def get_trigrams(*names):
+    """returns set of the lowercase trigrams of the names"""
+    trigrams = set()
+    for name in names:
+        name = (name or '').lower()
+        for start in range(len(name) - TRIGRAM_SIZE + 1):
+            trigrams.add(name[start:start + TRIGRAM_SIZE])
+    return trigrams
+
+
+def get_user_names(user_ids):
+    """returns dictionary user id -> (user name, real name)"""
+    names = User.objects.filter(
+                        id__in=user_ids
+                    ).values_list('id', 'username', 'askbot_profile__real_name')
+    return dict([(user_id, (username, real_name)) for user_id, username, real_name in names])
+
+
+def update_user_trigrams(user_ids):
+    """writes the changed trigrams of the users,
+    returns ``True`` if any trigrams were changed"""
+    names = get_user_names(user_ids)
+    stored = dict()
+    rows = UserTrigram.objects.filter(user_id__in=user_ids).values_list('user_id', 'trigram')
+    for user_id, trigram in rows:
+        stored.setdefault(user_id, set()).add(trigram)
+
+    new_rows = list()
+    changed = False
+    for user_id in user_ids:
+        old_trigrams = stored.get(user_id, set())
+        new_trigrams = get_trigrams(*names.get(user_id, ()))
+        stale = old_trigrams - new_trigrams
+        if stale:
+            UserTrigram.objects.filter(user_id=user_id, trigram__in=stale).delete()
+        new_rows.extend([
+            UserTrigram(user_id=user_id, trigram=trigram)
+            for trigram in new_trigrams - old_trigrams
+        ])
+        changed = changed or new_trigrams != old_trigrams
+    UserTrigram.objects.bulk_create(new_rows)
+    return changed
+
+
+def rebuild_user_trigrams():
+    """recreates the trigrams of all users,
+    returns the number of the trigram rows"""
+    UserTrigram.objects.all().delete()
+    names = User.objects.values_list('id', 'username', 'askbot_profile__real_name')
+    rows = list()
+    count = 0
+    for user_id, username, real_name in names.iterator():
+        rows.extend([
+            UserTrigram(user_id=user_id, trigram=trigram)
+            for trigram in get_trigrams(username, real_name)
+        ])
+        if len(rows) >= REBUILD_BATCH_SIZE:
+            UserTrigram.objects.bulk_create(rows)
+            count += len(rows)
+            rows = list()
+    UserTrigram.objects.bulk_create(rows)
+    return count + len(rows)
+
+
+def search_users_by_trigrams(users_query_set, search_query):
+    """returns users whose user name or real name contains the query,
+    queries shorter than a trigram match the beginning of the user name"""
+    search_query = search_query.strip()
+    trigrams = get_trigrams(search_query)
+    if not trigrams:
+        return users_query_set.filter(username__istartswith=search_query)
+
+    candidate_ids = UserTrigram.objects.filter(
+                                    trigram__in=trigrams
+                                ).values(
+                                    'user_id'
+                                ).annotate(
+                                    count=models.Count('id')
+                                ).filter(
+                                    count=len(trigrams)
+                                ).values('user_id')
+    #the trigrams may be found in the names in a different order
+    return users_query_set.filter(
+                models.Q(id__in=candidate_ids),
+                models.Q(username__icontains=search_query) |
+                models.Q(askbot_profile__real_name__icontains=search_query)
+            )
+
+
+def remember_username(sender, instance, **kwargs):
+    """the trigrams are updated only when the user name
+    differs from the one loaded from the database"""
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+def remember_real_name(sender, instance, **kwargs):
+    instance._loaded_real_name = instance.__dict__.get('real_name')
+
+
+def update_trigrams_on_user_save(sender, instance, created=False, **kwargs):
+    if not user_trigrams_enabled():
+        return
+    old_username = getattr(instance, '_loaded_username', None)
+    if not created and old_username == instance.username:
+        return
+    instance._loaded_username = instance.username
+    update_user_trigrams([instance.id])
+
+
+def update_trigrams_on_profile_save(sender, instance, created=False, update_fields=None, **kwargs):
+    if not user_trigrams_enabled():
+        return
+    if update_fields is not None and 'real_name' not in update_fields:
+        return
+    if not created and getattr(instance, '_loaded_real_name', None) == instance.real_name:
+        return
+    instance._loaded_real_name = instance.real_name
+    update_user_trigrams([instance.pk])
+
@@ -0,0 +1,153 @@
+"""Cache of the usernames by the case-folded prefix,
+used to resolve the @mentions in the posts
+and to autocomplete the usernames.
+
+Usernames are kept in "buckets" stored in the django cache,
+one bucket per prefix up to :data:`BUCKET_PREFIX_LENGTH` characters long,
+each holding pairs (case-folded username, user id) of the users whose
+names start with the prefix. All name seeds of a post are resolved with
+one read of the cache, the missing buckets are loaded with one query.
+
+Buckets are refreshed when a user is created, renamed or deleted,
+e.g. merged into another account. Entries left from the users renamed
+elsewhere are harmless - the found users are checked against the seeds.
+"""
+import hashlib
+import operator
+
+from django.contrib.auth.models import User
+from django.core import cache
+from django.db.models import Q
+from django.utils.encoding import smart_str
+
+from askbot.utils.lists import batch_size
+
+#longer prefixes share the bucket of their first characters
+BUCKET_PREFIX_LENGTH = 3
+
+
+def fold_username(username):
+    return username.lower()
+
+
+def get_bucket_prefix(name_seed):
+    return fold_username(name_seed)[:BUCKET_PREFIX_LENGTH]
+
+
+def get_bucket_cache_key(prefix):
+    return 'username-prefix-%s' % hashlib.md5(smart_str(prefix)).hexdigest()
+
+
+def get_username_bucket_prefixes(username):
+    """prefixes of all buckets which may contain the username"""
+    folded_name = fold_username(username)
+    length = min(len(folded_name), BUCKET_PREFIX_LENGTH)
+    return [folded_name[:size] for size in range(1, length + 1)]
+
+
+def load_buckets(prefixes):
+    """returns dictionary prefix -> list of pairs
+    (case-folded username, user id), reads the missing
+    buckets from the database with one query"""
+    prefixes = set(prefixes)
+    cache_keys = dict([(get_bucket_cache_key(prefix), prefix) for prefix in prefixes])
+    cached = cache.cache.get_many(cache_keys.keys())
+    buckets = dict([(cache_keys[key], value) for key, value in cached.items()])
+
+    missing = prefixes - set(buckets.keys())
+    if missing:
+        name_filter = reduce(
+                        operator.or_,
+                        [Q(username__istartswith=prefix) for prefix in missing]
+                    )
+        users = User.objects.filter(name_filter).values_list('username', 'id')
+        new_buckets = dict([(prefix, list()) for prefix in missing])
+        for username, user_id in users:
+            folded_name = fold_username(username)
+            for prefix in get_username_bucket_prefixes(username):
+                if prefix in new_buckets:
+                    new_buckets[prefix].append((folded_name, user_id))
+        cache.cache.set_many(
+            dict([(get_bucket_cache_key(prefix), value) for prefix, value in new_buckets.items()])
+        )
+        buckets.update(new_buckets)
+    return buckets
+
+
+def get_users_by_name_seeds(name_seeds):
+    """returns list of users whose names start
+    with any of the ``name_seeds``, case-insensitive"""
+    folded_seeds = set([fold_username(seed) for seed in name_seeds if seed])
+    if not folded_seeds:
+        return list()
+
+    buckets = load_buckets([get_bucket_prefix(seed) for seed in folded_seeds])
+    user_ids = set()
+    for seed in folded_seeds:
+        for folded_name, user_id in buckets[get_bucket_prefix(seed)]:
+            if folded_name.startswith(seed):
+                user_ids.add(user_id)
+    if not user_ids:
+        return list()
+
+    users = User.objects.filter(id__in=user_ids)
+    #drop the users renamed since the bucket was filled
+    return [
+        user for user in users
+        if any(fold_username(user.username).startswith(seed) for seed in folded_seeds)
+    ]
+
+
+def get_usernames_by_prefix(prefix, limit):
+    """returns up to ``limit`` usernames starting with
+    the prefix, case-insensitive, in alphabetical order"""
+    folded_prefix = fold_username(prefix)
+    if not folded_prefix or limit <= 0:
+        return list()
+
+    bucket_prefix = get_bucket_prefix(folded_prefix)
+    bucket = load_buckets([bucket_prefix])[bucket_prefix]
+    user_ids = [
+        user_id for folded_name, user_id in sorted(bucket)
+        if folded_name.startswith(folded_prefix)
+    ]
+
+    usernames = list()
+    for chunk in batch_size(user_ids, limit):
+        names = dict(User.objects.filter(id__in=chunk).values_list('id', 'username'))
+        for user_id in chunk:
+            username = names.get(user_id)
+            #skip the users renamed or deleted since the bucket was filled
+            if username and fold_username(username).startswith(folded_prefix):
+                usernames.append(username)
+        if len(usernames) >= limit:
+            break
+    return usernames[:limit]
+
+
+def evict_username(username):
+    """removes the buckets which may contain the username"""
+    prefixes = get_username_bucket_prefixes(username)
+    cache.cache.delete_many([get_bucket_cache_key(prefix) for prefix in prefixes])
+
+
+def update_username_index(sender, instance, created=False, **kwargs):
+    """evicts the buckets missing the new or the renamed user"""
+    if not instance.username:
+        return
+    if created:
+        evict_username(instance.username)
+        return
+
+    entry = (fold_username(instance.username), instance.id)
+    prefixes = get_username_bucket_prefixes(instance.username)
+    cache_keys = [get_bucket_cache_key(prefix) for prefix in prefixes]
+    cached = cache.cache.get_many(cache_keys)
+    stale_keys = [key for key, bucket in cached.items() if entry not in bucket]
+    if stale_keys:
+        cache.cache.delete_many(stale_keys)
+
+
+def remove_from_username_index(sender, instance, **kwargs):
+    if instance.username:
+        evict_username(instance.username)
@@ -0,0 +1,184 @@
+"""In-process buffer of the writes caused by the page visits:
+increments of the question view counts and the times of the
+last visits of the users.
+
+The values are accumulated per thread and per user and
+written in a few bulk UPDATE queries once in
+``ASKBOT_VISIT_BUFFER_FLUSH_INTERVAL`` seconds,
+so that many visits to one thread (or by one user) between
+the flushes cost a single write.
+The buffer lives in the memory of each process, so the flush is
+triggered by the visits and, for the values buffered before the
+process went idle, by a timer thread started with the first value.
+With the interval of ``0`` the values are written right away,
+without the celery task.
+Values buffered in a process that exits before the flush are lost.
+"""
+import threading
+import time
+
+from django.conf import settings as django_settings
+from django.core import cache
+from django.db import connection
+from django.db.models import Case, DateTimeField, F, IntegerField, Value, When
+
+from askbot.utils import translation as translation_utils
+
+#max number of rows updated by one query
+FLUSH_BATCH_SIZE = 500
+
+
+def get_batches(items, batch_size=FLUSH_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def write_view_counts(view_counts):
+    """``view_counts`` - dictionary thread id -> view count increment,
+    the summary html of each thread is regenerated once"""
+    from askbot.models import Thread
+    if not view_counts:
+        return
+
+    for thread_ids in get_batches(view_counts.keys()):
+        increment = Case(
+                        *[When(id=thread_id, then=Value(view_counts[thread_id]))
+                            for thread_id in thread_ids],
+                        output_field=IntegerField()
+                    )
+        Thread.objects.filter(
+                        id__in=thread_ids
+                    ).update(view_count=F('view_count') + increment)
+
+    langs = translation_utils.get_language_codes()
+    threads = Thread.objects.filter(id__in=view_counts.keys())
+    keys = list()
+    for thread in threads:
+        keys.extend([thread.get_summary_cache_key(lang) for lang in langs])
+    cache.cache.delete_many(keys)
+
+    if not django_settings.CELERY_ALWAYS_EAGER:
+        for thread in threads:
+            thread.update_summary_html()# proactively regenerate thread summary html
+
+
+def write_user_visits(user_visits):
+    """``user_visits`` - dictionary user id ->
+    tuple (last seen time, consecutive days visit count)"""
+    from askbot.models import UserProfile
+    if not user_visits:
+        return
+
+    for user_ids in get_batches(user_visits.keys()):
+        last_seen = Case(
+                        *[When(pk=user_id, then=Value(user_visits[user_id][0]))
+                            for user_id in user_ids],
+                        output_field=DateTimeField()
+                    )
+        days_count = Case(
+                        *[When(pk=user_id, then=Value(user_visits[user_id][1]))
+                            for user_id in user_ids],
+                        output_field=IntegerField()
+                    )
+        profiles = UserProfile.objects.filter(pk__in=user_ids)
+        profiles.update(last_seen=last_seen, consecutive_days_visit_count=days_count)
+        for profile in profiles:
+            profile.update_cache()
+
+
+def write_visits(view_counts=None, user_visits=None):
+    write_view_counts(view_counts)
+    write_user_visits(user_visits)
+
+
+class VisitBuffer(object):
+    """thread safe accumulator of the view counts and the user visits"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timer = None
+        self.reset()
+
+    def reset(self):
+        self.view_counts = dict()
+        self.user_visits = dict()
+        self.started_at = time.time()
+
+    def add_thread_view(self, thread_id):
+        with self.lock:
+            self.view_counts[thread_id] = self.view_counts.get(thread_id, 0) + 1
+
+    def add_user_visit(self, user_id, timestamp, consecutive_days):
+        with self.lock:
+            self.user_visits[user_id] = (timestamp, consecutive_days)
+
+    def get_user_visit(self, user_id):
+        """returns buffered tuple (last seen time, consecutive days
+        visit count) or ``None``"""
+        return self.user_visits.get(user_id)
+
+    def pop_data(self):
+        with self.lock:
+            data = {
+                'view_counts': self.view_counts,
+                'user_visits': self.user_visits
+            }
+            self.reset()
+        return data
+
+    def get_interval(self):
+        return django_settings.ASKBOT_VISIT_BUFFER_FLUSH_INTERVAL
+
+    def is_due(self):
+        return time.time() - self.started_at >= self.get_interval()
+
+    def flush(self):
+        """writes the buffered values, in a celery task
+        unless the flush interval is ``0``"""
+        data = self.pop_data()
+        if not (data['view_counts'] or data['user_visits']):
+            return
+        if self.get_interval() == 0:
+            write_visits(**data)
+        else:
+            from askbot import tasks
+            from askbot.utils.transaction import defer_celery_task
+            defer_celery_task(tasks.flush_visit_buffer, kwargs=data)
+
+    def flush_idle(self):
+        """flushes the values buffered before the process went
+        idle, runs outside of the requests, so the task is
+        sent right away"""
+        from askbot import tasks
+        with self.lock:
+            self.timer = None
+        data = self.pop_data()
+        if data['view_counts'] or data['user_visits']:
+            tasks.flush_visit_buffer.apply_async(kwargs=data)
+
+    def run_timer(self):
+        try:
+            self.flush_idle()
+        finally:
+            #the timer thread has its own connection
+            connection.close()
+
+    def schedule_flush(self):
+        """starts the timer which flushes the buffer
+        in one interval, unless it is running already"""
+        with self.lock:
+            if self.timer is not None:
+                return
+            self.timer = threading.Timer(self.get_interval(), self.run_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def maybe_flush(self):
+        if self.is_due():
+            self.flush()
+        else:
+            self.schedule_flush()
+
+
+visit_buffer = VisitBuffer()
@@ -0,0 +1,265 @@
+"""Deferred processing of the votes.
+
+With ``ASKBOT_ASYNC_VOTES = True`` the vote request only saves
+the :class:`~askbot.models.Vote` and bumps the scores of the post
+(and of the thread for questions) with atomic increments.
+The other effects - changes of reputation of the post author and
+of the voter, the badges and the invalidation of the thread caches -
+are stored as :class:`PendingVoteEffect` rows and applied by the
+celery task ``askbot.tasks.apply_vote_effects``.
+
+The task is scheduled once per post within
+``ASKBOT_VOTE_EFFECTS_DELAY`` seconds, so a burst of votes on
+a popular post is processed together: the reputation of each
+user is updated once, the caches of the thread are reset once.
+"""
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.core import cache
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from askbot import const
+from askbot.conf import settings as askbot_settings
+from askbot.models.repute import Repute, Vote
+from askbot.models.thread_listing import ThreadListing, listing_is_enabled
+from askbot.search import result_cache
+
+#time after which the votes on the post schedule the task again,
+#even if the previously scheduled task did not run
+SCHEDULE_TIMEOUT = 300
+
+
+def async_votes_enabled():
+    return django_settings.ASKBOT_ASYNC_VOTES
+
+
+class PendingVoteEffect(models.Model):
+    """vote or cancellation of a vote whose effects
+    on reputation, badges and caches are not applied yet"""
+    post = models.ForeignKey('Post', related_name='+')
+    user = models.ForeignKey(User, related_name='+')
+    vote = models.SmallIntegerField(choices=Vote.VOTE_CHOICES)
+    cancel = models.BooleanField(default=False)
+    added_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        app_label = 'askbot'
+        db_table = 'askbot_pending_vote_effect'
+
+
+def get_schedule_cache_key(post_id):
+    return 'vote-effects-scheduled-%d' % post_id
+
+
+def schedule_vote_effects(post_id):
+    """schedules the task, unless it is scheduled already"""
+    if cache.cache.add(get_schedule_cache_key(post_id), True, SCHEDULE_TIMEOUT):
+        from askbot import tasks
+        from askbot.utils.transaction import defer_celery_task
+        defer_celery_task(
+            tasks.apply_vote_effects,
+            args=(post_id,),
+            countdown=django_settings.ASKBOT_VOTE_EFFECTS_DELAY
+        )
+
+
+def bump_scores(post, vote_type, cancel):
+    """increments the scores of the post and of the thread
+    in the database and in the ``post`` object"""
+    from askbot.models.post import Post
+    from askbot.models.question import Thread
+    sign = -1 if cancel else 1
+    delta = vote_type * sign
+    updates = {'points': F('points') + delta}
+    if vote_type == Vote.VOTE_DOWN:
+        count_field = 'vote_down_count'
+    elif post.post_type != 'comment':
+        count_field = 'vote_up_count'
+    else:
+        count_field = None
+    if count_field and cancel:
+        #the counts never go below zero
+        updates[count_field] = Case(
+                        When(**{count_field + '__gt': 0, 'then': F(count_field) - 1}),
+                        default=Value(0)
+                    )
+        setattr(post, count_field, max(0, getattr(post, count_field) - 1))
+    elif count_field:
+        updates[count_field] = F(count_field) + 1
+        setattr(post, count_field, getattr(post, count_field) + 1)
+    Post.objects.filter(id=post.id).update(**updates)
+    post.points += delta
+
+    if post.post_type == 'question' and post.thread_id:
+        Thread.objects.filter(id=post.thread_id).update(points=F('points') + delta)
+        if listing_is_enabled():
+            ThreadListing.objects.filter(thread_id=post.thread_id).update(
+                                                    points=F('points') + delta
+                                                )
+        #the order of the question lists sorted by votes changes
+        result_cache.evict_results_of_threads([post.thread_id])
+
+
+def save_vote(user, post, vote_type, cancel=False, timestamp=None):
+    """saves or deletes the vote, updates the scores and
+    defers the rest of the work, returns the saved vote
+    or ``None`` if the vote was canceled or not changed"""
+    timestamp = timestamp or timezone.now()
+    with transaction.atomic():
+        try:
+            vote = Vote.objects.select_for_update().get(user=user, voted_post=post)
+        except Vote.DoesNotExist:
+            vote = None
+
+        if cancel:
+            if vote is None or vote.is_opposite(vote_type):
+                return None
+            vote.delete()
+            changes = [(vote_type, True)]
+            result = None
+        else:
+            if vote is None:
+                vote = Vote(user=user, voted_post=post, vote=vote_type, voted_at=timestamp)
+                changes = [(vote_type, False)]
+            elif vote.is_opposite(vote_type):
+                changes = [(vote.vote, True), (vote_type, False)]
+                vote.vote = vote_type
+            else:
+                return None
+            vote.save()
+            result = vote
+
+        for changed_vote, canceled in changes:
+            bump_scores(post, changed_vote, canceled)
+            PendingVoteEffect.objects.create(
+                post=post, user=user, vote=changed_vote,
+                cancel=canceled, added_at=timestamp
+            )
+    schedule_vote_effects(post.id)
+    return result
+
+
+def get_reputation_changes(post, effect):
+    """returns list of tuples (user id, points, repute fields)
+    for the effect, following the rules of :mod:`askbot.auth`"""
+    if post.wiki or post.is_anonymous:
+        return list()
+
+    author_id = post.author_id
+    if effect.vote == Vote.VOTE_UP:
+        if post.post_type == 'comment':
+            return list()
+        points = askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+        if effect.cancel:
+            return [(author_id, -points, {'negative': -points, 'reputation_type': -8})]
+        return [(author_id, points, {'positive': points, 'reputation_type': 1})]
+
+    received = askbot_settings.REP_LOSS_FOR_RECEIVING_DOWNVOTE
+    given = askbot_settings.REP_LOSS_FOR_DOWNVOTING
+    if effect.cancel:
+        return [
+            (author_id, -received, {'positive': abs(received), 'reputation_type': 4}),
+            (effect.user_id, -given, {'positive': abs(given), 'reputation_type': 5}),
+        ]
+    return [
+        (author_id, received, {'negative': received, 'reputation_type': -3}),
+        (effect.user_id, given, {'negative': given, 'reputation_type': -5}),
+    ]
+
+
+def apply_reputation_changes(post, effects):
+    """updates the reputation of each affected user
+    once and records the history of the changes"""
+    users = dict()
+    user_ids = set([post.author_id] + [effect.user_id for effect in effects])
+    for user in User.objects.filter(id__in=user_ids):
+        users[user.id] = user
+
+    question = post.thread._question_post() if post.thread_id else None
+    language_code = question.language_code if question else post.language_code
+    #reputation gained by the upvotes today is limited
+    upvote_gains = dict()
+    totals = dict()
+    running = dict([(user_id, user.reputation) for user_id, user in users.items()])
+    reputes = list()
+    for effect in effects:
+        for user_id, points, repute_fields in get_reputation_changes(post, effect):
+            if user_id not in upvote_gains:
+                upvote_gains[user_id] = \
+                    Repute.objects.get_reputation_by_upvoted_today(users[user_id])
+            if repute_fields['reputation_type'] == 1:
+                if upvote_gains[user_id] >= askbot_settings.MAX_REP_GAIN_PER_USER_PER_DAY:
+                    continue
+                upvote_gains[user_id] += points
+            elif repute_fields['reputation_type'] == -8:
+                upvote_gains[user_id] += points
+
+            totals[user_id] = totals.get(user_id, 0) + points
+            running[user_id] = max(const.MIN_REPUTATION, running[user_id] + points)
+            reputes.append(
+                Repute(
+                    user_id=user_id,
+                    question=question,
+                    language_code=language_code,
+                    reputed_at=effect.added_at,
+                    reputation=running[user_id],
+                    **repute_fields
+                )
+            )
+
+    for user_id, points in totals.items():
+        user = users[user_id]
+        user.receive_reputation(points, post.language_code)
+        user.save()
+    Repute.objects.bulk_create(reputes)
+
+
+def award_vote_badges(post, effects):
+    """considers the badges once per voter"""
+    from askbot.models import VOTES_TO_EVENTS
+    from askbot.models.badges import award_badges_signal
+    seen = set()
+    for effect in effects:
+        if effect.cancel:
+            continue
+        event = VOTES_TO_EVENTS.get((effect.vote, post.post_type))
+        if event is None or (effect.user_id, event) in seen:
+            continue
+        seen.add((effect.user_id, event))
+        award_badges_signal.send(
+            None,
+            event=event,
+            actor=effect.user,
+            context_object=post,
+            timestamp=effect.added_at
+        )
+
+
+def apply_pending_vote_effects(post_id):
+    """applies the effects of the votes on the post
+    recorded since the previous run"""
+    from askbot.models.post import Post
+    #votes added from now on will schedule another run
+    cache.cache.delete(get_schedule_cache_key(post_id))
+    with transaction.atomic():
+        effects = list(
+            PendingVoteEffect.objects.select_for_update().filter(
+                post_id=post_id
+            ).select_related('user').order_by('id')
+        )
+        if not effects:
+            return
+        PendingVoteEffect.objects.filter(id__in=[effect.id for effect in effects]).delete()
+        try:
+            post = Post.objects.select_related('thread').get(id=post_id)
+        except Post.DoesNotExist:
+            return
+
+        apply_reputation_changes(post, effects)
+        if post.thread_id:
+            #the points of the thread and of its listing
+            #are already updated by bump_scores
+            post.thread.reset_cached_data()
+        award_vote_badges(post, effects)
@@ -41,3 +41,28 @@ def get_threads_from_query(query, language=None):
 
 def get_users_from_query(query, language=None):
     return search_model(query, model_class=User, language=language)
+
+
+def update_index(model_class, object_ids):
+    """updates documents of the objects in all search
+    connections with one backend call per connection, removes
+    documents of the objects excluded from the index"""
+    object_ids = set(object_ids)
+    for alias in connections.connections_info.keys():
+        try:
+            index = connections[alias].get_unified_index().get_index(model_class)
+        except NotHandled:
+            continue
+        backend = connections[alias].get_backend()
+        objects = list(index.index_queryset(using=alias).filter(pk__in=object_ids))
+        if objects:
+            backend.update(index, objects)
+        found_ids = set([obj.pk for obj in objects])
+        for object_id in object_ids - found_ids:
+            backend.remove(get_identifier(model_class, object_id))
+
+
+def get_identifier(model_class, object_id):
+    """returns id of the document in the haystack format"""
+    meta = model_class._meta
+    return '%s.%s.%s' % (meta.app_label, meta.model_name, object_id)
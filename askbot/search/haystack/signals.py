@@ -1,6 +1,6 @@
 from django.db.models import signals as django_signals
 
-from haystack.signals import RealtimeSignalProcessor
+from haystack.signals import BaseSignalProcessor, RealtimeSignalProcessor
 
 from askbot import signals as askbot_signals
 
@@ -40,6 +40,21 @@ class AskbotRealtimeSignalProcessor(RealtimeSignalProcessor):
         except ImportError:
             pass
 
+class AskbotQueuedSignalProcessor(BaseSignalProcessor):
+    '''
+    Leaves the updates of the index to the search reindex
+    queue, see :mod:`askbot.models.reindex_queue`, which
+    collects the changed threads and users and sends them
+    to the backend in batches. To be used together with
+    ``ASKBOT_SEARCH_REINDEX_QUEUE = True``
+    '''
+
+    def setup(self):
+        pass
+
+    def teardown(self):
+        pass
+
 try:
     from haystack.exceptions import NotHandled
     from celery_haystack.signals import CelerySignalProcessor
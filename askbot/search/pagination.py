@@ -0,0 +1,264 @@
+"""Keyset (a.k.a. "seek") pagination of the question lists.
+
+Instead of ``OFFSET``, the next and the previous pages are selected
+by comparing the value of the sort column and the thread id
+with the values of the last (or the first) item of the current page,
+which are passed between the requests as an opaque "cursor".
+The total count is taken from the cache.
+"""
+import datetime
+import hashlib
+
+from django.conf import settings as django_settings
+from django.core import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import smart_str
+from django.utils.translation import get_language
+
+from askbot import const
+
+#sort method prefix -> sort column
+SORT_FIELD_MAP = {
+    'age': 'added_at',
+    'activity': 'last_activity_at',
+    'answers': 'answer_count',
+    'votes': 'points',
+}
+
+DATETIME_FIELDS = ('added_at', 'last_activity_at')
+
+CURSOR_DATETIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def get_sort_field(sort_method):
+    """returns tuple (sort field name, is descending)
+    or ``None`` if the sort method cannot be
+    paginated by keyset (e.g. relevance sort)"""
+    bits = sort_method.split('-')
+    if len(bits) != 2 or bits[0] not in SORT_FIELD_MAP:
+        return None
+    return SORT_FIELD_MAP[bits[0]], bits[1] == 'desc'
+
+
+def encode_cursor(direction, value, item_id):
+    """returns cursor string, direction is
+    'a' (items after the value) or 'b' (items before the value)"""
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value, timezone.utc)
+        value = value.strftime(CURSOR_DATETIME_FORMAT)
+    return '%s%s_%d' % (direction, value, item_id)
+
+
+def decode_cursor(cursor, sort_field):
+    """returns tuple (direction, value, item_id)
+    raises ``ValueError`` if the cursor is malformed"""
+    cursor = smart_str(cursor)
+    direction = cursor[:1]
+    if direction not in ('a', 'b'):
+        raise ValueError('bad cursor direction')
+    value, item_id = cursor[1:].split('_')
+    if sort_field in DATETIME_FIELDS:
+        value = datetime.datetime.strptime(value, CURSOR_DATETIME_FORMAT)
+        if django_settings.USE_TZ:
+            value = timezone.make_aware(value, timezone.utc)
+    else:
+        value = int(value)
+    return direction, value, int(item_id)
+
+
+def get_cached_count(queryset, cache_key, timeout=const.SEARCH_COUNT_CACHE_TIMEOUT):
+    """returns count of items in the queryset, which
+    may be up to ``timeout`` seconds old"""
+    count = cache.cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.cache.set(cache_key, count, timeout)
+    return count
+
+
+def get_search_count_cache_key(request_user, search_state, language_code):
+    """cache key for the question count of the search state:
+    results depend on the user tag selections and groups,
+    so the key is per user for the authenticated users"""
+    if request_user.is_authenticated():
+        user_key = str(request_user.id)
+    else:
+        user_key = 'anon'
+    search_key = search_state.change_page(1).query_string()
+    key = '%s-%s-%s' % (user_key, language_code, search_key)
+    return 'search-count-%s' % hashlib.md5(smart_str(key)).hexdigest()
+
+
+class KeysetPage(object):
+    """a page compatible with the :class:`django.core.paginator.Page`
+    as used in the templates, plus the cursors
+    to the neighbouring pages"""
+
+    def __init__(self, object_list, number, paginator,
+                 next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class KeysetPaginator(object):
+    """paginates the queryset by the value of the sort field
+    and the item id.
+
+    ``id_field`` - name of the field with the item id, used as
+    a tie breaker, ``loader`` - a function which turns the list
+    of ids of the page into the list of objects,
+    ``count`` - (approximate) number of items in the queryset.
+    """
+
+    def __init__(self, queryset, sort_method, per_page,
+                 id_field='id', loader=None, count=None):
+        self.sort_field, self.descending = get_sort_field(sort_method)
+        self.queryset = queryset
+        self.per_page = per_page
+        self.id_field = id_field
+        self.loader = loader
+        if count is None:
+            count = queryset.count()
+        self.count = count
+
+    @property
+    def num_pages(self):
+        if self.count == 0:
+            return 1
+        return (self.count - 1) // self.per_page + 1
+
+    def get_ordering(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        return (prefix + self.sort_field, prefix + self.id_field)
+
+    def get_seek_filter(self, value, item_id, forward):
+        """filter selecting items following (or preceding,
+        if not ``forward``) the item in the sort order"""
+        if self.descending == forward:
+            lookup = '__lt'
+        else:
+            lookup = '__gt'
+        return Q(**{self.sort_field + lookup: value}) | \
+            Q(**{self.sort_field: value, self.id_field + lookup: item_id})
+
+    def get_rows(self, queryset, start=0):
+        rows = queryset.values_list(self.id_field, self.sort_field)
+        return list(rows[start:start + self.per_page + 1])
+
+    def page(self, number=1, cursor=None):
+        """returns page of items either after/before the cursor
+        or, if the cursor is not given or is invalid,
+        the page by number, in which case an offset is used"""
+        queryset = self.queryset
+        direction = None
+        if cursor:
+            try:
+                direction, value, item_id = decode_cursor(cursor, self.sort_field)
+            except ValueError:
+                direction = None
+
+        if direction == 'a':
+            queryset = queryset.filter(self.get_seek_filter(value, item_id, True))
+            rows = self.get_rows(queryset.order_by(*self.get_ordering()))
+            has_more_after = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_more_before = True
+        elif direction == 'b':
+            queryset = queryset.filter(self.get_seek_filter(value, item_id, False))
+            rows = self.get_rows(queryset.order_by(*self.get_ordering(reverse=True)))
+            has_more_before = len(rows) > self.per_page
+            rows = list(reversed(rows[:self.per_page]))
+            has_more_after = True
+            if not has_more_before:
+                number = 1
+        else:
+            start = (number - 1) * self.per_page
+            rows = self.get_rows(queryset.order_by(*self.get_ordering()), start)
+            has_more_after = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_more_before = number > 1
+
+        next_cursor = previous_cursor = None
+        if rows and has_more_after:
+            item_id, value = rows[-1]
+            next_cursor = encode_cursor('a', value, item_id)
+        if rows and has_more_before:
+            item_id, value = rows[0]
+            previous_cursor = encode_cursor('b', value, item_id)
+
+        object_list = [row[0] for row in rows]
+        if self.loader:
+            object_list = self.loader(object_list)
+
+        return KeysetPage(
+                    object_list, number, self,
+                    next_cursor=next_cursor,
+                    previous_cursor=previous_cursor
+                )
+
+
+def paginate_threads(queryset, request_user, search_state,
+                     cursor=None, id_field='id', page_size=None):
+    """returns tuple (paginator, page) for the results
+    of the thread search, page items are threads.
+
+    Uses keyset pagination whenever the sort method allows,
+    ``queryset`` may return either threads or the thread listing rows
+    identified by the ``id_field``. The ``page_size`` defaults
+    to the page size of the search state.
+    """
+    from askbot.models import Thread
+    page_size = page_size or search_state.page_size
+    if get_sort_field(search_state.sort) is None:
+        paginator = Paginator(queryset, page_size)
+        if paginator.num_pages < search_state.page:
+            search_state.page = 1
+        page = paginator.page(search_state.page)
+        page.object_list = list(page.object_list) # evaluate the queryset
+        return paginator, page
+
+    cache_key = get_search_count_cache_key(
+                                request_user, search_state, get_language()
+                            )
+    paginator = KeysetPaginator(
+                        queryset,
+                        search_state.sort,
+                        page_size,
+                        id_field=id_field,
+                        loader=Thread.objects.get_for_list,
+                        count=get_cached_count(queryset, cache_key)
+                    )
+    if paginator.num_pages < search_state.page:
+        search_state.page = 1
+        cursor = None
+    page = paginator.page(search_state.page, cursor=cursor)
+    search_state.page = page.number
+    return paginator, page
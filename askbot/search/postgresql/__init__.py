@@ -24,6 +24,15 @@ LANGUAGE_NAMES = {
     'zh-cn': 'chinese',
 }
 
+#triggers updating the vectors of the threads and the posts
+#on each save, replaced by the search reindex queue
+VECTOR_TRIGGERS = (
+    ('thread_search_vector_update_trigger', 'askbot_thread'),
+    ('thread_search_vector_insert_trigger', 'askbot_thread'),
+    ('post_search_vector_insert_trigger', 'askbot_post'),
+    ('post_search_vector_update_trigger', 'askbot_post'),
+)
+
 def setup_full_text_search(script_path):
     """using postgresql database connection,
     installs the plsql language, if necessary
@@ -107,3 +116,62 @@ run_user_search = run_thread_search #an alias
 def run_title_search(query_set, query):
     """runs search for title and tags"""
     return run_full_text_search(query_set, query, 'title_search_vector')
+
+
+def drop_vector_triggers():
+    """drops the triggers recomputing the text search vectors
+    on each save of a thread or a post, with the search reindex
+    queue the vectors are updated by :func:`update_thread_vectors`,
+    the triggers are restored by the init_postgresql_full_text_search"""
+    cursor = connection.cursor()
+    try:
+        for trigger_name, table_name in VECTOR_TRIGGERS:
+            cursor.execute('DROP TRIGGER IF EXISTS %s ON %s' % (trigger_name, table_name))
+    finally:
+        cursor.close()
+
+
+def update_thread_vectors(thread_ids):
+    """recomputes text search vectors of the posts and of
+    the threads from the current texts, titles and tags"""
+    thread_ids = list(thread_ids)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            'UPDATE askbot_post SET text_search_vector = '
+            'get_post_tsv(text, post_type, language_code) '
+            "WHERE thread_id = ANY(%s) AND post_type IN ('question', 'answer', 'comment')",
+            [thread_ids]
+        )
+        cursor.execute(
+            'UPDATE askbot_post SET text_search_vector = '
+            'text_search_vector || get_dependent_comments_tsv(id) '
+            "WHERE thread_id = ANY(%s) AND post_type IN ('question', 'answer')",
+            [thread_ids]
+        )
+        #with the update trigger in place the title is added twice,
+        #which does not change the matches
+        cursor.execute(
+            'UPDATE askbot_thread SET '
+            'title_search_vector = get_thread_tsv(title, tagnames, language_code), '
+            'text_search_vector = get_thread_tsv(title, tagnames, language_code) || '
+            'get_dependent_answers_tsv(id, language_code) || '
+            'get_thread_question_tsv(id, language_code) '
+            'WHERE id = ANY(%s)',
+            [thread_ids]
+        )
+    finally:
+        cursor.close()
+
+
+def update_user_vectors(user_ids):
+    """recomputes text search vectors of the users in one query"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            'UPDATE auth_user SET text_search_vector = get_auth_user_tsv(id) '
+            'WHERE id = ANY(%s)',
+            [list(user_ids)]
+        )
+    finally:
+        cursor.close()
@@ -0,0 +1,203 @@
+"""Cache of the question list search results for anonymous visitors.
+
+The results - ids of the threads on the page, related tags
+and contributors - are stored under the key made of the canonical
+"fingerprint" of the search state and the language.
+
+The key also includes the "generation" counters, one per scope and
+search tag (or for the searches without tags). A change of a thread
+increments the counters of its scopes and tags, so that only the results
+of the searches which might include this thread go stale -
+see :func:`evict_thread_results`. The counters are changed with the
+atomic ``incr`` of the cache, concurrent requests do not lose
+the evictions.
+"""
+import hashlib
+import time
+
+from django.contrib.auth.models import User
+from django.core import cache
+from django.utils.encoding import smart_str
+from django.utils.translation import get_language
+
+from askbot import const
+from askbot.conf import settings as askbot_settings
+from askbot.search.pagination import KeysetPage
+
+#scopes available to the anonymous visitors
+CACHED_SCOPES = ('all', 'unanswered')
+
+
+class CachedPaginator(object):
+    """paginator of the cached page, has only the
+    attributes used by the question list views"""
+
+    def __init__(self, count, per_page):
+        self.count = count
+        self.per_page = per_page
+
+    @property
+    def num_pages(self):
+        if self.count == 0:
+            return 1
+        return (self.count - 1) // self.per_page + 1
+
+
+def can_cache_results(request, search_state):
+    """True if the results of the search are the same
+    for all anonymous visitors and are worth caching"""
+    if request.user.is_authenticated():
+        return False
+    if search_state.query or search_state.author:
+        return False
+    if search_state.scope not in CACHED_SCOPES:
+        return False
+    if search_state.page > const.CACHED_SEARCH_PAGES:
+        return False
+    #pages reached via cursors are not cached
+    return 'cursor' not in request.GET
+
+
+def get_fingerprint(search_state, language_code=None):
+    """canonical representation of the search state,
+    the same for the searches with the same tags
+    typed in a different order"""
+    language_code = language_code or get_language()
+    tags = sorted(set(search_state.unified_tags()))
+    return '%s|%s|%s|%d|%d|%s' % (
+                    search_state.scope,
+                    search_state.sort,
+                    ','.join(tags),
+                    search_state.page,
+                    search_state.page_size,
+                    language_code
+                )
+
+
+def get_generation_cache_key(scope, tag_name=None):
+    """key of the generation counter for the scope and the tag,
+    ``tag_name`` is ``None`` for the searches without tags"""
+    tag_key = hashlib.md5(smart_str(tag_name or '')).hexdigest()
+    return 'search-results-generation-%s-%s' % (scope, tag_key)
+
+
+def get_generation_cache_keys(search_state):
+    tags = sorted(set(search_state.unified_tags()))
+    if tags:
+        return [get_generation_cache_key(search_state.scope, tag) for tag in tags]
+    return [get_generation_cache_key(search_state.scope)]
+
+
+def get_generations(keys):
+    """returns list of the generations stored under the keys,
+    the missing counters are started from the current time,
+    so that a counter dropped by the cache does not
+    bring back the results stored before"""
+    generations = cache.cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.cache.add(key, int(time.time()), None)
+            generations[key] = cache.cache.get(key, 0)
+    return [generations[key] for key in keys]
+
+
+def increment_generation(key):
+    try:
+        cache.cache.incr(key)
+    except ValueError:
+        #no counter yet - there are no results to evict
+        pass
+
+
+def get_results_cache_key(search_state, language_code=None):
+    """key of the results, must be taken before running the search"""
+    fingerprint = get_fingerprint(search_state, language_code)
+    generations = get_generations(get_generation_cache_keys(search_state))
+    fingerprint += '|' + ','.join([str(generation) for generation in generations])
+    return 'search-results-%s' % hashlib.md5(smart_str(fingerprint)).hexdigest()
+
+
+def get_cached_results(results_key):
+    """returns dictionary with the cached results or ``None``"""
+    return cache.cache.get(results_key)
+
+
+def cache_results(results_key, paginator, page, related_tags, contributors, meta_data):
+    """stores the search results, the results of a search
+    running during a change of a thread are stored
+    with the old generations and are never read"""
+    data = {
+        'thread_ids': [thread.id for thread in page.object_list],
+        'count': paginator.count,
+        'page_number': page.number,
+        'next_cursor': getattr(page, 'next_cursor', None),
+        'previous_cursor': getattr(page, 'previous_cursor', None),
+        'related_tags': [
+            (tag.id, getattr(tag, 'local_used_count', None)) for tag in related_tags
+        ],
+        'contributor_ids': [user.id for user in contributors],
+        'meta_data': meta_data,
+    }
+    cache.cache.set(results_key, data, const.SEARCH_RESULTS_CACHE_TIMEOUT)
+
+
+def load_cached_results(data, search_state):
+    """returns tuple (paginator, page, related tags, contributors)
+    made from the cached data"""
+    from askbot.models import Tag, Thread
+
+    paginator = CachedPaginator(data['count'], search_state.page_size)
+    threads = Thread.objects.get_for_list(data['thread_ids'])
+    page = KeysetPage(
+                threads, data['page_number'], paginator,
+                next_cursor=data['next_cursor'],
+                previous_cursor=data['previous_cursor']
+            )
+
+    tag_ids = [tag_id for tag_id, used_count in data['related_tags']]
+    tag_map = dict([(tag.id, tag) for tag in Tag.objects.filter(id__in=tag_ids)])
+    related_tags = list()
+    for tag_id, used_count in data['related_tags']:
+        tag = tag_map.get(tag_id)
+        if tag:
+            tag.local_used_count = used_count
+            related_tags.append(tag)
+
+    users = User.objects.filter(
+                        id__in=data['contributor_ids']
+                    ).only('id', 'username', 'askbot_profile__gravatar')
+    user_map = dict([(user.id, user) for user in users])
+    contributors = [user_map[user_id] for user_id in data['contributor_ids'] if user_id in user_map]
+    return paginator, page, related_tags, contributors
+
+
+def get_affected_scopes(thread):
+    """scopes whose lists may change when the thread changes"""
+    meaning = askbot_settings.UNANSWERED_QUESTION_MEANING
+    if meaning == 'NO_ANSWERS' and thread.answer_count > 1:
+        #the thread is not in the unanswered list
+        #neither before nor after the change
+        return ('all',)
+    return CACHED_SCOPES
+
+
+def evict_thread_results(thread, tag_names=None):
+    """makes stale the cached results of the searches which may
+    include the thread: those without tags and those with any of the
+    thread tags, ``tag_names`` - extra tags (e.g. the removed ones)
+    """
+    tag_names = set(tag_names or [])
+    tag_names.update(thread.get_tag_names())
+
+    for scope in get_affected_scopes(thread):
+        increment_generation(get_generation_cache_key(scope))
+        for tag_name in tag_names:
+            increment_generation(get_generation_cache_key(scope, tag_name))
+
+
+def evict_results_of_threads(thread_ids):
+    """same as :func:`evict_thread_results` for the threads
+    changed with the queryset ``.update()``, which sends no signals"""
+    from askbot.models import Thread
+    for thread in Thread.objects.filter(id__in=thread_ids):
+        evict_thread_results(thread)
@@ -0,0 +1,392 @@
+"""Full text search in SQLite with the FTS5 extension.
+
+The index is kept in three FTS5 tables, with the ``rowid``
+equal to the id of the indexed object:
+
+* ``askbot_thread_fts`` - title, tags and the text of the
+  question and the answers of each thread
+* ``askbot_post_fts`` - text of each post
+* ``askbot_user_fts`` - user names and the "about" texts
+
+The index is used with ``ASKBOT_SQLITE_FULL_TEXT_SEARCH = True``.
+The tables are created and filled by the migration or by the
+management command ``init_sqlite_full_text_search`` and are
+updated by the signal handlers on saving of the threads, posts,
+users and their profiles. The saves not changing the indexed texts
+do not touch the index, the changed title and tags are written
+to the row of the thread, the changed texts of the posts are
+written to the rows of the threads by the search reindex queue,
+once per thread. Matches are ranked with BM25, the rank is selected
+as column ``relevance`` used by the sort method ``relevance-desc``.
+
+Until the tables are created the searches fall back to
+the ``icontains`` filters.
+"""
+import re
+
+from django.conf import settings as django_settings
+from django.db import connection
+
+import askbot
+from askbot.utils.translation import get_language
+
+THREAD_INDEX_TABLE = 'askbot_thread_fts'
+POST_INDEX_TABLE = 'askbot_post_fts'
+USER_INDEX_TABLE = 'askbot_user_fts'
+
+INDEX_TABLES = (
+    (THREAD_INDEX_TABLE, ('title', 'tagnames', 'text')),
+    (POST_INDEX_TABLE, ('text',)),
+    (USER_INDEX_TABLE, ('username', 'about')),
+)
+
+#stemming of english words and case folding of all languages
+TOKENIZER = 'porter unicode61 remove_diacritics 1'
+
+#weights of the columns of the thread index in the BM25 rank
+THREAD_RANK = 'bm25(%s, 10.0, 5.0, 1.0)' % THREAD_INDEX_TABLE
+
+#number of rows written per query by the index rebuild
+INDEX_BATCH_SIZE = 500
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+_INDEX_STATE = dict()
+
+
+def is_configured():
+    """True if the database is SQLite and
+    the full text search is turned on in the settings"""
+    return connection.vendor == 'sqlite' \
+        and django_settings.ASKBOT_SQLITE_FULL_TEXT_SEARCH
+
+
+def is_enabled():
+    """True if the search is configured and the index tables exist,
+    the tables are looked up until they are found"""
+    if not is_configured():
+        return False
+    if 'enabled' not in _INDEX_STATE:
+        if THREAD_INDEX_TABLE not in connection.introspection.table_names():
+            return False
+        _INDEX_STATE['enabled'] = True
+    return True
+
+
+def reset_index_state():
+    _INDEX_STATE.clear()
+
+
+def supports_fts5():
+    """True if the SQLite library is compiled with FTS5"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute('CREATE VIRTUAL TABLE temp.askbot_fts5_test USING fts5(text)')
+        cursor.execute('DROP TABLE temp.askbot_fts5_test')
+        return True
+    except Exception:
+        return False
+    finally:
+        cursor.close()
+
+
+def create_index_tables():
+    cursor = connection.cursor()
+    for table_name, columns in INDEX_TABLES:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, tokenize='%s')" % (
+                table_name, ', '.join(columns), TOKENIZER
+            )
+        )
+    reset_index_state()
+
+
+def drop_index_tables():
+    cursor = connection.cursor()
+    for table_name, columns in INDEX_TABLES:
+        cursor.execute('DROP TABLE IF EXISTS %s' % table_name)
+    reset_index_state()
+
+
+def get_match_expression(query_text, columns=None):
+    """returns FTS5 query matching any of the words of
+    the ``query_text``, optionally only in the ``columns``,
+    or ``None`` if the text has no words"""
+    terms = TERM_RE.findall(query_text)
+    if not terms:
+        return None
+    expression = ' OR '.join(['"%s"' % term for term in terms])
+    if columns:
+        expression = '{%s} : (%s)' % (' '.join(columns), expression)
+    return expression
+
+
+def run_full_text_search(query_set, query_text, index_table, rank, columns=None):
+    """filters the ``query_set`` by the matches in the ``index_table``,
+    selects the rank of the match as column ``relevance``"""
+    expression = get_match_expression(query_text, columns)
+    if expression is None:
+        return query_set.none()
+    db_table = query_set.model._meta.db_table
+    where = [
+        '%s.rowid = %s.id' % (index_table, db_table),
+        '%s MATCH %%s' % index_table,
+    ]
+    params = [expression]
+    if askbot.is_multilingual() and db_table == 'askbot_thread':
+        where.append('askbot_thread.language_code = %s')
+        params.append(get_language())
+    return query_set.extra(
+        select={'relevance': '-' + rank},
+        tables=[index_table],
+        where=where,
+        params=params
+    )
+
+
+def run_thread_search(query_set, query_text):
+    """runs search for full thread content"""
+    return run_full_text_search(query_set, query_text, THREAD_INDEX_TABLE, THREAD_RANK)
+
+
+def run_title_search(query_set, query_text):
+    """runs search for title and tags"""
+    return run_full_text_search(
+        query_set, query_text, THREAD_INDEX_TABLE, THREAD_RANK, columns=('title', 'tagnames')
+    )
+
+
+def run_user_search(query_set, query_text):
+    """runs search for user names and "about" texts"""
+    return run_full_text_search(
+        query_set, query_text, USER_INDEX_TABLE, 'bm25(%s)' % USER_INDEX_TABLE
+    )
+
+
+def run_post_search(query_set, query_text):
+    """returns posts of the threads matching the query
+    and the posts whose own text matches it"""
+    expression = get_match_expression(query_text)
+    if expression is None:
+        return query_set.none()
+    where = (
+        '(askbot_post.thread_id IN (SELECT rowid FROM %(threads)s WHERE %(threads)s MATCH %%s)'
+        ' OR askbot_post.id IN (SELECT rowid FROM %(posts)s WHERE %(posts)s MATCH %%s))'
+    ) % {'threads': THREAD_INDEX_TABLE, 'posts': POST_INDEX_TABLE}
+    return query_set.extra(where=[where], params=[expression, expression])
+
+
+def write_rows(table_name, columns, rows):
+    """replaces the index rows, ``rows`` - list of
+    tuples (rowid, value of each column)"""
+    if not rows:
+        return
+    cursor = connection.cursor()
+    cursor.executemany(
+        'DELETE FROM %s WHERE rowid = %%s' % table_name,
+        [(row[0],) for row in rows]
+    )
+    cursor.executemany(
+        'INSERT INTO %s (rowid, %s) VALUES (%s)' % (
+            table_name, ', '.join(columns), ', '.join(['%s'] * (len(columns) + 1))
+        ),
+        rows
+    )
+
+
+def delete_rows(table_name, row_ids):
+    if row_ids:
+        cursor = connection.cursor()
+        cursor.executemany(
+            'DELETE FROM %s WHERE rowid = %%s' % table_name,
+            [(row_id,) for row_id in row_ids]
+        )
+
+
+def get_indexed_values(table_name, columns, row_id):
+    """returns tuple of the indexed values or ``None``"""
+    cursor = connection.cursor()
+    cursor.execute(
+        'SELECT %s FROM %s WHERE rowid = %%s' % (', '.join(columns), table_name),
+        [row_id]
+    )
+    return cursor.fetchone()
+
+
+def get_thread_rows(thread_ids):
+    """returns index rows of the threads"""
+    from askbot.models import Post, Thread
+    texts = dict()
+    post_texts = Post.objects.filter(
+                            thread_id__in=thread_ids,
+                            post_type__in=('question', 'answer'),
+                            deleted=False
+                        ).order_by('id').values_list('thread_id', 'text')
+    for thread_id, text in post_texts:
+        texts.setdefault(thread_id, list()).append(text or '')
+    threads = Thread.objects.filter(id__in=thread_ids).values_list('id', 'title', 'tagnames')
+    return [
+        (thread_id, title, tagnames, '\n'.join(texts.get(thread_id, [])))
+        for thread_id, title, tagnames in threads
+    ]
+
+
+def get_user_rows(user_ids):
+    """returns index rows of the users"""
+    from askbot.models import LocalizedUserProfile, User
+    abouts = dict()
+    profiles = LocalizedUserProfile.objects.filter(
+                                auth_user_id__in=user_ids
+                            ).values_list('auth_user_id', 'about')
+    for user_id, about in profiles:
+        if about:
+            abouts.setdefault(user_id, list()).append(about)
+    users = User.objects.filter(id__in=user_ids).values_list('id', 'username')
+    return [
+        (user_id, username, '\n'.join(abouts.get(user_id, [])))
+        for user_id, username in users
+    ]
+
+
+def get_batches(items):
+    items = list(items)
+    for start in range(0, len(items), INDEX_BATCH_SIZE):
+        yield items[start:start + INDEX_BATCH_SIZE]
+
+
+def rebuild_index():
+    """fills the index tables, returns dictionary
+    with the numbers of indexed threads, posts and users"""
+    from askbot.models import Post, Thread, User
+    counts = {'threads': 0, 'posts': 0, 'users': 0}
+    cursor = connection.cursor()
+    for table_name, columns in INDEX_TABLES:
+        cursor.execute('DELETE FROM %s' % table_name)
+
+    thread_columns = dict(INDEX_TABLES)[THREAD_INDEX_TABLE]
+    for thread_ids in get_batches(Thread.objects.values_list('id', flat=True)):
+        rows = get_thread_rows(thread_ids)
+        write_rows(THREAD_INDEX_TABLE, thread_columns, rows)
+        counts['threads'] += len(rows)
+
+    posts = Post.objects.filter(deleted=False).values_list('id', 'text')
+    batch = list()
+    for post_id, text in posts.iterator():
+        batch.append((post_id, text or ''))
+        if len(batch) == INDEX_BATCH_SIZE:
+            write_rows(POST_INDEX_TABLE, ('text',), batch)
+            counts['posts'] += len(batch)
+            batch = list()
+    write_rows(POST_INDEX_TABLE, ('text',), batch)
+    counts['posts'] += len(batch)
+
+    user_columns = dict(INDEX_TABLES)[USER_INDEX_TABLE]
+    for user_ids in get_batches(User.objects.values_list('id', flat=True)):
+        rows = get_user_rows(user_ids)
+        write_rows(USER_INDEX_TABLE, user_columns, rows)
+        counts['users'] += len(rows)
+    return counts
+
+
+def update_thread_index(thread_ids):
+    """rewrites the index rows of the threads,
+    removes the rows of the threads which do not exist"""
+    delete_rows(THREAD_INDEX_TABLE, thread_ids)
+    write_rows(
+        THREAD_INDEX_TABLE,
+        dict(INDEX_TABLES)[THREAD_INDEX_TABLE],
+        get_thread_rows(thread_ids)
+    )
+
+
+def update_user_index(user_ids):
+    """rewrites the index rows of the users,
+    removes the rows of the users which do not exist"""
+    delete_rows(USER_INDEX_TABLE, user_ids)
+    write_rows(
+        USER_INDEX_TABLE,
+        dict(INDEX_TABLES)[USER_INDEX_TABLE],
+        get_user_rows(user_ids)
+    )
+
+
+def is_updated_on_save():
+    """False if the threads and the users are
+    reindexed by the search reindex queue"""
+    return is_enabled() and not django_settings.ASKBOT_SEARCH_REINDEX_QUEUE
+
+
+def queue_thread_text_update(thread_id):
+    """the posts of the thread are re-read by the reindex queue task,
+    so the posts saved together update the row of the thread once"""
+    from askbot.models.reindex_queue import PendingReindex, enqueue_reindex
+    enqueue_reindex(PendingReindex.THREAD, [thread_id])
+
+
+def index_thread(sender, instance, **kwargs):
+    if not is_updated_on_save():
+        return
+    values = (instance.title, instance.tagnames)
+    indexed = get_indexed_values(THREAD_INDEX_TABLE, ('title', 'tagnames'), instance.id)
+    if indexed is None:
+        update_thread_index([instance.id])
+    elif tuple(indexed) != values:
+        cursor = connection.cursor()
+        cursor.execute(
+            'UPDATE %s SET title = %%s, tagnames = %%s WHERE rowid = %%s' % THREAD_INDEX_TABLE,
+            list(values) + [instance.id]
+        )
+
+
+def unindex_thread(sender, instance, **kwargs):
+    if is_enabled():
+        delete_rows(THREAD_INDEX_TABLE, [instance.id])
+
+
+def index_post(sender, instance, **kwargs):
+    if not is_enabled():
+        return
+    text = None if instance.deleted else instance.text or ''
+    indexed = get_indexed_values(POST_INDEX_TABLE, ('text',), instance.id)
+    if text == (indexed and indexed[0]):
+        return
+    if text is None:
+        delete_rows(POST_INDEX_TABLE, [instance.id])
+    else:
+        write_rows(POST_INDEX_TABLE, ('text',), [(instance.id, text)])
+    if is_updated_on_save() and instance.thread_id \
+        and instance.post_type in ('question', 'answer'):
+        queue_thread_text_update(instance.thread_id)
+
+
+def unindex_post(sender, instance, **kwargs):
+    if not is_enabled():
+        return
+    delete_rows(POST_INDEX_TABLE, [instance.id])
+    if is_updated_on_save() and instance.thread_id \
+        and instance.post_type in ('question', 'answer'):
+        queue_thread_text_update(instance.thread_id)
+
+
+def index_user(sender, instance, **kwargs):
+    if not is_updated_on_save():
+        return
+    indexed = get_indexed_values(USER_INDEX_TABLE, ('username',), instance.id)
+    if indexed is None:
+        update_user_index([instance.id])
+    elif indexed[0] != instance.username:
+        cursor = connection.cursor()
+        cursor.execute(
+            'UPDATE %s SET username = %%s WHERE rowid = %%s' % USER_INDEX_TABLE,
+            [instance.username, instance.id]
+        )
+
+
+def index_localized_profile(sender, instance, **kwargs):
+    if is_updated_on_save():
+        update_user_index([instance.auth_user_id])
+
+
+def unindex_user(sender, instance, **kwargs):
+    if is_enabled():
+        delete_rows(USER_INDEX_TABLE, [instance.id])
@@ -91,6 +91,9 @@ TEMPLATES = (
 )
 
 MIDDLEWARE_CLASSES = (
+    ## Enable the following middleware to log the number of sql queries,
+    ## cache reads and template rendering time of each view
+    #'askbot.middleware.profiler.ViewProfileMiddleware',
     #'django.middleware.gzip.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -14,6 +14,7 @@ from jinja2.utils import open_if_exists
 from askbot.conf import settings as askbot_settings
 from askbot.skins import utils
 from askbot.utils.translation import get_language, HAS_ASKBOT_LOCALE_MIDDLEWARE
+from askbot.utils.profiling import render_timer
 
 from coffin import template
 template.add_to_builtins('askbot.templatetags.extra_filters_jinja')
@@ -203,13 +204,15 @@ def get_askbot_template(template):
 def render_into_skin_as_string(template, data, request):
     context = RequestContext(request, data)
     template = get_askbot_template(template)
-    return template.render(context)
+    with render_timer():
+        return template.render(context)
 
 def render_text_into_skin(text, data, request):
     context = RequestContext(request, data)
     skin = get_skin()
     template = skin.from_string(text)
-    return template.render(context)
+    with render_timer():
+        return template.render(context)
 
 class Loader(BaseLoader):
     """skins template loader for Django > 1.2
@@ -3,6 +3,7 @@ from django.core.exceptions import ImproperlyConfigured
 from django.template.backends.base import BaseEngine
 from askbot.skins.loaders import Loader, get_skin
 from askbot.utils.loading import load_module
+from askbot.utils.profiling import render_timer
 
 class AskbotSkinTemplates(BaseEngine):
 
@@ -83,4 +84,5 @@ class Template(object):
             context['request'] = request
             context = self.update_context(context, request)
 
-        return self.template.render(context)
+        with render_timer():
+            return self.template.render(context)
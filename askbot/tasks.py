@@ -22,6 +22,7 @@ import sys
 import traceback
 import uuid
 
+from django.conf import settings as django_settings
 from django.contrib.contenttypes.models import ContentType
 from django.template import Context
 from django.template.loader import get_template
@@ -30,9 +31,11 @@ from django.utils.translation import activate as activate_language
 import simplejson
 
 from celery.decorators import task
+from celery.signals import task_prerun
 from celery.utils.log import get_task_logger
 
 from askbot.conf import settings as askbot_settings
+from askbot.conf.settings_wrapper import check_settings_version
 from askbot import const
 from askbot import mail
 from askbot.mail.messages import (
@@ -50,12 +53,21 @@ from askbot.models import (
 )
 from askbot.models.user import get_invited_moderators
 from askbot.models.badges import award_badges_signal
-from askbot import exceptions as askbot_exceptions
+from askbot.models.visit_buffer import write_visits
+from askbot.models.vote_effects import apply_pending_vote_effects
+from askbot.models.reindex_queue import process_reindex_queue
+from askbot.utils.lists import batch_size
 from askbot.utils.twitter import Twitter
 
 
 logger = get_task_logger(__name__)
 
+#tasks see the settings changed since the worker started
+task_prerun.connect(
+    check_settings_version,
+    dispatch_uid='check_settings_version_on_task_start'
+)
+
 
 # TODO: Make exceptions raised inside record_post_update_celery_task() ...
 #       ... propagate upwards to test runner, if only CELERY_ALWAYS_EAGER = True
@@ -231,6 +243,28 @@ def record_question_visit(
         context_object=question_post)
 
 
+@task(ignore_result=True)
+def flush_visit_buffer(view_counts=None, user_visits=None):
+    """writes the question view counts and the user visit
+    times accumulated by the visit buffer"""
+    write_visits(view_counts=view_counts, user_visits=user_visits)
+
+
+@task(ignore_result=True)
+def apply_vote_effects(post_id):
+    """updates reputation, badges and caches after
+    the votes on the post, see :mod:`askbot.models.vote_effects`"""
+    apply_pending_vote_effects(post_id)
+
+
+@task(ignore_result=True)
+def process_search_reindex_queue():
+    """sends the threads and the users changed since the
+    previous run to the search index, see
+    :mod:`askbot.models.reindex_queue`"""
+    process_reindex_queue()
+
+
 @task()
 def send_instant_notifications_about_activity_in_post(
         activity_id=None, post_id=None, recipients=None):
@@ -269,23 +303,34 @@ def send_instant_notifications_about_activity_in_post(
     else:
         log_id = None
 
-    for user in recipients:
-        if user.is_blocked():
-            continue
+    activate_language(post.language_code)
 
-        activate_language(post.language_code)
+    #the alert is rendered once per content variant
+    #and copied for each recipient
+    email = InstantEmailAlert({
+        'from_user': update_activity.user,
+        'post': post,
+        'update_activity': update_activity
+    })
+    if not email.is_enabled():
+        return
 
-        email = InstantEmailAlert({
-            'to_user': user,
-            'from_user': update_activity.user,
-            'post': post,
-            'update_activity': update_activity
-        })
-        try:
-            email.send([user.email])
-        except askbot_exceptions.EmailNotSent as error:
-            logger.debug(
-                '%s, error=%s, logId=%s' % (user.email, error, log_id)
-            )
-        else:
-            logger.debug('success %s, logId=%s' % (user.email, log_id))
+    recipients = [user for user in recipients if not user.is_blocked()]
+    chunk_size = django_settings.ASKBOT_EMAIL_BATCH_SIZE
+    for chunk in batch_size(recipients, chunk_size):
+        messages = list()
+        for user in chunk:
+            try:
+                messages.append(email.build_recipient_message(user))
+            except Exception as error:
+                logger.debug(
+                    '%s, error=%s, logId=%s' % (user.email, error, log_id)
+                )
+
+        failed = set(mail.send_messages(messages))
+        for message in messages:
+            email_list = ','.join(message.to)
+            if message in failed:
+                logger.debug('failed %s, logId=%s' % (email_list, log_id))
+            else:
+                logger.debug('success %s, logId=%s' % (email_list, log_id))
@@ -0,0 +1,91 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from askbot import const
+from askbot import models
+from askbot.conf import settings
+from askbot.models.badge_evaluator import evaluate_badges
+from askbot.tests.utils import AskbotTestCase
+from askbot.tests.utils import with_settings
+
+
+class BadgeEvaluatorTests(AskbotTestCase):
+
+    def setUp(self):
+        self.u1 = self.create_user(username='user1')
+        self.u2 = self.create_user(username='user2')
+        self.u3 = self.create_user(username='user3')
+
+    def set_points(self, post, points):
+        models.Post.objects.filter(id=post.id).update(points=points)
+
+    def get_award_count(self, badge_key, user):
+        return models.Award.objects.filter(badge__slug=badge_key, user=user).count()
+
+    def test_quality_post_awarded_in_bulk(self):
+        question = self.post_question(user=self.u1)
+        answer = self.post_answer(user=self.u2, question=question)
+        self.set_points(answer, settings.NICE_ANSWER_BADGE_MIN_UPVOTES)
+
+        result = evaluate_badges(['nice-answer'])
+        self.assertEqual(result['awards'], {'nice-answer': 1})
+
+        award = models.Award.objects.get(badge__slug='nice-answer')
+        self.assertEqual(award.user, self.u2)
+        self.assertEqual(award.content_object, answer)
+        self.assertEqual(models.BadgeData.objects.get(slug='nice-answer').awarded_count, 1)
+        self.assertEqual(models.UserProfile.objects.get(pk=self.u2.id).bronze, 1)
+
+        activity = models.Activity.objects.get(
+                            activity_type=const.TYPE_ACTIVITY_PRIZE,
+                            object_id=award.id
+                        )
+        self.assertEqual(list(activity.recipients.all()), [self.u2])
+
+        #second run finds nothing new
+        result = evaluate_badges(['nice-answer'])
+        self.assertEqual(result['awards'], {'nice-answer': 0})
+        self.assertEqual(self.get_award_count('nice-answer', self.u2), 1)
+
+    def test_single_badge_awarded_once(self):
+        for title in ('first question', 'second question'):
+            question = self.post_question(user=self.u1, title=title)
+            self.set_points(question, 1)
+        evaluate_badges(['student'])
+        self.assertEqual(self.get_award_count('student', self.u1), 1)
+
+    @with_settings(CIVIC_DUTY_BADGE_MIN_VOTES=2, COMMENTATOR_BADGE_MIN_COMMENTS=2)
+    def test_civic_duty_and_commentator(self):
+        with override_settings(ASKBOT_PERIODIC_BADGES=('civic-duty', 'commentator')):
+            question = self.post_question(user=self.u1)
+            answer = self.post_answer(user=self.u2, question=question)
+            self.u3.upvote(question)
+            self.u3.downvote(answer)
+            self.post_comment(user=self.u1, parent_post=answer)
+            self.post_comment(user=self.u1, parent_post=answer)
+            #not awarded on the request path
+            self.assertEqual(self.get_award_count('civic-duty', self.u3), 0)
+            self.assertEqual(self.get_award_count('commentator', self.u1), 0)
+
+            evaluate_badges(['civic-duty', 'commentator'])
+        self.assertEqual(self.get_award_count('civic-duty', self.u3), 1)
+        self.assertEqual(self.get_award_count('commentator', self.u1), 1)
+        self.assertEqual(self.get_award_count('civic-duty', self.u2), 0)
+
+    def test_command(self):
+        question = self.post_question(user=self.u1)
+        self.set_points(question, settings.NICE_QUESTION_BADGE_MIN_UPVOTES)
+        output = StringIO()
+        call_command('askbot_award_badges', badges='nice-question', stdout=output)
+        self.assertIn('nice-question: 1', output.getvalue())
+        self.assertIn('awards per second', output.getvalue())
+        self.assertEqual(self.get_award_count('nice-question', self.u1), 1)
+
+    def test_command_rejects_unsupported_badges(self):
+        for badge_key in ('no-such-badge', 'editor'):
+            self.assertRaises(
+                CommandError,
+                call_command, 'askbot_award_badges', badges=badge_key, stdout=StringIO()
+            )
@@ -0,0 +1,118 @@
+import random
+
+from django.db.models import Count, F
+
+from askbot import models
+from askbot.benchmarks.generator import ForumGenerator, ZipfSampler
+from askbot.benchmarks.runner import BenchmarkRunner
+from askbot.benchmarks.runner import compare_reports
+from askbot.benchmarks.runner import summarize
+from askbot.tests.utils import AskbotTestCase
+
+
+def generate_forum(username_prefix='bench', seed=1):
+    generator = ForumGenerator(
+        users=20, questions=10, answers=25, comments=15, votes=60,
+        tags=8, seed=seed, batch_size=7, username_prefix=username_prefix
+    )
+    generator.generate()
+    return generator
+
+
+class ZipfSamplerTests(AskbotTestCase):
+
+    def test_first_items_are_drawn_more_often(self):
+        sampler = ZipfSampler(['a', 'b', 'c', 'd'], 1.5, random.Random(1))
+        draws = [sampler.sample() for _ in range(1000)]
+        self.assertTrue(draws.count('a') > draws.count('b') > draws.count('d'))
+
+    def test_sample_distinct(self):
+        sampler = ZipfSampler(range(5), 2.0, random.Random(1))
+        items = sampler.sample_distinct(10, exclude=set([0]))
+        self.assertEqual(sorted(items), [1, 2, 3, 4])
+
+
+class ForumGeneratorTests(AskbotTestCase):
+
+    def test_counts(self):
+        counts = generate_forum().counts
+        self.assertEqual(counts['users'], 20)
+        self.assertEqual(counts['tags'], 8)
+        self.assertEqual(models.Thread.objects.count(), 10)
+        self.assertEqual(models.Post.objects.get_questions().count(), 10)
+        self.assertEqual(models.Post.objects.get_answers().count(), 25)
+        self.assertEqual(models.Post.objects.get_comments().count(), 15)
+        self.assertEqual(models.Vote.objects.count(), counts['votes'])
+        self.assertEqual(models.UserProfile.objects.filter(
+                                auth_user_ptr__username__startswith='bench_'
+                            ).count(), 20)
+
+    def test_counters_match_rows(self):
+        generate_forum()
+        for thread in models.Thread.objects.annotate(tag_count=Count('tags')):
+            self.assertEqual(thread.answer_count, thread.posts.get_answers().count())
+            self.assertEqual(thread.tag_count, len(thread.tagnames.split()))
+            self.assertEqual(thread.points, thread._question_post().points)
+        for post in models.Post.objects.all():
+            self.assertEqual(post.comment_count, post.comments.count())
+            self.assertEqual(
+                post.points,
+                post.votes.filter(vote=1).count() - post.votes.filter(vote=-1).count()
+            )
+            self.assertEqual(post.current_revision.post_id, post.id)
+        for tag in models.Tag.objects.all():
+            self.assertEqual(tag.used_count, tag.threads.count())
+        self.assertFalse(models.Vote.objects.filter(user=F('voted_post__author')).exists())
+
+    def test_same_seed_makes_same_forum(self):
+        generate_forum(username_prefix='one')
+        generate_forum(username_prefix='two')
+        threads = list(models.Thread.objects.order_by('id'))
+        first_titles = [thread.title for thread in threads[:10]]
+        second_titles = [thread.title for thread in threads[10:]]
+        self.assertEqual(first_titles, second_titles)
+
+    def test_existing_prefix_is_refused(self):
+        generate_forum()
+        self.assertRaises(ValueError, generate_forum)
+
+    def test_new_objects_get_new_ids(self):
+        generate_forum()
+        user = self.create_user('newcomer')
+        self.post_question(user=user)
+        self.assertEqual(models.Thread.objects.count(), 11)
+
+
+class BenchmarkRunnerTests(AskbotTestCase):
+
+    def test_report(self):
+        generate_forum()
+        answer_count = models.Post.objects.get_answers().count()
+        report = BenchmarkRunner(runs=2).run()
+        self.assertEqual(report['forum']['questions'], 10)
+        for name, data in report['scenarios'].items():
+            self.assertTrue(data['min_ms'] <= data['median_ms'] <= data['max_ms'])
+            self.assertTrue(data['queries'] > 0, name)
+        self.assertEqual(report['scenarios']['email_alerts']['runs'], 1)
+        self.assertEqual(report['scenarios']['vote']['runs'], 2)
+        #writes are rolled back
+        self.assertEqual(models.Post.objects.get_answers().count(), answer_count)
+
+    def test_summarize(self):
+        data = summarize([0.004, 0.001, 0.002, 0.003], [5, 7, 6, 5])
+        self.assertEqual(data['median_ms'], 2.5)
+        self.assertEqual(data['min_ms'], 1)
+        self.assertEqual(data['max_ms'], 4)
+        self.assertEqual(data['p95_ms'], 4)
+        self.assertEqual(data['queries'], 7)
+
+    def test_compare_reports(self):
+        baseline = {'scenarios': {'vote': {'median_ms': 10.0}, 'question_view': {'median_ms': 20.0}}}
+        report = {'scenarios': {
+                        'vote': {'median_ms': 13.0},
+                        'question_view': {'median_ms': 21.0},
+                        'badge_award': {'median_ms': 5.0}
+                    }}
+        results = compare_reports(report, baseline, threshold=1.2)
+        regressions = dict([(item['scenario'], item['regression']) for item in results])
+        self.assertEqual(regressions, {'vote': True, 'question_view': False})
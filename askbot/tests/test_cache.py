@@ -1,6 +1,11 @@
 from django.db import connection
+from django.core import cache
+from django.core.cache.backends.locmem import LocMemCache
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from mock import patch
+from askbot.conf import settings as askbot_settings
+from askbot.models import Thread
 from askbot.tests.utils import AskbotTestCase
 
 
@@ -27,3 +32,62 @@ class CacheTests(AskbotTestCase):
         self.assertTrue(before_count > after_count,
                 ('Expected fewer queries after calling visit_question. ' +
                  'Before visit: %d. After visit: %d.') % (before_count, after_count))
+
+
+class PostDataCacheTests(AskbotTestCase):
+    def setUp(self):
+        self.old_cache = cache.cache
+        #default test cache culls entries too early
+        cache.cache = LocMemCache('', {'OPTIONS':{'MAX_ENTRIES': 1000000}})
+        self.author = self.create_user('author')
+        self.viewer1 = self.create_user('viewer1')
+        self.viewer2 = self.create_user('viewer2')
+        self.question = self.post_question(user=self.author)
+        self.post_answer(user=self.author, question=self.question)
+
+    def tearDown(self):
+        cache.cache = self.old_cache
+
+    def get_post_data_calls(self, user):
+        thread = Thread.objects.get(id=self.question.thread_id)
+        with patch.object(Thread, 'get_post_data', autospec=True,
+                          side_effect=Thread.get_post_data) as get_post_data:
+            thread.get_cached_post_data(user=user)
+            return get_post_data.call_count
+
+    @patch.object(askbot_settings, 'GROUPS_ENABLED', True)
+    def test_users_with_same_groups_share_cached_data(self):
+        thread = self.question.thread
+        signature = thread.get_group_signature(self.viewer1)
+        self.assertNotEqual(signature, 'public')
+        self.assertEqual(signature, thread.get_group_signature(self.viewer2))
+        self.assertEqual(self.get_post_data_calls(self.viewer1), 1)
+        self.assertEqual(self.get_post_data_calls(self.viewer2), 0)
+
+    @patch.object(askbot_settings, 'GROUPS_ENABLED', True)
+    def test_invalidation_evicts_all_signatures(self):
+        self.get_post_data_calls(self.author)
+        self.get_post_data_calls(self.viewer1)
+        self.question.thread.invalidate_cached_post_data()
+        self.assertEqual(self.get_post_data_calls(self.author), 1)
+        self.assertEqual(self.get_post_data_calls(self.viewer1), 1)
+
+    @patch.object(askbot_settings, 'GROUPS_ENABLED', True)
+    def test_users_with_different_groups_do_not_share_cached_data(self):
+        group = self.create_group()
+        self.viewer1.join_group(group, force=True)
+        self.question.add_to_groups([group])
+        thread = self.question.thread
+        self.assertNotEqual(
+            thread.get_group_signature(self.viewer1),
+            thread.get_group_signature(self.viewer2)
+        )
+        self.assertEqual(self.get_post_data_calls(self.viewer1), 1)
+        self.assertEqual(self.get_post_data_calls(self.viewer2), 1)
+        self.assertEqual(self.get_post_data_calls(self.viewer1), 0)
+
+    @patch.object(askbot_settings, 'GROUPS_ENABLED', False)
+    def test_all_users_share_cached_data_without_groups(self):
+        self.assertEqual(self.get_post_data_calls(self.viewer1), 1)
+        self.assertEqual(self.get_post_data_calls(self.author), 0)
+        self.assertEqual(self.get_post_data_calls(None), 0)
@@ -1,20 +1,35 @@
+import asyncore
 import bs4
 import copy
 import datetime
 import functools
+import re
+import smtpd
+import threading
 import time
+from StringIO import StringIO
 from django.conf import settings as django_settings
+from django.core import cache
 from django.core import management
+from django.core.cache.backends.locmem import LocMemCache
 from django.core import serializers
 import django.core.mail
+import django.core.mail.backends.locmem
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
 from django.utils import translation, timezone
+from mock import patch
 from askbot.tests import utils
 from askbot.tests.utils import with_settings
 from askbot import models
 from askbot import mail
+from askbot.mail.digest import DigestBuilder
+from askbot.mail.messages import InstantEmailAlert
+from askbot.management.base import EmailReport
 from askbot.conf import settings as askbot_settings
 from askbot import const
 from askbot.models.question import Thread
@@ -807,6 +822,46 @@ class TagFollowedInstantWholeForumEmailAlertTests(utils.AskbotTestCase):
             self.user1.email in outbox[0].recipients()
         )
 
+    @with_settings(USE_WILDCARD_TAGS=True)
+    def test_ignored_wildcard_excludes_subscriber(self):
+        self.user1.email_tag_filter_strategy = const.EXCLUDE_IGNORED
+        self.user1.save()
+        self.user1.mark_tags(
+            wildcards = ('some*',),
+            reason = 'bad',
+            action = 'add'
+        )
+        self.post_question(user = self.user2, tags = 'something')
+        self.assertEqual(len(django.core.mail.outbox), 0)
+        self.post_question(user = self.user2, tags = 'other')
+        self.assertEqual(len(django.core.mail.outbox), 1)
+
+    def test_wildcard_prefixes_follow_tag_selections(self):
+        self.user1.mark_tags(
+            wildcards = ('some*', 'other*'),
+            reason = 'good',
+            action = 'add'
+        )
+        self.user1.mark_tags(
+            wildcards = ('some*',),
+            reason = 'bad',
+            action = 'add'
+        )
+        prefixes = models.WildcardTagPrefix.objects.filter(user=self.user1)
+        self.assertEqual(
+            set(prefixes.values_list('prefix', 'reason')),
+            set([('other', 'good'), ('some', 'bad')])
+        )
+        subscriber_ids = models.WildcardTagPrefix.objects.get_subscriber_ids(
+                                                ['something'], 'bad'
+                                            )
+        self.assertEqual(
+            [row['user_id'] for row in subscriber_ids], [self.user1.id]
+        )
+        models.WildcardTagPrefix.objects.all().delete()
+        models.WildcardTagPrefix.objects.rebuild()
+        self.assertEqual(prefixes.count(), 2)
+
     @with_settings(SUBSCRIBED_TAG_SELECTOR_ENABLED=False)
     def test_tag_based_subscription_on_new_question_works1(self):
         """someone subscribes for an pre-existing tag
@@ -1148,3 +1203,325 @@ class MailMessagesTests(utils.AskbotTestCase):
                             'footer_code': 'nothing'
                         }).render_body()
         self.assertTrue(user.username in message)
+
+
+class DigestBuilderTests(utils.AskbotTestCase):
+    """tests for the set-based builder of the batch email alerts"""
+
+    def setUp(self):
+        self.old_cache = cache.cache
+        #default test cache culls entries too early
+        cache.cache = LocMemCache('', {'OPTIONS':{'MAX_ENTRIES': 1000000}})
+        self.setup_timestamp = timezone.now() - datetime.timedelta(14)
+        self.author = self.create_user(
+                                'author',
+                                date_joined=self.setup_timestamp
+                            )
+        self.schedule = copy.deepcopy(models.EmailFeedSetting.NO_EMAIL_SCHEDULE)
+        self.schedule['q_all'] = 'w'
+        self.subscribers = list()
+        self.question = self.post_question(
+                                user=self.author,
+                                timestamp=self.setup_timestamp
+                            )
+
+    def tearDown(self):
+        cache.cache = self.old_cache
+
+    def add_subscribers(self, count):
+        for i in range(count):
+            user = self.create_user(
+                        'subscriber%d' % len(self.subscribers),
+                        notification_schedule=self.schedule,
+                        date_joined=self.setup_timestamp
+                    )
+            self.subscribers.append(user)
+
+    def get_users(self, users):
+        return list(models.User.objects.filter(id__in=[user.id for user in users]))
+
+    def get_build_query_count(self, users):
+        with CaptureQueriesContext(connection) as queries:
+            digests = DigestBuilder(self.get_users(users)).build()
+        self.assertEqual(len(digests), len(users))
+        return len(queries.captured_queries)
+
+    def test_query_count_does_not_depend_on_user_count(self):
+        self.add_subscribers(6)
+        DigestBuilder(self.get_users(self.subscribers)).build()#warm up
+        count = self.get_build_query_count(self.subscribers[:2])
+        self.assertEqual(self.get_build_query_count(self.subscribers), count)
+
+    def test_digest_is_sent_once(self):
+        self.add_subscribers(3)
+        management.call_command('send_email_alerts', chunk_size=2)
+        outbox = django.core.mail.outbox
+        recipients = set([message.recipients()[0] for message in outbox])
+        self.assertEqual(recipients, set([user.email for user in self.subscribers]))
+        management.call_command('send_email_alerts', chunk_size=2)
+        self.assertEqual(len(django.core.mail.outbox), 3)
+
+    def test_start_user_id(self):
+        self.add_subscribers(3)
+        start_user_id = self.subscribers[1].id
+        management.call_command('send_email_alerts', start_user_id=start_user_id)
+        recipients = [message.recipients()[0] for message in django.core.mail.outbox]
+        self.assertEqual(
+            sorted(recipients),
+            sorted([user.email for user in self.subscribers[1:]])
+        )
+
+    @patch('askbot.mail.digest.FIRST_REPORT_QUESTIONS_LIMIT', 1)
+    def test_first_report_questions_are_limited(self):
+        self.add_subscribers(1)
+        latest_question = self.post_question(
+                                user=self.author,
+                                timestamp=self.setup_timestamp + datetime.timedelta(1)
+                            )
+        builder = DigestBuilder(self.get_users(self.subscribers))
+        builder.build()
+        self.assertEqual(builder.questions, [latest_question])
+
+
+class InProcessPool(object):
+    """replaces the process pool in tests,
+    because the workers can't see the test database"""
+    def __init__(self, processes):
+        self.processes = processes
+
+    def map(self, func, items):
+        return [func(item) for item in items]
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+@patch('askbot.management.base.multiprocessing.Pool', InProcessPool)
+class EmailWorkerPoolTests(utils.AskbotTestCase):
+
+    def setUp(self):
+        self.old_cache = cache.cache
+        #default test cache culls entries too early
+        cache.cache = LocMemCache('', {'OPTIONS':{'MAX_ENTRIES': 1000000}})
+        timestamp = timezone.now() - datetime.timedelta(14)
+        schedule = copy.deepcopy(models.EmailFeedSetting.NO_EMAIL_SCHEDULE)
+        schedule['q_all'] = 'w'
+        self.author = self.create_user('author', date_joined=timestamp)
+        self.subscribers = [
+            self.create_user(
+                'subscriber%d' % i,
+                notification_schedule=schedule,
+                date_joined=timestamp
+            ) for i in range(3)
+        ]
+        self.post_question(user=self.author, timestamp=timestamp)
+
+    def tearDown(self):
+        cache.cache = self.old_cache
+
+    def test_report_merge(self):
+        report = EmailReport()
+        report.sent = 2
+        other = EmailReport()
+        other.sent = 1
+        other.failed = 1
+        other.skipped = 3
+        report.merge(other)
+        self.assertEqual(unicode(report), u'sent 3, failed 1, skipped 3')
+
+    def test_emails_are_sent_by_workers(self):
+        stdout = StringIO()
+        management.call_command(
+                        'send_email_alerts',
+                        workers=2,
+                        verbosity=2,
+                        stdout=stdout
+                    )
+        recipients = set([message.recipients()[0] for message in django.core.mail.outbox])
+        self.assertEqual(recipients, set([user.email for user in self.subscribers]))
+        #author has no feeds, so is skipped
+        self.assertTrue('sent 3, failed 0, skipped 1' in stdout.getvalue())
+
+    def test_failed_emails_are_counted(self):
+        stdout = StringIO()
+        with patch(
+                'django.core.mail.backends.locmem.EmailBackend.send_messages',
+                side_effect=IOError
+            ):
+            management.call_command(
+                            'send_email_alerts',
+                            workers=2,
+                            verbosity=2,
+                            stdout=stdout
+                        )
+        self.assertTrue('sent 0, failed 3, skipped 1' in stdout.getvalue())
+
+    @patch('askbot.management.base.USER_CHUNK_SIZE', 2)
+    def test_users_are_loaded_in_chunks(self):
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            management.call_command('send_email_alerts', verbosity=2, stdout=stdout)
+        self.assertTrue('sent 3, failed 0, skipped 1' in stdout.getvalue())
+        #the ids of 4 users are never loaded with a single query
+        id_lists = list()
+        for query in queries.captured_queries:
+            id_lists.extend(re.findall(r'"user_id" IN \(([^)]*)\)', query['sql']))
+        self.assertTrue(id_lists)
+        for id_list in id_lists:
+            self.assertTrue(len(id_list.split(',')) <= 2)
+
+
+class CountingEmailBackend(django.core.mail.backends.locmem.EmailBackend):
+    """keeps the number of opened connections"""
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+
+
+class StubSMTPServer(smtpd.SMTPServer):
+    """local smtp server, which counts the connections
+    and keeps the recipients of the received messages"""
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.recipients = list()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.serve)
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        self.recipients.extend(rcpttos)
+
+    def serve(self):
+        while not self.stopped.is_set():
+            asyncore.loop(timeout=0.05, count=1)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        asyncore.close_all()
+
+
+class SendMessagesTests(utils.AskbotTestCase):
+
+    def setUp(self):
+        django.core.mail.outbox = list()
+        CountingEmailBackend.opened = 0
+
+    def build_messages(self, count):
+        return [
+            mail.prepare_message(
+                subject_line='hello',
+                body_text='<p>hello</p>',
+                recipient_list=['user%d@example.com' % number]
+            )
+            for number in range(count)
+        ]
+
+    def test_connection_is_reopened_after_batch(self):
+        with self.settings(
+                    EMAIL_BACKEND='askbot.tests.test_email_alerts.CountingEmailBackend',
+                    ASKBOT_EMAIL_BATCH_SIZE=2
+                ):
+            failed = mail.send_messages(self.build_messages(5))
+        self.assertEqual(failed, [])
+        self.assertEqual(len(django.core.mail.outbox), 5)
+        self.assertEqual(CountingEmailBackend.opened, 3)
+
+    def test_failed_message_is_retried(self):
+        backend = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        with patch(backend, side_effect=[IOError, 1, 1]) as send:
+            failed = mail.send_messages(self.build_messages(2))
+        self.assertEqual(failed, [])
+        self.assertEqual(send.call_count, 3)
+
+    @override_settings(ASKBOT_EMAIL_SEND_RETRIES=1)
+    def test_failed_messages_are_returned(self):
+        messages = self.build_messages(2)
+        backend = 'django.core.mail.backends.locmem.EmailBackend.send_messages'
+        with patch(backend, side_effect=IOError) as send:
+            failed = mail.send_messages(messages)
+        self.assertEqual(failed, messages)
+        self.assertEqual(send.call_count, 4)
+
+    def test_messages_are_sent_over_smtp(self):
+        server = StubSMTPServer()
+        server.start()
+        try:
+            with self.settings(
+                        EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                        EMAIL_HOST='127.0.0.1',
+                        EMAIL_PORT=server.port,
+                        EMAIL_HOST_USER='',
+                        EMAIL_HOST_PASSWORD='',
+                        EMAIL_USE_TLS=False,
+                        EMAIL_USE_SSL=False,
+                        ASKBOT_EMAIL_BATCH_SIZE=10
+                    ):
+                failed = mail.send_messages(self.build_messages(20))
+        finally:
+            server.stop()
+        self.assertEqual(failed, [])
+        self.assertEqual(len(server.recipients), 20)
+        self.assertEqual(server.connections, 2)
+
+
+class InstantAlertFanOutTests(utils.AskbotTestCase):
+
+    def setUp(self):
+        self.author = self.create_user('author')
+        self.question = self.post_question(user=self.author)
+        self.activity = models.Activity.objects.get(
+                            question=self.question,
+                            activity_type=const.TYPE_ACTIVITY_ASK_QUESTION
+                        )
+        self.recipients = [
+            self.create_user('recipient%d' % number) for number in range(3)
+        ]
+
+    def make_alert(self, to_user=None):
+        context = {
+            'from_user': self.author,
+            'post': self.question,
+            'update_activity': self.activity
+        }
+        if to_user:
+            context['to_user'] = to_user
+        return InstantEmailAlert(context)
+
+    def test_alert_is_rendered_once_for_many_recipients(self):
+        alert = self.make_alert()
+        with patch.object(
+                InstantEmailAlert, 'render_body',
+                autospec=True, side_effect=InstantEmailAlert.render_body
+            ) as render_body:
+            messages = [
+                alert.build_recipient_message(user) for user in self.recipients
+            ]
+        self.assertEqual(render_body.call_count, 1)
+        self.assertEqual(
+            [message.to for message in messages],
+            [[user.email] for user in self.recipients]
+        )
+
+    def test_copies_match_individual_alerts(self):
+        alert = self.make_alert()
+        for user in self.recipients + [self.author]:
+            message = alert.build_recipient_message(user)
+            expected = self.make_alert(to_user=user).build_message([user.email])
+            self.assertEqual(message.subject, expected.subject)
+            self.assertEqual(message.body, expected.body)
+            self.assertEqual(message.alternatives, expected.alternatives)
+            self.assertTrue(user.get_unsubscribe_url() in message.body)
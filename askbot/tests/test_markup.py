@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 from django.conf import settings as django_settings
+from django.core import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils.six import StringIO
+from mock import patch
+from askbot.conf import settings as askbot_settings
 from askbot.utils.markup import markdown_input_converter
 from askbot.tests.utils import AskbotTestCase
+from askbot.tests.utils import with_settings
 from askbot.utils import markup
 
 class MarkupTest(AskbotTestCase):
@@ -131,3 +137,63 @@ replace that <a href="http://example.com">example.com</a>
         """<a href="http://example.com"><div>http://example.com</div></a>
         """
         self.assertHTMLEqual(self.conv(text), expected)
+
+
+class RenderedHtmlCacheTests(AskbotTestCase):
+
+    def setUp(self):
+        markup.rendered_html_cache.clear()
+        markup.reset_cached_parser()
+        self.converter_path = 'askbot.utils.markup.markdown_input_converter'
+
+    def tearDown(self):
+        markup.rendered_html_cache.clear()
+        markup.reset_cached_parser()
+
+    def test_parser_is_reused(self):
+        self.assertTrue(markup.get_cached_parser() is markup.get_cached_parser())
+
+    def test_parser_is_rebuilt_after_settings_change(self):
+        parser = markup.get_cached_parser()
+        with_settings(MARKUP_CODE_FRIENDLY=not askbot_settings.MARKUP_CODE_FRIENDLY)(
+            lambda: self.assertFalse(markup.get_cached_parser() is parser)
+        )()
+
+    def test_html_is_converted_once(self):
+        with patch('askbot.utils.markup.markdown_input_converter') as converter:
+            converter.return_value = '<p>text</p>'
+            html1 = markup.convert_text_cached(self.converter_path, 'text')
+            html2 = markup.convert_text_cached(self.converter_path, 'text')
+        self.assertEqual(converter.call_count, 1)
+        self.assertEqual(html1, '<p>text</p>')
+        self.assertEqual(html2, '<p>text</p>')
+
+    def test_html_is_read_from_shared_cache(self):
+        html = markup.convert_text_cached(self.converter_path, 'text')
+        markup.rendered_html_cache.clear()
+        with patch('askbot.utils.markup.markdown_input_converter') as converter:
+            self.assertEqual(markup.convert_text_cached(self.converter_path, 'text'), html)
+        self.assertFalse(converter.called)
+
+    def test_settings_change_invalidates_html(self):
+        text = 'text with _underscores_'
+        html = markup.convert_text_cached(self.converter_path, text)
+        code_friendly = not askbot_settings.MARKUP_CODE_FRIENDLY
+        convert = with_settings(MARKUP_CODE_FRIENDLY=code_friendly)(
+            lambda: markup.convert_text_cached(self.converter_path, text)
+        )
+        self.assertNotEqual(convert(), html)
+
+    def test_memory_cache_is_bounded(self):
+        with self.settings(ASKBOT_RENDERED_HTML_CACHE_SIZE=2):
+            for text in ('one', 'two', 'three'):
+                markup.convert_text_cached(self.converter_path, text)
+        self.assertEqual(len(markup.rendered_html_cache.items), 2)
+
+    def test_benchmark_keeps_other_cache_entries(self):
+        self.post_question(user=self.create_user('user'), body_text='benchmarked text')
+        cache.cache.set('unrelated-key', 'value')
+        output = StringIO()
+        call_command('askbot_benchmark_markup', stdout=output)
+        self.assertIn('Converted', output.getvalue())
+        self.assertEqual(cache.cache.get('unrelated-key'), 'value')
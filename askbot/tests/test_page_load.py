@@ -3,24 +3,38 @@ from askbot.search.state_manager import SearchState
 from django.test import signals
 from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.test.utils import modify_settings
+from django.test.utils import override_settings
 from django.core import management
 from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
 from django.core import cache
+from django.http import HttpResponse
+from django.test.client import RequestFactory
 import simplejson
+import keyedcache
 from django.utils.translation import activate as activate_language
 
 import coffin
 import coffin.template
 from bs4 import BeautifulSoup
+from mock import patch
 
 import askbot
+from askbot import const
 from askbot import models
+from askbot.middleware.profiler import ViewProfileMiddleware
 from askbot.utils.slug import slugify
 from askbot.deployment import package_utils
 from askbot.tests.utils import AskbotTestCase
 from askbot.conf import settings as askbot_settings
+from askbot.conf.settings_wrapper import get_bulk_cache_key
+from askbot.conf.settings_wrapper import settings_snapshot
 from askbot.tests.utils import skipIf
 from askbot.tests.utils import with_settings
+from askbot.utils.profiling import QueryBudgetExceeded
+from askbot.utils.profiling import ViewProfile
+from askbot.utils.profiling import get_active_profiles
 
 
 def patch_jinja2():
@@ -42,6 +56,27 @@ if CMAJOR == 0 and CMINOR == 3 and CMICRO < 4:
     patch_jinja2()
 
 
+#max numbers of sql queries run by the views in ViewQueryBudgetTests,
+#the measured counts with a few queries to spare, so that
+#a view running a query per listed item fails the test
+QUERY_BUDGETS = {
+    'askbot.feed.RssLastestQuestionsFeed': 30,
+    'askbot.views.commands.api_get_questions': 19,
+    'askbot.views.commands.vote': 8,
+    'askbot.views.commands.load_object_description': 10,
+    'askbot.views.meta.about': 12,
+    'askbot.views.meta.badges': 11,
+    'askbot.views.readers.question': 46,
+    'askbot.views.readers.questions': 65,
+    'askbot.views.readers.revisions': 18,
+    'askbot.views.users.edit_user': 18,
+    'askbot.views.users.show_users': 12,
+    'askbot.views.users.user_network': 14,
+    'askbot.views.users.user_stats': 57,
+    'askbot.views.writers.ask': 25,
+}
+
+
 class PageLoadTestCase(AskbotTestCase):
 
     serialized_rollback = True
@@ -818,3 +853,168 @@ class UserProfilePageTests(AskbotTestCase):
         response = self.client.get(url, data={'sort':'network'})
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.templates[0].name, 'user_profile/user_network.html')
+
+
+@override_settings(ASKBOT_QUERY_BUDGET_STRICT=True)
+@modify_settings(MIDDLEWARE_CLASSES={'prepend': 'askbot.middleware.profiler.ViewProfileMiddleware'})
+class QueryBudgetTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user('user')
+        for number in range(3):
+            self.post_question(user=self.user, title='question %d' % number)
+
+    def test_profile_counts_repeated_queries(self):
+        with ViewProfile() as profile:
+            for question in models.Post.objects.filter(post_type='question'):
+                question.thread.title
+        duplicates = profile.get_duplicate_queries()
+        self.assertEqual(profile.query_count, 4)
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0][1], 3)
+
+    def test_profile_counts_cache_reads(self):
+        cache.cache.set('key1', 'value')
+        with ViewProfile() as profile:
+            cache.cache.get('key1')
+            cache.cache.get('key2')
+            cache.cache.get_many(['key1', 'key2', 'key3'])
+        self.assertEqual(profile.cache_hits, 2)
+        self.assertEqual(profile.cache_misses, 3)
+
+    def test_view_over_budget_fails(self):
+        budgets = {'askbot.views.readers.questions': 1}
+        with self.settings(ASKBOT_QUERY_BUDGETS=budgets):
+            self.assertRaises(
+                QueryBudgetExceeded,
+                self.client.get, reverse('questions')
+            )
+
+    def test_exception_removes_profile(self):
+        middleware = ViewProfileMiddleware()
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        self.assertEqual(len(get_active_profiles()), 1)
+        middleware.process_exception(request, ValueError())
+        self.assertEqual(get_active_profiles(), [])
+
+    def test_stale_profile_is_removed(self):
+        middleware = ViewProfileMiddleware()
+        middleware.process_request(RequestFactory().get('/'))
+        #the next request in the thread
+        request = RequestFactory().get('/')
+        middleware.process_request(request)
+        self.assertEqual(get_active_profiles(), [request._askbot_view_profile])
+        middleware.process_response(request, HttpResponse())
+        self.assertEqual(get_active_profiles(), [])
+
+    @override_settings(DEBUG=True)
+    def test_debug_mode_adds_headers(self):
+        response = self.client.get(reverse('questions'))
+        self.assertTrue(int(response['X-Askbot-Queries']) > 0)
+        self.assertTrue('X-Askbot-Template-Time' in response)
+
+
+@override_settings(ASKBOT_QUERY_BUDGETS=QUERY_BUDGETS, ASKBOT_QUERY_BUDGET_STRICT=True)
+@modify_settings(MIDDLEWARE_CLASSES={'prepend': 'askbot.middleware.profiler.ViewProfileMiddleware'})
+class ViewQueryBudgetTests(AskbotTestCase):
+    """loads the views with the budgets of the queries enforced,
+    the views exceeding their budgets fail the tests"""
+
+    def setUp(self):
+        self.old_cache = cache.cache
+        cache.cache = DummyCache('', {})
+        #all settings are cached, as on a running site, in a cache
+        #of their own, so that the other tests do not change the counts
+        settings_cache = LocMemCache('query-budgets', {'OPTIONS': {'MAX_ENTRIES': 1000000}})
+        settings_cache.clear()
+        settings_cache_patch = patch.object(keyedcache, 'cache', settings_cache)
+        settings_cache_patch.start()
+        self.addCleanup(settings_cache_patch.stop)
+        settings_snapshot.reset()
+        askbot_settings.prime_cache(get_bulk_cache_key())
+
+        self.user = self.create_user('user')
+        self.answerers = [self.create_user('answerer%d' % number) for number in range(3)]
+        for number in range(10):
+            self.question = self.post_question(
+                                user=self.user,
+                                title='question %d' % number,
+                                tags='common tag%d' % number
+                            )
+        for answerer in self.answerers:
+            answer = self.post_answer(user=answerer, question=self.question)
+            self.post_comment(user=self.user, parent_post=answer)
+        self.answerers[0].upvote(self.question)
+
+    def tearDown(self):
+        cache.cache = self.old_cache
+
+    def get(self, url, data=None):
+        response = self.client.get(url, data=data or {})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_user_url(self):
+        return reverse(
+                'user_profile',
+                kwargs={'id': self.user.id, 'slug': slugify(self.user.username)}
+            )
+
+    def test_latest_questions_feed(self):
+        self.get(reverse('latest_questions_feed'))
+
+    def test_api_get_questions(self):
+        self.get(reverse('api_get_questions'), {'query_text': 'question'})
+
+    def test_load_object_description(self):
+        group = models.Group(name='somegroup')
+        group.description = models.Post.objects.create_new_tag_wiki(
+                                                author=self.user, text='some text'
+                                            )
+        group.save()
+        self.get(
+            reverse('load_object_description'),
+            {'object_id': group.id, 'model_name': 'Group'}
+        )
+
+    def test_about(self):
+        self.get(reverse('about'))
+
+    def test_badges(self):
+        self.get(reverse('badges'))
+
+    def test_question(self):
+        self.get(self.question.get_absolute_url())
+
+    def test_questions(self):
+        self.get(reverse('questions'))
+
+    def test_revisions(self):
+        self.get(reverse('question_revisions', kwargs={'id': self.question.id}))
+
+    def test_edit_user(self):
+        self.client.login(method='force', user_id=self.user.id)
+        self.get(reverse('edit_user', kwargs={'id': self.user.id}))
+
+    def test_show_users(self):
+        self.get(reverse('users'))
+
+    def test_user_network(self):
+        self.get(self.get_user_url(), {'sort': 'network'})
+
+    def test_user_stats(self):
+        self.get(self.get_user_url())
+
+    def test_ask(self):
+        self.client.login(method='force', user_id=self.user.id)
+        self.get(reverse('ask'))
+
+    def test_vote(self):
+        self.client.login(method='force', user_id=self.answerers[1].id)
+        response = self.client.post(
+            reverse('vote'),
+            data={'type': const.VOTE_UPVOTE_QUESTION, 'postId': self.question.id},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.status_code, 200)
@@ -10,6 +10,7 @@ from django.core.cache.backends.dummy import DummyCache
 from django.core.cache.backends.locmem import LocMemCache
 
 from django.core.exceptions import ValidationError
+from django.db.models.query import QuerySet
 from django.template.loader import get_template
 from django.template import Context
 from askbot.tests.utils import AskbotTestCase
@@ -17,9 +18,13 @@ from askbot.models import Post
 from askbot.models import PostRevision
 from askbot.models import Thread
 from askbot.models import Tag
+from askbot.models import TagCooccurrence
+from askbot.models import ThreadTagWeight
+from askbot.models.tag_cooccurrence import rebuild_tag_cooccurrence
 from askbot.models import Group
 from askbot.search.state_manager import DummySearchState
 import simplejson
+from mock import patch
 from django.utils import timezone
 from askbot.tests.utils import skipIf, with_settings
 from askbot.conf import settings as askbot_settings
@@ -220,6 +225,111 @@ class ThreadTagModelsTests(AskbotTestCase):
         self.assertListEqual([3, 2, 2, 2, 1], [t.local_used_count for t in tags])
         self.assertListEqual([3, 2, 2, 2, 2], [t.used_count for t in tags])
 
+    def get_cooccurrence_counts(self):
+        return dict([
+            ((item.tag.name, item.other_tag.name), item.count)
+            for item in TagCooccurrence.objects.all()
+        ])
+
+    def test_tag_cooccurrence_counts(self):
+        counts = self.get_cooccurrence_counts()
+        self.assertEqual(counts[('tag1', 'tag3')], 2)
+        self.assertEqual(counts[('tag3', 'tag1')], 2)
+        self.assertEqual(counts[('tag4', 'tag5')], 2)
+        self.assertEqual(counts[('tag1', 'tag6')], 1)
+        self.assertFalse(('tag6', 'tag6') in counts)
+
+        self.q1.thread.retag(
+            retagged_by=self.user,
+            retagged_at=timezone.now(),
+            tagnames='tag1 tag6'
+        )
+        counts = self.get_cooccurrence_counts()
+        self.assertEqual(counts[('tag1', 'tag3')], 1)
+        self.assertEqual(counts[('tag1', 'tag6')], 2)
+        self.assertEqual(counts[('tag6', 'tag1')], 2)
+
+        rebuild_tag_cooccurrence()
+        self.assertEqual(self.get_cooccurrence_counts(), counts)
+
+    def test_deleted_thread_is_not_counted(self):
+        self.user.delete_question(self.q2)
+        counts = self.get_cooccurrence_counts()
+        self.assertEqual(counts[('tag4', 'tag5')], 1)
+        self.assertEqual(counts[('tag1', 'tag3')], 2)
+        self.assertFalse(
+            ThreadTagWeight.objects.filter(thread=self.q2.thread).exists()
+        )
+
+        self.user.restore_post(self.q2)
+        self.assertEqual(self.get_cooccurrence_counts()[('tag4', 'tag5')], 2)
+
+        self.q4.thread.delete()
+        counts = self.get_cooccurrence_counts()
+        self.assertEqual(counts[('tag4', 'tag5')], 1)
+        self.assertFalse(('tag1', 'tag6') in counts)
+
+    def test_private_thread_is_not_counted(self):
+        private = self.post_question(tags='tag1 secret', is_private=True)
+        counts = self.get_cooccurrence_counts()
+        self.assertFalse(('tag1', 'secret') in counts)
+        self.assertFalse(private.thread.id in [
+            thread_id for thread_id in
+            ThreadTagWeight.objects.values_list('thread_id', flat=True)
+        ])
+        private.thread.make_public()
+        self.assertEqual(self.get_cooccurrence_counts()[('tag1', 'secret')], 1)
+
+        rebuild_tag_cooccurrence()
+        self.assertEqual(self.get_cooccurrence_counts()[('tag1', 'secret')], 1)
+
+    def test_existing_pair_is_incremented_on_create_conflict(self):
+        tag1 = Tag.objects.get(name='tag1')
+        tag6 = Tag.objects.get(name='tag6')
+        pairs = TagCooccurrence.objects.filter(tag=tag1, other_tag=tag6)
+        #the row is created by a concurrent transaction
+        #after the update finds nothing
+        original_update = QuerySet.update
+        def update(queryset, **kwargs):
+            updated = original_update(queryset, **kwargs)
+            if queryset.model is TagCooccurrence and updated == 0:
+                TagCooccurrence.objects.create(tag=tag1, other_tag=tag6, count=1)
+            return updated
+        pairs.delete()
+        with patch.object(QuerySet, 'update', update):
+            TagCooccurrence.objects.add_pair(tag1.id, tag6.id)
+        self.assertEqual(pairs.get().count, 2)
+
+    def test_related_tags_from_cooccurrence(self):
+        tags = TagCooccurrence.objects.get_related_tags(['tag1'])
+        self.assertListEqual(
+            ['tag2', 'tag3', 'tag4', 'tag5', 'tag6'], [t.name for t in tags]
+        )
+        self.assertListEqual([2, 2, 1, 1, 1], [t.local_used_count for t in tags])
+
+        tags = TagCooccurrence.objects.get_related_tags(
+                                    ['tag1', 'tag4'], ignored_tag_names=['tag2']
+                                )
+        self.assertListEqual(['tag3', 'tag5', 'tag6'], [t.name for t in tags])
+        self.assertListEqual([4, 3, 2], [t.local_used_count for t in tags])
+
+    def test_similar_threads(self):
+        similar = self.q1.thread.get_similar_threads().data()
+        self.assertListEqual(
+            [self.q4.thread.title, self.q2.thread.title],
+            [item['title'] for item in similar]
+        )
+        self.assertEqual(self.q3.thread.get_similar_threads().data()[0]['title'],
+                         self.q4.thread.title)
+
+    def test_similar_threads_are_in_the_same_language(self):
+        Thread.objects.filter(id=self.q4.thread_id).update(language_code='de')
+        cache.cache.delete('similar-threads-%s' % self.q1.thread_id)
+        similar = self.q1.thread.get_similar_threads().data()
+        self.assertListEqual(
+            [self.q2.get_absolute_url()], [item['url'] for item in similar]
+        )
+
     def test_run_adv_search_1(self):
         ss = SearchState.get_empty()
         qs, meta_data = Thread.objects.run_advanced_search(request_user=self.user, search_state=ss)
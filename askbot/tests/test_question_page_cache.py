@@ -0,0 +1,116 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mock import patch
+
+from askbot.models import Group, Thread
+from askbot.tests.utils import AskbotTestCase
+from askbot.tests.utils import with_settings
+from askbot.views.readers import CSRF_TOKEN_PLACEHOLDER
+
+
+class QuestionPageCacheTests(AskbotTestCase):
+
+    def setUp(self):
+        self.old_cache = cache.cache
+        #default test cache culls entries too early
+        cache.cache = LocMemCache('', {'OPTIONS':{'MAX_ENTRIES': 1000000}})
+        self.asker = self.create_user('asker')
+        self.answerer = self.create_user('answerer')
+        self.question = self.post_question(user=self.asker)
+        self.answer = self.post_answer(
+                            user=self.answerer,
+                            question=self.question,
+                            body_text='first answer to the question'
+                        )
+
+    def tearDown(self):
+        cache.cache = self.old_cache
+
+    def visit(self, user=None):
+        if user:
+            self.client.login(method='force', user_id=user.id)
+        else:
+            self.client.logout()
+        response = self.client.get(self.question.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_cache_hit_does_not_load_posts(self):
+        self.visit(self.asker)
+        with patch.object(Thread, 'get_post_data_for_question_view') as get_data:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.visit(self.asker)
+            self.assertFalse(get_data.called)
+        self.assertTrue('first answer to the question' in response.content)
+        for query in queries.captured_queries:
+            self.assertFalse('askbot_postrevision' in query['sql'])
+
+    def test_overlay_is_per_user(self):
+        self.visit(self.answerer)
+        self.asker.upvote(self.answer)
+        response = self.visit(self.asker)
+        self.assertEqual(response.context['user_votes'], {self.answer.id: 1})
+        self.assertEqual(response.context['user_post_id_list'], [self.question.id])
+        response = self.visit(self.answerer)
+        self.assertEqual(response.context['user_post_id_list'], [self.answer.id])
+
+    def test_csrf_token_is_not_shared(self):
+        self.visit(self.answerer)
+        response = self.visit(self.asker)
+        csrf_token = response.cookies[settings.CSRF_COOKIE_NAME].value
+        self.assertFalse(CSRF_TOKEN_PLACEHOLDER in response.content)
+        self.assertTrue(csrf_token in response.content)
+        self.assertEqual(
+            set(re.findall(r"csrfmiddlewaretoken' value='(\w+)'", response.content)),
+            set([csrf_token])
+        )
+
+    def test_new_answer_invalidates_cache(self):
+        self.visit()
+        self.post_answer(
+                    user=self.asker,
+                    question=self.question,
+                    body_text='second answer to the question'
+                )
+        response = self.visit()
+        self.assertTrue('second answer to the question' in response.content)
+
+    def test_author_badges_invalidate_cache(self):
+        self.visit()
+        self.answerer.gold = 7
+        self.answerer.save()
+        response = self.visit()
+        self.assertTrue('<span class="badgecount">7</span>' in response.content)
+
+    @with_settings(LIMIT_ONE_ANSWER_PER_USER=True)
+    def test_previous_answer_on_cache_hit(self):
+        self.visit(self.asker)
+        response = self.visit(self.answerer)
+        self.assertFalse(response.context['new_answer_allowed'])
+        self.assertEqual(response.context['previous_answer'].id, self.answer.id)
+
+
+class GroupSignatureTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user('user')
+        self.question = self.post_question(user=self.user)
+
+    @with_settings(GROUPS_ENABLED=False)
+    def test_group_signature_without_groups(self):
+        thread = self.question.thread
+        self.assertEqual(thread.get_group_signature(self.user), 'public')
+
+    def test_group_signature_with_groups(self):
+        thread = self.question.thread
+        global_group = Group.objects.get_global_group()
+        with patch('askbot.models.question.askbot_settings') as mocked_settings:
+            mocked_settings.GROUPS_ENABLED = True
+            signature = thread.get_group_signature(AnonymousUser())
+        self.assertEqual(signature, str(global_group.id))
@@ -0,0 +1,100 @@
+from django.core import cache
+from django.core.management import call_command
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from mock import patch
+
+from askbot import models
+from askbot.models.reindex_queue import enqueue_reindex, get_queue_stats, process_reindex_queue
+from askbot.search import sqlite as sqlite_search
+from askbot.tests.utils import AskbotTestCase
+
+
+@override_settings(
+    ASKBOT_SEARCH_REINDEX_QUEUE=True,
+    ASKBOT_SQLITE_FULL_TEXT_SEARCH=True
+)
+class SearchReindexQueueTests(AskbotTestCase):
+
+    def setUp(self):
+        cache.cache.clear()
+        call_command('init_sqlite_full_text_search', stdout=StringIO())
+        self.user = self.create_user('searcher')
+
+    def tearDown(self):
+        sqlite_search.reset_index_state()
+
+    def get_thread_ids(self, query):
+        return [thread.id for thread in models.Thread.objects.get_for_query(query)]
+
+    def test_changes_are_coalesced(self):
+        with patch('askbot.utils.transaction.defer_celery_task') as defer:
+            question = self.post_question(user=self.user, title='Growing cucumbers')
+            self.post_answer(user=self.user, question=question, body_text='Plenty of sunlight')
+            self.post_comment(user=self.user, parent_post=question, body_text='And water')
+        self.assertEqual(defer.call_count, 1)
+
+        stats = get_queue_stats()
+        self.assertEqual(stats['thread'], 1)
+        self.assertEqual(stats['user'], 1)
+        self.assertEqual(stats['depth'], 2)
+        self.assertTrue(stats['lag'] >= 0)
+        #the index waits for the queue
+        self.assertEqual(self.get_thread_ids('sunlight'), [])
+
+        self.assertEqual(process_reindex_queue(), 2)
+        self.assertEqual(self.get_thread_ids('sunlight'), [question.thread.id])
+        self.assertEqual(get_queue_stats(), {'thread': 0, 'user': 0, 'depth': 0, 'lag': 0})
+
+    def test_batches(self):
+        with patch('askbot.utils.transaction.defer_celery_task'):
+            questions = [
+                self.post_question(user=self.user, title='Question about radish %d' % number)
+                for number in range(3)
+            ]
+        depth = get_queue_stats()['depth']
+        self.assertTrue(depth >= 3)
+        with override_settings(ASKBOT_SEARCH_REINDEX_BATCH_SIZE=1):
+            self.assertEqual(process_reindex_queue(), depth)
+        self.assertEqual(
+            sorted(self.get_thread_ids('radish')),
+            sorted([question.thread.id for question in questions])
+        )
+
+    def test_change_during_reindex_is_kept(self):
+        from askbot.models import reindex_queue
+        reindex_objects = reindex_queue.reindex_objects
+
+        def reindex_and_change(kind, object_ids):
+            reindex_objects(kind, object_ids)
+            #edit saved while the task reindexes the user
+            enqueue_reindex(kind, object_ids)
+
+        with patch('askbot.utils.transaction.defer_celery_task'):
+            user = self.create_user('gardener')
+        with patch.object(reindex_queue, 'reindex_objects', side_effect=reindex_and_change):
+            with patch('askbot.utils.transaction.defer_celery_task'):
+                self.assertEqual(process_reindex_queue(), 1)
+        self.assertTrue(
+            models.PendingReindex.objects.filter(kind='user', object_id=user.id).exists()
+        )
+        self.assertEqual(process_reindex_queue(), 1)
+        self.assertEqual(get_queue_stats()['depth'], 0)
+
+    def test_deleted_thread_is_removed(self):
+        question = self.post_question(user=self.user, title='Planting garlic')
+        self.assertEqual(self.get_thread_ids('garlic'), [question.thread.id])
+        with patch('askbot.utils.transaction.defer_celery_task'):
+            models.PendingReindex.objects.create(kind='thread', object_id=question.thread.id)
+            question.thread.delete()
+        process_reindex_queue()
+        self.assertEqual(self.get_thread_ids('garlic'), [])
+
+    def test_status_command(self):
+        with patch('askbot.utils.transaction.defer_celery_task'):
+            self.create_user('gardener')
+        output = StringIO()
+        call_command('askbot_search_reindex_queue', status=True, stdout=output)
+        self.assertIn('queued: 1 (threads: 0, users: 1)', output.getvalue())
+        call_command('askbot_search_reindex_queue', stdout=StringIO())
+        self.assertEqual(models.get_users_by_text_query('gardener')[0].username, 'gardener')
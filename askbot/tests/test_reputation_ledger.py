@@ -0,0 +1,149 @@
+import datetime
+
+from django.core.management import call_command
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from askbot import const
+from askbot import models
+from askbot.conf import settings as askbot_settings
+from askbot.models.reputation_ledger import get_ledger_reputation
+from askbot.models.reputation_ledger import get_reputation_mismatches
+from askbot.models.reputation_ledger import record_reputation_change
+from askbot.models.reputation_ledger import replay_reputation
+from askbot.models.reputation_ledger import take_reputation_snapshots
+from askbot.models.reputation_ledger import SNAPSHOT_LAG
+from askbot.tests.utils import AskbotTestCase
+
+
+class ReputationLedgerTests(AskbotTestCase):
+
+    def setUp(self):
+        self.asker = self.create_user('asker')
+        self.answerer = self.create_user('answerer')
+        self.voters = [self.create_user('voter%d' % number) for number in range(3)]
+        self.question = self.post_question(user=self.asker)
+        self.answer = self.post_answer(user=self.answerer, question=self.question)
+
+    def get_reputation(self, user):
+        return models.UserProfile.objects.get(pk=user.id).reputation
+
+    def get_localized_reputation(self, user):
+        return models.LocalizedUserProfile.objects.get(
+                                    auth_user=user,
+                                    language_code=self.question.language_code
+                                ).reputation
+
+    def make_changes(self):
+        for voter in self.voters:
+            voter.upvote(self.answer)
+        self.voters[0].downvote(self.question)
+        self.asker.accept_best_answer(self.answer)
+        self.voters[1].flag_post(self.question, force=True)
+        self.voters[2].moderate_user_reputation(
+            user=self.answerer, reputation_change=-3, comment='spam'
+        )
+
+    def test_losses_are_stored_as_negative_numbers(self):
+        self.voters[0].downvote(self.answer)
+        reputes = models.Repute.objects.filter(reputation_type__in=(-3, -5))
+        self.assertEqual(reputes.count(), 2)
+        for repute in reputes:
+            self.assertEqual(repute.positive, 0)
+            self.assertTrue(repute.negative < 0)
+
+    def get_snapshot_time(self):
+        return timezone.now() + datetime.timedelta(seconds=SNAPSHOT_LAG)
+
+    def test_snapshots_and_ledger_balance(self):
+        self.voters[0].upvote(self.answer)
+        #the new rows are left for the next snapshot
+        self.assertEqual(take_reputation_snapshots(), 0)
+        self.assertEqual(take_reputation_snapshots(self.get_snapshot_time()), 1)
+        snapshot = models.ReputationSnapshot.objects.get(user=self.answerer)
+        self.assertEqual(snapshot.reputation, askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE)
+        #nothing new
+        self.assertEqual(take_reputation_snapshots(self.get_snapshot_time()), 0)
+
+        self.voters[1].upvote(self.answer)
+        ledger = get_ledger_reputation()
+        key = (self.answerer.id, self.answer.language_code)
+        self.assertEqual(ledger[key], self.get_localized_reputation(self.answerer))
+
+        self.assertEqual(take_reputation_snapshots(self.get_snapshot_time()), 1)
+        snapshot = models.ReputationSnapshot.objects.get(user=self.answerer)
+        self.assertEqual(snapshot.reputation, 2 * askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE)
+        self.assertEqual(get_ledger_reputation(), ledger)
+
+    def test_replay_matches_stored_reputation(self):
+        self.make_changes()
+        replayed = replay_reputation()
+        key = (self.answerer.id, self.answer.language_code)
+        self.assertEqual(
+            replayed[key],
+            3 * askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+            + askbot_settings.REP_GAIN_FOR_RECEIVING_ANSWER_ACCEPTANCE
+            - 3
+        )
+        self.assertEqual(get_reputation_mismatches(replayed), [])
+
+    def test_replay_applies_lower_limit_at_each_change(self):
+        downvoted_at = timezone.now() - datetime.timedelta(days=1)
+        self.voters[0].downvote(self.answer, timestamp=downvoted_at)
+        self.voters[1].upvote(self.answer)
+        replayed = replay_reputation()
+        #the loss was taken from the reputation at its lower limit
+        self.assertEqual(
+            replayed[(self.answerer.id, self.answer.language_code)],
+            askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+        )
+        self.assertEqual(get_reputation_mismatches(replayed), [])
+
+    def test_replay_counts_imported_reputation(self):
+        record_reputation_change(self.asker, 50, const.TYPE_REPUTATION_IMPORTED)
+        self.voters[0].downvote(self.question)
+        self.assertEqual(get_reputation_mismatches(replay_reputation()), [])
+
+    def test_replay_after_merge_of_users(self):
+        self.make_changes()
+        from_user, to_user = self.voters[2], self.create_user('newvoter')
+        record_reputation_change(from_user, 20, const.TYPE_REPUTATION_IMPORTED)
+        call_command('merge_users', str(from_user.id), str(to_user.id), stdout=StringIO())
+        self.assertEqual(models.Repute.objects.filter(user_id=from_user.id).count(), 0)
+        self.assertEqual(self.get_localized_reputation(to_user), 20)
+        self.assertEqual(get_reputation_mismatches(replay_reputation()), [])
+
+    def test_replay_applies_daily_upvote_limit(self):
+        max_gain = askbot_settings.MAX_REP_GAIN_PER_USER_PER_DAY
+        askbot_settings.update('MAX_REP_GAIN_PER_USER_PER_DAY', 1)
+        try:
+            for voter in self.voters:
+                voter.upvote(self.answer)
+            replayed = replay_reputation()
+            key = (self.answerer.id, self.answer.language_code)
+            self.assertEqual(replayed[key], askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE)
+            self.assertEqual(get_reputation_mismatches(replayed), [])
+        finally:
+            askbot_settings.update('MAX_REP_GAIN_PER_USER_PER_DAY', max_gain)
+
+    def test_recount_command(self):
+        self.make_changes()
+        expected = self.get_reputation(self.answerer)
+        models.UserProfile.objects.filter(pk=self.answerer.id).update(reputation=500)
+
+        output = StringIO()
+        call_command('askbot_recount_reputation', stdout=output)
+        self.assertIn('answerer (id %d): stored 500' % self.answerer.id, output.getvalue())
+        self.assertIn('Found 1 differences', output.getvalue())
+        self.assertEqual(self.get_reputation(self.answerer), 500)
+
+        output = StringIO()
+        call_command('askbot_recount_reputation', fix=True, stdout=output)
+        self.assertIn('Fixed 1 differences', output.getvalue())
+        self.assertEqual(self.get_reputation(self.answerer), expected)
+        correction = models.Repute.objects.get(
+                            reputation_type=const.TYPE_REPUTATION_RECOUNTED
+                        )
+        self.assertEqual(correction.user, self.answerer)
+        self.assertEqual(correction.negative, expected - 500)
+        self.assertEqual(get_reputation_mismatches(replay_reputation()), [])
@@ -0,0 +1,144 @@
+import datetime
+
+from django.core import cache
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from django.utils import timezone
+import simplejson
+
+from askbot.models import Thread
+from askbot.search.pagination import KeysetPaginator
+from askbot.search.pagination import decode_cursor, encode_cursor
+from askbot.search.pagination import get_sort_field, paginate_threads
+from askbot.search.state_manager import SearchState
+from askbot.tests.utils import AskbotTestCase, with_settings
+
+
+class CursorTests(AskbotTestCase):
+
+    def test_get_sort_field(self):
+        self.assertEqual(get_sort_field('activity-desc'), ('last_activity_at', True))
+        self.assertEqual(get_sort_field('votes-asc'), ('points', False))
+        self.assertEqual(get_sort_field('relevance-desc'), None)
+
+    def test_datetime_cursor(self):
+        timestamp = datetime.datetime(2016, 1, 2, 3, 4, 5, 6)
+        cursor = encode_cursor('a', timestamp, 15)
+        direction, value, item_id = decode_cursor(cursor, 'added_at')
+        self.assertEqual((direction, item_id), ('a', 15))
+        self.assertEqual(timezone.make_naive(value, timezone.utc) \
+                            if timezone.is_aware(value) else value, timestamp)
+
+    def test_integer_cursor(self):
+        cursor = encode_cursor('b', -3, 7)
+        self.assertEqual(decode_cursor(cursor, 'points'), ('b', -3, 7))
+
+    def test_bad_cursor(self):
+        self.assertRaises(ValueError, decode_cursor, 'x1_2', 'points')
+        self.assertRaises(ValueError, decode_cursor, 'a1', 'points')
+
+
+class KeysetPaginationTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user('user')
+        #all questions share the same score, so the
+        #thread id must break the ties
+        for idx in range(5):
+            self.post_question(user=self.user, title='question %d' % idx)
+        self.thread_ids = list(
+                    Thread.objects.order_by('-points', '-id').values_list('id', flat=True)
+                )
+
+    def get_paginator(self, sort_method='votes-desc'):
+        return KeysetPaginator(
+                        Thread.objects.all(), sort_method, 2,
+                        loader=Thread.objects.get_for_list
+                    )
+
+    def test_walk_forward_and_back(self):
+        paginator = self.get_paginator()
+        self.assertEqual(paginator.num_pages, 3)
+
+        page1 = paginator.page(1)
+        self.assertEqual([t.id for t in page1], self.thread_ids[:2])
+        self.assertFalse(page1.has_previous())
+
+        page2 = paginator.page(2, cursor=page1.next_cursor)
+        self.assertEqual([t.id for t in page2], self.thread_ids[2:4])
+
+        page3 = paginator.page(3, cursor=page2.next_cursor)
+        self.assertEqual([t.id for t in page3], self.thread_ids[4:])
+        self.assertFalse(page3.has_next())
+
+        back = paginator.page(2, cursor=page3.previous_cursor)
+        self.assertEqual([t.id for t in back], self.thread_ids[2:4])
+        back = paginator.page(1, cursor=back.previous_cursor)
+        self.assertEqual([t.id for t in back], self.thread_ids[:2])
+        self.assertEqual(back.previous_cursor, None)
+
+    def test_page_by_number(self):
+        page = self.get_paginator().page(2)
+        self.assertEqual([t.id for t in page], self.thread_ids[2:4])
+        self.assertTrue(page.next_cursor is not None)
+
+    def test_invalid_cursor_falls_back_to_number(self):
+        page = self.get_paginator().page(2, cursor='garbage')
+        self.assertEqual([t.id for t in page], self.thread_ids[2:4])
+
+    def test_count_is_cached(self):
+        search_state = SearchState.get_empty()
+        search_state.page_size = 2
+        qs, meta_data = Thread.objects.run_advanced_search(
+                                request_user=self.user, search_state=search_state
+                            )
+        paginator, page = paginate_threads(qs, self.user, search_state)
+        self.assertEqual(paginator.count, 5)
+        self.post_question(user=self.user)
+        paginator, page = paginate_threads(qs, self.user, search_state)
+        self.assertEqual(paginator.count, 5)
+        cache.cache.clear()
+        paginator, page = paginate_threads(qs, self.user, search_state)
+        self.assertEqual(paginator.count, 6)
+
+    @with_settings(DEFAULT_QUESTIONS_PAGE_SIZE='10')
+    def test_questions_view_next_link(self):
+        for idx in range(6):
+            self.post_question(user=self.user, title='another question %d' % idx)
+        url = reverse('questions') + 'scope:all/sort:votes-desc/page:1/'
+        response = self.client.get(url)
+        cursor = response.context['threads'].next_cursor
+        self.assertTrue(cursor in response.content)
+        url = reverse('questions') + 'scope:all/sort:votes-desc/page:2/'
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_cursor(self):
+        cache.cache.clear()
+        url = reverse('api_v1_questions')
+        data = simplejson.loads(self.client.get(url, {'sort': 'age-asc'}).content)
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(data['previous_cursor'], None)
+
+    @with_settings(DEFAULT_QUESTIONS_PAGE_SIZE='2')
+    def test_api_page_size(self):
+        cache.cache.clear()
+        url = reverse('api_v1_questions')
+        data = simplejson.loads(self.client.get(url, {'sort': 'age-asc'}).content)
+        self.assertEqual(data['pages'], 3)
+        self.assertEqual(len(data['questions']), 2)
+
+
+@override_settings(ASKBOT_THREAD_LISTING_ENABLED=True)
+class ListingKeysetPaginationTests(KeysetPaginationTests):
+
+    def get_paginator(self, sort_method='votes-desc'):
+        from askbot.models import ThreadListing
+        qs, meta_data = ThreadListing.objects.run_search(
+                                request_user=self.user,
+                                search_state=SearchState.get_empty().change_sort(sort_method)
+                            )
+        return KeysetPaginator(
+                        qs, sort_method, 2, id_field='thread',
+                        loader=Thread.objects.get_for_list
+                    )
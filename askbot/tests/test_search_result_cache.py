@@ -0,0 +1,115 @@
+from django.core import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test.utils import override_settings
+
+from askbot.search import result_cache
+from askbot.search.state_manager import SearchState
+from askbot.tests.utils import AskbotTestCase
+
+
+class SearchResultCacheTests(AskbotTestCase):
+
+    def setUp(self):
+        self.old_cache = cache.cache
+        #default test cache culls entries too early
+        cache.cache = LocMemCache('', {'OPTIONS':{'MAX_ENTRIES': 1000000}})
+        self.user = self.create_user('user')
+        self.question1 = self.post_question(user=self.user, tags='one two')
+        self.question2 = self.post_question(user=self.user, tags='three')
+
+    def tearDown(self):
+        cache.cache = self.old_cache
+
+    def get_state(self, tags=None, scope='all'):
+        return SearchState(
+                    scope=scope, sort='activity-desc', query=None, tags=tags,
+                    author=None, page=None, user_logged_in=False
+                )
+
+    def get_cached_results(self, search_state):
+        results_key = result_cache.get_results_cache_key(search_state)
+        return result_cache.get_cached_results(results_key)
+
+    def visit(self, search_state):
+        response = self.client.get(search_state.full_url())
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_fingerprint_ignores_tag_order(self):
+        self.assertEqual(
+            result_cache.get_fingerprint(self.get_state('one,two')),
+            result_cache.get_fingerprint(self.get_state('two,one'))
+        )
+        self.assertNotEqual(
+            result_cache.get_fingerprint(self.get_state('one')),
+            result_cache.get_fingerprint(self.get_state('one', scope='unanswered'))
+        )
+
+    def test_results_are_cached(self):
+        search_state = self.get_state()
+        self.visit(search_state)
+        data = self.get_cached_results(search_state)
+        self.assertEqual(
+            set(data['thread_ids']),
+            set([self.question1.thread_id, self.question2.thread_id])
+        )
+        related_tag_names = set([tag.name for tag in self.question1.thread.tags.all()])
+        related_tag_names.add('three')
+        response = self.visit(search_state)
+        threads = response.context['threads'].object_list
+        self.assertEqual(len(threads), 2)
+        self.assertEqual(
+            set([tag.name for tag in response.context['tags']]),
+            related_tag_names
+        )
+
+    def test_authenticated_results_are_not_cached(self):
+        self.client.login(user_id=self.user.id, method='force')
+        search_state = self.get_state()
+        self.visit(search_state)
+        self.assertEqual(self.get_cached_results(search_state), None)
+
+    def test_targeted_eviction(self):
+        no_tags = self.get_state()
+        tag_one = self.get_state('one')
+        tag_three = self.get_state('three')
+        for search_state in (no_tags, tag_one, tag_three):
+            self.visit(search_state)
+
+        self.user.retag_question(question=self.question1, tags='one four')
+
+        self.assertEqual(self.get_cached_results(no_tags), None)
+        self.assertEqual(self.get_cached_results(tag_one), None)
+        self.assertNotEqual(self.get_cached_results(tag_three), None)
+
+    def test_new_question_is_listed(self):
+        search_state = self.get_state('three')
+        self.visit(search_state)
+        question = self.post_question(user=self.user, tags='three')
+        response = self.visit(search_state)
+        thread_ids = [thread.id for thread in response.context['threads'].object_list]
+        self.assertTrue(question.thread_id in thread_ids)
+
+    def test_results_of_search_during_change_are_not_read(self):
+        search_state = self.get_state('three')
+        #key taken before the search
+        results_key = result_cache.get_results_cache_key(search_state)
+        self.user.retag_question(question=self.question2, tags='three five')
+        self.visit(search_state)
+        self.assertEqual(result_cache.get_cached_results(results_key), None)
+        self.assertNotEqual(self.get_cached_results(search_state), None)
+
+    @override_settings(ASKBOT_ASYNC_VOTES=True)
+    def test_vote_evicts_results(self):
+        no_tags = self.get_state()
+        tag_one = self.get_state('one')
+        tag_three = self.get_state('three')
+        for search_state in (no_tags, tag_one, tag_three):
+            self.visit(search_state)
+
+        voter = self.create_user('voter')
+        voter.upvote(self.question1)
+
+        self.assertEqual(self.get_cached_results(no_tags), None)
+        self.assertEqual(self.get_cached_results(tag_one), None)
+        self.assertNotEqual(self.get_cached_results(tag_three), None)
@@ -1,8 +1,16 @@
 import askbot
 from askbot.tests.utils import AskbotTestCase
 from askbot.conf import settings as askbot_settings
+from askbot.conf.settings_wrapper import bump_settings_version
+from askbot.conf.settings_wrapper import settings_snapshot
+from askbot.conf.settings_wrapper import SETTINGS_VERSION_CACHE_KEY
+from askbot.deps.livesettings.values import Value
 from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test.client import Client
 from django.utils import translation
+from mock import patch
 
 class SettingsTests(AskbotTestCase):
     def setUp(self):
@@ -48,3 +56,37 @@ class SettingsTests(AskbotTestCase):
         self.assertSettingEquals('MIN_REP_TO_VOTE_UP', 500)
 
         askbot_settings.update('MIN_REP_TO_VOTE_UP', backup)
+
+
+class SettingsSnapshotTests(AskbotTestCase):
+
+    def setUp(self):
+        bump_settings_version()
+
+    def test_values_are_read_once_per_version(self):
+        value = askbot_settings.MIN_REP_TO_VOTE_UP
+        askbot_settings.as_dict()
+        with patch.object(Value, '_value') as read_value:
+            self.assertEqual(askbot_settings.MIN_REP_TO_VOTE_UP, value)
+            self.assertEqual(askbot_settings.as_dict()['MIN_REP_TO_VOTE_UP'], value)
+        self.assertFalse(read_value.called)
+
+    def test_version_change_drops_snapshot(self):
+        askbot_settings.MIN_REP_TO_VOTE_UP
+        #settings changed by another process
+        cache.set(SETTINGS_VERSION_CACHE_KEY, 'other-version')
+        Client().get(reverse('questions'))
+        self.assertEqual(settings_snapshot.version, 'other-version')
+        with patch.object(Value, '_value') as read_value:
+            read_value.return_value = 7
+            self.assertEqual(askbot_settings.MIN_REP_TO_VOTE_UP, 7)
+
+    def test_update_changes_version(self):
+        version = cache.get(SETTINGS_VERSION_CACHE_KEY)
+        backup = askbot_settings.MIN_REP_TO_VOTE_UP
+        askbot_settings.update('MIN_REP_TO_VOTE_UP', backup + 1)
+        try:
+            self.assertNotEqual(cache.get(SETTINGS_VERSION_CACHE_KEY), version)
+            self.assertEqual(askbot_settings.MIN_REP_TO_VOTE_UP, backup + 1)
+        finally:
+            askbot_settings.update('MIN_REP_TO_VOTE_UP', backup)
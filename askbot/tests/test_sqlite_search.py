@@ -0,0 +1,120 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from mock import patch
+
+from askbot import models
+from askbot.conf import should_show_sort_by_relevance
+from askbot.search import sqlite as sqlite_search
+from askbot.search.state_manager import SearchState
+from askbot.tests.utils import AskbotTestCase
+
+
+@override_settings(ASKBOT_SQLITE_FULL_TEXT_SEARCH=True)
+class SqliteFullTextSearchTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user('searcher')
+        self.question = self.post_question(
+                                user=self.user,
+                                title='How to water tomatoes',
+                                body_text='Leaves of my tomato plants turn yellow',
+                                tags='garden'
+                            )
+        self.post_answer(
+                    user=self.user,
+                    question=self.question,
+                    body_text='Water them in the morning, never at night'
+                )
+        self.other = self.post_question(
+                                user=self.user,
+                                title='Pruning apple trees',
+                                body_text='When should one prune the trees, a tomato is irrelevant',
+                                tags='orchard'
+                            )
+        call_command('init_sqlite_full_text_search', stdout=StringIO())
+
+    def tearDown(self):
+        sqlite_search.reset_index_state()
+
+    def get_thread_ids(self, query):
+        return [thread.id for thread in models.Thread.objects.get_for_query(query)]
+
+    def test_sort_by_relevance_is_enabled(self):
+        self.assertTrue(sqlite_search.is_enabled())
+        self.assertTrue(should_show_sort_by_relevance())
+
+    def test_stemmed_search_in_answers(self):
+        self.assertEqual(self.get_thread_ids('watering'), [self.question.thread.id])
+        self.assertEqual(self.get_thread_ids('night'), [self.question.thread.id])
+        self.assertEqual(self.get_thread_ids('orchard'), [self.other.thread.id])
+        self.assertEqual(self.get_thread_ids('"?'), [])
+
+    def test_title_matches_rank_higher(self):
+        threads = models.Thread.objects.get_for_query('tomato').order_by('-relevance')
+        self.assertEqual(
+            [thread.id for thread in threads],
+            [self.question.thread.id, self.other.thread.id]
+        )
+
+    def test_title_query(self):
+        threads = models.Thread.objects.all().get_for_title_query('tomatoes')
+        self.assertEqual([thread.id for thread in threads], [self.question.thread.id])
+        #words of the question body are not searched
+        threads = models.Thread.objects.all().get_for_title_query('irrelevant')
+        self.assertEqual(list(threads), [])
+
+    def test_index_follows_edits(self):
+        self.user.edit_question(
+                        question=self.other,
+                        title='Pruning pear trees',
+                        body_text='Nothing about vegetables',
+                        revision_comment='edit',
+                        tags='orchard',
+                    )
+        self.assertEqual(self.get_thread_ids('pear'), [self.other.thread.id])
+        self.assertEqual(self.get_thread_ids('apple'), [])
+        answer = self.post_answer(user=self.user, question=self.other, body_text='Use sharp shears')
+        self.assertEqual(self.get_thread_ids('shears'), [self.other.thread.id])
+        self.user.delete_post(answer)
+        self.assertEqual(self.get_thread_ids('shears'), [])
+
+    def test_unchanged_post_does_not_update_index(self):
+        with patch('askbot.search.sqlite.queue_thread_text_update') as queue:
+            self.question.save()
+            self.question.thread.save()
+        self.assertEqual(queue.call_count, 0)
+
+    def test_search_is_opt_in(self):
+        with self.settings(ASKBOT_SQLITE_FULL_TEXT_SEARCH=False):
+            self.assertFalse(sqlite_search.is_enabled())
+            self.assertRaises(
+                CommandError,
+                call_command, 'init_sqlite_full_text_search', stdout=StringIO()
+            )
+        self.assertTrue(sqlite_search.is_enabled())
+
+    def test_post_text_query(self):
+        posts = models.Post.objects.filter(post_type='question').get_by_text_query('morning')
+        self.assertEqual([post.id for post in posts], [self.question.id])
+
+    def test_user_search(self):
+        user = self.create_user('gardener')
+        user.update_localized_profile(about='Grows cucumbers')
+        users = models.get_users_by_text_query('cucumber')
+        self.assertEqual([found.id for found in users], [user.id])
+        self.assertEqual(
+            [found.id for found in models.get_users_by_text_query('searcher')],
+            [self.user.id]
+        )
+
+    def test_questions_sorted_by_relevance(self):
+        url = SearchState(
+                    scope='all', sort='relevance-desc',
+                    query='tomato', user_logged_in=False
+                ).full_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        threads = list(response.context['threads'].object_list)
+        self.assertEqual(threads[0].id, self.question.thread.id)
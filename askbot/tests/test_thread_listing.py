@@ -0,0 +1,104 @@
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+
+from askbot.models import Thread
+from askbot.models import ThreadListing
+from askbot.models import ThreadListingTag
+from askbot.search.state_manager import SearchState
+from askbot.tests.utils import AskbotTestCase
+
+
+@override_settings(ASKBOT_THREAD_LISTING_ENABLED=True)
+class ThreadListingTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user('user')
+        self.user2 = self.create_user('user2')
+        self.q1 = self.post_question(user=self.user, tags='tag1 tag2')
+        self.q2 = self.post_question(user=self.user, tags='tag1 tag3')
+        self.q3 = self.post_question(user=self.user2, tags='tag3')
+        self.post_answer(user=self.user2, question=self.q1)
+
+    def run_both_searches(self, search_state):
+        listing_ids, listing_meta = ThreadListing.objects.run_search(
+                                    request_user=self.user, search_state=search_state
+                                )
+        threads, meta = Thread.objects.run_advanced_search(
+                                    request_user=self.user, search_state=search_state
+                                )
+        return list(listing_ids), [thread.id for thread in threads]
+
+    def test_rows_are_created_by_signals(self):
+        listing = ThreadListing.objects.get(thread=self.q1.thread)
+        tag_names = set(self.q1.thread.tags.values_list('name', flat=True))
+        self.assertEqual(tag_names, set(['tag1', 'tag2']))
+        self.assertEqual(
+            set(listing.get_tag_ids()),
+            set(self.q1.thread.tags.values_list('id', flat=True))
+        )
+        self.assertEqual(listing.author_id, self.user.id)
+        self.assertEqual(listing.answer_count, 1)
+
+    def test_retag_updates_row(self):
+        self.user.retag_question(question=self.q3, tags='tag1')
+        listing = ThreadListing.objects.get(thread=self.q3.thread)
+        tag_ids = list(self.q3.thread.tags.values_list('id', flat=True))
+        self.assertEqual(listing.get_tag_ids(), tag_ids)
+        self.assertEqual(ThreadListingTag.objects.filter(listing=listing).count(), 1)
+
+    @override_settings(ASKBOT_ASYNC_VOTES=True)
+    def test_vote_updates_row(self):
+        self.user2.upvote(self.q1)
+        listing = ThreadListing.objects.get(thread=self.q1.thread)
+        self.assertEqual(listing.points, 1)
+
+    def test_deleting_content_of_user_updates_rows(self):
+        admin = self.create_user('admin', status='d')
+        admin.delete_all_content_authored_by_user(self.user2)
+        listing = ThreadListing.objects.get(thread=self.q3.thread)
+        self.assertTrue(listing.deleted)
+
+    def test_delete_question_updates_row(self):
+        self.user2.delete_question(self.q3)
+        listing = ThreadListing.objects.get(thread=self.q3.thread)
+        self.assertTrue(listing.deleted)
+
+    def test_rebuild(self):
+        ThreadListing.objects.all().delete()
+        count = ThreadListing.objects.rebuild(batch_size=2)
+        self.assertEqual(count, 3)
+        listing = ThreadListing.objects.get(thread=self.q2.thread)
+        group_ids = self.q2.thread.groups.values_list('id', flat=True)
+        self.assertEqual(set(listing.get_group_ids()), set(group_ids))
+
+    def test_search_matches_advanced_search(self):
+        search_state = SearchState.get_empty()
+        search_states = (
+            search_state,
+            search_state.add_tag('tag1'),
+            search_state.add_tag('tag1').add_tag('tag3'),
+            search_state.add_tag('tag5'),
+            search_state.change_scope('unanswered'),
+            SearchState(
+                scope=None, sort=None, query=None, tags=None,
+                author=self.user2.id, page=None, user_logged_in=True
+            ),
+        )
+        for state in search_states:
+            for sort in ('age-desc', 'age-asc', 'answers-desc', 'activity-desc'):
+                state = state.change_sort(sort)
+                listing_ids, thread_ids = self.run_both_searches(state)
+                self.assertEqual(set(listing_ids), set(thread_ids))
+
+    def test_text_search_is_not_supported(self):
+        search_state = SearchState(
+                            scope=None, sort=None, query='body', tags=None,
+                            author=None, page=None, user_logged_in=True
+                        )
+        self.assertFalse(ThreadListing.objects.can_run_search(search_state))
+        self.assertTrue(ThreadListing.objects.can_run_search(SearchState.get_empty()))
+
+    def test_questions_page(self):
+        response = self.client.get(reverse('questions'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['threads'].object_list), 3)
@@ -3,6 +3,8 @@ from askbot.conf import settings as askbot_settings
 from askbot import models
 import django.core.mail
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 class ThreadModelTestsWithGroupsEnabled(AskbotTestCase):
 
@@ -126,3 +128,38 @@ class ThreadModelTestsWithGroupsEnabled(AskbotTestCase):
         answer_groups = set(answer.groups.all())
         user_groups = set(self.user.get_groups())
         self.assertEqual(len(answer_groups & user_groups), 1)
+
+
+class ThreadPostDataQueryCountTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user('user')
+        self.question = self.post_question(user=self.user)
+        self.answer_count = 0
+
+    def add_answers(self, count):
+        for i in range(count):
+            self.answer_count += 1
+            user = self.create_user('answerer%d' % self.answer_count)
+            answer = self.post_answer(user=user, question=self.question)
+            self.edit_answer(user=user, answer=answer)
+            self.post_comment(user=self.user, parent_post=answer)
+
+    def count_post_data_queries(self):
+        thread = models.Thread.objects.get(id=self.question.thread_id)
+        with CaptureQueriesContext(connection) as queries:
+            question, answers, post_to_author, published = thread.get_post_data()
+            for post in [question] + answers:
+                post.get_earliest_revision().author.username
+                post.get_latest_revision().author.username
+                for comment in post.get_cached_comments():
+                    comment.get_latest_revision().author.username
+        self.assertEqual(len(answers), self.answer_count)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_thread_size(self):
+        self.add_answers(2)
+        self.count_post_data_queries()#warm up the settings cache
+        small_thread_count = self.count_post_data_queries()
+        self.add_answers(20)
+        self.assertEqual(self.count_post_data_queries(), small_thread_count)
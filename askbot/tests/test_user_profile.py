@@ -0,0 +1,63 @@
+from django.core import cache
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from mock import patch
+
+from askbot import models
+from askbot.models.user_profile import get_profile_cache_key
+from askbot.models.user_profile import profile_identity_map
+from askbot.tests.utils import AskbotTestCase
+
+
+class ProfileIdentityMapTests(AskbotTestCase):
+
+    def setUp(self):
+        self.users = [self.create_user('user%d' % number) for number in range(5)]
+        profile_identity_map.activate()
+
+    def tearDown(self):
+        profile_identity_map.deactivate()
+
+    def get_fresh_users(self):
+        return list(models.User.objects.filter(id__in=[user.id for user in self.users]))
+
+    def test_profile_is_read_once_per_request(self):
+        user = self.get_fresh_users()[0]
+        models.get_profile(user)
+        with patch('askbot.models.user_profile.cache', wraps=cache.cache) as profile_cache:
+            same_user = models.User.objects.get(id=user.id)
+            self.assertEqual(same_user.reputation, user.reputation)
+        self.assertFalse(profile_cache.get.called)
+
+    def test_profile_is_shared_by_user_instances(self):
+        user1 = models.User.objects.get(id=self.users[0].id)
+        user2 = models.User.objects.get(id=self.users[0].id)
+        user1.reputation = 50
+        self.assertEqual(user2.reputation, 50)
+
+    def test_prime_profiles_reads_cache_once(self):
+        users = self.get_fresh_users()
+        with patch('askbot.models.user_profile.cache', wraps=cache.cache) as profile_cache:
+            with CaptureQueriesContext(connection) as queries:
+                models.prime_profiles(users)
+                reputations = [user.reputation for user in users]
+        self.assertEqual(profile_cache.get_many.call_count, 1)
+        self.assertFalse(profile_cache.get.called)
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.assertEqual(reputations, [user.reputation for user in self.users])
+
+    def test_prime_profiles_loads_missing_profiles_in_one_query(self):
+        users = self.get_fresh_users()
+        cache.cache.delete_many([get_profile_cache_key(user) for user in users])
+        with CaptureQueriesContext(connection) as queries:
+            models.prime_profiles(users)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertTrue(cache.cache.get(get_profile_cache_key(users[0])))
+
+    def test_map_is_inactive_outside_requests(self):
+        profile_identity_map.deactivate()
+        models.get_profile(self.users[0])
+        self.assertEqual(profile_identity_map.get(self.users[0].id), None)
+        Client().get('/')
+        self.assertEqual(profile_identity_map.profiles, None)
@@ -0,0 +1,70 @@
+from django.core import cache
+from django.core import management
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+from mock import patch
+
+from askbot import models
+from askbot.models import user_trigrams
+from askbot.models.user_trigrams import get_trigrams
+from askbot.tests.utils import AskbotTestCase
+
+
+@override_settings(ASKBOT_USER_SEARCH_TRIGRAMS=True)
+class UserTrigramTests(AskbotTestCase):
+
+    def setUp(self):
+        cache.cache.clear()
+        self.alice = self.create_user('alice_gardener')
+        self.bob = self.create_user('BobBuilder')
+        self.bob.real_name = 'Robert Gardner'
+        self.bob.askbot_profile.save()
+
+    def get_usernames(self, query):
+        users = models.get_users_by_text_query(query)
+        return sorted([user.username for user in users])
+
+    def test_get_trigrams(self):
+        self.assertEqual(get_trigrams('Bob', 'ab'), set(['bob']))
+        self.assertEqual(get_trigrams('abcd'), set(['abc', 'bcd']))
+
+    def test_trigrams_follow_saves(self):
+        trigrams = set(models.UserTrigram.objects.filter(
+                                            user=self.bob
+                                        ).values_list('trigram', flat=True))
+        self.assertEqual(trigrams, get_trigrams('BobBuilder', 'Robert Gardner'))
+        self.bob.username = 'Bobby'
+        self.bob.save()
+        self.assertEqual(self.get_usernames('builder'), [])
+        self.assertEqual(self.get_usernames('bobby'), ['Bobby'])
+
+    def test_substring_search(self):
+        self.assertEqual(self.get_usernames('garden'), ['alice_gardener'])
+        self.assertEqual(self.get_usernames('GARD'), ['BobBuilder', 'alice_gardener'])
+        #all trigrams are found, but not in this order
+        self.assertEqual(self.get_usernames('derbob'), [])
+        #short queries match the beginning of the user name
+        self.assertEqual(self.get_usernames('al'), ['alice_gardener'])
+
+    def test_about_text_is_not_searched(self):
+        self.alice.update_localized_profile(about='Grows cucumbers')
+        self.assertEqual(self.get_usernames('cucumber'), [])
+
+    def test_trigrams_are_updated_only_on_rename(self):
+        user = models.User.objects.get(id=self.alice.id)
+        with patch.object(user_trigrams, 'update_user_trigrams') as update:
+            user.save()
+            self.assertEqual(update.call_count, 0)
+            user.username = 'alice'
+            user.save()
+            self.assertEqual(update.call_count, 1)
+
+    def test_rebuild_command(self):
+        models.UserTrigram.objects.all().delete()
+        management.call_command('askbot_rebuild_user_trigrams', stdout=StringIO())
+        self.assertEqual(self.get_usernames('builder'), ['BobBuilder'])
+
+    def test_merge_users(self):
+        management.call_command('merge_users', str(self.bob.id), str(self.alice.id))
+        self.assertEqual(self.get_usernames('builder'), [])
+        self.assertEqual(self.get_usernames('alice'), ['alice_gardener'])
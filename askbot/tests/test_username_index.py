@@ -0,0 +1,109 @@
+from django.core import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from askbot import models
+from askbot.models.username_index import get_users_by_name_seeds
+from askbot.models.username_index import get_usernames_by_prefix
+from askbot.tests.utils import AskbotTestCase
+from askbot.utils import markup
+
+
+class UsernameIndexTests(AskbotTestCase):
+
+    def setUp(self):
+        cache.cache.clear()
+        self.alice = self.create_user('alice')
+        self.alicia = self.create_user('Alicia')
+
+    def get_usernames(self, *name_seeds):
+        return sorted([user.username for user in get_users_by_name_seeds(name_seeds)])
+
+    def test_users_are_found_by_prefix(self):
+        self.assertEqual(self.get_usernames('ali'), ['Alicia', 'alice'])
+        self.assertEqual(self.get_usernames('ALIC'), ['Alicia', 'alice'])
+        self.assertEqual(self.get_usernames('alice'), ['alice'])
+        self.assertEqual(self.get_usernames('bob'), [])
+
+    def test_new_user_is_found(self):
+        self.get_usernames('ali')
+        self.create_user('alina')
+        self.assertEqual(self.get_usernames('alin'), ['alina'])
+
+    def test_renamed_user_is_found_by_new_name(self):
+        self.get_usernames('ali', 'bob')
+        self.alice.username = 'bob'
+        self.alice.save()
+        self.assertEqual(self.get_usernames('ali'), ['Alicia'])
+        self.assertEqual(self.get_usernames('bob'), ['bob'])
+
+    def test_deleted_user_is_not_found(self):
+        self.get_usernames('ali')
+        self.alicia.delete()
+        self.assertEqual(self.get_usernames('ali'), ['alice'])
+
+    def test_usernames_by_prefix(self):
+        self.create_user('alina')
+        self.assertEqual(get_usernames_by_prefix('ALI', 10), ['alice', 'Alicia', 'alina'])
+        self.assertEqual(get_usernames_by_prefix('ali', 2), ['alice', 'Alicia'])
+        self.assertEqual(get_usernames_by_prefix('alin', 10), ['alina'])
+        self.assertEqual(get_usernames_by_prefix('bob', 10), [])
+
+    def test_usernames_by_prefix_skip_renamed_users(self):
+        self.assertEqual(get_usernames_by_prefix('a', 1), ['alice'])
+        self.alice.username = 'bob'
+        self.alice.save()
+        self.assertEqual(get_usernames_by_prefix('a', 1), ['Alicia'])
+        self.assertEqual(get_usernames_by_prefix('bo', 10), ['bob'])
+
+    def test_autocomplete_view(self):
+        self.client.login(method='force', user_id=self.alice.id)
+        response = self.client.get(reverse('get_users_info'), {'q': 'alic', 'limit': 5})
+        #the first user is the administrator and sees the emails
+        self.assertEqual(
+            response.content,
+            'alice|alice@example.com\nAlicia|Alicia@example.com'
+        )
+
+    def test_mentions_are_resolved_with_one_lookup(self):
+        names = ['user%d' % number for number in range(20)]
+        for name in names:
+            self.create_user(name)
+        text = ' '.join(['@' + name for name in names])
+
+        with CaptureQueriesContext(connection) as queries:
+            question = self.post_question(user=self.alice, body_text=text)
+        likes = [query for query in queries.captured_queries if 'LIKE' in query['sql']]
+        self.assertEqual(len(likes), 1)
+        mentions = models.Activity.objects.get_mentions(mentioned_in=question)
+        self.assertEqual(len(mentions), 20)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.post_question(user=self.alice, body_text=text)
+        likes = [query for query in queries.captured_queries if 'LIKE' in query['sql']]
+        self.assertEqual(len(likes), 0)
+
+
+class MentionizeTextTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user('user1')
+
+    def mentionize(self, text):
+        return markup.mentionize_text(text, [self.user])
+
+    def test_mention_requires_termination_char_before(self):
+        authors, output = self.mentionize('mail@user1')
+        self.assertEqual(authors, [])
+        self.assertEqual(output, 'mail@user1')
+
+    def test_mention_after_at_sign(self):
+        authors, output = self.mentionize('@@user1')
+        self.assertEqual(authors, [self.user])
+        self.assertEqual(output, '@' + markup.format_mention_in_html(self.user))
+
+    def test_near_miss_is_not_mentioned(self):
+        authors, output = self.mentionize('@user12 @')
+        self.assertEqual(authors, [])
+        self.assertEqual(output, '@user12 @')
@@ -0,0 +1,99 @@
+import datetime
+
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from django.utils import timezone
+from mock import patch
+
+from askbot import models
+from askbot.models.visit_buffer import visit_buffer, write_view_counts
+from askbot.tests.utils import AskbotTestCase
+
+
+@override_settings(ASKBOT_VISIT_BUFFER_FLUSH_INTERVAL=3600)
+class VisitBufferTests(AskbotTestCase):
+
+    def setUp(self):
+        visit_buffer.pop_data()
+        self.user = self.create_user('user')
+        self.question = self.post_question(user=self.user)
+
+    def tearDown(self):
+        visit_buffer.pop_data()
+        if visit_buffer.timer:
+            visit_buffer.timer.cancel()
+            visit_buffer.timer = None
+
+    def visit_question(self):
+        client = Client()#new session for each visit
+        client.get(
+            self.question.get_absolute_url(),
+            HTTP_ACCEPT_LANGUAGE='en',
+            HTTP_USER_AGENT='Mozilla Gecko'
+        )
+
+    def get_view_count(self):
+        return models.Thread.objects.get(id=self.question.thread_id).view_count
+
+    def test_view_counts_are_buffered(self):
+        for i in range(3):
+            self.visit_question()
+        self.assertEqual(self.get_view_count(), 0)
+        visit_buffer.flush()
+        self.assertEqual(self.get_view_count(), 3)
+
+    def test_view_counts_are_written_in_one_query(self):
+        question2 = self.post_question(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            write_view_counts({self.question.thread_id: 2, question2.thread_id: 5})
+        updates = [query for query in queries.captured_queries
+                    if 'UPDATE' in query['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.get_view_count(), 2)
+        thread2 = models.Thread.objects.get(id=question2.thread_id)
+        self.assertEqual(thread2.view_count, 5)
+
+    def get_saved_last_seen(self):
+        #profile cache holds the buffered values, so read the table
+        profile = models.UserProfile.objects.get(pk=self.user.pk)
+        return profile.last_seen
+
+    def test_user_visits_are_buffered(self):
+        last_seen = self.get_saved_last_seen()
+        timestamp = last_seen + datetime.timedelta(minutes=1)
+        models.record_user_visit(self.user, timestamp)
+        self.assertEqual(self.get_saved_last_seen(), last_seen)
+        self.assertEqual(self.reload_object(self.user).last_seen, timestamp)
+        visit_buffer.flush()
+        self.assertEqual(self.get_saved_last_seen(), timestamp)
+
+    def test_consecutive_days_are_counted_once(self):
+        today = timezone.now()
+        self.user.last_seen = today
+        self.user.save()
+        tomorrow = today + datetime.timedelta(1)
+        models.record_user_visit(self.user, tomorrow)
+        models.record_user_visit(self.user, tomorrow + datetime.timedelta(minutes=1))
+        visit_buffer.flush()
+        user = self.reload_object(self.user)
+        self.assertEqual(user.consecutive_days_visit_count, 1)
+        self.assertEqual(user.last_seen, tomorrow + datetime.timedelta(minutes=1))
+
+    def test_idle_buffer_is_flushed_by_timer(self):
+        self.visit_question()
+        self.assertNotEqual(visit_buffer.timer, None)
+        #what the timer thread runs, minus closing the connection
+        visit_buffer.flush_idle()
+        self.assertEqual(visit_buffer.timer, None)
+        self.assertEqual(self.get_view_count(), 1)
+
+    @override_settings(ASKBOT_VISIT_BUFFER_FLUSH_INTERVAL=0)
+    def test_zero_interval_writes_right_away(self):
+        with patch('askbot.tasks.flush_visit_buffer') as flush_task:
+            self.visit_question()
+        self.assertFalse(flush_task.apply.called)
+        self.assertFalse(flush_task.apply_async.called)
+        self.assertEqual(self.get_view_count(), 1)
+        self.assertEqual(visit_buffer.timer, None)
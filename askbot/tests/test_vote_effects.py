@@ -0,0 +1,109 @@
+from django.core import cache
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from mock import patch
+
+from askbot import const
+from askbot import models
+from askbot.conf import settings as askbot_settings
+from askbot.models.vote_effects import apply_pending_vote_effects
+from askbot.tests.utils import AskbotTestCase
+from askbot.tests.utils import with_settings
+
+
+@override_settings(ASKBOT_ASYNC_VOTES=True)
+class AsyncVoteTests(AskbotTestCase):
+
+    def setUp(self):
+        cache.cache.clear()
+        self.author = self.create_user('author')
+        self.question = self.post_question(user=self.author)
+        self.answer = self.post_answer(user=self.author, question=self.question)
+        self.voters = [self.create_user('voter%d' % number, reputation=100) for number in range(3)]
+
+    def reload(self, obj):
+        return obj.__class__.objects.get(id=obj.id)
+
+    def get_reputation(self, user):
+        return models.UserProfile.objects.get(pk=user.id).reputation
+
+    def test_upvote_is_applied(self):
+        reputation = self.get_reputation(self.author)
+        self.voters[0].upvote(self.answer)
+        answer = self.reload(self.answer)
+        self.assertEqual(answer.points, 1)
+        self.assertEqual(answer.vote_up_count, 1)
+        self.assertEqual(
+            self.get_reputation(self.author),
+            reputation + askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+        )
+        self.assertEqual(models.Repute.objects.filter(user=self.author, reputation_type=1).count(), 1)
+        self.assertEqual(models.PendingVoteEffect.objects.count(), 0)
+
+    def test_question_vote_updates_thread_points(self):
+        self.voters[0].downvote(self.question)
+        self.assertEqual(self.reload(self.question).points, -1)
+        self.assertEqual(self.reload(self.question.thread).points, -1)
+        self.assertEqual(
+            self.get_reputation(self.voters[0]),
+            100 + askbot_settings.REP_LOSS_FOR_DOWNVOTING
+        )
+
+    def test_votes_on_post_are_coalesced(self):
+        with patch('askbot.utils.transaction.defer_celery_task') as defer:
+            for voter in self.voters:
+                voter.upvote(self.answer)
+        self.assertEqual(defer.call_count, 1)
+        self.assertEqual(self.reload(self.answer).points, 3)
+        self.assertEqual(models.PendingVoteEffect.objects.count(), 3)
+
+        reputation = self.get_reputation(self.author)
+        apply_pending_vote_effects(self.answer.id)
+        self.assertEqual(
+            self.get_reputation(self.author),
+            reputation + 3 * askbot_settings.REP_GAIN_FOR_RECEIVING_UPVOTE
+        )
+        self.assertEqual(models.PendingVoteEffect.objects.count(), 0)
+
+        #next vote schedules the task again
+        with patch('askbot.utils.transaction.defer_celery_task') as defer:
+            self.create_user('voter9', reputation=100).upvote(self.answer)
+        self.assertEqual(defer.call_count, 1)
+
+    def test_cancel_reverts_effects(self):
+        reputation = self.get_reputation(self.author)
+        vote = self.voters[0].upvote(self.answer)
+        vote.cancel()
+        answer = self.reload(self.answer)
+        self.assertEqual(answer.points, 0)
+        self.assertEqual(answer.vote_up_count, 0)
+        self.assertEqual(self.get_reputation(self.author), reputation)
+        self.assertFalse(models.Vote.objects.filter(voted_post=self.answer).exists())
+
+    def test_cancel_does_not_make_counts_negative(self):
+        vote = self.voters[0].upvote(self.answer)
+        models.Post.objects.filter(id=self.answer.id).update(vote_up_count=0)
+        vote.cancel()
+        self.assertEqual(self.reload(self.answer).vote_up_count, 0)
+
+    @with_settings(MAX_REP_GAIN_PER_USER_PER_DAY=10, REP_GAIN_FOR_RECEIVING_UPVOTE=10)
+    def test_cancel_in_batch_keeps_daily_limit(self):
+        vote = self.voters[0].upvote(self.answer)
+        reputation = self.get_reputation(self.author)
+        with patch('askbot.utils.transaction.defer_celery_task'):
+            vote.cancel()
+            self.voters[1].upvote(self.answer)
+            self.voters[2].upvote(self.answer)
+        apply_pending_vote_effects(self.answer.id)
+        self.assertEqual(self.get_reputation(self.author), reputation)
+
+    def test_vote_view(self):
+        self.client.login(method='force', user_id=self.voters[0].id)
+        response = self.client.post(
+            reverse('vote'),
+            data={'type': const.VOTE_UPVOTE_ANSWER, 'postId': self.answer.id},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('"count": 1', response.content)
+        self.assertEqual(self.reload(self.answer).points, 1)
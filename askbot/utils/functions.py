@@ -233,7 +233,10 @@ def setup_paginator(context):
                 "in_leading_range" : in_leading_range,
                 "in_trailing_range" : in_trailing_range,
                 "pages_outside_leading_range": pages_outside_leading_range,
-                "pages_outside_trailing_range": pages_outside_trailing_range}
+                "pages_outside_trailing_range": pages_outside_trailing_range,
+                #cursors are available when the page was made by keyset paginator
+                "next_cursor": getattr(page_object, 'next_cursor', None),
+                "previous_cursor": getattr(page_object, 'previous_cursor', None)}
 
 def get_admin():
     """Returns an admin users, usefull for raising flags"""
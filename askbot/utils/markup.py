@@ -3,15 +3,23 @@ handling of markdown and additional syntax rules -
 such as optional link patterns, video embedding and
 Twitter-style @mentions"""
 
+import hashlib
 import re
 import logging
+import threading
+from collections import OrderedDict
 
+from django.conf import settings as django_settings
+from django.core import cache
+from django.utils.encoding import force_unicode
 from django.utils.html import urlize
 from django.utils.module_loading import import_string
 
 from askbot import const
 from askbot.conf import settings as askbot_settings
 from askbot.utils.functions import split_phrases
+from askbot.utils.html import ALLOWED_HTML_ATTRIBUTES
+from askbot.utils.html import ALLOWED_HTML_ELEMENTS
 from askbot.utils.html import sanitize_html
 from askbot.utils.html import strip_tags
 from askbot.utils.html import urlize_html
@@ -20,6 +28,10 @@ from askbot.utils.html import urlize_html
 URL_RE = re.compile("((?<!(href|.src|data)=['\"])((http|https|ftp)\://([a-zA-Z0-9\.\-]+(\:[a-zA-Z0-9\.&amp;%\$\-]+)*@)*((25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9])\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9]|0)\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9]|0)\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[0-9])|localhost|([a-zA-Z0-9\-]+\.)*[a-zA-Z0-9\-]+\.(com|edu|gov|int|mil|net|org|biz|arpa|info|name|pro|aero|coop|museum|[a-zA-Z]{2}))(\:[0-9]+)*(/($|[a-zA-Z0-9\.\,\?\'\\\+&amp;%\$#\=~_\-]+))*))")
 
 
+def get_markdown_class_addr():
+    return getattr(django_settings, 'ASKBOT_MARKDOWN_CLASS', 'markdown2.Markdown')
+
+
 def get_parser(markdown_class_addr=None):
     """
     Returns an instance of configured :class:`markdown2.Markdown parser.
@@ -29,9 +41,7 @@ def get_parser(markdown_class_addr=None):
     :type markdown_class_addr: ``str``
     """
     if markdown_class_addr is None:
-        from django.conf import settings as django_settings
-        markdown_class_addr = getattr(django_settings, 'ASKBOT_MARKDOWN_CLASS',
-                                      'markdown2.Markdown')
+        markdown_class_addr = get_markdown_class_addr()
     Markdown = import_string(markdown_class_addr)
     extras = ['link-patterns', 'video']
 
@@ -72,6 +82,112 @@ def get_parser(markdown_class_addr=None):
     )
 
 
+def get_parser_settings():
+    """returns tuple of the settings used to configure the parser"""
+    return (
+        get_markdown_class_addr(),
+        askbot_settings.ENABLE_MATHJAX,
+        askbot_settings.MARKUP_CODE_FRIENDLY,
+        askbot_settings.ENABLE_AUTO_LINKING,
+        askbot_settings.AUTO_LINK_PATTERNS,
+        askbot_settings.AUTO_LINK_URLS,
+    )
+
+
+def get_markup_settings_version():
+    """returns hash of the settings which change
+    the html converted from the post texts"""
+    values = get_parser_settings() + (
+        getattr(django_settings, 'ASKBOT_ALLOWED_HTML_ELEMENTS', ALLOWED_HTML_ELEMENTS),
+        getattr(django_settings, 'ASKBOT_ALLOWED_HTML_ATTRIBUTES', ALLOWED_HTML_ATTRIBUTES),
+    )
+    return hashlib.md5(repr(values)).hexdigest()
+
+
+_PARSERS = threading.local()
+
+
+def get_cached_parser():
+    """same as :func:`get_parser`, but the parser is
+    made once per thread and rebuilt only when the
+    settings used to configure it change"""
+    parser_settings = get_parser_settings()
+    if getattr(_PARSERS, 'settings', None) != parser_settings:
+        _PARSERS.parser = get_parser()
+        _PARSERS.settings = parser_settings
+    return _PARSERS.parser
+
+
+def reset_cached_parser():
+    _PARSERS.__dict__.clear()
+
+
+class RenderedHtmlCache(object):
+    """Cache of the html converted from the post texts.
+
+    The recently used items are kept in the process memory,
+    up to ``ASKBOT_RENDERED_HTML_CACHE_SIZE`` of them,
+    the others are looked up in the shared django cache.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get_key(self, converter_path, text):
+        text_hash = hashlib.sha1(force_unicode(text).encode('utf-8')).hexdigest()
+        key_data = (converter_path, get_markup_settings_version(), text_hash)
+        return 'askbot-html-' + hashlib.md5(repr(key_data)).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            html = self.items.pop(key, None)
+            if html is not None:
+                self.items[key] = html #move to the end
+                return html
+        html = cache.cache.get(key)
+        if html is not None:
+            self.add_local(key, html)
+        return html
+
+    def add_local(self, key, html):
+        size = django_settings.ASKBOT_RENDERED_HTML_CACHE_SIZE
+        with self.lock:
+            self.items[key] = html
+            while len(self.items) > size:
+                self.items.popitem(last=False)
+
+    def set(self, key, html):
+        self.add_local(key, html)
+        cache.cache.set(key, html)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.items.pop(key, None)
+        cache.cache.delete_many(keys)
+
+    def clear(self):
+        with self.lock:
+            self.items = OrderedDict()
+
+
+rendered_html_cache = RenderedHtmlCache()
+
+
+def convert_text_cached(converter_path, text):
+    """returns html converted from the ``text`` by the
+    converter function at the python path ``converter_path``,
+    the results are cached by the converter, the version
+    of the markup settings and the hash of the text"""
+    key = rendered_html_cache.get_key(converter_path, text)
+    html = rendered_html_cache.get(key)
+    if html is None:
+        html = import_string(converter_path)(text)
+        rendered_html_cache.set(key, html)
+    return html
+
+
 def format_mention_in_html(mentioned_user):
     """formats mention as url to the user profile"""
     url = mentioned_user.get_profile_url()
@@ -79,63 +195,45 @@ def format_mention_in_html(mentioned_user):
     return '<a href="%s">@%s</a>' % (url, username)
 
 
+def match_mentioned_author(text, start, anticipated_authors):
+    """matches ``text`` from the position ``start`` with the names
+    of ``anticipated_authors`` - list of user objects.
+    Returns the first matched user object and the position
+    of the end of the matched name, or ``(None, start)``"""
+    for author in anticipated_authors:
+        end = start + len(author.username)
+        if text[start:end].lower() != author.username.lower():
+            continue
+        if end == len(text) or text[end] in const.TWITTER_STYLE_MENTION_TERMINATION_CHARS:
+            return author, end
+        # near miss, here we could insert a warning that perhaps
+        # a termination character is needed
+    return None, start
+
+
 def extract_first_matching_mentioned_author(text, anticipated_authors):
     """matches beginning of ``text`` string with the names
     of ``anticipated_authors`` - list of user objects.
     Returns upon first match the first matched user object
     and the remainder of the ``text`` that is left unmatched"""
+    author, end = match_mentioned_author(text, 0, anticipated_authors)
+    return author, text[end:]
 
-    if not text:
-        return None, ''
 
-    for author in anticipated_authors:
-        if text.lower().startswith(author.username.lower()):
-            ulen = len(author.username)
-            if len(text) == ulen:
-                text = ''
-            elif text[ulen] in const.TWITTER_STYLE_MENTION_TERMINATION_CHARS:
-                text = text[ulen:]
-            else:
-                # near miss, here we could insert a warning that perhaps
-                # a termination character is needed
-                continue
-            return author, text
-    return None, text
+MENTION_NAME_SEED_RE = re.compile(
+    '@([^@%s]{1,11})' % re.escape(const.TWITTER_STYLE_MENTION_TERMINATION_CHARS)
+)
 
 
 def extract_mentioned_name_seeds(text):
     """Returns list of strings that
     follow the '@' symbols in the text.
-    The strings will be 10 characters long,
+    The strings will be 11 characters long,
     or shorter, if the subsequent character
     is one of the list accepted to be termination
     characters.
     """
-    extra_name_seeds = set()
-    while '@' in text:
-        pos = text.index('@')
-        text = text[pos+1:]  # chop off prefix
-        name_seed = ''
-        for char in text:
-            if char in const.TWITTER_STYLE_MENTION_TERMINATION_CHARS:
-                extra_name_seeds.add(name_seed)
-                name_seed = ''
-                break
-            if len(name_seed) > 10:
-                extra_name_seeds.add(name_seed)
-                name_seed = ''
-                break
-            if char == '@':
-                if len(name_seed) > 0:
-                    extra_name_seeds.add(name_seed)
-                    name_seed = ''
-                break
-            name_seed += char
-        if len(name_seed) > 0:
-            # in case we run off the end of text
-            extra_name_seeds.add(name_seed)
-
-    return extra_name_seeds
+    return set(MENTION_NAME_SEED_RE.findall(text))
 
 
 def mentionize_text(text, anticipated_authors):
@@ -144,60 +242,40 @@ def mentionize_text(text, anticipated_authors):
       replaced with urls to the corresponding user profiles
     * list of users whose names matched the @mentions
     """
-    output = ''
+    output = list()
     mentioned_authors = list()
-    while '@' in text:
-        # the purpose of this loop is to convert any occurance of
-        # '@mention ' syntax
-        # to user account links leading space is required unless @ is the first
-        # character in whole text, also, either a punctuation or
-        # a ' ' char is required after the name
-        pos = text.index('@')
-
+    start = 0
+    pos = text.find('@')
+    while pos != -1:
         # save stuff before @mention to the output
-        output += text[:pos]  # this works for pos == 0 too
-
-        if len(text) == pos + 1:
-            # finish up if the found @ is the last symbol
-            output += '@'
-            text = ''
-            break
-
-        if pos > 0:
-
-            if text[pos-1] in const.TWITTER_STYLE_MENTION_TERMINATION_CHARS:
-                # if there is a termination character before @mention
-                # indeed try to find a matching person
-                text = text[pos+1:]
-                mentioned_author, text = \
-                    extract_first_matching_mentioned_author(
-                        text, anticipated_authors)
-                if mentioned_author:
-                    mentioned_authors.append(mentioned_author)
-                    output += format_mention_in_html(mentioned_author)
-                else:
-                    output += '@'
-
-            else:
-                # if there isn't, i.e. text goes like something@mention,
-                # do not look up people
-                output += '@'
-                text = text[pos+1:]
+        output.append(text[start:pos])
+        start = pos + 1
+
+        # leading space or other termination character is required
+        # unless @ is the first character in whole text or follows
+        # another @, i.e. in text like something@mention
+        # people are not looked up
+        prev_char = text[pos - 1] if pos > 0 else None
+        if prev_char is None or prev_char == '@' \
+            or prev_char in const.TWITTER_STYLE_MENTION_TERMINATION_CHARS:
+            mentioned_author, end = match_mentioned_author(
+                                            text, start, anticipated_authors
+                                        )
         else:
-            # do this if @ is the first character
-            text = text[1:]
-            mentioned_author, text = \
-                extract_first_matching_mentioned_author(
-                    text, anticipated_authors)
-            if mentioned_author:
-                mentioned_authors.append(mentioned_author)
-                output += format_mention_in_html(mentioned_author)
-            else:
-                output += '@'
+            mentioned_author = None
+
+        if mentioned_author:
+            mentioned_authors.append(mentioned_author)
+            output.append(format_mention_in_html(mentioned_author))
+            start = end
+        else:
+            output.append('@')
+
+        pos = text.find('@', start)
 
     # append the rest of text that did not have @ symbols
-    output += text
-    return mentioned_authors, output
+    output.append(text[start:])
+    return mentioned_authors, ''.join(output)
 
 
 def plain_text_input_converter(text):
@@ -207,7 +285,7 @@ def plain_text_input_converter(text):
 
 def markdown_input_converter(text):
     """markdown to html converter"""
-    text = get_parser().convert(text)
+    text = get_cached_parser().convert(text)
     text = sanitize_html(text)
     text = urlize_html(text)
     return sanitize_html(text)
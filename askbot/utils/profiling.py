@@ -0,0 +1,223 @@
+"""Measurement of the database, cache and template work done
+by a block of code, usually by a view.
+
+:class:`ViewProfile` is a context manager recording the number and
+the total time of the SQL queries, the queries repeated with different
+parameters (the usual sign of the N+1 problem), the cache hits and
+misses and the time spent rendering the templates::
+
+    with ViewProfile('readers.question') as profile:
+        response = view(request)
+    logging.info(profile.format_log_line())
+
+The same measurements are made for every view by the
+:class:`askbot.middleware.profiler.ViewProfileMiddleware`.
+"""
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from django.db import connection as default_connection
+
+STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUE_LIST_RE = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+_ACTIVE = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    """raised when a view runs more queries than allowed
+    by the setting ``ASKBOT_QUERY_BUDGETS``"""
+
+
+def get_query_fingerprint(sql):
+    """returns the query with the literal values replaced,
+    so that the queries differing only by the parameters match"""
+    sql = STRING_LITERAL_RE.sub('?', sql)
+    sql = NUMBER_LITERAL_RE.sub('?', sql)
+    return VALUE_LIST_RE.sub('(...)', sql)
+
+
+def get_view_name(view_func):
+    name = getattr(view_func, '__name__', view_func.__class__.__name__)
+    return '%s.%s' % (view_func.__module__, name)
+
+
+def set_request_view(request, view_func):
+    """names the profile of the request after the ``view_func``,
+    used by the views dispatching the request to other functions"""
+    profile = getattr(request, '_askbot_view_profile', None)
+    if profile:
+        profile.name = get_view_name(view_func)
+
+
+def get_active_profiles():
+    profiles = getattr(_ACTIVE, 'profiles', None)
+    if profiles is None:
+        profiles = list()
+        _ACTIVE.profiles = profiles
+    return profiles
+
+
+def record_template_render(seconds):
+    """adds rendering time to the profiles active in this thread"""
+    for profile in get_active_profiles():
+        profile.template_time += seconds
+
+
+class render_timer(object):
+    """context manager timing a template render"""
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *args):
+        record_template_render(time.time() - self.start)
+
+
+def record_cache_reads(hits, misses):
+    for profile in get_active_profiles():
+        profile.cache_hits += hits
+        profile.cache_misses += misses
+
+
+def instrument_cache(backend):
+    """replaces the read methods of the cache backend instance
+    with the ones counting hits and misses, cache backends
+    are not shared between the threads"""
+    get = backend.get
+    get_many = backend.get_many
+
+    def counting_get(key, default=None, version=None):
+        value = get(key, default=default, version=version)
+        if getattr(_ACTIVE, 'in_get_many', False):
+            #some backends implement get_many with get
+            return value
+        if value is default:
+            record_cache_reads(0, 1)
+        else:
+            record_cache_reads(1, 0)
+        return value
+
+    def counting_get_many(keys, version=None):
+        keys = list(keys)
+        _ACTIVE.in_get_many = True
+        try:
+            values = get_many(keys, version=version)
+        finally:
+            _ACTIVE.in_get_many = False
+        record_cache_reads(len(values), len(keys) - len(values))
+        return values
+
+    backend.get = counting_get
+    backend.get_many = counting_get_many
+
+
+def uninstrument_cache(backend):
+    for name in ('get', 'get_many'):
+        backend.__dict__.pop(name, None)
+
+
+class ViewProfile(object):
+    """records the work done inside the ``with`` block"""
+
+    def __init__(self, name=None, connection=None):
+        self.name = name
+        self.connection = connection or default_connection
+        self.queries = list()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.total_time = 0.0
+
+    def __enter__(self):
+        profiles = get_active_profiles()
+        if not profiles:
+            self.cache_backend = caches[DEFAULT_CACHE_ALIAS]
+            instrument_cache(self.cache_backend)
+        else:
+            self.cache_backend = None
+        profiles.append(self)
+
+        self.force_debug_cursor = self.connection.force_debug_cursor
+        self.connection.force_debug_cursor = True
+        self.saved_queries_log = None
+        if self.connection.queries_log.maxlen is not None:
+            #the log of the connection keeps only the latest queries,
+            #longer blocks are recorded in an unlimited one
+            self.saved_queries_log = self.connection.queries_log
+            self.connection.queries_log = deque(self.saved_queries_log)
+        self.initial_query_count = len(self.connection.queries_log)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.total_time = time.time() - self.start
+        self.connection.force_debug_cursor = self.force_debug_cursor
+        self.queries = list(self.connection.queries_log)[self.initial_query_count:]
+        if self.saved_queries_log is not None:
+            self.saved_queries_log.extend(self.queries)
+            self.connection.queries_log = self.saved_queries_log
+        get_active_profiles().remove(self)
+        if self.cache_backend:
+            uninstrument_cache(self.cache_backend)
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def sql_time(self):
+        return sum([float(query['time']) for query in self.queries])
+
+    def get_duplicate_queries(self):
+        """returns list of pairs (fingerprint, count)
+        of the queries run more than once, most repeated first"""
+        counts = Counter([get_query_fingerprint(query['sql']) for query in self.queries])
+        return [(sql, count) for sql, count in counts.most_common() if count > 1]
+
+    def as_dict(self):
+        duplicates = self.get_duplicate_queries()
+        return {
+            'view': self.name,
+            'queries': self.query_count,
+            'sql_time': round(self.sql_time, 4),
+            'duplicate_queries': sum([count - 1 for sql, count in duplicates]),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'template_time': round(self.template_time, 4),
+            'total_time': round(self.total_time, 4),
+        }
+
+    def format_log_line(self):
+        data = self.as_dict()
+        keys = ('view', 'queries', 'sql_time', 'duplicate_queries',
+                'cache_hits', 'cache_misses', 'template_time', 'total_time')
+        return ' '.join(['%s=%s' % (key, data[key]) for key in keys])
+
+    def get_response_headers(self):
+        data = self.as_dict()
+        return {
+            'X-Askbot-Queries': str(data['queries']),
+            'X-Askbot-SQL-Time': str(data['sql_time']),
+            'X-Askbot-Duplicate-Queries': str(data['duplicate_queries']),
+            'X-Askbot-Cache-Hits': str(data['cache_hits']),
+            'X-Askbot-Cache-Misses': str(data['cache_misses']),
+            'X-Askbot-Template-Time': str(data['template_time']),
+        }
+
+    def check_budget(self, budgets):
+        """raises :class:`QueryBudgetExceeded` if the view
+        ran more queries than given for it in the ``budgets``"""
+        budget = budgets.get(self.name)
+        if budget is not None and self.query_count > budget:
+            duplicates = self.get_duplicate_queries()[:3]
+            details = '; '.join(['%d x %s' % (count, sql) for sql, count in duplicates])
+            raise QueryBudgetExceeded(
+                '%s ran %d queries, the budget is %d. Repeated queries: %s' % (
+                    self.name, self.query_count, budget, details or 'none'
+                )
+            )
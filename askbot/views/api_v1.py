@@ -7,6 +7,7 @@ from django.db.models import Q
 from django.core.urlresolvers import reverse
 from askbot import models
 from askbot.conf import settings as askbot_settings
+from askbot.search.pagination import paginate_threads
 from askbot.search.state_manager import SearchState
 from askbot.utils.html import site_url
 from askbot.utils.functions import get_epoch_str
@@ -191,11 +192,13 @@ def questions(request):
     #global_group = models.Group.objects.get_global_group()
     #qs = qs.exclude(~Q(groups__id=global_group.id))
 
-    page_size = askbot_settings.DEFAULT_QUESTIONS_PAGE_SIZE
-    paginator = Paginator(qs, page_size)
-    if paginator.num_pages < search_state.page:
-        search_state.page = 1
-    page = paginator.page(search_state.page)
+    paginator, page = paginate_threads(
+                            qs,
+                            request_user=request.user,
+                            search_state=search_state,
+                            cursor=request.GET.get('cursor'),
+                            page_size=int(askbot_settings.DEFAULT_QUESTIONS_PAGE_SIZE)
+                        )
 
     question_list = list()
     for thread in page.object_list:
@@ -205,7 +208,9 @@ def questions(request):
     ajax_data = {
         'count': paginator.count,
         'pages' : paginator.num_pages,
-        'questions': question_list
+        'questions': question_list,
+        'next_cursor': getattr(page, 'next_cursor', None),
+        'previous_cursor': getattr(page, 'previous_cursor', None),
     }
     response_data = simplejson.dumps(ajax_data)
     return HttpResponse(response_data, content_type='application/json')
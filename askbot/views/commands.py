@@ -48,6 +48,7 @@ from django.template import RequestContext
 from askbot.skins.loaders import render_into_skin_as_string
 from askbot.skins.loaders import render_text_into_skin
 from askbot.models.tag import get_tags_by_names
+from askbot.models.username_index import get_usernames_by_prefix
 
 
 def process_vote(user = None, vote_direction = None, post = None):
@@ -97,7 +98,7 @@ def process_vote(user = None, vote_direction = None, post = None):
         response_data['count'] = post.points
         response_data['status'] = 0 #this means "not cancel", normal operation
 
-    if vote and post.thread_id:
+    if vote and post.thread_id and not models.async_votes_enabled():
         #todo: may be more careful here and clear
         #less items and maybe recalculate certain data
         #depending on whether the vote is on question
@@ -188,7 +189,7 @@ def vote(request):
             response_data = process_vote(
                 user=user, vote_direction=vote_args[1], post=post)
 
-            if vote_args[0] == 'question':
+            if vote_args[0] == 'question' and not models.async_votes_enabled():
                 post.thread.update_summary_html()
         elif vote_type in const.VOTE_TYPES_REPORTING:
             user.flag_post(post, cancel=vote_args[1], cancel_all=vote_args[2])
@@ -1235,15 +1236,18 @@ def get_users_info(request):
     query = request.GET['q']
     limit = IntegerField().clean(request.GET['limit'])
 
-    users = models.User.objects
-    user_info_list = users.filter(username__istartswith=query)
-
+    usernames = get_usernames_by_prefix(query, limit)
     if request.user.is_administrator_or_moderator():
-        user_info_list = user_info_list.values_list('username', 'email')
+        emails = dict(
+            models.User.objects.filter(
+                            username__in=usernames
+                        ).values_list('username', 'email')
+        )
+        user_info_list = [(username, emails.get(username, '')) for username in usernames]
     else:
-        user_info_list = user_info_list.values_list('username')
+        user_info_list = [(username,) for username in usernames]
 
-    result_list = ['|'.join(info) for info in user_info_list[:limit]]
+    result_list = ['|'.join(info) for info in user_info_list]
     return HttpResponse('\n'.join(result_list), content_type='text/plain')
 
 @csrf.csrf_protect
@@ -16,6 +16,7 @@ from django.http import HttpResponse
 from django.http import Http404
 from django.http import HttpResponseNotAllowed
 from django.http import HttpResponseBadRequest
+from django.core import cache
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
 from django.template.loader import get_template
 from django.template import Context, RequestContext
@@ -26,6 +27,7 @@ from django.utils.translation import ugettext as _
 from django.utils.translation import ungettext
 from django.utils import translation
 from django.views.decorators import csrf
+from django.middleware.csrf import get_token
 from django.core.urlresolvers import reverse
 from django.core import exceptions as django_exceptions
 from django.contrib.humanize.templatetags import humanize
@@ -41,6 +43,8 @@ from askbot.forms import ShowTagsForm
 from askbot.forms import ShowQuestionForm
 from askbot.models.post import MockPost
 from askbot.models.tag import Tag
+from askbot.search import result_cache
+from askbot.search.pagination import paginate_threads
 from askbot.search.state_manager import SearchState, DummySearchState
 from askbot.startup_procedures import domain_is_bad
 from askbot.templatetags import extra_tags
@@ -58,6 +62,9 @@ import askbot
 #todo: - take these out of const or settings
 from askbot.models import Post, Vote
 
+#stands for the csrf token in the cached html of the question page
+CSRF_TOKEN_PLACEHOLDER = '__askbot_csrf_token__'
+
 #refactor? - we have these
 #views that generate a listing of questions in one way or another:
 #index, unanswered, questions, search, tag
@@ -83,39 +90,88 @@ def questions(request, **kwargs):
                     **kwargs
                 )
 
-    qs, meta_data = models.Thread.objects.run_advanced_search(
-                        request_user=request.user, search_state=search_state
-                    )
-    if meta_data['non_existing_tags']:
-        search_state = search_state.remove_tags(meta_data['non_existing_tags'])
-
-    paginator = Paginator(qs, search_state.page_size)
-    if paginator.num_pages < search_state.page:
-        search_state.page = 1
-    page = paginator.page(search_state.page)
-    page.object_list = list(page.object_list) # evaluate the queryset
-
-    # INFO: Because for the time being we need question posts and thread authors
-    #       down the pipeline, we have to precache them in thread objects
-    models.Thread.objects.precache_view_data_hack(threads=page.object_list)
-
-    related_tags = Tag.objects.get_related_to_search(
-                        threads=page.object_list,
-                        ignored_tag_names=meta_data.get('ignored_tag_names',[])
-                    )
+    #results for anonymous visitors are shared
+    cache_search = result_cache.can_cache_results(request, search_state)
+    cached_data = None
+    if cache_search:
+        results_key = result_cache.get_results_cache_key(search_state)
+        cached_data = result_cache.get_cached_results(results_key)
+
+    if cached_data:
+        meta_data = cached_data['meta_data']
+        if meta_data['non_existing_tags']:
+            search_state = search_state.remove_tags(meta_data['non_existing_tags'])
+        paginator, page, related_tags, contributors = \
+            result_cache.load_cached_results(cached_data, search_state)
+        search_state.page = page.number
+        models.Thread.objects.precache_view_data_hack(
+            threads=[thread for thread in page.object_list \
+                                    if not thread.summary_html_cached()]
+        )
+    else:
+        use_listing = models.listing_is_enabled() and \
+            models.ThreadListing.objects.can_run_search(search_state)
+
+        if use_listing:
+            #paginate over thread ids from the denormalized table
+            qs, meta_data = models.ThreadListing.objects.run_search(
+                                request_user=request.user, search_state=search_state
+                            )
+        else:
+            qs, meta_data = models.Thread.objects.run_advanced_search(
+                                request_user=request.user, search_state=search_state
+                            )
+        if meta_data['non_existing_tags']:
+            search_state = search_state.remove_tags(meta_data['non_existing_tags'])
+
+        paginator, page = paginate_threads(
+                                qs,
+                                request_user=request.user,
+                                search_state=search_state,
+                                cursor=request.GET.get('cursor'),
+                                id_field=('thread' if use_listing else 'id')
+                            )
+
+        # INFO: Because for the time being we need question posts and thread authors
+        #       down the pipeline, we have to precache them in thread objects
+        models.Thread.objects.precache_view_data_hack(threads=page.object_list)
+
+        related_tags = None
+        if search_state.tags and search_state.scope == 'all' \
+            and not (search_state.query or search_state.author):
+            #tags used together with the selected ones in the public threads,
+            #the other searches use the tags of the threads on the page
+            related_tags = models.TagCooccurrence.objects.get_related_tags(
+                            search_state.tags,
+                            ignored_tag_names=meta_data.get('ignored_tag_names',[])
+                        )
+        if not related_tags:
+            related_tags = Tag.objects.get_related_to_search(
+                            threads=page.object_list,
+                            ignored_tag_names=meta_data.get('ignored_tag_names',[])
+                        )
+
+        contributors = list(
+            models.Thread.objects.get_thread_contributors(
+                                            thread_list=page.object_list
+                                        ).only(
+                                               'id', 'username',
+                                               'askbot_profile__gravatar'
+                                              )
+                            )
+
+        if cache_search:
+            result_cache.cache_results(
+                results_key, paginator, page,
+                related_tags, contributors, meta_data
+            )
+
+    models.prime_profiles(contributors)
+
     tag_list_type = askbot_settings.TAG_LIST_FORMAT
     if tag_list_type == 'cloud': #force cloud to sort by name
         related_tags = sorted(related_tags, key = operator.attrgetter('name'))
 
-    contributors = list(
-        models.Thread.objects.get_thread_contributors(
-                                        thread_list=page.object_list
-                                    ).only(
-                                           'id', 'username',
-                                           'askbot_profile__gravatar'
-                                          )
-                        )
-
     paginator_context = {
         'is_paginated' : (paginator.count > search_state.page_size),
         'pages': paginator.num_pages,
@@ -529,12 +585,86 @@ def question(request, id):#refactor - long subroutine. display question body, an
 
     logging.debug('answer_sort_method=' + unicode(answer_sort_method))
 
-    #load answers and post id's->athor_id mapping
-    #posts are pre-stuffed with the correctly ordered comments
-    question_post, answers, post_to_author, published_answer_ids = thread.get_post_data_for_question_view(
-                                sort_method=answer_sort_method,
-                                user=request.user
-                            )
+    #rendered posts are cached per thread, sort method, page and
+    #the group signature of the user (see Thread.get_group_signature),
+    #the per-user state - votes, ownership of the posts, follow status
+    #and the drafts is applied on top of the cached html
+    is_cacheable = not (show_comment or show_answer) \
+        and question_post.is_approved() \
+        and not (
+            askbot_settings.CONTENT_MODERATION_MODE == 'premoderation' \
+            and request.user.is_authenticated() \
+            and request.user.is_watched()
+        )
+
+    page_fragment = None
+    if is_cacheable:
+        page_fragment_key = thread.get_page_fragment_cache_key(
+                                        user=request.user,
+                                        sort_method=answer_sort_method,
+                                        page=show_page
+                                    )
+        page_fragment = cache.cache.get(page_fragment_key)
+        #the html includes the user cards of the authors and editors
+        if page_fragment and page_fragment['user_cards_signature'] != \
+            models.get_user_cards_signature(
+                        page_fragment['card_user_ids'], translation.get_language()
+                    ):
+            page_fragment = None
+
+    show_comment_position = None
+    paginator_context = None
+    if page_fragment:
+        #the posts are not loaded at all
+        answer_ids = page_fragment['answer_ids']
+        page_answers = page_fragment['page_answer_ids']
+        post_to_author = page_fragment['post_to_author']
+        published_answer_ids = page_fragment['published_answer_ids']
+        answer_count = page_fragment['answer_count']
+        oldest_answer_id = page_fragment['oldest_answer_id']
+    else:
+        #load answers and post id's->athor_id mapping
+        #posts are pre-stuffed with the correctly ordered comments
+        question_post, answers, post_to_author, published_answer_ids = thread.get_post_data_for_question_view(
+                                    sort_method=answer_sort_method,
+                                    user=request.user
+                                )
+        answer_ids = [answer.id for answer in answers]
+
+        #resolve page number and comment number for permalinks
+        if show_comment:
+            show_page = show_comment.get_page_number(answer_posts=answers)
+            show_comment_position = show_comment.get_order_number()
+        elif show_answer:
+            show_page = show_post.get_page_number(answer_posts=answers)
+
+        objects_list = Paginator(answers, const.ANSWERS_PAGE_SIZE)
+        if show_page > objects_list.num_pages:
+            return HttpResponseRedirect(question_post.get_absolute_url())
+        page_objects = objects_list.page(show_page)
+        page_answers = page_objects.object_list
+
+        #authors of the posts on the page
+        page_posts = [question_post] + list(page_answers)
+        for post in list(page_posts):
+            page_posts.extend(post.get_cached_comments())
+        models.prime_profiles([post.author for post in page_posts])
+        card_user_ids = set([post.author_id for post in page_posts])
+        card_user_ids.update([
+            post.last_edited_by_id for post in page_posts if post.last_edited_by_id
+        ])
+
+        paginator_data = {
+            'is_paginated' : (objects_list.count > const.ANSWERS_PAGE_SIZE),
+            'pages': objects_list.num_pages,
+            'current_page_number': show_page,
+            'page_object': page_objects,
+            'base_url' : request.path + '?sort=%s&' % answer_sort_method,
+        }
+        paginator_context = functions.setup_paginator(paginator_data)
+        answer_count = thread.get_answer_count(request.user)
+        oldest_answer_id = thread.get_oldest_answer_id(request.user)
+
     user_votes = {}
     user_post_id_list = list()
     #todo: cache this query set, but again takes only 3ms!
@@ -550,44 +680,16 @@ def question(request, id):#refactor - long subroutine. display question body, an
             post_id for post_id in post_to_author if post_to_author[post_id] == request.user.id
         ]
 
-    #resolve page number and comment number for permalinks
-    show_comment_position = None
-    if show_comment:
-        show_page = show_comment.get_page_number(answer_posts=answers)
-        show_comment_position = show_comment.get_order_number()
-    elif show_answer:
-        show_page = show_post.get_page_number(answer_posts=answers)
-
-    objects_list = Paginator(answers, const.ANSWERS_PAGE_SIZE)
-    if show_page > objects_list.num_pages:
-        return HttpResponseRedirect(question_post.get_absolute_url())
-    page_objects = objects_list.page(show_page)
-
     #count visits
     signals.question_visited.send(None,
                     request=request,
                     question=question_post,
                 )
 
-    paginator_data = {
-        'is_paginated' : (objects_list.count > const.ANSWERS_PAGE_SIZE),
-        'pages': objects_list.num_pages,
-        'current_page_number': show_page,
-        'page_object': page_objects,
-        'base_url' : request.path + '?sort=%s&' % answer_sort_method,
-    }
-    paginator_context = functions.setup_paginator(paginator_data)
-
     #todo: maybe consolidate all activity in the thread
     #for the user into just one query?
     favorited = thread.has_favorite_by_user(request.user)
 
-    is_cacheable = True
-    if show_page != 1:
-        is_cacheable = False
-    elif show_comment_position > askbot_settings.MAX_COMMENTS_TO_SHOW:
-        is_cacheable = False
-
     #maybe load draft
     initial = {}
     if request.user.is_authenticated():
@@ -616,10 +718,11 @@ def question(request, id):#refactor - long subroutine. display question body, an
     previous_answer = None
     if request.user.is_authenticated():
         if askbot_settings.LIMIT_ONE_ANSWER_PER_USER:
-            for answer in answers:
-                if answer.author_id == request.user.pk:
+            for answer_id in answer_ids:
+                if post_to_author.get(answer_id) == request.user.pk:
                     new_answer_allowed = False
-                    previous_answer = answer
+                    #only the id is used on the page
+                    previous_answer = models.Post(id=answer_id, post_type='answer')
                     break
 
     if request.user.is_authenticated() and askbot_settings.GROUPS_ENABLED:
@@ -635,17 +738,15 @@ def question(request, id):#refactor - long subroutine. display question body, an
     data = {
         'active_tab': 'questions',
         'answer' : answer_form,
-        'answers' : page_objects.object_list,
-        'answer_count': thread.get_answer_count(request.user),
+        'answers' : page_answers,
+        'answer_count': answer_count,
         'blank_comment': MockPost(post_type='comment', author=request.user),#data for the js comment template
         'category_tree_data': askbot_settings.CATEGORY_TREE,
         'favorited' : favorited,
         'group_read_only': group_read_only,
-        'is_cacheable': False,#is_cacheable, #temporary, until invalidation fix
         'language_code': translation.get_language(),
-        'long_time': const.LONG_TIME,#"forever" caching
         'new_answer_allowed': new_answer_allowed,
-        'oldest_answer_id': thread.get_oldest_answer_id(request.user),
+        'oldest_answer_id': oldest_answer_id,
         'page_class': 'question-page',
         'paginator_context' : paginator_context,
         'previous_answer': previous_answer,
@@ -672,6 +773,32 @@ def question(request, id):#refactor - long subroutine. display question body, an
     extra = context.get_extra('ASKBOT_QUESTION_PAGE_EXTRA_CONTEXT', request, data)
     data.update(extra)
 
+    if is_cacheable:
+        if page_fragment is None:
+            template = get_template('question/posts.html')
+            html = template.render(context=dict(data), request=request)
+            #csrf token is the only visitor-specific value in the html,
+            #it is put back in the question/content.html template
+            csrf_token = get_token(request)
+            page_fragment = {
+                'html': html.replace(csrf_token, CSRF_TOKEN_PLACEHOLDER),
+                'answer_ids': answer_ids,
+                'page_answer_ids': [answer.id for answer in page_answers],
+                'post_to_author': post_to_author,
+                'published_answer_ids': list(published_answer_ids),
+                'answer_count': answer_count,
+                'oldest_answer_id': oldest_answer_id,
+                'card_user_ids': list(card_user_ids),
+                'user_cards_signature': models.get_user_cards_signature(
+                                            card_user_ids, translation.get_language()
+                                        ),
+            }
+            cache.cache.set(
+                page_fragment_key, page_fragment, const.QUESTION_PAGE_CACHE_TIMEOUT
+            )
+        data['posts_html'] = page_fragment['html']
+        data['csrf_token_placeholder'] = CSRF_TOKEN_PLACEHOLDER
+
     return render(request, 'question.html', data)
     #print 'generated in ', timezone.now() - before
     #return res
@@ -60,6 +60,7 @@ from askbot.search.state_manager import SearchState
 from askbot.utils import url_utils
 from askbot.utils.loading import load_module
 from askbot.utils.akismet_utils import akismet_check_spam
+from askbot.utils.profiling import set_request_view
 
 def owner_or_moderator_required(f):
     @functools.wraps(f)
@@ -220,6 +221,8 @@ def show_users(request, by_group=False, group_id=None, group_slug=None):
     except (EmptyPage, InvalidPage):
         users_page = objects_list.page(objects_list.num_pages)
 
+    models.prime_profiles(users_page)
+
     paginator_data = {
         'is_paginated' : is_paginated,
         'pages': objects_list.num_pages,
@@ -1385,6 +1388,7 @@ def user(request, id, slug=None, tab_name=None):
         raise Http404
 
     user_view_func = USER_VIEW_CALL_TABLE.get(tab_name, user_stats)
+    set_request_view(request, user_view_func)
 
     search_state = SearchState(
         scope=None,